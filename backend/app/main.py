@@ -14,7 +14,12 @@ from .routes import auth, renewal_workflow, statistics
 from .utils.exceptions import APIException
 from .services.database import DatabaseManager
 from .services.redis_manager import RedisManager
-from .middleware.auth import authenticate_session
+from .services.ai_conversation_manager import AIConversationManager
+from .services.usage_log_writer import UsageLogWriter
+from .services.mcp_cache import mcp_result_cache
+from .services.mcp_stdio_pool import mcp_stdio_pools
+from .services.mcp_transport import mcp_transport
+from .middleware.auth import authenticate_session, require_role
 
 # 載入環境變數
 load_dotenv()
@@ -145,13 +150,27 @@ def create_app() -> Quart:
     # 健康檢查端點
     @app.route("/health")
     async def health_check():
-        """健康檢查端點"""
+        """健康檢查端點（僅供存活檢查，不公開內部狀態）"""
         return jsonify({
             "status": "healthy",
             "service": "電信門市銷售助理系統",
             "version": "1.0.0"
         })
     
+    # 運行指標端點（連線池、快取與寫入佇列狀態）
+    @app.route("/api/metrics")
+    @require_role(["Manager", "Admin"])
+    async def metrics():
+        """運行指標端點（限主管與管理員）"""
+        return jsonify({
+            "database": app.db_manager.get_pool_stats() if hasattr(app, 'db_manager') else None,
+            "redis": app.redis_manager.get_metrics() if hasattr(app, 'redis_manager') else None,
+            "ai_usage_log": app.usage_log_writer.get_stats() if hasattr(app, 'usage_log_writer') else None,
+            "mcp_http": mcp_transport.get_stats(),
+            "mcp_cache": mcp_result_cache.get_stats(),
+            "mcp_stdio": mcp_stdio_pools.get_stats()
+        })
+    
     # 根路徑
     @app.route("/")
     async def root():
@@ -188,7 +207,7 @@ def create_app() -> Quart:
         """應用程式啟動時初始化"""
         logger.info("🚀 應用程式啟動中...")
         
-        # 初始化資料庫連線
+        # 初始化資料庫連線池（全應用程式共用，Oracle 無法連線時由 DatabaseManager 延遲重連）
         db_manager = DatabaseManager()
         await db_manager.initialize()
         app.db_manager = db_manager
@@ -198,6 +217,28 @@ def create_app() -> Quart:
         await redis_manager.initialize()
         app.redis_manager = redis_manager
         
+        # MCP Tool 快取（MCP_CACHE_REDIS=true 時由多個 worker 共用）
+        mcp_result_cache.attach_redis(redis_manager)
+        
+        # 預先啟動 stdio MCP Server 子程序（USE_HTTP_TRANSPORT=false 時）
+        await mcp_stdio_pools.warm_start()
+        
+        # AI 使用記錄背景批次寫入
+        usage_log_writer = UsageLogWriter(db_manager)
+        usage_log_writer.start()
+        app.usage_log_writer = usage_log_writer
+        
+        # 初始化共用的 AI 對話管理器（共用 Redis，保持 OpenAI / MCP 連線）
+        ai_manager = AIConversationManager(
+            redis_manager=redis_manager,
+            usage_log_writer=usage_log_writer
+        )
+        try:
+            await ai_manager.initialize()
+        except Exception as e:
+            logger.warning("AI 對話管理器初始化失敗，將於第一次對話時重試", error=str(e))
+        app.ai_manager = ai_manager
+        
         logger.info("✅ 應用程式啟動完成")
     
     @app.after_serving
@@ -205,6 +246,20 @@ def create_app() -> Quart:
         """應用程式關閉時清理"""
         logger.info("🛑 應用程式關閉中...")
         
+        # 關閉 AI 對話管理器
+        if getattr(app, 'ai_manager', None):
+            await app.ai_manager.close()
+        
+        # 關閉共用的 MCP HTTP 連線池
+        await mcp_transport.close()
+        
+        # 結束 stdio MCP Server 子程序
+        await mcp_stdio_pools.close()
+        
+        # 寫入剩餘的 AI 使用記錄（需在關閉資料庫連線前）
+        if getattr(app, 'usage_log_writer', None):
+            await app.usage_log_writer.close()
+        
         # 關閉資料庫連線
         if hasattr(app, 'db_manager'):
             await app.db_manager.close()
@@ -215,28 +270,4 @@ def create_app() -> Quart:
         
         logger.info("✅ 應用程式關閉完成")
     
-    # 立即初始化（開發模式）
-    async def init_services():
-        """立即初始化服務"""
-        logger.info("🚀 立即初始化服務...")
-        
-        # 初始化資料庫連線
-        db_manager = DatabaseManager()
-        await db_manager.initialize()
-        app.db_manager = db_manager
-        
-        # 初始化 Redis 連線
-        redis_manager = RedisManager()
-        await redis_manager.initialize()
-        app.redis_manager = redis_manager
-        
-        logger.info("✅ 服務初始化完成")
-    
-    # 在開發模式下立即初始化
-    import asyncio
-    try:
-        asyncio.run(init_services())
-    except Exception as e:
-        logger.error("服務初始化失敗", error=str(e))
-    
-    return app
\ No newline at end of file
+    return app
\ No newline at end of file
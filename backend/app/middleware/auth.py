@@ -43,8 +43,10 @@ async def authenticate_session():
         expire_time = datetime.fromisoformat(session_data['expire_time'])
         if datetime.now() > expire_time:
             # Session 過期，清除
-            await redis_manager.delete(f"session:{session_id}")
-            await redis_manager.delete(f"staff_sessions:{session_data['staff_id']}")
+            await redis_manager.delete_many([
+                f"session:{session_id}",
+                f"staff_sessions:{session_data['staff_id']}"
+            ])
             request.user = None
             return
         
@@ -104,4 +106,4 @@ def require_store_access(f):
         # 其他角色只能存取自己的門市
         # 這個邏輯可以在具體的路由中進一步檢查
         return await f(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+    return decorated_function
\ No newline at end of file
@@ -138,8 +138,10 @@ async def logout():
         
         if session_data:
             # 刪除相關的 Redis 資料
-            await redis_manager.delete(f"session:{session_id}")
-            await redis_manager.delete(f"staff_sessions:{session_data['staff_id']}")
+            await redis_manager.delete_many([
+                f"session:{session_id}",
+                f"staff_sessions:{session_data['staff_id']}"
+            ])
             
             logger.info("員工登出成功", staff_code=session_data.get('staff_code'), session_id=session_id)
         
@@ -171,8 +173,10 @@ async def get_current_user():
         expire_time = datetime.fromisoformat(session_data['expire_time'])
         if datetime.now() > expire_time:
             # Session 已過期，清除 Redis 資料
-            await redis_manager.delete(f"session:{session_id}")
-            await redis_manager.delete(f"staff_sessions:{session_data['staff_id']}")
+            await redis_manager.delete_many([
+                f"session:{session_id}",
+                f"staff_sessions:{session_data['staff_id']}"
+            ])
             raise AuthenticationError("Session 已過期，請重新登入")
         
         # 返回員工資訊
@@ -255,4 +259,4 @@ async def change_password():
         return jsonify({"success": False, "error": str(e)}), e.status_code
     except Exception as e:
         logger.error("變更密碼錯誤", error=str(e))
-        return jsonify({"success": False, "error": "系統錯誤"}), 500
\ No newline at end of file
+        return jsonify({"success": False, "error": "系統錯誤"}), 500
\ No newline at end of file
@@ -1,12 +1,19 @@
 """
 續約工作流程路由
 """
-from quart import Blueprint, request, jsonify, current_app
+from quart import Blueprint, request, jsonify, current_app, g
+from typing import Optional
 import structlog
 import json
+import asyncio
 from datetime import datetime
 
-from ..services.workflow_session import WorkflowSessionManager, WorkflowStep
+from ..services.ai_conversation_manager import AIConversationManager
+from ..services.workflow_session import (
+    WorkflowSessionManager,
+    WorkflowSessionUnitOfWork,
+    WorkflowStep
+)
 from ..services.crm_factory import get_crm_service
 from ..services.pos_factory import get_pos_service
 from ..services.promotion_factory import get_promotion_service
@@ -21,6 +28,74 @@ def get_workflow_manager() -> WorkflowSessionManager:
     return WorkflowSessionManager(current_app.redis_manager)
 
 
+async def get_ai_manager() -> AIConversationManager:
+    """
+    取得應用程式共用的 AI 對話管理器
+    
+    通常已於 before_serving 建立；若尚未建立（例如測試環境）則建立並共用 app 的 RedisManager。
+    MCP Server 於啟動時無法連線的情況下，會在此重試初始化。
+    """
+    if getattr(current_app, 'ai_manager', None) is None:
+        current_app.ai_manager = AIConversationManager(
+            redis_manager=current_app.redis_manager,
+            usage_log_writer=getattr(current_app, 'usage_log_writer', None)
+        )
+    
+    await current_app.ai_manager.initialize()
+    return current_app.ai_manager
+
+
+async def load_workflow_session(session_id: str) -> Optional[WorkflowSessionUnitOfWork]:
+    """
+    取得本次請求的 Session 工作單元
+    
+    同一請求內只從 Redis 讀取一次，變更累積於記憶體，
+    於請求結束時由 flush_workflow_sessions 一次寫回
+    """
+    units = g.setdefault('workflow_sessions', {})
+    
+    if session_id not in units:
+        unit = await get_workflow_manager().load(session_id)
+        if not unit:
+            return None
+        units[session_id] = unit
+    
+    return units[session_id]
+
+
+@bp.after_request
+async def flush_workflow_sessions(response):
+    """
+    寫回本次請求累積的 Session 變更；寫回失敗時改為回傳錯誤
+    
+    請求已提交資料庫交易（g.workflow_committed）時只記錄寫回失敗，保留成功回應
+    """
+    committed = g.pop('workflow_committed', False)
+    
+    for unit in g.pop('workflow_sessions', {}).values():
+        try:
+            if await unit.flush():
+                continue
+            error, status_code = "系統錯誤", 500
+        except ValueError as e:
+            logger.warning("Session 寫回被拒絕", session_id=unit.session_id, error=str(e))
+            error, status_code = "Session 狀態已變更，請重新操作", 409
+        
+        if committed:
+            logger.error(
+                "資料庫已提交但 Session 寫回失敗",
+                session_id=unit.session_id,
+                error=error
+            )
+            continue
+        
+        if response.status_code < 400:
+            response = jsonify({"success": False, "error": error})
+            response.status_code = status_code
+    
+    return response
+
+
 @bp.route('/start', methods=['POST'])
 async def start_workflow():
     """
@@ -83,8 +158,8 @@ async def query_customer():
             return jsonify({"success": False, "error": "缺少必要參數"}), 400
         
         # 驗證 Session
-        workflow_manager = get_workflow_manager()
-        session_data = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session_data = workflow_session.data if workflow_session else None
         
         if not session_data:
             return jsonify({"success": False, "error": "Session 不存在或已過期"}), 404
@@ -113,8 +188,7 @@ async def query_customer():
             }), 400
         
         # 更新 Session
-        await workflow_manager.update_customer_selection(
-            session_id,
+        workflow_session.update_customer_selection(
             {
                 "id_number": id_number,
                 "customer_id": customer["customer_id"],
@@ -123,11 +197,10 @@ async def query_customer():
             }
         )
         
-        # 轉換到 QUERY_CUSTOMER 狀態
-        await workflow_manager.transition_to_step(session_id, WorkflowStep.QUERY_CUSTOMER)
-        
-        # 然後轉換到下一步驟
-        await workflow_manager.transition_to_step(session_id, WorkflowStep.LIST_PHONES)
+        # 轉換到 QUERY_CUSTOMER 狀態，然後轉換到下一步驟（一次完成）
+        workflow_session.transition_steps(
+            [WorkflowStep.QUERY_CUSTOMER, WorkflowStep.LIST_PHONES]
+        )
         
         logger.info(
             "客戶查詢成功",
@@ -171,8 +244,8 @@ async def list_phones():
             return jsonify({"success": False, "error": "缺少 session_id"}), 400
         
         # 驗證 Session
-        workflow_manager = get_workflow_manager()
-        session_data = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session_data = workflow_session.data if workflow_session else None
         
         if not session_data:
             return jsonify({"success": False, "error": "Session 不存在或已過期"}), 404
@@ -212,7 +285,7 @@ async def list_phones():
             })
         
         # 轉換到 SELECT_PHONE 狀態
-        await workflow_manager.transition_to_step(session_id, WorkflowStep.SELECT_PHONE)
+        workflow_session.transition_to_step(WorkflowStep.SELECT_PHONE)
         
         logger.info(
             "門號列表取得成功",
@@ -254,8 +327,8 @@ async def select_phone():
             return jsonify({"success": False, "error": "缺少必要參數"}), 400
         
         # 驗證 Session
-        workflow_manager = get_workflow_manager()
-        session_data = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session_data = workflow_session.data if workflow_session else None
         
         if not session_data:
             return jsonify({"success": False, "error": "Session 不存在或已過期"}), 404
@@ -309,45 +382,30 @@ async def select_phone():
             ]
             
             updates = {field: None for field in fields_to_clear}
-            await workflow_manager.update_customer_selection(session_id, updates)
+            workflow_session.update_customer_selection(updates)
             
-            # 手動重置狀態到 SELECT_PHONE（繞過狀態轉換檢查）
-            session_data['current_step'] = WorkflowStep.SELECT_PHONE.value
-            session_data['updated_at'] = datetime.now().isoformat()
-            await workflow_manager.redis.set_json(
-                f"renewal_session:{session_id}",
-                session_data,
-                ex=3600
-            )
-            logger.info(
-                "已重置工作流程狀態",
-                session_id=session_id,
-                new_step=WorkflowStep.SELECT_PHONE.value
-            )
+            # 重置狀態到 SELECT_PHONE（繞過狀態轉換檢查）
+            workflow_session.reset_to_step(WorkflowStep.SELECT_PHONE)
         
         # 檢查續約資格
         crm_service = await get_crm_service()
         eligibility = await crm_service.check_eligibility(phone_number, customer_id)
         
         # 更新 Session
-        await workflow_manager.update_customer_selection(
-            session_id,
+        workflow_session.update_customer_selection(
             {
                 "selected_phone_number": phone_number,
                 "eligibility_check": eligibility
             }
         )
         
-        # 先轉換到 CHECK_ELIGIBILITY 狀態
-        await workflow_manager.transition_to_step(session_id, WorkflowStep.CHECK_ELIGIBILITY)
+        # 先轉換到 CHECK_ELIGIBILITY 狀態，符合資格時一併轉換到下一步驟
+        next_steps = [WorkflowStep.CHECK_ELIGIBILITY]
+        if eligibility["eligible"]:
+            next_steps.append(WorkflowStep.SELECT_DEVICE_TYPE)
+        workflow_session.transition_steps(next_steps)
         
         if eligibility["eligible"]:
-            # 轉換到下一步驟
-            await workflow_manager.transition_to_step(
-                session_id,
-                WorkflowStep.SELECT_DEVICE_TYPE
-            )
-            
             logger.info(
                 "門號選擇成功，符合續約資格",
                 session_id=session_id,
@@ -418,8 +476,8 @@ async def select_device_type():
             }), 400
         
         # 驗證 Session
-        workflow_manager = get_workflow_manager()
-        session_data = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session_data = workflow_session.data if workflow_session else None
         
         if not session_data:
             return jsonify({"success": False, "error": "Session 不存在或已過期"}), 404
@@ -472,23 +530,11 @@ async def select_device_type():
                 device_type=device_type
             )
             
-            # 手動重置狀態到 SELECT_DEVICE_TYPE（繞過狀態轉換檢查）
-            session_data['current_step'] = WorkflowStep.SELECT_DEVICE_TYPE.value
-            session_data['updated_at'] = datetime.now().isoformat()
-            await workflow_manager.redis.set_json(
-                f"renewal_session:{session_id}",
-                session_data,
-                ex=3600
-            )
-            logger.info(
-                "已重置工作流程狀態",
-                session_id=session_id,
-                new_step=WorkflowStep.SELECT_DEVICE_TYPE.value
-            )
+            # 重置狀態到 SELECT_DEVICE_TYPE（繞過狀態轉換檢查）
+            workflow_session.reset_to_step(WorkflowStep.SELECT_DEVICE_TYPE)
         
         # 更新 Session - 儲存裝置類型選擇
-        await workflow_manager.update_customer_selection(
-            session_id,
+        workflow_session.update_customer_selection(
             {"device_type": device_type}
         )
         
@@ -496,8 +542,7 @@ async def select_device_type():
         if device_type == "none":
             # 單純續約，跳過裝置選擇，直接到方案列表
             # 儲存空設備資料
-            await workflow_manager.update_customer_selection(
-                session_id,
+            workflow_session.update_customer_selection(
                 {
                     "device": {
                         "device_id": "none",
@@ -510,7 +555,7 @@ async def select_device_type():
         
         # 轉換狀態
         try:
-            await workflow_manager.transition_to_step(session_id, next_step)
+            workflow_session.transition_to_step(next_step)
             logger.info(
                 "狀態轉換成功",
                 session_id=session_id,
@@ -584,8 +629,8 @@ async def select_device_os():
             }), 400
         
         # 驗證 Session
-        workflow_manager = get_workflow_manager()
-        session_data = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session_data = workflow_session.data if workflow_session else None
         
         if not session_data:
             return jsonify({"success": False, "error": "Session 不存在或已過期"}), 404
@@ -616,28 +661,16 @@ async def select_device_os():
                 os_type=os_type_lower
             )
             
-            # 手動重置狀態到 SELECT_DEVICE_OS（繞過狀態轉換檢查）
-            session_data['current_step'] = WorkflowStep.SELECT_DEVICE_OS.value
-            session_data['updated_at'] = datetime.now().isoformat()
-            await workflow_manager.redis.set_json(
-                f"renewal_session:{session_id}",
-                session_data,
-                ex=3600
-            )
-            logger.info(
-                "已重置工作流程狀態",
-                session_id=session_id,
-                new_step=WorkflowStep.SELECT_DEVICE_OS.value
-            )
+            # 重置狀態到 SELECT_DEVICE_OS（繞過狀態轉換檢查）
+            workflow_session.reset_to_step(WorkflowStep.SELECT_DEVICE_OS)
         
         # 更新 Session - 儲存作業系統選擇
-        await workflow_manager.update_customer_selection(
-            session_id,
+        workflow_session.update_customer_selection(
             {"device_os": os_type_lower}
         )
         
         # 轉換狀態到 SELECT_DEVICE
-        await workflow_manager.transition_to_step(session_id, WorkflowStep.SELECT_DEVICE)
+        workflow_session.transition_to_step(WorkflowStep.SELECT_DEVICE)
         
         logger.info(
             "作業系統已選擇",
@@ -681,8 +714,8 @@ async def query_devices():
             return jsonify({"success": False, "error": "缺少 session_id"}), 400
         
         # 驗證 Session
-        workflow_manager = get_workflow_manager()
-        session_data = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session_data = workflow_session.data if workflow_session else None
         
         if not session_data:
             return jsonify({"success": False, "error": "Session 不存在或已過期"}), 404
@@ -765,8 +798,8 @@ async def get_recommendations():
             return jsonify({"success": False, "error": "缺少必要參數"}), 400
         
         # 驗證 Session
-        workflow_manager = get_workflow_manager()
-        session_data = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session_data = workflow_session.data if workflow_session else None
         
         if not session_data:
             return jsonify({"success": False, "error": "Session 不存在或已過期"}), 404
@@ -848,8 +881,8 @@ async def select_device():
             return jsonify({"success": False, "error": "缺少必要參數"}), 400
         
         # 驗證 Session
-        workflow_manager = get_workflow_manager()
-        session_data = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session_data = workflow_session.data if workflow_session else None
         
         if not session_data:
             return jsonify({"success": False, "error": "Session 不存在或已過期"}), 404
@@ -880,19 +913,8 @@ async def select_device():
                 device_id=device_id
             )
             
-            # 手動重置狀態到 SELECT_DEVICE（繞過狀態轉換檢查）
-            session_data['current_step'] = WorkflowStep.SELECT_DEVICE.value
-            session_data['updated_at'] = datetime.now().isoformat()
-            await workflow_manager.redis.set_json(
-                f"renewal_session:{session_id}",
-                session_data,
-                ex=3600
-            )
-            logger.info(
-                "已重置工作流程狀態",
-                session_id=session_id,
-                new_step=WorkflowStep.SELECT_DEVICE.value
-            )
+            # 重置狀態到 SELECT_DEVICE（繞過狀態轉換檢查）
+            workflow_session.reset_to_step(WorkflowStep.SELECT_DEVICE)
         
         # 取得設備詳細資料 (從 POS service)
         pos_service = await get_pos_service()
@@ -906,26 +928,25 @@ async def select_device():
             return jsonify({"success": False, "error": "設備不存在"}), 404
         
         # 更新 Session - 儲存設備選擇
-        await workflow_manager.update_customer_selection(
-            session_id,
+        workflow_session.update_customer_selection(
             {
                 "device_id": device_id,
                 "device_color": color if color else "預設"
             }
         )
         
-        # 重新獲取 session_data（可能已被更新）
-        session_data = await workflow_manager.get_session(session_id)
-        
         # 將設備資料存入 session 頂層 (供 Step 10 confirm 使用)
-        session_data['device'] = {
-            **device_detail,
-            "color": color if color else "預設"
-        }
-        await workflow_manager.update_session(session_id, session_data)
+        workflow_session.update_session(
+            {
+                "device": {
+                    **device_detail,
+                    "color": color if color else "預設"
+                }
+            }
+        )
         
         # 轉換狀態到 LIST_PLANS
-        await workflow_manager.transition_to_step(session_id, WorkflowStep.LIST_PLANS)
+        workflow_session.transition_to_step(WorkflowStep.LIST_PLANS)
         
         logger.info(
             "設備已選擇",
@@ -953,8 +974,8 @@ async def get_session(session_id: str):
     取得工作流程 Session 資料
     """
     try:
-        workflow_manager = get_workflow_manager()
-        session_data = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session_data = workflow_session.data if workflow_session else None
         
         if not session_data:
             return jsonify({"success": False, "error": "Session 不存在或已過期"}), 404
@@ -1029,8 +1050,8 @@ async def search_promotions():
             }), 400
         
         # 驗證 session
-        workflow_manager = get_workflow_manager()
-        session = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session = workflow_session.data if workflow_session else None
         
         if not session:
             return jsonify({"success": False, "error": "Session 不存在"}), 404
@@ -1054,14 +1075,15 @@ async def search_promotions():
         )
         
         # 更新 session (記錄搜尋歷史)
-        if 'search_history' not in session:
-            session['search_history'] = []
-        session['search_history'].append({
+        search_history = session.get('search_history', [])
+        search_history.append({
             "query": query,
-            "timestamp": str(__import__('datetime').datetime.now()),
+            "timestamp": str(datetime.now()),
             "results_count": result.get('total', 0)
         })
-        await workflow_manager.update_session(session_id, session)
+        workflow_session.update_session(
+            {"search_history": search_history}
+        )
         
         logger.info(
             "促銷方案搜尋完成",
@@ -1110,8 +1132,8 @@ async def get_plan_details():
             }), 400
         
         # 驗證 session
-        workflow_manager = get_workflow_manager()
-        session = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session = workflow_session.data if workflow_session else None
         
         if not session:
             return jsonify({"success": False, "error": "Session 不存在"}), 404
@@ -1178,8 +1200,8 @@ async def calculate_upgrade_cost():
             }), 400
         
         # 驗證 session
-        workflow_manager = get_workflow_manager()
-        session = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session = workflow_session.data if workflow_session else None
         
         if not session:
             return jsonify({"success": False, "error": "Session 不存在"}), 404
@@ -1270,8 +1292,8 @@ async def list_plans():
             return jsonify({"success": False, "error": "缺少 session_id"}), 400
         
         # 驗證 Session
-        workflow_manager = get_workflow_manager()
-        session = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session = workflow_session.data if workflow_session else None
         
         if not session:
             return jsonify({"success": False, "error": "Session 不存在"}), 404
@@ -1352,8 +1374,9 @@ async def list_plans():
             promotions_count=len(promotions)
         )
         
+        # 收集所有促銷關聯的方案，一次批次取得詳情（同一方案以第一個關聯的促銷為準）
+        plan_promotions = {}
         for promo in promotions:
-            # 取得促銷關聯的方案
             plan_ids = promo.get('plans', [])
             
             logger.debug(
@@ -1364,44 +1387,40 @@ async def list_plans():
             )
             
             for plan_id in plan_ids:
-                plan = await promotion_service.get_plan_details(plan_id)
-                
-                if not plan:
-                    logger.warning(
-                        "方案不存在",
-                        plan_id=plan_id,
-                        promotion_id=promo.get("promotion_id")
-                    )
-                    continue
-                
-                logger.debug(
-                    "方案詳情取得",
-                    plan_id=plan_id,
-                    plan_name=plan.get("name")
-                )
-                
-                # TODO: 可在此處加入資格檢查邏輯
-                # 例如：檢查在網時間、月消費門檻等
-                
-                # 組合方案資訊
-                plan_info = {
-                    "plan_id": plan["plan_id"],
-                    "name": plan["name"],
-                    "monthly_fee": plan["monthly_fee"],
-                    "data": plan.get("data", "未提供"),
-                    "voice": plan.get("voice", "未提供"),
-                    "sms": plan.get("sms", "不限"),
-                    "contract_months": plan["contract_months"],
-                    "gifts": plan.get("gifts", []),
-                    "promotion_id": promo["promotion_id"],
-                    "promotion_title": promo["title"],
-                    "relevance_score": promo.get("relevance_score", 0),
-                    "is_recommended": promo.get("priority", 0) >= 8
-                }
-                
-                # 避免重複
-                if not any(p["plan_id"] == plan_id for p in qualified_plans):
-                    qualified_plans.append(plan_info)
+                plan_promotions.setdefault(plan_id, promo)
+        
+        plans_result = await promotion_service.get_plans_details(list(plan_promotions))
+        plan_details = plans_result.get("plans", {})
+        
+        if plans_result.get("not_found"):
+            logger.warning(
+                "方案不存在",
+                plan_ids=plans_result["not_found"]
+            )
+        
+        for plan_id, promo in plan_promotions.items():
+            plan = plan_details.get(plan_id)
+            if not plan:
+                continue
+            
+            # TODO: 可在此處加入資格檢查邏輯
+            # 例如：檢查在網時間、月消費門檻等
+            
+            # 組合方案資訊
+            qualified_plans.append({
+                "plan_id": plan["plan_id"],
+                "name": plan["name"],
+                "monthly_fee": plan["monthly_fee"],
+                "data": plan.get("data", "未提供"),
+                "voice": plan.get("voice", "未提供"),
+                "sms": plan.get("sms", "不限"),
+                "contract_months": plan["contract_months"],
+                "gifts": plan.get("gifts", []),
+                "promotion_id": promo["promotion_id"],
+                "promotion_title": promo["title"],
+                "relevance_score": promo.get("relevance_score", 0),
+                "is_recommended": promo.get("priority", 0) >= 8
+            })
         
         # 依相關性和推薦度排序
         qualified_plans.sort(
@@ -1410,8 +1429,9 @@ async def list_plans():
         )
         
         # 更新 Session 狀態
-        session['current_step'] = WorkflowStep.LIST_PLANS.value
-        await workflow_manager.update_session(session_id, session)
+        workflow_session.update_session(
+            {"current_step": WorkflowStep.LIST_PLANS.value}
+        )
         
         logger.info(
             "Step 8: 列出方案完成",
@@ -1463,11 +1483,11 @@ async def compare_plans():
         )
         
         # 初始化服務
-        workflow_manager = get_workflow_manager()
         promotion_service = await get_promotion_service()
         
         # 驗證 Session
-        session = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session = workflow_session.data if workflow_session else None
         if not session:
             logger.warning("Session 不存在", session_id=session_id)
             return jsonify({"success": False, "error": "Session 不存在"}), 401
@@ -1528,10 +1548,13 @@ async def compare_plans():
             }), 400
         
         # 儲存比較結果到 session
-        session['comparison_result'] = comparison_result
-        session['compared_plan_ids'] = plan_ids
-        session['current_step'] = WorkflowStep.COMPARE_PLANS.value
-        await workflow_manager.update_session(session_id, session)
+        workflow_session.update_session(
+            {
+                "comparison_result": comparison_result,
+                "compared_plan_ids": plan_ids,
+                "current_step": WorkflowStep.COMPARE_PLANS.value
+            }
+        )
         
         logger.info(
             "Step 9: 比較方案完成",
@@ -1578,8 +1601,8 @@ async def select_plan():
             }), 400
         
         # 驗證 session
-        workflow_manager = get_workflow_manager()
-        session = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session = workflow_session.data if workflow_session else None
         
         if not session:
             return jsonify({"success": False, "error": "Session 不存在"}), 404
@@ -1617,7 +1640,7 @@ async def select_plan():
         )
         
         # 更新 session
-        session['selected_plan'] = {
+        selected_plan = {
             "plan_id": plan_id,
             "plan_name": plan['name'],
             "monthly_fee": plan['monthly_fee'],
@@ -1625,12 +1648,16 @@ async def select_plan():
             "data": plan['data'],
             "voice": plan['voice'],
             "cost_details": cost_result,
-            "selected_at": str(__import__('datetime').datetime.now())
+            "selected_at": str(datetime.now())
         }
         
         # 前進到 CONFIRM 步驟
-        session['current_step'] = WorkflowStep.CONFIRM.value
-        await workflow_manager.update_session(session_id, session)
+        workflow_session.update_session(
+            {
+                "selected_plan": selected_plan,
+                "current_step": WorkflowStep.CONFIRM.value
+            }
+        )
         
         logger.info(
             "方案選擇完成",
@@ -1643,7 +1670,7 @@ async def select_plan():
             "success": True,
             "message": "方案已選擇",
             "next_step": "CONFIRM",
-            "selected_plan": session['selected_plan']
+            "selected_plan": selected_plan
         })
         
     except Exception as e:
@@ -1684,8 +1711,8 @@ async def confirm_application():
             return jsonify({"success": False, "error": "缺少 session_id"}), 400
         
         # 驗證 Session
-        workflow_manager = get_workflow_manager()
-        session = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session = workflow_session.data if workflow_session else None
         
         if not session:
             return jsonify({"success": False, "error": "Session 不存在"}), 404
@@ -1717,27 +1744,35 @@ async def confirm_application():
         phone = session.get('phone')
         contract = session.get('contract')
         
-        # 動態取得缺失的資料
+        # 動態取得缺失的資料（同時查詢，HTTP MCP 會合併為一次批次調用）
         crm_service = await get_crm_service()
+        phone_number = customer_selection.get('selected_phone_number')
         
-        if not customer and customer_selection.get('id_number'):
-            customer = await crm_service.query_customer_by_id(
-                customer_selection.get('id_number')
-            )
+        async def fetch_customer():
+            if not customer and customer_selection.get('id_number'):
+                return await crm_service.query_customer_by_id(
+                    customer_selection.get('id_number')
+                )
+            return customer
+        
+        async def fetch_phone():
+            if not phone and phone_number:
+                customer_id = customer_selection.get('customer_id')
+                phones_list = await crm_service.get_customer_phones(customer_id)
+                return next(
+                    (p for p in phones_list if p["phone_number"] == phone_number),
+                    None
+                )
+            return phone
         
-        if not phone and customer_selection.get('selected_phone_number'):
-            phone_number = customer_selection.get('selected_phone_number')
-            customer_id = customer_selection.get('customer_id')
-            phones_list = await crm_service.get_customer_phones(customer_id)
-            phone = next(
-                (p for p in phones_list if p["phone_number"] == phone_number),
-                None
-            )
+        async def fetch_contract():
+            if not contract and phone_number:
+                return await crm_service.get_phone_contract(phone_number)
+            return contract
         
-        if not contract and customer_selection.get('selected_phone_number'):
-            contract = await crm_service.get_phone_contract(
-                customer_selection.get('selected_phone_number')
-            )
+        customer, phone, contract = await asyncio.gather(
+            fetch_customer(), fetch_phone(), fetch_contract()
+        )
         
         # 驗證必要資料完整性
         missing_fields = []
@@ -1850,8 +1885,8 @@ async def submit_application():
             return jsonify({"success": False, "error": "缺少 session_id"}), 400
         
         # 驗證 Session
-        workflow_manager = get_workflow_manager()
-        session = await workflow_manager.get_session(session_id)
+        workflow_session = await load_workflow_session(session_id)
+        session = workflow_session.data if workflow_session else None
         
         if not session:
             return jsonify({"success": False, "error": "Session 不存在"}), 404
@@ -1889,11 +1924,28 @@ async def submit_application():
         today = datetime.datetime.now().strftime('%Y%m%d')
         order_number = f"ORD{today}{session_id[-6:]}"
         
-        # 取得資料庫連線
-        oracle_manager = current_app.oracle_manager
+        # 提交資料庫前先將 Session 轉為已完成並立即寫回（確認目前步驟仍為 confirm），
+        # 並行或重送的申辦請求會在此被拒絕，不會重複寫入訂單
+        workflow_session.transition_to_step(WorkflowStep.COMPLETED)
+        workflow_session.update_session(
+            {
+                "order_number": order_number,
+                "completed_at": str(datetime.datetime.now())
+            }
+        )
+        try:
+            claimed = await workflow_session.flush()
+        except ValueError as e:
+            logger.warning("申辦已在處理中或 Session 已變更", session_id=session_id, error=str(e))
+            return jsonify({
+                "success": False,
+                "error": "Session 狀態已變更，請重新操作"
+            }), 409
+        
+        if not claimed:
+            return jsonify({"success": False, "error": "系統錯誤"}), 500
         
         try:
-            # 開始資料庫交易
             # 1. 更新 RenewalSessions
             update_session_sql = """
                 UPDATE renewal_sessions
@@ -1905,14 +1957,6 @@ async def submit_application():
                 WHERE session_id = :session_id
             """
             
-            await oracle_manager.execute(
-                update_session_sql,
-                {
-                    'session_id': session_id,
-                    'total_amount': total_amount
-                }
-            )
-            
             # 2. 記錄 CustomerServiceLogs
             service_log_sql = """
                 INSERT INTO customer_service_logs (
@@ -1925,14 +1969,24 @@ async def submit_application():
             
             notes = f"續約申辦完成 - 方案: {selected_plan.get('plan_name')}, 總金額: {total_amount}"
             
-            await oracle_manager.execute(
-                service_log_sql,
-                {
-                    'staff_id': staff_id,
-                    'customer_id': customer.get('customer_id'),
-                    'notes': notes
-                }
-            )
+            # 使用共用的資料庫連線池，兩個 SQL 在同一交易中提交
+            await current_app.db_manager.execute_transaction([
+                (
+                    update_session_sql,
+                    {
+                        'session_id': session_id,
+                        'total_amount': total_amount
+                    }
+                ),
+                (
+                    service_log_sql,
+                    {
+                        'staff_id': staff_id,
+                        'customer_id': customer.get('customer_id'),
+                        'notes': notes
+                    }
+                )
+            ])
             
             logger.info(
                 "申辦提交成功",
@@ -1949,16 +2003,16 @@ async def submit_application():
                 error=str(db_error),
                 exc_info=True
             )
+            # 還原 Session 為確認步驟，讓使用者可以重新提交（由 flush_workflow_sessions 寫回）
+            workflow_session.reset_to_step(WorkflowStep.CONFIRM)
+            workflow_session.update_session({"order_number": None, "completed_at": None})
             return jsonify({
                 "success": False,
                 "error": "資料庫更新失敗，請稍後再試"
             }), 500
         
-        # 更新 Redis Session 狀態
-        session['current_step'] = WorkflowStep.COMPLETED.value
-        session['order_number'] = order_number
-        session['completed_at'] = str(datetime.datetime.now())
-        await workflow_manager.update_session(session_id, session)
+        # 訂單已提交，之後的 Session 寫回失敗不可再改為錯誤回應（避免用戶端重送造成重複申辦）
+        g.workflow_committed = True
         
         return jsonify({
             "success": True,
@@ -2026,8 +2080,8 @@ async def chat_stream():
             return jsonify({"success": False, "error": "缺少 message"}), 400
         
         # 驗證 Session
-        workflow_manager = get_workflow_manager()
-        session = await workflow_manager.get_session(renewal_session_id)
+        workflow_session = await load_workflow_session(renewal_session_id)
+        session = workflow_session.data if workflow_session else None
         
         if not session:
             logger.warning("Session 不存在", renewal_session_id=renewal_session_id)
@@ -2067,10 +2121,8 @@ async def chat_stream():
             message=message[:50]  # 只記錄前 50 字
         )
         
-        # 建立 AI 對話管理器
-        from ..services.ai_conversation_manager import AIConversationManager
-        ai_manager = AIConversationManager()
-        await ai_manager.initialize()
+        # 取得共用的 AI 對話管理器
+        ai_manager = await get_ai_manager()
         
         # 使用生成器函數返回 SSE 串流
         async def generate_sse():
@@ -2085,8 +2137,6 @@ async def chat_stream():
             except Exception as e:
                 logger.error("SSE 串流錯誤", error=str(e), exc_info=True)
                 yield f"event: error\ndata: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
-            finally:
-                await ai_manager.close()
         
         # 返回 SSE 回應
         return generate_sse(), {
@@ -2097,4 +2147,4 @@ async def chat_stream():
         
     except Exception as e:
         logger.error("AI 對話失敗", error=str(e), exc_info=True)
-        return jsonify({"success": False, "error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"success": False, "error": str(e)}), 500
\ No newline at end of file
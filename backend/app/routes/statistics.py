@@ -1,9 +1,14 @@
 """
 統計相關路由
 """
+from datetime import datetime
+
 from quart import Blueprint, request, jsonify, current_app
 import structlog
 
+from ..services.token_usage import TokenUsageTracker
+from ..services.workflow_session import WorkflowSessionManager
+
 logger = structlog.get_logger()
 bp = Blueprint('statistics', __name__)
 
@@ -54,4 +59,51 @@ async def get_store_rankings():
         })
     except Exception as e:
         logger.error("取得門市排行榜錯誤", error=str(e))
-        return jsonify({"success": False, "error": "系統錯誤"}), 500
\ No newline at end of file
+        return jsonify({"success": False, "error": "系統錯誤"}), 500
+
+@bp.route('/ai-usage', methods=['GET'])
+async def get_ai_usage():
+    """
+    AI Token 使用量
+    
+    Query 參數:
+        date: 日期（YYYYMMDD，預設今天）
+        renewal_session_id: 續約 Session ID（選填，只能查詢自己的 Session，一併回傳該 Session 的使用量）
+    """
+    try:
+        if not hasattr(request, 'user') or not request.user:
+            return jsonify({"success": False, "error": "未登入"}), 401
+        
+        staff_id = request.user.get('staff_id')
+        
+        date = request.args.get('date')
+        if date is not None:
+            try:
+                if len(date) != 8 or not date.isdigit():
+                    raise ValueError(date)
+                datetime.strptime(date, "%Y%m%d")
+            except ValueError:
+                return jsonify({"success": False, "error": "date 格式錯誤，應為 YYYYMMDD"}), 400
+        
+        session_id = request.args.get('renewal_session_id')
+        if session_id:
+            session = await WorkflowSessionManager(current_app.redis_manager).get_session(session_id)
+            if not session:
+                return jsonify({"success": False, "error": "Session 不存在"}), 404
+            if session.get('staff_id') != staff_id:
+                logger.warning("Session 不屬於該員工", renewal_session_id=session_id, staff_id=staff_id)
+                return jsonify({"success": False, "error": "Session 不屬於該員工"}), 403
+        
+        tracker = TokenUsageTracker(current_app.redis_manager)
+        data = {
+            "staff_id": staff_id,
+            "staff_daily": await tracker.get_staff_usage(staff_id, date)
+        }
+        
+        if session_id:
+            data["session"] = await tracker.get_session_usage(session_id)
+        
+        return jsonify({"success": True, "data": data})
+    except Exception as e:
+        logger.error("取得 AI 使用量錯誤", error=str(e))
+        return jsonify({"success": False, "error": "系統錯誤"}), 500
@@ -7,17 +7,21 @@ AI Conversation Manager - Sprint 7
 - Token 使用追蹤
 - SSE 串流輸出
 """
-from typing import AsyncGenerator, Dict, List, Any, Optional
+from typing import AsyncGenerator, Dict, List, Any, Optional, Tuple
+import asyncio
 import json
 import os
 import structlog
 from datetime import datetime
 from openai import AsyncAzureOpenAI
 
-from .mcp_client_http import MCPClientServiceHTTP
-from .mcp_client_pos_http import MCPClientServicePOSHTTP
-from .mcp_client_promotion_http import MCPClientServicePromotionHTTP
+from .mcp_client_http import mcp_client_http
+from .mcp_client_pos_http import mcp_client_pos_http
+from .mcp_client_promotion_http import mcp_client_promotion_http
 from .redis_manager import RedisManager
+from .workflow_session import WorkflowSessionManager
+from .token_usage import TokenUsageTracker, estimate_tokens, estimate_messages_tokens
+from .usage_log_writer import UsageLogWriter
 
 logger = structlog.get_logger()
 
@@ -40,10 +44,24 @@ class AIConversationManager:
     2. 協調 Function Calling
     3. 串流輸出 AI 回答
     4. 追蹤 Token 使用
+    
+    整個應用程式共用一個實例（於 before_serving 建立），只保存長期使用的
+    OpenAI / MCP Client 與 Redis 連線；每次對話的訊息、Tool Calls 與 Token
+    計數都是 chat_stream 內的區域變數，多個 SSE 請求可同時使用同一實例。
     """
     
-    def __init__(self):
-        """初始化 AI 對話管理器"""
+    def __init__(
+        self,
+        redis_manager: Optional[RedisManager] = None,
+        usage_log_writer: Optional[UsageLogWriter] = None
+    ):
+        """
+        初始化 AI 對話管理器
+        
+        Args:
+            redis_manager: 共用的 Redis 管理器（未提供時自行建立，並由本管理器負責關閉）
+            usage_log_writer: 應用程式共用的 AI 使用記錄寫入器（未提供時不寫入資料庫）
+        """
         # Azure OpenAI Client
         self.client = AsyncAzureOpenAI(
             api_key=os.getenv("AZURE_OPENAI_API_KEY"),
@@ -51,44 +69,92 @@ class AIConversationManager:
             azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
         )
         
-        # MCP Clients
-        self.crm_client = MCPClientServiceHTTP()
-        self.pos_client = MCPClientServicePOSHTTP()
-        self.promotion_client = MCPClientServicePromotionHTTP()
+        # MCP Clients（與服務工廠共用同一組實例，HTTP 連線池由 mcp_transport 管理）
+        self.crm_client = mcp_client_http
+        self.pos_client = mcp_client_pos_http
+        self.promotion_client = mcp_client_promotion_http
         
         # Redis Manager
-        self.redis_manager = RedisManager()
+        self._owns_redis = redis_manager is None
+        self.redis_manager = redis_manager or RedisManager()
+        
+        # AI 使用記錄（背景批次寫入資料庫，寫入器與資料庫連線由應用程式管理）
+        self.usage_log_writer = usage_log_writer
+        
+        self.initialized = False
+        self._init_lock = asyncio.Lock()
+        
+        # 每個 Session / 門市人員的 Token 使用量累計
+        self.usage_tracker = TokenUsageTracker(self.redis_manager)
         
         # 配置
         self.model = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o")
         self.max_iterations = int(os.getenv("AI_MAX_FUNCTION_ITERATIONS", "5"))
         self.max_tokens = int(os.getenv("AI_MAX_TOKENS", "1000"))
         
+        # 同一輪的多個 Tool Calls 並行執行：同時執行上限與單一工具逾時秒數
+        self.tool_concurrency = int(os.getenv("AI_TOOL_CONCURRENCY", "4"))
+        self.tool_timeout = float(os.getenv("AI_TOOL_TIMEOUT", "15"))
+        
+        # 對話紀錄：帶入最近幾筆訊息，較早的訊息可選擇以摘要取代
+        self.chat_context_messages = int(os.getenv("AI_CHAT_CONTEXT_MESSAGES", "6"))
+        self.chat_summary_enabled = os.getenv("AI_CHAT_SUMMARY_ENABLED", "false").lower() == "true"
+        self.chat_summary_trigger = int(os.getenv("AI_CHAT_SUMMARY_TRIGGER", "20"))
+        # 背景執行中的摘要工作（每個 Session 同時只有一個）
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
+        
         logger.info("AI Conversation Manager 初始化", model=self.model)
     
     async def initialize(self):
-        """初始化所有 MCP Clients"""
-        logger.info("初始化 MCP Clients")
-        await self.crm_client.initialize()
-        await self.pos_client.initialize()
-        await self.promotion_client.initialize()
-        await self.redis_manager.initialize()
-        logger.info("所有 MCP Clients 初始化完成")
+        """
+        初始化所有 MCP Clients（已初始化時直接返回，可在每次對話前呼叫）
+        
+        Raises:
+            RuntimeError: MCP Server 無法連線（下次呼叫時會再重試）
+        """
+        if self.initialized:
+            return
+        
+        async with self._init_lock:
+            if self.initialized:
+                return
+            
+            logger.info("初始化 MCP Clients")
+            await self.crm_client.initialize()
+            await self.pos_client.initialize()
+            await self.promotion_client.initialize()
+            if self._owns_redis:
+                await self.redis_manager.initialize()
+            
+            self.initialized = True
+            logger.info("所有 MCP Clients 初始化完成")
     
     async def close(self):
-        """關閉所有連線"""
+        """關閉所有連線（共用的 Redis 管理器由應用程式負責關閉）"""
         logger.info("關閉 AI Conversation Manager")
+        tasks = list(self._summary_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
         await self.crm_client.close()
         await self.pos_client.close()
         await self.promotion_client.close()
-        await self.redis_manager.close()
+        await self.client.close()
+        if self._owns_redis:
+            await self.redis_manager.close()
+        self.initialized = False
     
-    def _get_system_prompt(self, session_data: Dict[str, Any]) -> str:
+    def _get_system_prompt(
+        self,
+        session_data: Dict[str, Any],
+        chat_summary: Optional[str] = None
+    ) -> str:
         """
         根據 Session 資料生成系統提示詞
         
         Args:
             session_data: 續約 Session 資料
+            chat_summary: 較早對話的摘要（選填，取代完整的對話紀錄）
             
         Returns:
             系統提示詞
@@ -142,6 +208,12 @@ class AIConversationManager:
 - 方案名稱：{selected_plan.get('plan_name', '未知')}
 - 月租費：{selected_plan.get('monthly_fee', '未知')} 元
 - 合約期：{selected_plan.get('contract_months', '未知')} 個月
+"""
+        
+        if chat_summary:
+            prompt += f"""
+先前對話摘要：
+{chat_summary}
 """
         
         prompt += """
@@ -541,6 +613,46 @@ class AIConversationManager:
             logger.error(error_msg, function=function_name, error=str(e))
             return {"error": error_msg}
     
+    async def _execute_tool_calls(
+        self,
+        calls: List[Tuple[str, Dict[str, Any]]]
+    ) -> AsyncGenerator[Tuple[int, Any], None]:
+        """
+        並行執行 Tool Calls（同時最多 tool_concurrency 個，每個最多 tool_timeout 秒）
+        
+        Args:
+            calls: (function 名稱, 參數) 列表
+            
+        Yields:
+            依完成順序產出 (原始索引, 結果)
+        """
+        semaphore = asyncio.Semaphore(self.tool_concurrency)
+        
+        async def run(index: int, function_name: str, arguments: Dict[str, Any]) -> Tuple[int, Any]:
+            async with semaphore:
+                try:
+                    result = await asyncio.wait_for(
+                        self._call_function(function_name, arguments),
+                        timeout=self.tool_timeout
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning("Function 調用逾時", function=function_name, timeout=self.tool_timeout)
+                    result = {"error": f"Function 調用逾時: {function_name}"}
+            return index, result
+        
+        tasks = [
+            asyncio.create_task(run(index, function_name, arguments))
+            for index, (function_name, arguments) in enumerate(calls)
+        ]
+        
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # 串流中斷（例如前端斷線）時取消尚未完成的調用
+            for task in tasks:
+                task.cancel()
+    
     async def chat_stream(
         self,
         session_id: str,
@@ -561,23 +673,35 @@ class AIConversationManager:
         logger.info("開始 AI 對話", session_id=session_id, staff_id=staff_id)
         
         # 取得 Session 資料
-        # 注意：session_id 是 renewal_session_id，需要用 renewal_session: 前綴
-        session_key = f"renewal_session:{session_id}"
-        session_data = await self.redis_manager.get_json(session_key)
+        # 注意：session_id 是 renewal_session_id，透過 WorkflowSessionManager 讀取（支援 json/hash 儲存模式）
+        workflow_manager = WorkflowSessionManager(self.redis_manager)
+        session_data = await workflow_manager.get_session(session_id)
         
         if not session_data:
             yield f"event: error\ndata: {json.dumps({'type': 'error', 'error': 'Session 不存在'})}\n\n"
             return
         
+        # 對話紀錄另外存放，只取最近幾筆；較早的內容以摘要帶入系統提示詞
+        history = await workflow_manager.get_chat_history(
+            session_id, limit=self.chat_context_messages
+        )
+        chat_summary = (
+            await workflow_manager.get_chat_summary(session_id)
+            if self.chat_summary_enabled else None
+        )
+        
         # 建立對話歷史
         messages = [
-            {"role": "system", "content": self._get_system_prompt(session_data)},
+            {"role": "system", "content": self._get_system_prompt(session_data, chat_summary)},
+            *({"role": message["role"], "content": message["content"]} for message in history),
             {"role": "user", "content": user_message}
         ]
         
         # Function Calling 迭代
+        tools = self._get_function_definitions()
         total_prompt_tokens = 0
         total_completion_tokens = 0
+        usage_estimated = False
         iteration = 0
         
         try:
@@ -589,18 +713,24 @@ class AIConversationManager:
                 response = await self.client.chat.completions.create(
                     model=self.model,
                     messages=messages,
-                    tools=self._get_function_definitions(),
+                    tools=tools,
                     tool_choice="auto",
                     max_tokens=self.max_tokens,
-                    stream=True
+                    stream=True,
+                    stream_options={"include_usage": True}
                 )
                 
                 # 收集串流回應
                 collected_messages = []
                 tool_calls = []
                 current_tool_call = None
+                usage = None
                 
                 async for chunk in response:
+                    # 最後一個 chunk 帶有本次請求的 usage（choices 為空）
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    
                     if not chunk.choices:
                         continue
                     
@@ -645,11 +775,21 @@ class AIConversationManager:
                 if current_tool_call:
                     tool_calls.append(current_tool_call)
                 
+                # 累計 Token 使用量：優先使用 API 回傳的 usage，缺少時以 tokenizer 估算
+                if usage:
+                    total_prompt_tokens += usage.prompt_tokens
+                    total_completion_tokens += usage.completion_tokens
+                else:
+                    usage_estimated = True
+                    total_prompt_tokens += estimate_messages_tokens(messages, tools)
+                    total_completion_tokens += estimate_tokens("".join(collected_messages)) + sum(
+                        estimate_tokens(tool_call["function"]["name"]) +
+                        estimate_tokens(tool_call["function"]["arguments"])
+                        for tool_call in tool_calls
+                    )
+                
                 # 如果沒有 tool calls，結束迭代
                 if not tool_calls:
-                    # 取得 Token 使用量（估計）
-                    total_prompt_tokens += len(user_message) // 4
-                    total_completion_tokens += len("".join(collected_messages)) // 4
                     break
                 
                 # 執行 Tool Calls
@@ -659,6 +799,7 @@ class AIConversationManager:
                     "tool_calls": []
                 }
                 
+                calls = []
                 for tool_call in tool_calls:
                     function_name = tool_call["function"]["name"]
                     arguments_str = tool_call["function"]["arguments"]
@@ -668,16 +809,11 @@ class AIConversationManager:
                     except json.JSONDecodeError:
                         arguments = {}
                     
+                    calls.append((function_name, arguments))
+                    
                     # 通知前端 Function Calling
                     yield f"event: function_call\ndata: {json.dumps({'type': 'function_call', 'name': function_name, 'arguments': arguments})}\n\n"
                     
-                    # 調用 Function
-                    result = await self._call_function(function_name, arguments)
-                    
-                    # 通知前端 Function 結果
-                    yield f"event: function_result\ndata: {json.dumps({'type': 'function_result', 'name': function_name, 'result': result})}\n\n"
-                    
-                    # 加入到對話歷史
                     assistant_message["tool_calls"].append({
                         "id": tool_call["id"],
                         "type": "function",
@@ -686,23 +822,43 @@ class AIConversationManager:
                             "arguments": arguments_str
                         }
                     })
-                    
+                
+                # 並行調用 Function，每完成一個就通知前端
+                results: List[Any] = [None] * len(calls)
+                async for index, result in self._execute_tool_calls(calls):
+                    results[index] = result
+                    yield f"event: function_result\ndata: {json.dumps({'type': 'function_result', 'name': calls[index][0], 'tool_call_id': tool_calls[index]['id'], 'result': result})}\n\n"
+                
+                # 加入到對話歷史（assistant 訊息在前，tool 結果依原始順序）
+                messages.append(assistant_message)
+                for tool_call, (function_name, _), result in zip(tool_calls, calls, results):
                     messages.append({
                         "role": "tool",
                         "tool_call_id": tool_call["id"],
                         "name": function_name,
                         "content": json.dumps(result, ensure_ascii=False)
                     })
-                
-                messages.append(assistant_message)
-                
-                # 更新 Token 計數（估計）
-                total_prompt_tokens += len(arguments_str) // 4
-                total_completion_tokens += len(json.dumps(result)) // 4
             
             # 完成
             total_tokens = total_prompt_tokens + total_completion_tokens
-            yield f"event: done\ndata: {json.dumps({'type': 'done', 'tokens': {'prompt': total_prompt_tokens, 'completion': total_completion_tokens, 'total': total_tokens}})}\n\n"
+            yield f"event: done\ndata: {json.dumps({'type': 'done', 'tokens': {'prompt': total_prompt_tokens, 'completion': total_completion_tokens, 'total': total_tokens, 'estimated': usage_estimated}})}\n\n"
+            
+            # 累計 Session / 門市人員的 Token 使用量
+            await self.usage_tracker.record(
+                session_id,
+                staff_id,
+                total_prompt_tokens,
+                total_completion_tokens,
+                self._calculate_cost(total_prompt_tokens, total_completion_tokens)
+            )
+            
+            # 儲存本輪對話
+            await workflow_manager.add_chat_message(session_id, "user", user_message)
+            await workflow_manager.add_chat_message(
+                session_id, "assistant", "".join(collected_messages)
+            )
+            if self.chat_summary_enabled:
+                self._schedule_chat_summary(workflow_manager, session_id, staff_id)
             
             # 記錄 AI 使用
             await self._log_ai_usage(
@@ -721,6 +877,103 @@ class AIConversationManager:
             logger.error(error_msg, error=str(e))
             yield f"event: error\ndata: {json.dumps({'type': 'error', 'error': error_msg})}\n\n"
     
+    def _schedule_chat_summary(
+        self,
+        workflow_manager: WorkflowSessionManager,
+        session_id: str,
+        staff_id: str
+    ):
+        """
+        於背景更新對話摘要（不佔用 SSE 回應與連線）
+        
+        同一 Session 已有摘要工作執行中時略過，下一輪對話再檢查
+        """
+        running = self._summary_tasks.get(session_id)
+        if running is not None and not running.done():
+            return
+        
+        task = asyncio.create_task(self._update_chat_summary(workflow_manager, session_id, staff_id))
+        self._summary_tasks[session_id] = task
+        
+        def finished(done: asyncio.Task):
+            if self._summary_tasks.get(session_id) is done:
+                del self._summary_tasks[session_id]
+            if not done.cancelled() and done.exception() is not None:
+                logger.warning("背景對話摘要失敗", session_id=session_id, error=str(done.exception()))
+        
+        task.add_done_callback(finished)
+    
+    async def _update_chat_summary(
+        self,
+        workflow_manager: WorkflowSessionManager,
+        session_id: str,
+        staff_id: str
+    ):
+        """
+        對話紀錄達 chat_summary_trigger 筆時，將較早的訊息併入滾動摘要，
+        對話紀錄只保留最近 chat_context_messages 筆
+        
+        Args:
+            workflow_manager: 工作流程管理器
+            session_id: 續約 Session ID
+            staff_id: 門市人員 ID（摘要的 Token 使用量計入此人員）
+        """
+        history = await workflow_manager.get_chat_history(session_id)
+        
+        if len(history) < self.chat_summary_trigger:
+            return
+        
+        older = history[:-self.chat_context_messages] if self.chat_context_messages else history
+        previous_summary = await workflow_manager.get_chat_summary(session_id)
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in older)
+        
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "請將門市續約對話整理成簡短摘要，保留客戶需求、偏好與已討論過的手機及方案。"
+                    },
+                    {
+                        "role": "user",
+                        "content": f"先前摘要：\n{previous_summary or '無'}\n\n新的對話：\n{transcript}"
+                    }
+                ],
+                max_tokens=self.max_tokens
+            )
+            summary = response.choices[0].message.content
+        except Exception as e:
+            logger.warning("產生對話摘要失敗", session_id=session_id, error=str(e))
+            return
+        
+        usage = getattr(response, "usage", None)
+        if usage:
+            await self.usage_tracker.record(
+                session_id,
+                staff_id,
+                usage.prompt_tokens,
+                usage.completion_tokens,
+                self._calculate_cost(usage.prompt_tokens, usage.completion_tokens)
+            )
+        
+        if summary:
+            # 只修剪到摘要時讀取的紀錄範圍，摘要期間新增的訊息保留
+            await workflow_manager.set_chat_summary(
+                session_id,
+                summary,
+                keep_last=self.chat_context_messages,
+                history=history
+            )
+    
+    def _calculate_cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        """依模型定價計算成本（未列出的部署名稱以 gpt-4o 定價計算）"""
+        pricing = PRICING.get(self.model, PRICING["gpt-4o"])
+        return (
+            prompt_tokens / 1000 * pricing["prompt"] +
+            completion_tokens / 1000 * pricing["completion"]
+        )
+    
     async def _log_ai_usage(
         self,
         staff_id: str,
@@ -733,7 +986,7 @@ class AIConversationManager:
         total_tokens: int
     ):
         """
-        記錄 AI 使用到資料庫
+        記錄 AI 使用到資料庫（由 UsageLogWriter 背景批次寫入）
         
         Args:
             staff_id: 門市人員 ID
@@ -746,10 +999,7 @@ class AIConversationManager:
             total_tokens: 總 Token 數
         """
         # 計算成本
-        cost = (
-            prompt_tokens / 1000 * PRICING["gpt-4o"]["prompt"] +
-            completion_tokens / 1000 * PRICING["gpt-4o"]["completion"]
-        )
+        cost = self._calculate_cost(prompt_tokens, completion_tokens)
         
         logger.info(
             "記錄 AI 使用",
@@ -760,46 +1010,19 @@ class AIConversationManager:
             cost=cost
         )
         
-        try:
-            # 取得 DatabaseManager
-            from .database import DatabaseManager
-            db = DatabaseManager()
-            await db.initialize()
-            
-            # 寫入資料庫
-            sql = """
-                INSERT INTO ai_usage_logs (
-                    staff_id, session_id, usage_type,
-                    prompt_text, response_text,
-                    prompt_tokens, completion_tokens, total_tokens,
-                    cost_amount, created_at
-                )
-                VALUES (
-                    :staff_id, :session_id, :usage_type,
-                    :prompt_text, :response_text,
-                    :prompt_tokens, :completion_tokens, :total_tokens,
-                    :cost_amount, SYSDATE
-                )
-            """
-            
-            await db.execute(
-                sql,
-                {
-                    'staff_id': staff_id,
-                    'session_id': session_id,
-                    'usage_type': usage_type,
-                    'prompt_text': prompt_text[:4000] if prompt_text else None,  # CLOB 限制
-                    'response_text': response_text[:4000] if response_text else None,  # CLOB 限制
-                    'prompt_tokens': prompt_tokens,
-                    'completion_tokens': completion_tokens,
-                    'total_tokens': total_tokens,
-                    'cost_amount': cost
-                }
-            )
-            
-            await db.close()
-            
-            logger.info("AI 使用記錄已寫入資料庫", usage_id="auto-generated")
-            
-        except Exception as e:
-            logger.error("寫入 AI 使用記錄失敗", error=str(e), exc_info=True)
+        # 放入背景寫入佇列，不等待資料庫
+        if self.usage_log_writer is None:
+            logger.warning("AI 使用記錄寫入器未啟動，略過寫入資料庫", session_id=session_id)
+            return
+        
+        self.usage_log_writer.submit(
+            staff_id=staff_id,
+            session_id=session_id,
+            usage_type=usage_type,
+            prompt_text=prompt_text,
+            response_text=response_text,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=total_tokens,
+            cost_amount=cost
+        )
@@ -1,11 +1,31 @@
 import os
 import structlog
-from typing import Union
+from typing import Optional, Union
 
 from .crm_service import MockCRMService
 
 logger = structlog.get_logger()
 
+# 全應用程式共用的 Mock Service（建立時會產生完整的 Mock 資料，不在每次請求重建）
+_mock_crm_service: Optional[MockCRMService] = None
+
+
+def get_mock_crm_service() -> MockCRMService:
+    """取得共用的 Mock CRM Service（第一次使用時建立）"""
+    global _mock_crm_service
+    if _mock_crm_service is None:
+        _mock_crm_service = MockCRMService()
+    return _mock_crm_service
+
+
+def reload_mock_crm_service() -> MockCRMService:
+    """重新載入 Mock CRM 資料（處理中的請求繼續使用舊的實例）"""
+    global _mock_crm_service
+    _mock_crm_service = MockCRMService()
+    logger.info("Mock CRM Service 已重新載入")
+    return _mock_crm_service
+
+
 async def get_crm_service() -> Union[MockCRMService]: 
     """取得 CRM 服務實例"""
     # 每次呼叫時才讀取環境變數，避免在模組載入時就固定值
@@ -14,17 +34,17 @@ async def get_crm_service() -> Union[MockCRMService]:
     
     if use_mcp:
         if use_http_transport:
-            logger.info("使用 MCP CRM Service (HTTP)")
+            logger.debug("使用 MCP CRM Service (HTTP)")
             from .mcp_client_http import mcp_client_http
             await mcp_client_http.initialize()
             return mcp_client_http
         else:
-            logger.info("使用 MCP CRM Service (stdio)")
+            logger.debug("使用 MCP CRM Service (stdio)")
             from .mcp_client import mcp_client
             await mcp_client.initialize()
             return mcp_client
     else:
         # 使用 Mock Service (預設)
         logger.debug("使用 Mock CRM Service")
-        return MockCRMService()
+        return get_mock_crm_service()
     
\ No newline at end of file
@@ -2,7 +2,10 @@
 資料庫管理器 - Oracle 連線管理
 """
 import asyncio
-from typing import Optional, Dict, Any, List
+import os
+import time
+from collections import namedtuple
+from typing import Optional, Dict, Any, List, AsyncGenerator, Callable, Tuple
 import structlog
 from contextlib import asynccontextmanager
 
@@ -15,8 +18,44 @@ except ImportError:
 
 logger = structlog.get_logger()
 
+# 查詢結果的列格式
+ROW_FORMATS = ("dict", "tuple", "namedtuple")
+
+
+def _row_converter(columns: List[str], row_format: str) -> Callable[[tuple], Any]:
+    """
+    依列格式建立轉換函式
+    
+    Args:
+        columns: 欄位名稱
+        row_format: dict、tuple 或 namedtuple（屬性名稱為小寫欄位名稱）
+    """
+    if row_format == "tuple":
+        return tuple
+    if row_format == "namedtuple":
+        return namedtuple("Row", [column.lower() for column in columns], rename=True)._make
+    if row_format == "dict":
+        return lambda row: dict(zip(columns, row))
+    raise ValueError(f"不支援的列格式: {row_format}")
+
 class DatabaseManager:    
-    """Oracle 資料庫管理器"""
+    """
+    Oracle 資料庫管理器
+    
+    使用 python-oracledb Thin 模式的非同步連線池（create_pool_async），
+    查詢在事件迴圈上以 await 等待 Oracle 回應，不會阻塞其他請求。
+    
+    連線池設定（環境變數）：
+    - ORACLE_POOL_MIN / ORACLE_POOL_MAX / ORACLE_POOL_INCREMENT: 連線數下限、上限與每次增加數
+    - ORACLE_POOL_TIMEOUT: 連線池已滿時等待連線的秒數
+    - ORACLE_POOL_PING_INTERVAL: 閒置連線取出前檢查的間隔秒數
+    - ORACLE_STMT_CACHE_SIZE: 每條連線的 Statement Cache 大小
+    - ORACLE_STREAM_ARRAYSIZE: stream_query 每次向 Oracle 取回的列數
+    - ORACLE_RECONNECT_INTERVAL: 無法連線時重新建立連線池的間隔秒數
+    
+    整個應用程式共用一個實例（app.db_manager，於 before_serving 初始化），
+    路由與服務不應自行建立。
+    """
     
     def __init__(self):
         self.pool = None  # Connection pool
@@ -26,14 +65,32 @@ class DatabaseManager:
         self.service_name: Optional[str] = None
         self.user: Optional[str] = None
         self.password: Optional[str] = None
+        
+        self.initialized = False
+        self.use_real_db = False
+        
+        # 延遲重連：啟動時或之後連線池不存在時，每隔 reconnect_interval 秒於取用連線時重試
+        self.reconnect_interval = float(os.getenv('ORACLE_RECONNECT_INTERVAL', '30'))
+        self.reconnect_count = 0
+        self._connect_lock = asyncio.Lock()
+        self._last_connect_attempt = 0.0
+        
+        # 連線池統計
+        self.acquire_count = 0
+        self.acquire_wait_seconds = 0.0
+        self.acquire_errors = 0
+        
+        self.stream_arraysize = int(os.getenv('ORACLE_STREAM_ARRAYSIZE', '500'))
     
     async def initialize(self):
-        import os
-        from dotenv import load_dotenv
+        """
+        初始化資料庫連線池（應用程式啟動時呼叫一次，已初始化時直接返回）
+        
+        環境變數由應用程式啟動時載入（app.main 的 load_dotenv），這裡不再重複載入。
+        """
+        if self.initialized:
+            return
         
-        load_dotenv()
-
-        """初始化資料庫連線池"""
         self.host = os.getenv('ORACLE_HOST', 'localhost')
         self.port = int(os.getenv('ORACLE_PORT', '1521'))
         self.service_name = os.getenv('ORACLE_SERVICE', 'XEPDB1')
@@ -46,97 +103,196 @@ class DatabaseManager:
                 service=self.service_name, 
                 user=self.user)
         
+        self.initialized = True
+        
         if not ORACLE_AVAILABLE:
             logger.warning("⚠️ Oracle 模組不可用，使用模擬資料庫")
             self.pool = None
             return
         
+        # 在開發環境中，我們強制使用模擬模式
+        # 除非明確設置了環境變數要使用真實資料庫
+        self.use_real_db = os.getenv('USE_REAL_ORACLE_DB', 'false').lower() == 'true'
+        
+        if not self.use_real_db:
+            logger.info("🔧 開發模式：強制使用模擬資料庫")
+            self.pool = None
+            return
+        
+        # 使用 makedsn 建立 DSN
+        self.dsn = oracledb.makedsn(self.host, self.port, service_name=self.service_name)
+        await self._connect()
+    
+    async def _connect(self) -> bool:
+        """建立連線池並測試連線（失敗時保留設定，由 get_connection 延遲重連）"""
+        self._last_connect_attempt = time.monotonic()
+        pool = None
+        
         try:
-            # 在開發環境中，我們強制使用模擬模式
-            # 除非明確設置了環境變數要使用真實資料庫
-            import os
-            use_real_db = os.getenv('USE_REAL_ORACLE_DB', 'false').lower() == 'true'
-            
-            if not use_real_db:
-                logger.info("🔧 開發模式：強制使用模擬資料庫")
-                self.pool = None
-                return
-            
-            # 使用 makedsn 建立 DSN
-            dsn = oracledb.makedsn(self.host, self.port, service_name=self.service_name)
+            # 建立非同步連線池（Thin 模式）
+            pool = oracledb.create_pool_async(
+                user=self.user,
+                password=self.password,
+                dsn=self.dsn,
+                min=int(os.getenv('ORACLE_POOL_MIN', '2')),
+                max=int(os.getenv('ORACLE_POOL_MAX', '10')),
+                increment=int(os.getenv('ORACLE_POOL_INCREMENT', '1')),
+                getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+                wait_timeout=int(float(os.getenv('ORACLE_POOL_TIMEOUT', '10')) * 1000),
+                ping_interval=int(os.getenv('ORACLE_POOL_PING_INTERVAL', '60')),
+                stmtcachesize=int(os.getenv('ORACLE_STMT_CACHE_SIZE', '50'))
+            )
             
             # 測試連線
-            test_conn = oracledb.connect(user=self.user, password=self.password, dsn=dsn)
-            test_conn.close()
-            
-            logger.info("✅ Oracle 資料庫連線測試成功", 
-                       host=self.host, port=self.port, service=self.service_name)
-
-            # 儲存連線參數供後續使用
-            self.dsn = dsn
+            async with pool.acquire() as test_conn:
+                await test_conn.ping()
             
         except Exception as e:
-            logger.error("❌ Oracle 資料庫連線失敗，切換到模擬模式", error=str(e))
-            # 連線失敗時，設置為 None 以使用模擬資料庫
-            self.pool = None
-            self.dsn = None
+            logger.error(
+                "❌ Oracle 資料庫連線失敗，暫時使用模擬資料庫",
+                error=str(e),
+                retry_after=self.reconnect_interval
+            )
+            if pool is not None:
+                try:
+                    await pool.close(force=True)
+                except Exception:
+                    pass
+            return False
+        
+        self.pool = pool
+        logger.info("✅ Oracle 資料庫連線池建立成功", 
+                   host=self.host, port=self.port, service=self.service_name,
+                   pool_min=self.pool.min, pool_max=self.pool.max)
+        return True
+    
+    async def _ensure_pool(self):
+        """真實資料庫模式下連線池不存在時，距上次嘗試超過 reconnect_interval 秒即重新連線"""
+        if self.pool or not self.use_real_db:
+            return
+        
+        if time.monotonic() - self._last_connect_attempt < self.reconnect_interval:
+            return
+        
+        async with self._connect_lock:
+            if self.pool or time.monotonic() - self._last_connect_attempt < self.reconnect_interval:
+                return
+            if await self._connect():
+                self.reconnect_count += 1
     
     @asynccontextmanager
     async def get_connection(self):
-        """取得資料庫連線的上下文管理器"""
-        if not self.dsn:
-            logger.warning("⚠️ 資料庫 DSN 未初始化，使用模擬連線")
+        """取得資料庫連線的上下文管理器（自連線池取出，結束時歸還）"""
+        await self._ensure_pool()
+        
+        if not self.pool:
+            logger.warning("⚠️ 資料庫連線池未初始化，使用模擬連線")
             yield MockConnection()
             return
         
-        connection = None
+        started = time.monotonic()
         try:
-            # 使用 oracledb.connect 建立直接連線
-            connection = oracledb.connect(
-                user=self.user, 
-                password=self.password, 
-                dsn=self.dsn
-            )
-            yield connection
+            connection = await self.pool.acquire()
         except Exception as e:
+            self.acquire_errors += 1
             logger.error("資料庫連線錯誤", error=str(e))
             # 如果連線失敗，退回到模擬模式
             logger.warning("⚠️ 連線失敗，使用模擬連線")
-            # 確保我們沒有持有無效的連線
-            connection = None
             yield MockConnection()
             return
         finally:
-            if connection:
-                try:
-                    connection.close()
-                except Exception as e:
-                    logger.warning("關閉連線時發生錯誤", error=str(e))
+            self.acquire_count += 1
+            self.acquire_wait_seconds += time.monotonic() - started
+        
+        try:
+            yield connection
+        finally:
+            try:
+                await self.pool.release(connection)
+            except Exception as e:
+                logger.warning("歸還連線時發生錯誤", error=str(e))
     
-    async def execute_query(self, sql: str, params: Optional[Dict] = None) -> List[Dict[str, Any]]:
-        """執行查詢並返回結果"""
+    async def execute_query(
+        self,
+        sql: str,
+        params: Optional[Dict] = None,
+        row_format: str = "dict"
+    ) -> List[Any]:
+        """
+        執行查詢並返回結果
+        
+        Args:
+            sql: SQL
+            params: 綁定參數
+            row_format: dict（預設）、tuple 或 namedtuple
+        """
         async with self.get_connection() as conn:
             if isinstance(conn, MockConnection):
-                return conn.execute_query(sql, params)
+                return conn.execute_query(sql, params, row_format)
             
             with conn.cursor() as cursor:
                 if params:
-                    cursor.execute(sql, params)
+                    await cursor.execute(sql, params)
                 else:
-                    cursor.execute(sql)
+                    await cursor.execute(sql)
                 
                 # 取得欄位名稱
                 columns = [desc[0] for desc in cursor.description] if cursor.description else []
                 
                 # 取得所有結果
-                rows = cursor.fetchall()
+                rows = await cursor.fetchall()
+                
+                if row_format == "tuple":
+                    return rows
+                convert = _row_converter(columns, row_format)
+                return [convert(row) for row in rows]
+    
+    async def stream_query(
+        self,
+        sql: str,
+        params: Optional[Dict] = None,
+        batch_size: Optional[int] = None,
+        row_format: str = "tuple"
+    ) -> AsyncGenerator[List[Any], None]:
+        """
+        分批讀取查詢結果（報表、統計等大型結果集使用，不一次載入記憶體）
+        
+        Args:
+            sql: SQL
+            params: 綁定參數
+            batch_size: 每批列數（同時作為 arraysize / prefetchrows，預設 ORACLE_STREAM_ARRAYSIZE）
+            row_format: tuple（預設）、namedtuple 或 dict
+            
+        Yields:
+            每批的列
+        """
+        batch_size = batch_size or self.stream_arraysize
+        
+        async with self.get_connection() as conn:
+            if isinstance(conn, MockConnection):
+                rows = conn.execute_query(sql, params, row_format)
+                for start in range(0, len(rows), batch_size):
+                    yield rows[start:start + batch_size]
+                return
+            
+            with conn.cursor() as cursor:
+                # 需在 execute 之前設定：第一次往返即取回一批，之後每次 fetch 一批
+                cursor.arraysize = batch_size
+                cursor.prefetchrows = batch_size + 1
                 
-                # 轉換為字典列表
-                result = []
-                for row in rows:
-                    result.append(dict(zip(columns, row)))
+                if params:
+                    await cursor.execute(sql, params)
+                else:
+                    await cursor.execute(sql)
                 
-                return result
+                columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                convert = None if row_format == "tuple" else _row_converter(columns, row_format)
+                
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows if convert is None else [convert(row) for row in rows]
     
     async def execute_non_query(self, sql: str, params: Optional[Dict] = None) -> int:
         """執行非查詢 SQL（INSERT, UPDATE, DELETE）並返回影響的行數"""
@@ -146,25 +302,144 @@ class DatabaseManager:
             
             with conn.cursor() as cursor:
                 if params:
-                    cursor.execute(sql, params)
+                    await cursor.execute(sql, params)
                 else:
-                    cursor.execute(sql)
+                    await cursor.execute(sql)
                 
                 rowcount = cursor.rowcount
-                conn.commit()
+                await conn.commit()
                 return rowcount
     
+    async def execute_many(
+        self,
+        sql: str,
+        params_list: List[Any],
+        batch_errors: bool = False,
+        rejected: Optional[List[Any]] = None
+    ) -> int:
+        """
+        以 executemany 批次執行 DML（array DML，一次往返）並返回影響的行數
+        
+        Args:
+            sql: SQL
+            params_list: 每列的綁定參數
+            batch_errors: 為 True 時個別失敗的列不會中斷整批，成功的列照常提交，
+                失敗的列（位置與錯誤訊息）記錄於日誌
+            rejected: batch_errors 為 True 時，失敗列的綁定參數附加到此列表（供呼叫端另行保存）
+        
+        Raises:
+            ConnectionError: 已設定真實資料庫但無法連線（呼叫端可自行暫存資料）
+        """
+        if not params_list:
+            return 0
+        
+        async with self.get_connection() as conn:
+            if isinstance(conn, MockConnection):
+                if self.use_real_db:
+                    raise ConnectionError("Oracle 資料庫無法連線")
+                return conn.execute_many(sql, params_list)
+            
+            with conn.cursor() as cursor:
+                await cursor.executemany(sql, params_list, batcherrors=batch_errors)
+                rowcount = cursor.rowcount
+                
+                if batch_errors:
+                    errors = cursor.getbatcherrors()
+                    if errors:
+                        logger.warning(
+                            "批次執行部分資料列失敗",
+                            failed=len(errors),
+                            total=len(params_list),
+                            errors=[{"offset": error.offset, "message": error.message} for error in errors[:10]]
+                        )
+                        if rejected is not None:
+                            rejected.extend(params_list[error.offset] for error in errors)
+                
+                await conn.commit()
+                return rowcount
+    
+    async def execute_transaction(self, statements: List[Tuple[str, Optional[Dict]]]) -> List[int]:
+        """
+        在同一條連線上依序執行多個 DML，全部成功才提交，任一失敗即回滾
+        
+        Args:
+            statements: (SQL, 綁定參數) 列表
+            
+        Returns:
+            每個 SQL 影響的行數
+        
+        Raises:
+            ConnectionError: 已設定真實資料庫但無法連線
+        """
+        async with self.get_connection() as conn:
+            if isinstance(conn, MockConnection):
+                if self.use_real_db:
+                    raise ConnectionError("Oracle 資料庫無法連線")
+                return [conn.execute_non_query(sql, params) for sql, params in statements]
+            
+            rowcounts = []
+            try:
+                with conn.cursor() as cursor:
+                    for sql, params in statements:
+                        await cursor.execute(sql, params or {})
+                        rowcounts.append(cursor.rowcount)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+            
+            return rowcounts
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """取得連線池統計（供 /api/metrics 顯示）"""
+        if not self.pool:
+            if self.use_real_db:
+                return {"mode": "disconnected", "reconnect_interval": self.reconnect_interval}
+            return {"mode": "mock"}
+        
+        return {
+            "mode": "pool",
+            "min": self.pool.min,
+            "max": self.pool.max,
+            "opened": self.pool.opened,
+            "busy": self.pool.busy,
+            "acquire_count": self.acquire_count,
+            "acquire_errors": self.acquire_errors,
+            "reconnects": self.reconnect_count,
+            "avg_acquire_ms": round(self.acquire_wait_seconds / self.acquire_count * 1000, 3)
+            if self.acquire_count else 0.0
+        }
+    
+    async def _close_pool(self):
+        """關閉連線池"""
+        if self.pool:
+            try:
+                await self.pool.close()
+            except Exception as e:
+                logger.warning("關閉連線池時發生錯誤", error=str(e))
+        self.pool = None
+    
     async def close(self):
-        """關閉資料庫連線"""
-        if self.dsn:
-            logger.info("✅ Oracle 資料庫連線管理器已關閉")
-        # 由於使用直接連線而非連線池，無需特別清理
+        """關閉資料庫連線池"""
+        if self.pool:
+            await self._close_pool()
+            logger.info("✅ Oracle 資料庫連線池已關閉")
+        self.initialized = False
 
 class MockConnection:
     """模擬資料庫連線（開發用）"""
     
-    def execute_query(self, sql: str, params: Optional[Dict] = None) -> List[Dict[str, Any]]:
+    def execute_query(self, sql: str, params: Optional[Dict] = None, row_format: str = "dict") -> List[Any]:
         """模擬查詢執行"""
+        rows = self._execute_query(sql, params)
+        if row_format == "dict" or not rows:
+            return rows
+        columns = list(rows[0].keys())
+        convert = _row_converter(columns, row_format)
+        return [convert(tuple(row.values())) for row in rows]
+    
+    def _execute_query(self, sql: str, params: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """依 SQL 返回模擬資料"""
         logger.info("🔧 模擬查詢執行", sql=sql[:100], params=params)
         
         # 根據 SQL 返回模擬資料
@@ -209,4 +484,9 @@ class MockConnection:
     def execute_non_query(self, sql: str, params: Optional[Dict] = None) -> int:
         """模擬非查詢執行"""
         logger.info("🔧 模擬非查詢執行", sql=sql[:100], params=params)
-        return 1
\ No newline at end of file
+        return 1
+    
+    def execute_many(self, sql: str, params_list: List[Dict[str, Any]]) -> int:
+        """模擬批次執行"""
+        logger.info("🔧 模擬批次執行", sql=sql[:100], count=len(params_list))
+        return len(params_list)
\ No newline at end of file
@@ -0,0 +1,289 @@
+"""
+MCP Tool 結果快取 - 唯讀 Tool 的 TTL 快取
+
+CRM / POS / Promotion 的 HTTP MCP Client 在調用 Tool 前先查詢這裡：
+- 只快取唯讀 Tool（DEFAULT_TTLS 中列出者），reserve_device 等異動 Tool 一律直接調用
+- 每個 Tool 有各自的 TTL，本機快取以 LRU 限制筆數
+- 同時發出的相同調用共用同一個進行中的請求（request coalescing）
+- 只快取成功的結果；異動後可呼叫 invalidate() 清除相關 Tool 的快取
+- 可選擇以 Redis 作為第二層快取，讓多個 worker 共用（每筆結果一個鍵，由 Redis 依 TTL 自行過期）
+- CRM Tool 的結果含客戶個資，預設只保存在本機記憶體，不寫入 Redis
+
+設定（環境變數）：
+- MCP_CACHE_ENABLED: 是否啟用（預設 true）
+- MCP_CACHE_MAX_ENTRIES: 本機快取筆數上限（預設 1000）
+- MCP_CACHE_REDIS: 是否使用 Redis 共用快取（預設 false）
+- MCP_CACHE_REDIS_SERVERS: 使用 Redis 共用快取的 Server（預設 pos,promotion，加入 crm 需自行評估個資風險）
+- MCP_CACHE_TTL_{TOOL}: 個別 Tool 的 TTL 秒數（例如 MCP_CACHE_TTL_GET_PLAN_DETAILS=600，0 表示不快取）
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import structlog
+
+from .redis_manager import RedisManager
+
+logger = structlog.get_logger()
+
+# 唯讀 Tool 的預設 TTL（秒），未列出的 Tool 不快取
+DEFAULT_TTLS: Dict[str, Dict[str, int]] = {
+    "crm": {
+        "get_customer": 60,
+        "list_customer_phones": 60,
+        "get_phone_details": 60,
+        "check_renewal_eligibility": 30,
+        "check_promotion_eligibility": 30
+    },
+    "pos": {
+        # 設備資訊含庫存摘要（stock_summary），reserve_device 後清除
+        "get_device_info": 600,
+        "get_device_pricing": 300,
+        # 庫存會因預約而變動，TTL 較短且 reserve_device 後清除
+        "query_device_stock": 15,
+        "get_recommended_devices": 15
+    },
+    "promotion": {
+        "search_promotions": 300,
+        "get_plan_details": 600,
+        "get_plans_details": 600,
+        "compare_plans": 600,
+        "calculate_upgrade_cost": 300
+    }
+}
+
+# reserve_device 成功後需要清除的快取
+INVALIDATED_BY: Dict[Tuple[str, str], Tuple[str, ...]] = {
+    ("pos", "reserve_device"): ("get_device_info", "query_device_stock", "get_recommended_devices")
+}
+
+
+class MCPResultCache:
+    """唯讀 MCP Tool 結果快取（本機 LRU + 選用的 Redis 共用快取）"""
+
+    REDIS_KEY_PREFIX = "mcp_cache"
+
+    def __init__(self, enabled: Optional[bool] = None, max_entries: Optional[int] = None):
+        """
+        初始化
+
+        Args:
+            enabled: 是否啟用（預設讀取 MCP_CACHE_ENABLED）
+            max_entries: 本機快取筆數上限（預設讀取 MCP_CACHE_MAX_ENTRIES）
+        """
+        if enabled is None:
+            enabled = os.getenv("MCP_CACHE_ENABLED", "true").lower() == "true"
+        self.enabled = enabled
+        self.max_entries = max_entries or int(os.getenv("MCP_CACHE_MAX_ENTRIES", "1000"))
+        self.use_redis = os.getenv("MCP_CACHE_REDIS", "false").lower() == "true"
+        self.redis_servers = {
+            server.strip()
+            for server in os.getenv("MCP_CACHE_REDIS_SERVERS", "pos,promotion").split(",")
+            if server.strip()
+        }
+        self.redis_manager: Optional[RedisManager] = None
+
+        self.ttls = {
+            server: {
+                tool: int(os.getenv(f"MCP_CACHE_TTL_{tool.upper()}", str(ttl)))
+                for tool, ttl in tools.items()
+            }
+            for server, tools in DEFAULT_TTLS.items()
+        }
+
+        # key -> (到期時間, 結果)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # 每個 Tool 的版本，invalidate 後進行中的請求結果不寫入快取
+        self._generations: Dict[Tuple[str, str], int] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.redis_hits = 0
+        self.coalesced = 0
+
+    def attach_redis(self, redis_manager: RedisManager):
+        """設定 Redis 共用快取（MCP_CACHE_REDIS=true 時才使用）"""
+        if self.use_redis:
+            self.redis_manager = redis_manager
+            logger.info("MCP Tool 快取使用 Redis 共用快取")
+
+    def get_ttl(self, server: str, tool: str) -> int:
+        """取得 Tool 的 TTL（0 表示不快取）"""
+        return self.ttls.get(server, {}).get(tool, 0)
+
+    @staticmethod
+    def _digest(arguments: Dict[str, Any]) -> str:
+        """參數的雜湊（鍵順序不影響）"""
+        encoded = json.dumps(arguments, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+    def _redis_key(self, server: str, tool: str, digest: str = "*") -> str:
+        """取得快取結果的 Redis 鍵（digest 為 * 時是該 Tool 所有結果的樣式）"""
+        return f"{self.REDIS_KEY_PREFIX}:{server}:{tool}:{digest}"
+
+    def _uses_redis(self, server: str) -> bool:
+        """此 Server 的結果是否寫入 Redis 共用快取"""
+        return self.redis_manager is not None and server in self.redis_servers
+
+    async def call(
+        self,
+        server: str,
+        tool: str,
+        arguments: Dict[str, Any],
+        fetch: Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        調用 Tool（唯讀 Tool 先查快取）
+
+        Args:
+            server: crm、pos 或 promotion
+            tool: Tool 名稱
+            arguments: Tool 參數
+            fetch: 實際調用 MCP Server 的函式
+
+        Returns:
+            Tool 執行結果（快取結果的複本，呼叫端可自由修改）
+        """
+        ttl = self.get_ttl(server, tool)
+        if not self.enabled or ttl <= 0:
+            result = await fetch(tool, arguments)
+            if result.get("success"):
+                await self._invalidate_dependents(server, tool)
+            return result
+
+        digest = self._digest(arguments)
+        key = f"{server}:{tool}:{digest}"
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            generation = self._generations.get((server, tool), 0)
+            task = asyncio.ensure_future(
+                self._load(server, tool, arguments, digest, key, ttl, generation, fetch)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+
+        # 個別呼叫端被取消時，不影響共用同一請求的其他呼叫端
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def _finish(self, key: str, task: asyncio.Future):
+        """進行中的請求結束"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # 呼叫端都已取消時避免 "exception was never retrieved"
+            task.exception()
+
+    async def _load(
+        self,
+        server: str,
+        tool: str,
+        arguments: Dict[str, Any],
+        digest: str,
+        key: str,
+        ttl: int,
+        generation: int,
+        fetch: Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """本機快取未命中：查詢 Redis，仍未命中時調用 MCP Server 並寫入快取"""
+        if self._uses_redis(server):
+            cached = await self.redis_manager.get_json(self._redis_key(server, tool, digest))
+            if cached and cached.get("expires_at", 0) > time.time():
+                self.redis_hits += 1
+                self._store(key, cached["expires_at"], cached["result"])
+                return cached["result"]
+
+        self.misses += 1
+        result = await fetch(tool, arguments)
+
+        # 失敗結果不快取；調用期間被 invalidate 的結果也不寫入
+        if not result.get("success") or self._generations.get((server, tool), 0) != generation:
+            return result
+
+        expires_at = time.time() + ttl
+        self._store(key, expires_at, result)
+
+        if self._uses_redis(server):
+            await self.redis_manager.set_json(
+                self._redis_key(server, tool, digest),
+                {"expires_at": expires_at, "result": result},
+                ex=ttl
+            )
+
+        return result
+
+    def _store(self, key: str, expires_at: float, result: Dict[str, Any]):
+        """寫入本機快取（超過上限時移除最久未使用的項目）"""
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _invalidate_dependents(self, server: str, tool: str):
+        """異動 Tool 成功後清除受影響的快取"""
+        for dependent in INVALIDATED_BY.get((server, tool), ()):
+            await self.invalidate(server, dependent)
+
+    async def invalidate(self, server: str, tool: Optional[str] = None):
+        """
+        清除快取
+
+        Args:
+            server: crm、pos 或 promotion
+            tool: Tool 名稱（None 表示該 Server 的所有 Tool）
+        """
+        tools = [tool] if tool else list(self.ttls.get(server, {}))
+        prefixes = tuple(f"{server}:{name}:" for name in tools)
+
+        for name in tools:
+            self._generations[(server, name)] = self._generations.get((server, name), 0) + 1
+
+        for key in [key for key in self._entries if key.startswith(prefixes)]:
+            del self._entries[key]
+        for key in [key for key in self._inflight if key.startswith(prefixes)]:
+            # 之後的調用不再共用失效前的請求
+            del self._inflight[key]
+
+        if self._uses_redis(server):
+            for name in tools:
+                await self.redis_manager.delete_matching(self._redis_key(server, name))
+
+        logger.info("MCP Tool 快取已清除", server=server, tools=tools)
+
+    async def clear(self):
+        """清除所有快取"""
+        for server in self.ttls:
+            await self.invalidate(server)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得快取統計（供 /api/metrics 顯示）"""
+        return {
+            "enabled": self.enabled,
+            "redis": self.redis_manager is not None,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "redis_hits": self.redis_hits,
+            "coalesced": self.coalesced
+        }
+
+
+# 全域實例（三個 HTTP MCP Client 共用）
+mcp_result_cache = MCPResultCache()
@@ -0,0 +1,87 @@
+"""
+MCP Client 基礎類別 - HTTP 與 stdio Transport 共用
+
+CRM / POS / Promotion 的 Tool 介面寫在與 Transport 無關的子類別（CRMMCPClient 等），
+HTTP 與 stdio 版本只實作 initialize() 與 _send()：
+- _call_tool(): 唯讀 Tool 先查快取，未命中時以 _send() 調用
+- _send(): 連線中斷、逾時等例外一律轉為錯誤結果
+  {"success": False, "error": {"code", "message"}}，不拋出例外
+"""
+from typing import Any, Dict, Optional
+
+import structlog
+
+from .mcp_cache import mcp_result_cache
+
+logger = structlog.get_logger()
+
+
+class BaseMCPClient:
+    """MCP Client 基礎類別"""
+
+    # crm、pos 或 promotion（快取與日誌使用）
+    SERVER = ""
+
+    def __init__(self):
+        self.initialized = False
+
+    async def initialize(self):
+        """建立與 MCP Server 的連線（子類別實作）"""
+        raise NotImplementedError
+
+    async def close(self):
+        """釋放 MCP Client（共用的連線池與子程序由應用程式關閉）"""
+        self.initialized = False
+        logger.info("MCP Client 已關閉", server=self.SERVER, client=type(self).__name__)
+
+    async def _call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        調用 MCP Tool（唯讀 Tool 先查快取）
+
+        Args:
+            tool_name: Tool 名稱
+            arguments: Tool 參數
+
+        Returns:
+            Tool 執行結果
+        """
+        if not self.initialized:
+            await self.initialize()
+
+        return await mcp_result_cache.call(self.SERVER, tool_name, arguments, self._send)
+
+    async def _send(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """實際調用 MCP Server（子類別實作，失敗時返回錯誤結果）"""
+        raise NotImplementedError
+
+    async def invalidate_cache(self, tool_name: Optional[str] = None):
+        """清除此 Server 的 Tool 快取結果（tool_name 為 None 時清除全部）"""
+        await mcp_result_cache.invalidate(self.SERVER, tool_name)
+
+    @staticmethod
+    def error_result(code: str, message: str) -> Dict[str, Any]:
+        """Transport 層的錯誤結果"""
+        return {
+            "success": False,
+            "error": {
+                "code": code,
+                "message": message
+            }
+        }
+
+    @classmethod
+    def normalize_result(cls, result: Any) -> Dict[str, Any]:
+        """
+        統一 Server 回傳的失敗格式為 {"success": False, "error": {"code", "message"}}
+
+        BaseMCPServer.error_response 為 {"success": False, "error_code", "message"}，
+        部分 Tool 的 error 為字串
+        """
+        if not isinstance(result, dict):
+            return cls.error_result("MCP_EMPTY_RESPONSE", "MCP Server 無回應內容")
+        if result.get("success") or isinstance(result.get("error"), dict):
+            return result
+        return cls.error_result(
+            result.get("error_code", "MCP_TOOL_ERROR"),
+            str(result.get("error") or result.get("message"))
+        )
@@ -3,131 +3,26 @@ MCP Client Service - HTTP Transport 版本
 
 使用 HTTP 連接 MCP Server，解決 Windows stdio 相容性問題
 """
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 import structlog
 import os
 import httpx
 from pathlib import Path
 
+from .mcp_client_base import BaseMCPClient
+from .mcp_transport import MCPCallBatcher, mcp_transport
+
 logger = structlog.get_logger()
 
 
-class MCPClientServiceHTTP:
+class CRMMCPClient(BaseMCPClient):
     """
-    MCP Client 服務 (HTTP Transport)
+    CRM MCP Client 的 Tool 介面（HTTP 與 stdio 共用）
     
-    使用 HTTP 連接 MCP Server，提供與 MockCRMService 相同的介面
+    提供與 MockCRMService 相同的介面以便無縫切換
     """
     
-    def __init__(self, base_url: str = None):
-        """
-        初始化 HTTP Client
-        
-        Args:
-            base_url: MCP Server 的 HTTP URL，預設從環境變數讀取
-        """
-        self.base_url = base_url or os.getenv("MCP_CRM_HTTP_URL", "http://localhost:8001")
-        self.client: Optional[httpx.AsyncClient] = None
-        self.initialized = False
-        
-        logger.info("MCP Client Service (HTTP) 已建立", base_url=self.base_url)
-        
-    async def initialize(self):
-        """初始化 HTTP Client"""
-        if self.initialized:
-            logger.warning("MCP Client 已初始化")
-            return
-            
-        logger.info("初始化 MCP Client Service (HTTP)")
-        
-        # 建立 HTTP Client
-        self.client = httpx.AsyncClient(
-            base_url=self.base_url,
-            timeout=30.0,
-            headers={
-                "Content-Type": "application/json",
-                "User-Agent": "MCP-Client-HTTP/1.0"
-            }
-        )
-        
-        # 健康檢查
-        try:
-            response = await self.client.get("/health")
-            response.raise_for_status()
-            health = response.json()
-            logger.info("MCP Server 連接成功", health=health)
-        except Exception as e:
-            logger.error("無法連接 MCP Server", error=str(e), url=self.base_url)
-            raise RuntimeError(f"無法連接 MCP Server: {e}")
-        
-        self.initialized = True
-        logger.info("MCP Client Service (HTTP) 初始化完成")
-    
-    async def close(self):
-        """關閉 HTTP Client"""
-        logger.info("關閉 MCP Client Service (HTTP)")
-        
-        if self.client:
-            await self.client.aclose()
-            logger.info("HTTP Client 已關閉")
-        
-        self.initialized = False
-    
-    async def _call_tool(self, tool: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        調用 MCP Tool
-        
-        Args:
-            tool: Tool 名稱
-            arguments: Tool 參數
-            
-        Returns:
-            Tool 執行結果
-        """
-        if not self.client:
-            raise RuntimeError("MCP Client 未初始化，請先呼叫 initialize()")
-        
-        try:
-            response = await self.client.post(
-                "/mcp/call",
-                json={
-                    "tool": tool,
-                    "arguments": arguments
-                }
-            )
-            response.raise_for_status()
-            result = response.json()
-            
-            logger.debug("Tool 調用成功", tool=tool, success=result.get("success"))
-            return result
-            
-        except httpx.HTTPStatusError as e:
-            logger.error("HTTP 錯誤", tool=tool, status=e.response.status_code)
-            # 嘗試解析錯誤訊息
-            try:
-                error_detail = e.response.json()
-                return error_detail
-            except:
-                return {
-                    "success": False,
-                    "error": {
-                        "code": "HTTP_ERROR",
-                        "message": f"HTTP {e.response.status_code}: {str(e)}"
-                    }
-                }
-        except Exception as e:
-            logger.error("Tool 調用失敗", tool=tool, error=str(e))
-            return {
-                "success": False,
-                "error": {
-                    "code": "CALL_ERROR",
-                    "message": str(e)
-                }
-            }
-    
-    # ========================================
-    # CRM Tools (與 MockCRMService 保持相同介面)
-    # ========================================
+    SERVER = "crm"
     
     async def query_customer_by_id(self, id_number: str) -> Optional[Dict[str, Any]]:
         """
@@ -139,7 +34,7 @@ class MCPClientServiceHTTP:
         Returns:
             客戶資料，若不存在則返回 None
         """
-        logger.info("HTTP: 查詢客戶", id_number=id_number[:3] + "***")
+        logger.info("MCP: 查詢客戶", id_number=id_number[:3] + "***")
         
         result = await self._call_tool("get_customer", {"id_number": id_number})
         
@@ -163,7 +58,7 @@ class MCPClientServiceHTTP:
         Returns:
             門號列表
         """
-        logger.info("HTTP: 查詢客戶門號", customer_id=customer_id)
+        logger.info("MCP: 查詢客戶門號", customer_id=customer_id)
         
         result = await self._call_tool("list_customer_phones", {"customer_id": customer_id})
         
@@ -187,7 +82,7 @@ class MCPClientServiceHTTP:
         Returns:
             合約資訊
         """
-        logger.info("HTTP: 查詢門號合約", phone_number=phone_number)
+        logger.info("MCP: 查詢門號合約", phone_number=phone_number)
         
         result = await self._call_tool("get_phone_details", {"phone_number": phone_number})
         
@@ -208,7 +103,7 @@ class MCPClientServiceHTTP:
         Returns:
             使用量資訊
         """
-        logger.info("HTTP: 查詢門號使用量", phone_number=phone_number)
+        logger.info("MCP: 查詢門號使用量", phone_number=phone_number)
         
         result = await self._call_tool("get_phone_details", {"phone_number": phone_number})
         
@@ -229,7 +124,7 @@ class MCPClientServiceHTTP:
         Returns:
             帳單資訊
         """
-        logger.info("HTTP: 查詢門號帳單", phone_number=phone_number)
+        logger.info("MCP: 查詢門號帳單", phone_number=phone_number)
         
         result = await self._call_tool("get_phone_details", {"phone_number": phone_number})
         
@@ -257,7 +152,7 @@ class MCPClientServiceHTTP:
         Returns:
             資格檢查結果
         """
-        logger.info("HTTP: 檢查續約資格", phone_number=phone_number, customer_id=customer_id)
+        logger.info("MCP: 檢查續約資格", phone_number=phone_number, customer_id=customer_id)
         
         result = await self._call_tool(
             "check_renewal_eligibility",
@@ -301,5 +196,124 @@ class MCPClientServiceHTTP:
             }
 
 
+class MCPClientServiceHTTP(CRMMCPClient):
+    """
+    MCP Client 服務 (HTTP Transport)
+    
+    使用 HTTP 連接 CRM MCP Server
+    """
+    
+    def __init__(self, base_url: str = None):
+        """
+        初始化 HTTP Client
+        
+        Args:
+            base_url: MCP Server 的 HTTP URL，預設從環境變數讀取
+        """
+        super().__init__()
+        self.base_url = base_url or os.getenv("MCP_CRM_HTTP_URL", "http://localhost:8001")
+        
+        # 同時發出的 Tool 調用合併為一次 /mcp/batch
+        self._batcher = MCPCallBatcher(self._post_call, self._post_batch, "crm")
+        
+        logger.info("MCP Client Service (HTTP) 已建立", base_url=self.base_url)
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """共用的 HTTP 連線池（由 mcp_transport 管理，應用程式關閉時釋放）"""
+        return mcp_transport.get_client("crm", self.base_url)
+    
+    async def initialize(self):
+        """初始化 HTTP Client"""
+        if self.initialized:
+            logger.warning("MCP Client 已初始化")
+            return
+            
+        logger.info("初始化 MCP Client Service (HTTP)")
+        
+        # 健康檢查（使用共用連線池，只在第一次初始化時執行）
+        try:
+            response = await self.client.get("/health")
+            response.raise_for_status()
+            health = response.json()
+            logger.info("MCP Server 連接成功", health=health)
+        except Exception as e:
+            logger.error("無法連接 MCP Server", error=str(e), url=self.base_url)
+            raise RuntimeError(f"無法連接 MCP Server: {e}")
+        
+        self.initialized = True
+        logger.info("MCP Client Service (HTTP) 初始化完成")
+    
+    async def _send(self, tool: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """調用 Tool（同時發出的調用會合併為一次批次請求）"""
+        return await self._batcher.call(tool, arguments)
+    
+    async def _post_call(self, tool: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        調用單一 MCP Tool（POST /mcp/call）
+        
+        Args:
+            tool: Tool 名稱
+            arguments: Tool 參數
+            
+        Returns:
+            Tool 執行結果
+        """
+        try:
+            response = await self.client.post(
+                "/mcp/call",
+                json={
+                    "tool": tool,
+                    "arguments": arguments
+                }
+            )
+            response.raise_for_status()
+            result = response.json()
+            
+            logger.debug("Tool 調用成功", tool=tool, success=result.get("success"))
+            return result
+            
+        except httpx.HTTPStatusError as e:
+            logger.error("HTTP 錯誤", tool=tool, status=e.response.status_code)
+            # 嘗試解析錯誤訊息
+            try:
+                error_detail = e.response.json()
+                return error_detail
+            except:
+                return {
+                    "success": False,
+                    "error": {
+                        "code": "HTTP_ERROR",
+                        "message": f"HTTP {e.response.status_code}: {str(e)}"
+                    }
+                }
+        except Exception as e:
+            logger.error("Tool 調用失敗", tool=tool, error=str(e))
+            return {
+                "success": False,
+                "error": {
+                    "code": "CALL_ERROR",
+                    "message": str(e)
+                }
+            }
+    
+    async def _post_batch(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        批次調用 MCP Tools（POST /mcp/batch，一次往返）
+        
+        Args:
+            calls: (Tool 名稱, 參數) 列表
+            
+        Returns:
+            依序的批次項目（由 MCPCallBatcher 轉換格式）
+        """
+        response = await self.client.post(
+            "/mcp/batch",
+            json=[{"tool": tool, "arguments": arguments} for tool, arguments in calls]
+        )
+        response.raise_for_status()
+        return response.json()["results"]
+
+
 # 全域實例 (HTTP 模式)
 mcp_client_http = MCPClientServiceHTTP()
@@ -0,0 +1,44 @@
+"""
+POS MCP Client Service - stdio Transport
+
+透過 mcp_stdio_pool 共用長期執行的 POS MCP Server 子程序，
+Tool 介面與回傳格式與 HTTP 版本相同（共用 POSMCPClient）
+"""
+from typing import Dict, Any
+import structlog
+
+from .mcp_client_pos_http import POSMCPClient
+from .mcp_stdio_pool import mcp_stdio_pools
+
+logger = structlog.get_logger()
+
+
+class MCPClientServicePOS(POSMCPClient):
+    """POS MCP Client - stdio Transport"""
+    
+    def __init__(self):
+        super().__init__()
+        logger.info("MCP Client Service (POS stdio) 已建立")
+    
+    async def initialize(self):
+        """初始化 MCP Client（應用程式啟動時已預先建立連線則直接使用）"""
+        if self.initialized:
+            return
+        
+        await mcp_stdio_pools.get_pool("pos").start()
+        self.initialized = True
+        logger.info("MCP Client Service (POS stdio) 初始化完成")
+    
+    async def _send(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """透過 stdio Session Pool 調用 Tool"""
+        try:
+            result = await mcp_stdio_pools.get_pool("pos").call_tool(tool_name, arguments)
+        except Exception as e:
+            logger.error("MCP Tool 調用異常", tool=tool_name, error=str(e))
+            return self.error_result("MCP_CALL_EXCEPTION", str(e))
+        
+        return self.normalize_result(result)
+
+
+# 全域實例 (stdio 模式)
+mcp_client_pos = MCPClientServicePOS()
@@ -0,0 +1,51 @@
+"""
+Promotion MCP Client Service - stdio Transport
+
+透過 mcp_stdio_pool 共用長期執行的 Promotion MCP Server 子程序，
+Tool 介面與回傳格式與 HTTP 版本相同（共用 PromotionMCPClient）
+"""
+from typing import Dict, Any
+import structlog
+
+from .mcp_client_promotion_http import PromotionMCPClient
+from .mcp_stdio_pool import mcp_stdio_pools
+
+logger = structlog.get_logger()
+
+
+class MCPClientServicePromotion(PromotionMCPClient):
+    """Promotion MCP Client - stdio Transport"""
+    
+    def __init__(self):
+        super().__init__()
+        logger.info("MCP Client Service (Promotion stdio) 已建立")
+    
+    async def initialize(self):
+        """初始化 MCP Client（應用程式啟動時已預先建立連線則直接使用）"""
+        if self.initialized:
+            return
+        
+        await mcp_stdio_pools.get_pool("promotion").start()
+        self.initialized = True
+        logger.info("MCP Client Service (Promotion stdio) 初始化完成")
+    
+    async def _send(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """透過 stdio Session Pool 調用 Tool（包裝為與 HTTP /mcp/call 相同的格式）"""
+        try:
+            result = await mcp_stdio_pools.get_pool("promotion").call_tool(tool_name, arguments)
+        except Exception as e:
+            logger.error("MCP Tool 調用異常", tool=tool_name, error=str(e))
+            return self.error_result("MCP_CALL_EXCEPTION", str(e))
+        
+        # Server 端的錯誤回應（BaseMCPServer.error_response）
+        if not isinstance(result, dict) or result.get("success") is False:
+            return self.normalize_result(result)
+        
+        return {
+            "success": True,
+            "result": result
+        }
+
+
+# 全域實例 (stdio 模式)
+mcp_client_promotion = MCPClientServicePromotion()
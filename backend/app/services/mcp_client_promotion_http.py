@@ -5,90 +5,19 @@ Promotion MCP Client Service - HTTP Transport
 """
 import os
 import httpx
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import structlog
 
+from .mcp_client_base import BaseMCPClient
+from .mcp_transport import MCPCallBatcher, mcp_transport
+
 logger = structlog.get_logger()
 
 
-class MCPClientServicePromotionHTTP:
-    """Promotion MCP Client - HTTP Transport"""
-    
-    def __init__(self):
-        self.base_url = os.getenv("PROMOTION_MCP_SERVER_URL", "http://localhost:8003")
-        self.client: Optional[httpx.AsyncClient] = None
-        self.initialized = False
-        logger.info("MCP Client Service (Promotion HTTP) 已建立", base_url=self.base_url)
+class PromotionMCPClient(BaseMCPClient):
+    """Promotion MCP Client 的 Tool 介面（HTTP 與 stdio 共用）"""
     
-    async def initialize(self):
-        """初始化 MCP Client"""
-        if self.initialized:
-            return
-        
-        logger.info("初始化 MCP Client Service (Promotion HTTP)")
-        
-        # 建立 HTTP 客戶端
-        self.client = httpx.AsyncClient(timeout=30.0)
-        
-        # 測試連接
-        try:
-            response = await self.client.get(f"{self.base_url}/health")
-            if response.status_code == 200:
-                health = response.json()
-                logger.info("Promotion MCP Server 連接成功", health=health)
-            else:
-                logger.warning(
-                    "Promotion MCP Server 健康檢查返回非 200",
-                    status=response.status_code
-                )
-        except Exception as e:
-            logger.error("無法連接 Promotion MCP Server", error=str(e), base_url=self.base_url)
-            raise RuntimeError(f"Promotion MCP Server 連接失敗: {e}")
-        
-        self.initialized = True
-        logger.info("MCP Client Service (Promotion HTTP) 初始化完成")
-    
-    async def _call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        """調用 MCP Tool
-        
-        Args:
-            tool_name: Tool 名稱
-            arguments: Tool 參數
-            
-        Returns:
-            Tool 執行結果
-        """
-        if not self.initialized:
-            await self.initialize()
-        
-        try:
-            response = await self.client.post(
-                f"{self.base_url}/mcp/call",
-                json={
-                    "tool": tool_name,
-                    "arguments": arguments
-                }
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(
-                    "MCP Tool 調用失敗",
-                    tool=tool_name,
-                    status=response.status_code,
-                    response=response.text
-                )
-                return {
-                    "success": False,
-                    "error": f"HTTP {response.status_code}: {response.text}"
-                }
-        except Exception as e:
-            logger.error("MCP Tool 調用異常", tool=tool_name, error=str(e))
-            return {
-                "success": False,
-                "error": str(e)
-            }
+    SERVER = "promotion"
     
     async def search_promotions(
         self,
@@ -149,7 +78,7 @@ class MCPClientServicePromotionHTTP:
         Returns:
             方案詳細資訊
         """
-        logger.info("HTTP: 取得方案詳細資訊", plan_id=plan_id)
+        logger.info("MCP: 取得方案詳細資訊", plan_id=plan_id)
         
         result = await self._call_tool(
             "get_plan_details",
@@ -162,6 +91,35 @@ class MCPClientServicePromotionHTTP:
             logger.warning("取得方案詳細資訊失敗", error=result.get("error"))
             return None
     
+    async def get_plans_details(self, plan_ids: List[str]) -> Dict[str, Any]:
+        """
+        批次取得方案詳細資訊（一次往返）
+        
+        Args:
+            plan_ids: 方案編號列表
+            
+        Returns:
+            {
+                "plans": {plan_id: 方案詳細資訊},
+                "not_found": [不存在的方案編號]
+            }
+        """
+        logger.info("MCP: 批次取得方案詳細資訊", count=len(plan_ids))
+        
+        result = await self._call_tool(
+            "get_plans_details",
+            {"plan_ids": plan_ids}
+        )
+        
+        if result.get("success"):
+            return result.get("result", {})
+        else:
+            logger.warning("批次取得方案詳細資訊失敗", error=result.get("error"))
+            return {
+                "plans": {},
+                "not_found": list(plan_ids)
+            }
+    
     async def compare_plans(
         self,
         plan_ids: List[str]
@@ -255,12 +213,104 @@ class MCPClientServicePromotionHTTP:
                 "final_device_price": 0,
                 "total_cost": 0
             }
+
+
+class MCPClientServicePromotionHTTP(PromotionMCPClient):
+    """Promotion MCP Client - HTTP Transport"""
+    
+    def __init__(self):
+        super().__init__()
+        self.base_url = os.getenv("PROMOTION_MCP_SERVER_URL", "http://localhost:8003")
+        # 同時發出的 Tool 調用合併為一次 /mcp/batch
+        self._batcher = MCPCallBatcher(self._post_call, self._post_batch, "promotion")
+        logger.info("MCP Client Service (Promotion HTTP) 已建立", base_url=self.base_url)
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """共用的 HTTP 連線池（由 mcp_transport 管理，應用程式關閉時釋放）"""
+        return mcp_transport.get_client("promotion", self.base_url)
+    
+    async def initialize(self):
+        """初始化 MCP Client"""
+        if self.initialized:
+            return
+        
+        logger.info("初始化 MCP Client Service (Promotion HTTP)")
+        
+        # 測試連接（使用共用連線池，只在第一次初始化時執行）
+        try:
+            response = await self.client.get(f"{self.base_url}/health")
+            if response.status_code == 200:
+                health = response.json()
+                logger.info("Promotion MCP Server 連接成功", health=health)
+            else:
+                logger.warning(
+                    "Promotion MCP Server 健康檢查返回非 200",
+                    status=response.status_code
+                )
+        except Exception as e:
+            logger.error("無法連接 Promotion MCP Server", error=str(e), base_url=self.base_url)
+            raise RuntimeError(f"Promotion MCP Server 連接失敗: {e}")
+        
+        self.initialized = True
+        logger.info("MCP Client Service (Promotion HTTP) 初始化完成")
+    
+    async def _send(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """調用 Tool（同時發出的調用會合併為一次批次請求）"""
+        return await self._batcher.call(tool_name, arguments)
     
-    async def close(self):
-        """關閉 HTTP 客戶端"""
-        if self.client:
-            await self.client.aclose()
-            logger.info("Promotion MCP Client HTTP 已關閉")
+    async def _post_call(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """調用單一 MCP Tool（POST /mcp/call）
+        
+        Args:
+            tool_name: Tool 名稱
+            arguments: Tool 參數
+            
+        Returns:
+            Tool 執行結果
+        """
+        try:
+            response = await self.client.post(
+                f"{self.base_url}/mcp/call",
+                json={
+                    "tool": tool_name,
+                    "arguments": arguments
+                }
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                # Server 端的錯誤為字串，統一為 {"code", "message"}
+                if not result.get("success") and not isinstance(result.get("error"), dict):
+                    return self.error_result("MCP_TOOL_ERROR", str(result.get("error")))
+                return result
+            else:
+                logger.error(
+                    "MCP Tool 調用失敗",
+                    tool=tool_name,
+                    status=response.status_code,
+                    response=response.text
+                )
+                return self.error_result("MCP_CALL_ERROR", f"HTTP {response.status_code}: {response.text}")
+        except Exception as e:
+            logger.error("MCP Tool 調用異常", tool=tool_name, error=str(e))
+            return self.error_result("MCP_CALL_EXCEPTION", str(e))
+    
+    async def _post_batch(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """批次調用 MCP Tools（POST /mcp/batch，一次往返）
+        
+        Args:
+            calls: (Tool 名稱, 參數) 列表
+            
+        Returns:
+            依序的批次項目（由 MCPCallBatcher 轉換格式）
+        """
+        response = await self.client.post(
+            f"{self.base_url}/mcp/batch",
+            json=[{"tool": tool, "arguments": arguments} for tool, arguments in calls]
+        )
+        response.raise_for_status()
+        return response.json()["results"]
 
 
 # 全域實例 (HTTP 模式)
@@ -0,0 +1,427 @@
+"""
+MCP stdio Session Pool - 長期使用的 stdio MCP 連線
+
+stdio 模式下，每個 MCP Server（CRM / POS / Promotion）啟動固定數量的子程序，
+每個子程序保持一個 ClientSession，由所有請求共用：
+- 同一個 Session 可同時處理多個 Tool 調用（JSON-RPC 以 request id 區分），
+  每個 Session 的同時調用數有上限，請求分配到目前負載最低的 Session
+- 背景定期 ping 每個 Session，子程序結束或無回應時自動重新啟動
+- 應用程式啟動時預先建立（warm start），關閉時統一結束子程序
+
+設定（環境變數）：
+- MCP_STDIO_POOL_SIZE: 每個 Server 的子程序數（預設 2）
+- MCP_STDIO_MAX_CONCURRENCY: 每個 Session 的同時調用數（預設 8，Pool 上限為子程序數 × 此值）
+- MCP_STDIO_CALL_TIMEOUT: Tool 調用逾時秒數（預設 30）
+- MCP_STDIO_START_TIMEOUT: 子程序啟動與初始化逾時秒數（預設 15）
+- MCP_STDIO_HEALTH_INTERVAL: 健康檢查間隔秒數（預設 30）
+- MCP_STDIO_WARM_START: 應用程式啟動時是否預先建立連線（預設 true）
+- MCP_{SERVER}_COMMAND / MCP_{SERVER}_ARGS: 啟動 Server 的指令與程式路徑
+  （預設以目前的 Python 直譯器執行 mcp_servers/{server}_server.py，子程序與 backend 使用同一個 virtualenv）
+"""
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import structlog
+
+from .mcp_transport import NON_RETRYABLE_TOOLS
+
+try:
+    from mcp.client.session import ClientSession
+    from mcp.client.stdio import StdioServerParameters, stdio_client
+    MCP_AVAILABLE = True
+except ImportError:
+    MCP_AVAILABLE = False
+    ClientSession = None
+    StdioServerParameters = None
+    stdio_client = None
+
+try:
+    from mcp.shared.exceptions import McpError
+except ImportError:
+    class McpError(Exception):
+        """舊版 mcp 套件沒有 McpError"""
+
+logger = structlog.get_logger()
+
+BACKEND_DIR = Path(__file__).parent.parent.parent
+MCP_SERVERS_DIR = BACKEND_DIR / "mcp_servers"
+
+# Server 名稱 -> (程式檔名, 傳給子程序的環境變數)
+SERVER_SCRIPTS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "crm": ("crm_server.py", ("MCP_CRM_API_URL", "MCP_CRM_API_KEY")),
+    "pos": ("pos_server.py", ("MCP_POS_API_URL", "MCP_POS_API_KEY")),
+    "promotion": ("promotion_server.py", ())
+}
+
+
+class StdioSession:
+    """
+    一個 stdio MCP 子程序與其 ClientSession
+
+    stdio_client / ClientSession 必須在同一個 Task 中進入與離開，
+    因此由專屬的背景 Task 持有連線，close() 時通知該 Task 結束。
+    """
+
+    def __init__(self, server: str, params: Any, index: int):
+        """
+        初始化
+
+        Args:
+            server: Server 名稱
+            params: StdioServerParameters
+            index: Pool 中的位置（日誌用）
+        """
+        self.server = server
+        self.params = params
+        self.index = index
+        self.session: Optional[Any] = None
+        self.inflight = 0
+        self.error: Optional[BaseException] = None
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        """連線是否可用"""
+        return self.session is not None and self._task is not None and not self._task.done()
+
+    async def start(self, timeout: float):
+        """啟動子程序並完成 MCP 初始化"""
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise TimeoutError(f"{self.server} MCP Server 啟動逾時")
+        if not self.alive:
+            raise RuntimeError(f"{self.server} MCP Server 啟動失敗: {self.error}")
+
+    async def _run(self):
+        """持有連線直到 close()"""
+        try:
+            async with stdio_client(self.params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._stop.wait()
+        except Exception as e:
+            self.error = e
+            logger.warning("stdio MCP Session 結束", server=self.server, index=self.index, error=str(e))
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any], timeout: float) -> Any:
+        """調用 Tool"""
+        session = self.session
+        if session is None:
+            raise ConnectionError(f"{self.server} MCP Session 已中斷")
+
+        self.inflight += 1
+        try:
+            return await asyncio.wait_for(session.call_tool(name, arguments), timeout)
+        finally:
+            self.inflight -= 1
+
+    async def ping(self, timeout: float):
+        """健康檢查"""
+        session = self.session
+        if session is None:
+            raise ConnectionError(f"{self.server} MCP Session 已中斷")
+        await asyncio.wait_for(session.send_ping(), timeout)
+
+    async def close(self):
+        """結束子程序"""
+        self._stop.set()
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), 5)
+        except (asyncio.TimeoutError, Exception):
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+class StdioSessionPool:
+    """單一 MCP Server 的 stdio Session Pool"""
+
+    def __init__(
+        self,
+        server: str,
+        session_factory: Callable[[int], Any],
+        size: Optional[int] = None,
+        max_concurrency: Optional[int] = None
+    ):
+        """
+        初始化
+
+        Args:
+            server: Server 名稱
+            session_factory: 建立 Session 的函式（參數為 Pool 中的位置）
+            size: 子程序數
+            max_concurrency: 每個 Session 的同時調用上限
+        """
+        self.server = server
+        self.session_factory = session_factory
+        self.size = size or int(os.getenv("MCP_STDIO_POOL_SIZE", "2"))
+        self.max_concurrency = max_concurrency or int(os.getenv("MCP_STDIO_MAX_CONCURRENCY", "8"))
+        self.call_timeout = float(os.getenv("MCP_STDIO_CALL_TIMEOUT", "30"))
+        self.start_timeout = float(os.getenv("MCP_STDIO_START_TIMEOUT", "15"))
+        self.health_interval = float(os.getenv("MCP_STDIO_HEALTH_INTERVAL", "30"))
+
+        self._sessions: List[Optional[Any]] = [None] * self.size
+        self._respawning: Dict[int, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(self.size * self.max_concurrency)
+        self._start_lock = asyncio.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+        self.started = False
+
+        self.calls = 0
+        self.failures = 0
+        self.respawns = 0
+
+    async def start(self):
+        """啟動所有子程序（至少一個成功才算啟動完成）"""
+        async with self._start_lock:
+            if self.started:
+                return
+
+            await asyncio.gather(*(self._spawn(index) for index in range(self.size)))
+            if not any(self._alive(index) for index in range(self.size)):
+                raise RuntimeError(f"{self.server} MCP Server stdio 連線全部啟動失敗")
+
+            self._health_task = asyncio.create_task(self._health_loop())
+            self.started = True
+            logger.info(
+                "stdio MCP Session Pool 已啟動",
+                server=self.server,
+                size=self.size,
+                alive=sum(self._alive(index) for index in range(self.size))
+            )
+
+    def _alive(self, index: int) -> bool:
+        """位置上的 Session 是否可用"""
+        session = self._sessions[index]
+        return session is not None and session.alive
+
+    async def _spawn(self, index: int):
+        """啟動一個子程序"""
+        session = self.session_factory(index)
+        try:
+            await session.start(self.start_timeout)
+        except Exception as e:
+            logger.error("stdio MCP Session 啟動失敗", server=self.server, index=index, error=str(e))
+            self._sessions[index] = None
+            return
+        self._sessions[index] = session
+
+    def _schedule_respawn(self, index: int):
+        """背景重新啟動子程序（同一位置只會有一個重啟工作）"""
+        if index in self._respawning:
+            return
+        task = asyncio.create_task(self._respawn(index))
+        self._respawning[index] = task
+        task.add_done_callback(lambda _: self._respawning.pop(index, None))
+
+    async def _respawn(self, index: int):
+        """關閉舊的 Session 並重新啟動"""
+        old = self._sessions[index]
+        self._sessions[index] = None
+        if old is not None:
+            await old.close()
+        self.respawns += 1
+        logger.warning("重新啟動 stdio MCP Session", server=self.server, index=index)
+        await self._spawn(index)
+
+    def _pick(self) -> Tuple[int, Optional[Any]]:
+        """選擇目前負載最低的可用 Session（總同時調用數由 semaphore 限制）"""
+        candidates = [
+            (session.inflight, index)
+            for index, session in enumerate(self._sessions)
+            if session is not None and session.alive
+        ]
+        if not candidates:
+            return -1, None
+        _, index = min(candidates)
+        return index, self._sessions[index]
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> Any:
+        """
+        調用 Tool
+
+        Args:
+            name: Tool 名稱
+            arguments: Tool 參數
+
+        Returns:
+            Tool 回傳的 JSON 內容
+
+        Raises:
+            ConnectionError: 沒有可用的 Session
+        """
+        if not self.started:
+            await self.start()
+
+        attempts = 1 if name in NON_RETRYABLE_TOOLS else 2
+
+        async with self._semaphore:
+            for attempt in range(attempts):
+                index, session = self._pick()
+                if session is None:
+                    # 全部中斷時重新啟動並等待
+                    for dead in range(self.size):
+                        self._schedule_respawn(dead)
+                    await asyncio.gather(*self._respawning.values(), return_exceptions=True)
+                    index, session = self._pick()
+                if session is None:
+                    raise ConnectionError(f"{self.server} MCP Server 沒有可用的 stdio 連線")
+
+                self.calls += 1
+                try:
+                    result = await session.call_tool(name, arguments, self.call_timeout)
+                except (McpError, asyncio.TimeoutError):
+                    # Server 回應錯誤或執行逾時：Session 本身仍可用，由健康檢查判斷
+                    self.failures += 1
+                    raise
+                except Exception as e:
+                    self.failures += 1
+                    logger.warning(
+                        "stdio MCP Session 調用失敗",
+                        server=self.server,
+                        index=index,
+                        tool=name,
+                        error=str(e)
+                    )
+                    self._schedule_respawn(index)
+                    if attempt == attempts - 1:
+                        raise
+                    continue
+
+                return self._parse(result)
+
+    @staticmethod
+    def _parse(result: Any) -> Any:
+        """解析 Tool 回傳的文字內容（JSON）"""
+        if result.content:
+            return json.loads(result.content[0].text)
+        return None
+
+    async def _health_loop(self):
+        """定期檢查 Session，中斷或無回應時重新啟動"""
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for index in range(self.size):
+                if index in self._respawning:
+                    continue
+                session = self._sessions[index]
+                if session is None or not session.alive:
+                    self._schedule_respawn(index)
+                    continue
+                try:
+                    await session.ping(self.start_timeout)
+                except Exception as e:
+                    logger.warning("stdio MCP Session 健康檢查失敗", server=self.server, index=index, error=str(e))
+                    self._schedule_respawn(index)
+
+    async def close(self):
+        """結束所有子程序"""
+        if self._health_task:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+
+        for task in list(self._respawning.values()):
+            task.cancel()
+        await asyncio.gather(*self._respawning.values(), return_exceptions=True)
+
+        sessions = [session for session in self._sessions if session is not None]
+        self._sessions = [None] * self.size
+        await asyncio.gather(*(session.close() for session in sessions), return_exceptions=True)
+        self.started = False
+        logger.info("stdio MCP Session Pool 已關閉", server=self.server)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得 Pool 狀態"""
+        return {
+            "size": self.size,
+            "alive": sum(self._alive(index) for index in range(self.size)),
+            "inflight": sum(session.inflight for session in self._sessions if session is not None),
+            "calls": self.calls,
+            "failures": self.failures,
+            "respawns": self.respawns
+        }
+
+
+class MCPStdioPools:
+    """各 MCP Server 的 stdio Session Pool（由應用程式負責啟動與關閉）"""
+
+    def __init__(self):
+        self._pools: Dict[str, StdioSessionPool] = {}
+
+    @staticmethod
+    def stdio_enabled(server: str) -> bool:
+        """Server 是否設定為使用 stdio MCP（USE_MCP_{SERVER}=true 且不使用 HTTP Transport）"""
+        use_mcp = os.getenv(f"USE_MCP_{server.upper()}", "false").lower() == "true"
+        use_http = os.getenv("USE_HTTP_TRANSPORT", "true").lower() == "true"
+        return use_mcp and not use_http
+
+    @staticmethod
+    def _server_params(server: str) -> Any:
+        """取得啟動 Server 子程序的參數"""
+        if not MCP_AVAILABLE:
+            raise RuntimeError("找不到 mcp 套件，請執行: pip install mcp")
+
+        script, env_names = SERVER_SCRIPTS[server]
+        script_path = MCP_SERVERS_DIR / script
+        if os.getenv(f"MCP_{server.upper()}_ARGS"):
+            script_path = BACKEND_DIR / os.getenv(f"MCP_{server.upper()}_ARGS")
+        if not script_path.exists():
+            raise FileNotFoundError(f"MCP Server 不存在: {script_path}")
+
+        env = {name: os.getenv(name) for name in env_names if os.getenv(name)}
+        return StdioServerParameters(
+            command=os.getenv(f"MCP_{server.upper()}_COMMAND") or sys.executable,
+            args=[str(script_path)],
+            env=env or None
+        )
+
+    def get_pool(self, server: str) -> StdioSessionPool:
+        """取得 Server 的 Pool（第一次使用時建立，尚未啟動子程序）"""
+        pool = self._pools.get(server)
+        if pool is None:
+            params = self._server_params(server)
+            pool = StdioSessionPool(server, lambda index: StdioSession(server, params, index))
+            self._pools[server] = pool
+        return pool
+
+    async def warm_start(self):
+        """應用程式啟動時預先建立設定為 stdio 的 Server 連線（失敗時於第一次調用重試）"""
+        if os.getenv("MCP_STDIO_WARM_START", "true").lower() != "true":
+            return
+
+        servers = [server for server in SERVER_SCRIPTS if self.stdio_enabled(server)]
+        for server in servers:
+            try:
+                await self.get_pool(server).start()
+            except Exception as e:
+                logger.warning("stdio MCP Server 預先啟動失敗", server=server, error=str(e))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得各 Pool 狀態（供 /api/metrics 顯示）"""
+        return {server: pool.get_stats() for server, pool in self._pools.items()}
+
+    async def close(self):
+        """結束所有子程序（應用程式關閉時呼叫）"""
+        pools = list(self._pools.values())
+        self._pools.clear()
+        await asyncio.gather(*(pool.close() for pool in pools), return_exceptions=True)
+
+
+# 全域實例（由應用程式負責啟動與關閉）
+mcp_stdio_pools = MCPStdioPools()
@@ -0,0 +1,271 @@
+"""
+MCP HTTP Transport - 共用的 httpx 連線池
+
+CRM / POS / Promotion 的 HTTP MCP Client 都透過這裡取得 httpx.AsyncClient：
+每個 MCP Server 一個長期使用的 Client（連線 keep-alive 重複使用），
+由應用程式於關閉時統一釋放（after_serving），個別 Client 的 close() 不會關閉連線池。
+
+設定（環境變數）：
+- MCP_HTTP_MAX_CONNECTIONS: 每個 Server 的連線上限（預設 20）
+- MCP_HTTP_MAX_KEEPALIVE: 保持 keep-alive 的閒置連線數（預設 10）
+- MCP_HTTP_KEEPALIVE_EXPIRY: 閒置連線保留秒數（預設 30）
+- MCP_HTTP2: 是否啟用 HTTP/2（預設 false；需安裝 h2，只有 https 且 Server 支援時才會使用，
+  MCP Server 預設為 http://localhost，開啟沒有效果）
+- MCP_HTTP_CONNECT_TIMEOUT / MCP_HTTP_READ_TIMEOUT / MCP_HTTP_POOL_TIMEOUT:
+  連線、讀取、等待連線池的逾時秒數（預設 3 / 30 / 5）
+- {SERVER}_MCP_CONNECT_TIMEOUT / {SERVER}_MCP_READ_TIMEOUT / {SERVER}_MCP_POOL_TIMEOUT:
+  個別 Server 的逾時設定（SERVER 為 CRM、POS、PROMOTION），未設定時使用上述預設值
+- MCP_HTTP_BATCH: 是否將同時發出的 Tool 調用合併為一次 POST /mcp/batch（預設 true）
+- MCP_BATCH_MAX_CALLS: 每次批次調用的上限（預設 50，須與 Server 端相同或更小）
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import structlog
+
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+logger = structlog.get_logger()
+
+# 非冪等的 Tool（可能已在 Server 端執行，不可重送；HTTP 模式下也不合併為批次調用）
+NON_RETRYABLE_TOOLS = {"reserve_device"}
+
+
+class MCPTransport:
+    """每個 MCP Server 共用一個 httpx.AsyncClient"""
+
+    USER_AGENT = "MCP-Client-HTTP/1.0"
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+        self.limits = httpx.Limits(
+            max_connections=int(os.getenv("MCP_HTTP_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("MCP_HTTP_MAX_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("MCP_HTTP_KEEPALIVE_EXPIRY", "30"))
+        )
+
+        self.http2 = os.getenv("MCP_HTTP2", "false").lower() == "true"
+        if self.http2 and not H2_AVAILABLE:
+            logger.warning("找不到 h2 套件，MCP HTTP 連線使用 HTTP/1.1")
+            self.http2 = False
+
+    @staticmethod
+    def _timeout_setting(server: str, name: str, default: str) -> float:
+        """讀取個別 Server 的逾時設定，未設定時使用全域預設值"""
+        value = os.getenv(f"{server.upper()}_MCP_{name}_TIMEOUT")
+        return float(value or os.getenv(f"MCP_HTTP_{name}_TIMEOUT", default))
+
+    def get_timeout(self, server: str) -> httpx.Timeout:
+        """
+        取得 Server 的逾時設定（連線、讀取、等待連線池分開設定）
+
+        Args:
+            server: crm、pos 或 promotion
+        """
+        read = self._timeout_setting(server, "READ", "30")
+        return httpx.Timeout(
+            connect=self._timeout_setting(server, "CONNECT", "3"),
+            read=read,
+            write=read,
+            pool=self._timeout_setting(server, "POOL", "5")
+        )
+
+    def get_client(self, server: str, base_url: str) -> httpx.AsyncClient:
+        """
+        取得 Server 共用的 httpx.AsyncClient（第一次使用時建立）
+
+        Args:
+            server: crm、pos 或 promotion
+            base_url: MCP Server 的 HTTP URL
+
+        Returns:
+            httpx.AsyncClient
+        """
+        client = self._clients.get(server)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=base_url,
+                limits=self.limits,
+                timeout=self.get_timeout(server),
+                http2=self.http2,
+                headers={
+                    "Content-Type": "application/json",
+                    "User-Agent": self.USER_AGENT
+                }
+            )
+            self._clients[server] = client
+            logger.info(
+                "建立 MCP HTTP 連線池",
+                server=server,
+                base_url=base_url,
+                http2=self.http2,
+                max_connections=self.limits.max_connections
+            )
+        return client
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得連線池設定與狀態（供 /api/metrics 顯示）"""
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "servers": {
+                server: {"base_url": str(client.base_url), "closed": client.is_closed}
+                for server, client in self._clients.items()
+            }
+        }
+
+    async def close(self):
+        """關閉所有連線（應用程式關閉時呼叫）"""
+        clients = list(self._clients.values())
+        self._clients.clear()
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+        logger.info("MCP HTTP 連線池已關閉", count=len(clients))
+
+
+class MCPCallBatcher:
+    """
+    將同一時間發出的 Tool 調用合併為一次 POST /mcp/batch
+
+    呼叫端照常 await call()；同一個事件迴圈週期內排入的調用（例如 asyncio.gather
+    同時查詢客戶、門號與合約）會在下一個週期一起送出，結果依原順序交回各自的呼叫端。
+    只有一筆時使用原本的 /mcp/call；非冪等的 Tool（NON_RETRYABLE_TOOLS）一律直接使用 /mcp/call。
+    Server 不支援 /mcp/batch（404/405）或無法連線（請求尚未送出）時改為逐筆並行調用；
+    其他失敗（逾時、5xx 等）Server 可能已執行部分調用，直接將錯誤交回各呼叫端，不重送。
+
+    /mcp/batch 的每個項目為 {"ok": true, "result": 同 /mcp/call 的回應} 或
+    {"ok": false, "error": {"code", "message"}}，在這裡統一轉換為呼叫端使用的結果格式。
+    """
+
+    def __init__(
+        self,
+        call_one: Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        call_batch: Callable[[List[Tuple[str, Dict[str, Any]]]], Awaitable[List[Dict[str, Any]]]],
+        server: str
+    ):
+        """
+        初始化
+
+        Args:
+            call_one: 單筆調用（POST /mcp/call），需自行處理錯誤並返回結果
+            call_batch: 批次調用（POST /mcp/batch），依序返回每個項目
+            server: Server 名稱（日誌用）
+        """
+        self.call_one = call_one
+        self.call_batch = call_batch
+        self.server = server
+        self.enabled = os.getenv("MCP_HTTP_BATCH", "true").lower() == "true"
+        self.max_calls = int(os.getenv("MCP_BATCH_MAX_CALLS", "50"))
+        self.batch_supported = True
+        self._pending: List[Tuple[str, Dict[str, Any], asyncio.Future]] = []
+        self._tasks: set = set()
+
+    async def call(self, tool: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """調用 Tool（可能與同時發出的其他調用合併送出）"""
+        if not self.enabled or not self.batch_supported or tool in NON_RETRYABLE_TOOLS:
+            return await self.call_one(tool, arguments)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._pending:
+            # 等目前已排入的工作都執行過（也各自排入調用）後再送出
+            loop.call_soon(self._flush)
+        self._pending.append((tool, arguments, future))
+        return await future
+
+    def _flush(self):
+        """送出目前累積的調用"""
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), self.max_calls):
+            task = asyncio.ensure_future(self._send(pending[start:start + self.max_calls]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, pending: List[Tuple[str, Dict[str, Any], asyncio.Future]]):
+        """送出一批調用並把結果交回各自的呼叫端"""
+        calls = [(tool, arguments) for tool, arguments, _ in pending]
+
+        try:
+            if len(calls) == 1 or not self.batch_supported:
+                results = await asyncio.gather(*(self.call_one(tool, arguments) for tool, arguments in calls))
+            else:
+                results = await self._send_batch(calls)
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _send_batch(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        批次調用
+
+        Server 不支援批次調用或請求尚未送出時改為逐筆並行調用；
+        其他失敗時每個呼叫端都收到錯誤結果（Server 可能已執行，不重送）
+        """
+        try:
+            items = await self.call_batch(calls)
+            if len(items) != len(calls):
+                raise ValueError(f"批次結果數量不符: {len(items)} != {len(calls)}")
+            logger.debug("MCP 批次調用完成", server=self.server, count=len(calls))
+            return [self._unwrap(item) for item in items]
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code not in (404, 405):
+                return self._batch_failed(calls, e)
+            logger.warning("MCP Server 不支援批次調用，改為逐筆調用", server=self.server)
+            self.batch_supported = False
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            logger.warning("MCP 批次請求未送出，改為逐筆調用", server=self.server, error=str(e))
+        except Exception as e:
+            return self._batch_failed(calls, e)
+
+        return await asyncio.gather(*(self.call_one(tool, arguments) for tool, arguments in calls))
+
+    def _batch_failed(self, calls: List[Tuple[str, Dict[str, Any]]], error: Exception) -> List[Dict[str, Any]]:
+        """批次調用失敗（Server 可能已執行）時，每個呼叫端都收到錯誤結果"""
+        logger.error(
+            "MCP 批次調用失敗",
+            server=self.server,
+            tools=[tool for tool, _ in calls],
+            error=str(error)
+        )
+        return [
+            {
+                "success": False,
+                "error": {
+                    "code": "MCP_BATCH_ERROR",
+                    "message": str(error) or type(error).__name__
+                }
+            }
+            for _ in calls
+        ]
+
+    @staticmethod
+    def _unwrap(item: Any) -> Dict[str, Any]:
+        """將批次項目轉為與 /mcp/call 相同的結果；失敗項目轉為 {"success": False, "error": {"code", "message"}}"""
+        if not isinstance(item, dict) or "ok" not in item:
+            return {
+                "success": False,
+                "error": {
+                    "code": "MCP_INVALID_BATCH_ITEM",
+                    "message": "MCP Server 回傳的批次項目格式不符"
+                }
+            }
+        if item["ok"]:
+            return item.get("result") or {}
+        return {"success": False, "error": item.get("error")}
+
+
+# 全域實例（由應用程式負責關閉）
+mcp_transport = MCPTransport()
@@ -5,12 +5,35 @@ POS Service Factory
 """
 import os
 import structlog
-from typing import Union
+from typing import Optional, Union
 
 from .pos_service import MockPOSService
 
 logger = structlog.get_logger()
 
+# 全應用程式共用的 Mock Service（建立時會產生完整的 Mock 資料，不在每次請求重建）
+_mock_pos_service: Optional[MockPOSService] = None
+
+
+def get_mock_pos_service() -> MockPOSService:
+    """取得共用的 Mock POS Service（第一次使用時建立）"""
+    global _mock_pos_service
+    if _mock_pos_service is None:
+        _mock_pos_service = MockPOSService()
+    return _mock_pos_service
+
+
+def reload_mock_pos_service() -> MockPOSService:
+    """
+    重新載入 Mock POS 資料（設備目錄更新時呼叫）
+    
+    新的實例會重建庫存與預約記錄，處理中的請求繼續使用舊的實例
+    """
+    global _mock_pos_service
+    _mock_pos_service = MockPOSService()
+    logger.info("Mock POS Service 已重新載入")
+    return _mock_pos_service
+
 
 async def get_pos_service():
     """
@@ -31,18 +54,15 @@ async def get_pos_service():
     
     if use_mcp:
         if use_http_transport:
-            logger.info("使用 POS MCP Service (HTTP)")
+            logger.debug("使用 POS MCP Service (HTTP)")
             from .mcp_client_pos_http import mcp_client_pos_http
             await mcp_client_pos_http.initialize()
             return mcp_client_pos_http
         else:
-            logger.info("使用 POS MCP Service (stdio)")
-            # TODO: 實作 POS MCP Client stdio
-            # from .mcp_client_pos import mcp_client_pos
-            # await mcp_client_pos.initialize()
-            # return mcp_client_pos
-            logger.warning("POS MCP Client (stdio) 尚未實作，使用 Mock Service")
-            return MockPOSService()
+            logger.debug("使用 POS MCP Service (stdio)")
+            from .mcp_client_pos import mcp_client_pos
+            await mcp_client_pos.initialize()
+            return mcp_client_pos
     else:
         logger.debug("使用 Mock POS Service")
-        return MockPOSService()
+        return get_mock_pos_service()
@@ -31,6 +31,7 @@ class MockPOSService:
         base_server = BasePOSServer()
         self.mock_devices = base_server.mock_devices
         self.mock_stock = base_server.mock_stock
+        self.catalog = base_server.catalog
         self.mock_reservations = {}
         
         logger.info(
@@ -57,30 +58,11 @@ class MockPOSService:
         
         store_stock = self.mock_stock[store_id]
         devices = []
-        total_checked = 0
-        filtered_by_os = 0
-        
-        for device_id, stock_info in store_stock.items():
-            total_checked += 1
-            device = self.mock_devices.get(device_id)
-            if not device:
-                continue
-            
-            # 過濾條件
-            if os_filter and device["os"].lower() != os_filter.lower():
-                filtered_by_os += 1
-                logger.debug(
-                    "OS 過濾",
-                    device_id=device_id,
-                    device_os=device["os"],
-                    filter_os=os_filter
-                )
-                continue
-            if min_price and device["price"] < min_price:
-                continue
-            if max_price and device["price"] > max_price:
-                continue
-            
+        
+        # 作業系統與價格區間以索引查詢
+        for device_id in self.catalog.find(store_id, os_filter, min_price, max_price):
+            device = self.mock_devices[device_id]
+            stock_info = store_stock[device_id]
             available = stock_info["quantity"] - stock_info["reserved"]
             devices.append({
                 "device_id": device_id,
@@ -100,12 +82,11 @@ class MockPOSService:
                 "chip": device["chip"]
             })
         
-        devices.sort(key=lambda x: x["available"], reverse=True)
+        devices.sort(key=lambda x: (-x["available"], self.catalog.position(store_id, x["device_id"])))
         
         logger.info(
             "Mock: query_device_stock 結果",
-            total_checked=total_checked,
-            filtered_by_os=filtered_by_os,
+            total_checked=len(store_stock),
             result_count=len(devices)
         )
         
@@ -121,27 +102,19 @@ class MockPOSService:
         
         device = self.mock_devices[device_id].copy()
         
-        # 計算總庫存
-        total_stock = 0
-        available_stock = 0
+        # 總庫存已預先計算，只列出有此設備的門市
         store_stock_list = []
-        
-        for store_id, store_stock in self.mock_stock.items():
-            if device_id in store_stock:
-                stock_info = store_stock[device_id]
-                available = stock_info["quantity"] - stock_info["reserved"]
-                total_stock += stock_info["quantity"]
-                available_stock += available
-                store_stock_list.append({
-                    "store_id": store_id,
-                    "quantity": stock_info["quantity"],
-                    "reserved": stock_info["reserved"],
-                    "available": available
-                })
+        for store_id in self.catalog.stores_for(device_id):
+            stock_info = self.mock_stock[store_id][device_id]
+            store_stock_list.append({
+                "store_id": store_id,
+                "quantity": stock_info["quantity"],
+                "reserved": stock_info["reserved"],
+                "available": stock_info["quantity"] - stock_info["reserved"]
+            })
         
         device["stock_summary"] = {
-            "total_stock": total_stock,
-            "available_stock": available_stock,
+            **self.catalog.totals_for(device_id),
             "stores": store_stock_list
         }
         
@@ -158,45 +131,11 @@ class MockPOSService:
                 "reason": f"門市 {store_id} 不存在"
             }
         
-        store_stock = self.mock_stock[store_id]
-        candidates = []
-        
-        for device_id, stock_info in store_stock.items():
-            device = self.mock_devices.get(device_id)
-            if not device:
-                continue
-            
-            if device["os"].lower() != os_preference.lower() or device["price"] > budget:
-                continue
-            if is_flagship is not None and device["is_flagship"] != is_flagship:
-                continue
-            
-            available = stock_info["quantity"] - stock_info["reserved"]
-            if available <= 0:
-                continue
-            
-            # 計算推薦分數
-            score = device["popularity_score"]
-            price_ratio = device["price"] / budget
-            if price_ratio >= 0.8:
-                score += 5
-            elif price_ratio >= 0.6:
-                score += 3
-            
-            if device["is_flagship"]:
-                score += 3
-            
-            release_date = datetime.strptime(device["release_date"], "%Y-%m-%d")
-            months_old = (datetime.now() - release_date).days / 30
-            if months_old < 6:
-                score += 5
-            elif months_old < 12:
-                score += 2
-            
-            if available >= 5:
-                score += 2
-            
-            candidates.append({
+        # 推薦分數中與預算無關的部分已預先計算，結果依門市、作業系統、預算快取
+        recommendations = []
+        for device_id, score, available in self.catalog.recommend(store_id, os_preference, budget, is_flagship):
+            device = self.mock_devices[device_id]
+            recommendations.append({
                 "device_id": device_id,
                 "brand": device["brand"],
                 "model": device["model"],
@@ -215,9 +154,6 @@ class MockPOSService:
                 "battery": device["battery"]
             })
         
-        candidates.sort(key=lambda x: x["recommendation_score"], reverse=True)
-        recommendations = candidates[:5]
-        
         if not recommendations:
             return {
                 "recommendations": [],
@@ -273,7 +209,7 @@ class MockPOSService:
             "status": "active"
         }
         
-        self.mock_stock[store_id][device_id]["reserved"] += 1
+        self.catalog.reserve(store_id, device_id)
         device = self.mock_devices[device_id]
         
         logger.info("預約成功", reservation_id=reservation_id)
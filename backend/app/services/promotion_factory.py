@@ -5,12 +5,31 @@ Promotion Service Factory
 """
 import os
 import structlog
-from typing import Union
+from typing import Optional, Union
 
 from .promotion_service import MockPromotionService
 
 logger = structlog.get_logger()
 
+# 全應用程式共用的 Mock Service（建立時會產生完整的 Mock 資料，不在每次請求重建）
+_mock_promotion_service: Optional[MockPromotionService] = None
+
+
+def get_mock_promotion_service() -> MockPromotionService:
+    """取得共用的 Mock Promotion Service（第一次使用時建立）"""
+    global _mock_promotion_service
+    if _mock_promotion_service is None:
+        _mock_promotion_service = MockPromotionService()
+    return _mock_promotion_service
+
+
+def reload_mock_promotion_service() -> MockPromotionService:
+    """重新載入 Mock 促銷與方案資料（處理中的請求繼續使用舊的實例）"""
+    global _mock_promotion_service
+    _mock_promotion_service = MockPromotionService()
+    logger.info("Mock Promotion Service 已重新載入")
+    return _mock_promotion_service
+
 
 async def get_promotion_service() -> Union[MockPromotionService]:
     """取得 Promotion Service
@@ -27,19 +46,21 @@ async def get_promotion_service() -> Union[MockPromotionService]:
     
     if not use_mcp:
         # 使用 Mock Service (預設)
-        logger.info("使用 Mock Promotion Service")
-        return MockPromotionService()
+        logger.debug("使用 Mock Promotion Service")
+        return get_mock_promotion_service()
     
     # MCP Client 模式
     use_http = os.getenv('USE_HTTP_TRANSPORT', 'true').lower() == 'true'
     
     if use_http:
         # HTTP Transport
-        logger.info("使用 Promotion MCP Service (HTTP)")
+        logger.debug("使用 Promotion MCP Service (HTTP)")
         from .mcp_client_promotion_http import mcp_client_promotion_http
         await mcp_client_promotion_http.initialize()
         return mcp_client_promotion_http
     else:
-        # stdio Transport (尚未實作)
-        logger.warning("Promotion MCP Client (stdio) 尚未實作，使用 Mock Service")
-        return MockPromotionService()
+        # stdio Transport
+        logger.debug("使用 Promotion MCP Service (stdio)")
+        from .mcp_client_promotion import mcp_client_promotion
+        await mcp_client_promotion.initialize()
+        return mcp_client_promotion
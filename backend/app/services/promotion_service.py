@@ -33,6 +33,8 @@ class MockPromotionService:
         # 複製 Mock 資料
         self.promotions = base_server.promotions
         self.plans = base_server.plans
+        self.search_index = base_server.search_index
+        self.plan_catalog = base_server.plan_catalog
         
         logger.info(
             "Mock Promotion Service 已初始化",
@@ -44,7 +46,8 @@ class MockPromotionService:
         self,
         query: str,
         contract_type: Optional[str] = None,
-        limit: int = 5
+        limit: int = 5,
+        mode: Optional[str] = None
     ) -> Dict[str, Any]:
         """搜尋促銷方案
         
@@ -52,6 +55,7 @@ class MockPromotionService:
             query: 搜尋查詢
             contract_type: 合約類型篩選
             limit: 回傳筆數限制
+            mode: keyword、vector 或 hybrid（預設讀取 PROMOTION_SEARCH_MODE）
         
         Returns:
             {
@@ -67,76 +71,25 @@ class MockPromotionService:
         )
         
         try:
-            # 簡易關鍵字比對
-            query_lower = query.lower()
-            matched_promotions = []
+            # 與 PromotionServer 共用搜尋索引（關鍵字 + 向量混合檢索、合約類型 bitmap 篩選）
+            matched, total = self.search_index.search(query, contract_type, limit, mode)
             
-            logger.debug(
-                "開始搜尋",
-                query=query,
-                query_lower=query_lower,
-                contract_type=contract_type,
-                total_promotions=len(self.promotions)
-            )
-            
-            for promo in self.promotions:
-                score = 0
-                matched_keywords = []
-                
-                # 檢查關鍵字
-                for keyword in promo["keywords"]:
-                    if keyword in query_lower or keyword.lower() in query_lower:
-                        score += 10
-                        matched_keywords.append(keyword)
-                
-                # 檢查標題
-                if any(word in promo["title"] for word in query.split()):
-                    score += 5
-                
-                # 檢查描述
-                if any(word in promo["description"] for word in query.split()):
-                    score += 3
-                
-                # 合約類型篩選
-                if contract_type:
-                    promo_contract_types = promo["eligibility"].get("contract_type", [])
-                    if contract_type in promo_contract_types:
-                        score += 20
-                    else:
-                        logger.debug(
-                            "合約類型不符",
-                            promotion_id=promo["promotion_id"],
-                            required=contract_type,
-                            available=promo_contract_types,
-                            initial_score=score
-                        )
-                        continue
+            result_promotions = []
+            for promo, score in matched:
+                promo_copy = promo.copy()
+                promo_copy["relevance_score"] = round(score, 4)
+                result_promotions.append(promo_copy)
                 
-                if score > 0:
-                    promo_copy = promo.copy()
-                    promo_copy["relevance_score"] = score
-                    matched_promotions.append(promo_copy)
-                    
-                    logger.debug(
-                        "促銷匹配",
-                        promotion_id=promo["promotion_id"],
-                        promotion_title=promo["title"],
-                        score=score,
-                        matched_keywords=matched_keywords
-                    )
-            
-            # 依相關性排序
-            matched_promotions.sort(
-                key=lambda x: (x["relevance_score"], x["priority"]),
-                reverse=True
-            )
-            
-            # 限制回傳筆數
-            result_promotions = matched_promotions[:limit]
+                logger.debug(
+                    "促銷匹配",
+                    promotion_id=promo["promotion_id"],
+                    promotion_title=promo["title"],
+                    score=promo_copy["relevance_score"]
+                )
             
             return {
                 "promotions": result_promotions,
-                "total": len(matched_promotions),
+                "total": total,
                 "query": query
             }
             
@@ -156,39 +109,52 @@ class MockPromotionService:
             plan_id: 方案 ID
         
         Returns:
-            方案詳細資訊，若不存在則回傳 None
+            方案詳細資訊（唯讀，所有呼叫端共用），若不存在則回傳 None
         """
         logger.info("Mock: 取得方案詳情", plan_id=plan_id)
         
         try:
-            # 查詢方案
-            plan = next((p for p in self.plans if p["plan_id"] == plan_id), None)
+            # 與 PromotionServer 共用方案索引
+            result = self.plan_catalog.get_details(plan_id)
             
-            if not plan:
+            if result is None:
                 logger.warning("方案不存在", plan_id=plan_id)
                 return None
             
-            # 查詢適用的促銷活動
-            applicable_promotions = []
-            for promo in self.promotions:
-                if plan_id in promo.get("plans", []):
-                    applicable_promotions.append({
-                        "promotion_id": promo["promotion_id"],
-                        "title": promo["title"],
-                        "benefits": promo["benefits"]
-                    })
-            
-            # 組合完整資訊
-            result = plan.copy()
-            result["applicable_promotions"] = applicable_promotions
-            result["total_promotions"] = len(applicable_promotions)
-            
             return result
             
         except Exception as e:
             logger.error("取得方案詳情失敗", plan_id=plan_id, error=str(e))
             return None
     
+    async def get_plans_details(self, plan_ids: List[str]) -> Dict[str, Any]:
+        """批次取得方案詳情
+        
+        Args:
+            plan_ids: 方案 ID 列表（重複的 ID 只回傳一次）
+        
+        Returns:
+            {
+                "plans": {plan_id: 方案詳細資訊（唯讀）},
+                "not_found": [不存在的方案 ID]
+            }
+        """
+        logger.info("Mock: 批次取得方案詳情", count=len(plan_ids))
+        
+        plans = {}
+        not_found = []
+        for plan_id in dict.fromkeys(plan_ids):
+            details = self.plan_catalog.get_details(plan_id)
+            if details is None:
+                not_found.append(plan_id)
+            else:
+                plans[plan_id] = details
+        
+        return {
+            "plans": plans,
+            "not_found": not_found
+        }
+    
     async def compare_plans(
         self,
         plan_ids: List[str]
@@ -215,46 +181,17 @@ class MockPromotionService:
                     "comparison": {}
                 }
             
-            # 取得方案詳情
-            plans = []
-            for plan_id in plan_ids:
-                plan = await self.get_plan_details(plan_id)
-                if plan:
-                    plans.append(plan)
+            # 比較結果由方案索引快取（同一組方案不論順序只計算一次，方案或促銷變更後失效）
+            result = self.plan_catalog.compare(plan_ids)
             
-            if not plans:
+            if result is None:
                 return {
                     "error": "沒有找到有效的方案",
                     "plans": [],
                     "comparison": {}
                 }
             
-            # 建立比較表
-            comparison = {
-                "monthly_fee": {
-                    "min": min(p["monthly_fee"] for p in plans),
-                    "max": max(p["monthly_fee"] for p in plans),
-                    "values": {p["plan_id"]: p["monthly_fee"] for p in plans}
-                },
-                "data": {
-                    "values": {p["plan_id"]: p["data"] for p in plans}
-                },
-                "voice": {
-                    "values": {p["plan_id"]: p["voice"] for p in plans}
-                },
-                "contract_months": {
-                    "values": {p["plan_id"]: p["contract_months"] for p in plans}
-                }
-            }
-            
-            # 生成建議
-            recommendation = self._generate_recommendation(plans)
-            
-            return {
-                "plans": plans,
-                "comparison": comparison,
-                "recommendation": recommendation
-            }
+            return result
             
         except Exception as e:
             logger.error("比較方案失敗", error=str(e))
@@ -264,31 +201,6 @@ class MockPromotionService:
                 "comparison": {}
             }
     
-    def _generate_recommendation(self, plans: List[Dict[str, Any]]) -> str:
-        """生成方案推薦建議"""
-        if not plans:
-            return "無法提供建議"
-        
-        if len(plans) == 1:
-            return f"目前只有一個方案 {plans[0]['name']}"
-        
-        # 找出最便宜的
-        cheapest = min(plans, key=lambda x: x["monthly_fee"])
-        # 找出數據最多的
-        unlimited_data = [p for p in plans if "無限" in p["data"]]
-        
-        recommendations = []
-        recommendations.append(
-            f"🏷️ 最經濟實惠：{cheapest['name']} (月租 ${cheapest['monthly_fee']})"
-        )
-        
-        if unlimited_data:
-            recommendations.append(
-                f"🚀 重度使用者：{unlimited_data[0]['name']} (上網吃到飽)"
-            )
-        
-        return " | ".join(recommendations)
-    
     async def calculate_upgrade_cost(
         self,
         current_plan_fee: int,
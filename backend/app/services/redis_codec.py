@@ -0,0 +1,216 @@
+"""
+Redis 值編碼層 - 依鍵前綴選擇序列化與壓縮方式
+
+RedisManager 使用 decode_responses=True 的文字連線，因此所有格式都是字串：
+- JSON 文字（舊格式，json 或 orjson 序列化的結果相同，可直接解析）
+- "~z:" + base64(zlib(JSON))：超過壓縮門檻的 zlib 壓縮值
+- "~s:" + base64(zstd(JSON))：超過壓縮門檻的 zstd 壓縮值（需安裝 zstandard）
+
+JSON 文字不會以 "~" 開頭，讀取時依前綴判斷格式，舊的鍵不需轉換即可讀取。
+
+預設不壓縮：壓縮後的位元組須以 base64 存成文字（約增加 33%），一般大小的 Session
+節省的空間大多被抵銷；只有明顯大於門檻且重複內容多的值才值得以 +zlib / +zstd 開啟。
+
+預設以標準函式庫 json 序列化；orjson 為選用，安裝後以 REDIS_CODEC_RULES 開啟
+（例如 renewal_session:=orjson），未安裝時會記錄警告並改用 json。
+
+設定（環境變數）：
+- REDIS_CODEC_RULES: 鍵前綴與編碼方式（預設無，全部使用 REDIS_CODEC_DEFAULT），例如 "renewal_session:=orjson+zlib,session:=json"
+- REDIS_CODEC_DEFAULT: 未符合任何前綴時的編碼方式（預設 json）
+- REDIS_COMPRESS_MIN_BYTES: 壓縮門檻位元組數（預設 1024）
+"""
+import base64
+import json
+import os
+import zlib
+from typing import Any, Dict, Optional
+
+import structlog
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    zstandard = None
+
+logger = structlog.get_logger()
+
+ZLIB_PREFIX = "~z:"
+ZSTD_PREFIX = "~s:"
+
+DEFAULT_CODEC_RULES = ""
+
+
+def _dumps_json(value: Any) -> bytes:
+    """標準函式庫 JSON 序列化（與舊格式相同）"""
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def _dumps_orjson(value: Any) -> bytes:
+    """orjson 序列化，遇到 orjson 不支援的值時改用標準函式庫"""
+    try:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        return _dumps_json(value)
+
+
+def _loads(data: Any) -> Any:
+    """解析 JSON（有 orjson 時優先使用）"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # 例如 NaN 等 orjson 不接受、但標準函式庫接受的舊資料
+            pass
+    return json.loads(data)
+
+
+class RedisCodec:
+    """單一編碼方式：序列化器 + 可選的壓縮"""
+
+    SERIALIZERS = ("json", "orjson")
+    COMPRESSIONS = ("zlib", "zstd")
+
+    def __init__(
+        self,
+        serializer: str = "json",
+        compression: Optional[str] = None,
+        compress_min_bytes: int = 1024
+    ):
+        """
+        初始化
+
+        Args:
+            serializer: json 或 orjson
+            compression: None、zlib 或 zstd
+            compress_min_bytes: 序列化後超過此大小才壓縮
+        """
+        if serializer not in self.SERIALIZERS:
+            raise ValueError(f"不支援的序列化方式: {serializer}")
+        if compression is not None and compression not in self.COMPRESSIONS:
+            raise ValueError(f"不支援的壓縮方式: {compression}")
+
+        if serializer == "orjson" and not ORJSON_AVAILABLE:
+            logger.warning("找不到 orjson 套件，改用 json 序列化")
+            serializer = "json"
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            logger.warning("找不到 zstandard 套件，改用 zlib 壓縮")
+            compression = "zlib"
+
+        self.serializer = serializer
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self._dumps = _dumps_orjson if serializer == "orjson" else _dumps_json
+        self._zstd_compressor = zstandard.ZstdCompressor() if compression == "zstd" else None
+
+    @property
+    def name(self) -> str:
+        """編碼方式名稱（例如 orjson+zlib）"""
+        return f"{self.serializer}+{self.compression}" if self.compression else self.serializer
+
+    @classmethod
+    def from_spec(cls, spec: str, compress_min_bytes: int = 1024) -> "RedisCodec":
+        """由 "序列化[+壓縮]" 字串建立，例如 "orjson+zstd" """
+        serializer, _, compression = spec.strip().lower().partition("+")
+        return cls(serializer, compression or None, compress_min_bytes)
+
+    def encode(self, value: Any) -> str:
+        """編碼為可存入 Redis 的字串"""
+        data = self._dumps(value)
+
+        if self.compression and len(data) >= self.compress_min_bytes:
+            if self._zstd_compressor:
+                return ZSTD_PREFIX + base64.b64encode(self._zstd_compressor.compress(data)).decode("ascii")
+            return ZLIB_PREFIX + base64.b64encode(zlib.compress(data)).decode("ascii")
+
+        return data.decode("utf-8")
+
+
+def decode_value(raw: Any) -> Any:
+    """
+    依前綴判斷格式並解碼（不論寫入時使用哪種編碼方式）
+
+    Args:
+        raw: Redis 取得的值
+
+    Returns:
+        解碼後的值
+
+    Raises:
+        ValueError: 資料無法解碼（包含 zstd 壓縮但未安裝 zstandard）
+    """
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8")
+
+    if raw.startswith(ZLIB_PREFIX):
+        return _loads(zlib.decompress(base64.b64decode(raw[len(ZLIB_PREFIX):])))
+
+    if raw.startswith(ZSTD_PREFIX):
+        if not ZSTD_AVAILABLE:
+            raise ValueError("資料以 zstd 壓縮，但未安裝 zstandard 套件")
+        return _loads(
+            zstandard.ZstdDecompressor().decompress(base64.b64decode(raw[len(ZSTD_PREFIX):]))
+        )
+
+    return _loads(raw)
+
+
+class CodecRegistry:
+    """依鍵前綴選擇編碼方式（最長前綴優先）"""
+
+    def __init__(self, rules: Optional[Dict[str, RedisCodec]] = None, default: Optional[RedisCodec] = None):
+        """
+        初始化
+
+        Args:
+            rules: 鍵前綴與編碼方式
+            default: 未符合任何前綴時的編碼方式（預設 json）
+        """
+        self.default = default or RedisCodec()
+        self.rules = sorted((rules or {}).items(), key=lambda item: len(item[0]), reverse=True)
+
+    @classmethod
+    def from_env(cls) -> "CodecRegistry":
+        """由環境變數建立"""
+        compress_min_bytes = int(os.getenv("REDIS_COMPRESS_MIN_BYTES", "1024"))
+
+        rules = {}
+        for rule in os.getenv("REDIS_CODEC_RULES", DEFAULT_CODEC_RULES).split(","):
+            if not rule.strip():
+                continue
+            prefix, _, spec = rule.partition("=")
+            rules[prefix.strip()] = RedisCodec.from_spec(spec, compress_min_bytes)
+
+        default = RedisCodec.from_spec(os.getenv("REDIS_CODEC_DEFAULT", "json"), compress_min_bytes)
+
+        logger.info(
+            "Redis 編碼設定",
+            rules={prefix: codec.name for prefix, codec in rules.items()},
+            default=default.name
+        )
+
+        return cls(rules, default)
+
+    def for_key(self, key: str) -> RedisCodec:
+        """取得鍵對應的編碼方式"""
+        for prefix, codec in self.rules:
+            if key.startswith(prefix):
+                return codec
+        return self.default
+
+    def encode(self, key: str, value: Any) -> str:
+        """以鍵對應的編碼方式編碼"""
+        return self.for_key(key).encode(value)
+
+    @staticmethod
+    def decode(raw: Any) -> Any:
+        """解碼（依前綴判斷格式）"""
+        return decode_value(raw)
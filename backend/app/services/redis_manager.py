@@ -1,43 +1,142 @@
 """
 Redis 管理器 - Redis 連線與快取管理
 """
+import fnmatch
 import json
-from typing import Optional, Any, Dict, List, Union
+import os
+from contextlib import asynccontextmanager
+from typing import Optional, Any, Dict, List, Union, Callable, Awaitable, AsyncIterator, Iterable
 import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import RedisError, WatchError
 import structlog
+
+from .redis_codec import CodecRegistry, decode_value
 from datetime import timedelta
 
 logger = structlog.get_logger()
 
+
+# 鍵存在時才寫入 Hash 欄位並重設 TTL，存在檢查與寫入於 Redis 端一次完成
+# KEYS[1]: Hash 鍵
+# ARGV[1]: TTL（0 表示不設定）  ARGV[2]: 是否先刪除整個 Hash（1/0）
+# ARGV[3...]: 欄位、值交錯排列
+# 回傳: 1 已寫入，0 鍵不存在
+HSET_IF_EXISTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if ARGV[2] == '1' then
+    redis.call('DEL', KEYS[1])
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+if tonumber(ARGV[1]) > 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+
+class CommandStats:
+    """Redis 指令統計"""
+    
+    def __init__(self):
+        self.in_flight = 0
+        self.commands_total = 0
+        self.pipelines_total = 0
+
+
+class TrackedRedis(redis.Redis):
+    """記錄進行中指令數的 Redis 用戶端"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = CommandStats()
+    
+    async def execute_command(self, *args, **options):
+        self.stats.in_flight += 1
+        self.stats.commands_total += 1
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            self.stats.in_flight -= 1
+    
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> "TrackedPipeline":
+        pipe = TrackedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+        pipe.stats = self.stats
+        return pipe
+
+
+class TrackedPipeline(Pipeline):
+    """記錄進行中指令數的 Pipeline（整批指令計入進行中）"""
+    
+    stats: CommandStats
+    
+    async def execute(self, raise_on_error: bool = True) -> List[Any]:
+        count = len(self.command_stack)
+        self.stats.in_flight += count
+        self.stats.commands_total += count
+        self.stats.pipelines_total += 1
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            self.stats.in_flight -= count
+
+
 class RedisManager:
     """Redis 管理器"""
     
+    # 單一 DEL 指令最多帶的鍵數量
+    DELETE_BATCH_SIZE = 500
+    
     def __init__(self):
         self.redis: Optional[redis.Redis] = None
+        self.pool: Optional[redis.ConnectionPool] = None
         self.url: Optional[str] = None
+        self._scripts: Dict[str, Any] = {}
+        self.codecs = CodecRegistry.from_env()
     
     async def initialize(self, url: str = "redis://localhost:6379"):
-        """初始化 Redis 連線"""
+        """
+        初始化 Redis 連線
+        
+        連線池設定（環境變數）：
+        - REDIS_MAX_CONNECTIONS: 連線池大小（預設 50）
+        - REDIS_HEALTH_CHECK_INTERVAL: 閒置連線再次使用前的健康檢查間隔秒數（預設 30）
+        """
         self.url = url
         
         try:
-            # 建立 Redis 連線
-            self.redis = redis.from_url(
+            # 建立明確大小的連線池
+            self.pool = redis.ConnectionPool.from_url(
                 url,
+                max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50")),
+                health_check_interval=int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30")),
                 encoding="utf-8",
                 decode_responses=True,
                 socket_connect_timeout=5,
                 socket_timeout=5,
+                socket_keepalive=True,
                 retry_on_timeout=True
             )
+            self.redis = TrackedRedis(connection_pool=self.pool)
             
             # 測試連線
             await self.redis.ping()
             
-            logger.info("✅ Redis 連線初始化成功", url=url)
+            logger.info(
+                "✅ Redis 連線初始化成功",
+                url=url,
+                max_connections=self.pool.max_connections
+            )
             
         except Exception as e:
             logger.warning(f"⚠️ Redis 連線失敗，使用模擬快取: {e}")
+            if self.pool:
+                await self.pool.disconnect()
+                self.pool = None
             self.redis = MockRedis()
     
     async def get(self, key: str) -> Optional[str]:
@@ -53,7 +152,7 @@ class RedisManager:
         """設定值"""
         try:
             if isinstance(value, (dict, list)):
-                value = json.dumps(value, ensure_ascii=False)
+                value = self.codecs.encode(key, value)
             
             return await self.redis.set(key, value, ex=ex)
         except Exception as e:
@@ -65,7 +164,7 @@ class RedisManager:
         try:
             value = await self.get(key)
             if value:
-                return json.loads(value)
+                return decode_value(value)
             return None
         except (json.JSONDecodeError, Exception) as e:
             logger.error("Redis GET JSON 錯誤", key=key, error=str(e))
@@ -124,10 +223,287 @@ class RedisManager:
             logger.error("Redis SMEMBERS 錯誤", key=key, error=str(e))
             return set()
     
+    async def mget_json(self, keys: List[str]) -> List[Any]:
+        """
+        一次取得多個 JSON 值（單一 MGET）
+        
+        Args:
+            keys: Redis 鍵列表
+            
+        Returns:
+            與 keys 順序對應的值，不存在或無法解析的鍵為 None
+        """
+        if not keys:
+            return []
+        
+        try:
+            values = await self.redis.mget(keys)
+        except Exception as e:
+            logger.error("Redis MGET 錯誤", keys_count=len(keys), error=str(e))
+            return [None] * len(keys)
+        
+        results = []
+        for key, value in zip(keys, values):
+            try:
+                results.append(decode_value(value) if value else None)
+            except Exception as e:
+                logger.error("Redis MGET JSON 解析錯誤", key=key, error=str(e))
+                results.append(None)
+        return results
+    
+    async def mset_json(
+        self,
+        mapping: Dict[str, Any],
+        ex: Optional[int] = None,
+        ttls: Optional[Dict[str, int]] = None
+    ) -> bool:
+        """
+        一次寫入多個 JSON 值（單一 Pipeline 往返）
+        
+        Args:
+            mapping: 鍵與值
+            ex: 預設過期秒數
+            ttls: 個別鍵的過期秒數（覆寫 ex）
+            
+        Returns:
+            是否寫入成功
+        """
+        if not mapping:
+            return True
+        
+        ttls = ttls or {}
+        try:
+            async with self.pipeline() as pipe:
+                for key, value in mapping.items():
+                    pipe.set(key, self.codecs.encode(key, value), ex=ttls.get(key, ex))
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error("Redis MSET JSON 錯誤", keys_count=len(mapping), error=str(e))
+            return False
+    
+    async def delete_many(self, keys: Iterable[str]) -> int:
+        """
+        批次刪除多個鍵（每 DELETE_BATCH_SIZE 個鍵一個 DEL，同一次 Pipeline 往返）
+        
+        Args:
+            keys: Redis 鍵
+            
+        Returns:
+            實際刪除的鍵數量
+        """
+        keys = list(keys)
+        if not keys:
+            return 0
+        
+        try:
+            async with self.pipeline() as pipe:
+                for start in range(0, len(keys), self.DELETE_BATCH_SIZE):
+                    pipe.delete(*keys[start:start + self.DELETE_BATCH_SIZE])
+                results = await pipe.execute()
+            return sum(results)
+        except Exception as e:
+            logger.error("Redis 批次 DELETE 錯誤", keys_count=len(keys), error=str(e))
+            return 0
+    
+    async def delete_matching(self, pattern: str) -> int:
+        """
+        刪除符合樣式的所有鍵（SCAN 逐批取得，不使用會阻塞 Redis 的 KEYS）
+        
+        Args:
+            pattern: 鍵樣式，例如 "mcp_cache:pos:query_device_stock:*"
+            
+        Returns:
+            實際刪除的鍵數量
+        """
+        try:
+            keys = [key async for key in self.redis.scan_iter(match=pattern, count=self.DELETE_BATCH_SIZE)]
+        except Exception as e:
+            logger.error("Redis SCAN 錯誤", pattern=pattern, error=str(e))
+            return 0
+        return await self.delete_many(keys)
+    
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = False) -> AsyncIterator[Any]:
+        """
+        取得 Pipeline，離開時自動重置並歸還連線
+        
+        用法:
+            async with redis_manager.pipeline() as pipe:
+                pipe.get("a")
+                pipe.delete("b")
+                results = await pipe.execute()
+        
+        Args:
+            transaction: 是否以 MULTI/EXEC 包裝（預設只做批次傳送）
+        """
+        async with self.redis.pipeline(transaction=transaction) as pipe:
+            yield pipe
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        取得連線池與指令統計
+        
+        Returns:
+            連線池大小、進行中指令數（TrackedRedis 統計）與累計指令數
+        """
+        if self.pool is None:
+            return {"mode": "mock"}
+        
+        stats: Optional[CommandStats] = getattr(self.redis, "stats", None)
+        return {
+            "mode": "redis",
+            "pool_max_connections": self.pool.max_connections,
+            "in_flight_commands": stats.in_flight if stats else 0,
+            "commands_total": stats.commands_total if stats else 0,
+            "pipelines_total": stats.pipelines_total if stats else 0
+        }
+    
+    async def hget_json(self, key: str, field: str) -> Any:
+        """取得 Hash 單一欄位（JSON 值）"""
+        try:
+            value = await self.redis.hget(key, field)
+            return decode_value(value) if value is not None else None
+        except Exception as e:
+            logger.error("Redis HGET JSON 錯誤", key=key, field=field, error=str(e))
+            return None
+    
+    async def hgetall_json(self, key: str) -> Optional[Dict[str, Any]]:
+        """取得 Hash 所有欄位（各欄位值為 JSON）"""
+        try:
+            fields = await self.redis.hgetall(key)
+            if not fields:
+                return None
+            return {field: decode_value(value) for field, value in fields.items()}
+        except Exception as e:
+            logger.error("Redis HGETALL JSON 錯誤", key=key, error=str(e))
+            return None
+    
+    async def lrange_json(self, key: str, start: int = 0, end: int = -1) -> List[Any]:
+        """取得 List 範圍內的元素（各元素為 JSON）"""
+        try:
+            values = await self.redis.lrange(key, start, end)
+            return [decode_value(value) for value in values]
+        except Exception as e:
+            logger.error("Redis LRANGE JSON 錯誤", key=key, error=str(e))
+            return []
+    
+    async def hset_json(
+        self,
+        key: str,
+        mapping: Dict[str, Any],
+        ex: Optional[int] = None,
+        replace: bool = False,
+        only_if_exists: bool = False
+    ) -> bool:
+        """
+        以 JSON 編碼寫入 Hash 欄位，並在同一次往返中重設 TTL
+        
+        Args:
+            key: Redis 鍵
+            mapping: 欄位與值
+            ex: 過期秒數
+            replace: 是否先刪除整個 Hash 再寫入（整筆覆寫）
+            only_if_exists: 鍵不存在時不寫入（避免替已過期的資料建立殘缺 Hash）
+            
+        Returns:
+            是否寫入成功
+        """
+        try:
+            encoded = {
+                field: self.codecs.encode(key, value)
+                for field, value in mapping.items()
+            }
+            
+            if only_if_exists:
+                # 存在檢查與寫入需在同一個腳本內，避免期間鍵被其他寫入者重建或刪除
+                args: List[Any] = [ex or 0, "1" if replace else "0"]
+                for field, value in encoded.items():
+                    args.extend([field, value])
+                return await self.run_script(HSET_IF_EXISTS_SCRIPT, keys=[key], args=args) == 1
+            
+            pipe = self.redis.pipeline(transaction=True)
+            if replace:
+                pipe.delete(key)
+            pipe.hset(key, mapping=encoded)
+            if ex:
+                pipe.expire(key, ex)
+            await pipe.execute()
+            
+            return True
+        except Exception as e:
+            logger.error("Redis HSET JSON 錯誤", key=key, error=str(e))
+            return False
+    
+    async def run_script(self, script: str, keys: List[str], args: List[Any]) -> Any:
+        """
+        執行 Lua 腳本（首次使用時註冊，之後以 EVALSHA 執行）
+        
+        Args:
+            script: Lua 腳本內容
+            keys: KEYS 參數
+            args: ARGV 參數
+            
+        Returns:
+            腳本回傳值，Redis 錯誤時返回 None
+        """
+        try:
+            if script not in self._scripts:
+                self._scripts[script] = self.redis.register_script(script)
+            return await self._scripts[script](keys=keys, args=args)
+        except RedisError as e:
+            logger.error("Redis 腳本執行錯誤", keys=keys, error=str(e))
+            return None
+    
+    async def compare_and_set_json(
+        self,
+        key: str,
+        mutate: Callable[[Optional[Dict]], Dict],
+        ex: Optional[int] = None,
+        max_retries: int = 3
+    ) -> Optional[Dict]:
+        """
+        以 WATCH/MULTI 對 JSON 值做 compare-and-set
+        
+        讀取目前的值交給 mutate 產生新值後寫回；若期間有其他寫入（WatchError）
+        則重新讀取並再次呼叫 mutate。mutate 拋出的例外會直接往外傳遞。
+        
+        Args:
+            key: Redis 鍵
+            mutate: 接收目前值（不存在時為 None）並回傳新值的函式
+            ex: 過期秒數
+            max_retries: 衝突時的最大重試次數
+            
+        Returns:
+            寫入的新值；Redis 錯誤或重試次數用盡時返回 None
+        """
+        for attempt in range(max_retries):
+            try:
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    new_value = mutate(decode_value(raw) if raw else None)
+                    
+                    pipe.multi()
+                    pipe.set(key, self.codecs.encode(key, new_value), ex=ex)
+                    await pipe.execute()
+                    return new_value
+            except WatchError:
+                logger.warning("Redis CAS 衝突，重試", key=key, attempt=attempt + 1)
+            except RedisError as e:
+                logger.error("Redis CAS 錯誤", key=key, error=str(e))
+                return None
+        
+        logger.error("Redis CAS 重試次數用盡", key=key, max_retries=max_retries)
+        return None
+    
     async def close(self):
-        """關閉 Redis 連線"""
-        if self.redis and hasattr(self.redis, 'close'):
-            await self.redis.close()
+        """關閉 Redis 連線與連線池"""
+        if self.redis and hasattr(self.redis, 'aclose'):
+            await self.redis.aclose()
+        if self.pool:
+            await self.pool.disconnect()
+            self.pool = None
             logger.info("✅ Redis 連線已關閉")
 
 class MockRedis:
@@ -136,6 +512,8 @@ class MockRedis:
     def __init__(self):
         self.data = {}
         self.sets = {}
+        self.hashes = {}
+        self.lists = {}
     
     async def ping(self):
         """模擬 ping"""
@@ -149,20 +527,36 @@ class MockRedis:
     async def set(self, key: str, value: str, ex: Optional[int] = None) -> bool:
         """模擬 SET"""
         logger.debug("🔧 模擬 Redis SET", key=key, ex=ex)
+        self.hashes.pop(key, None)
         self.data[key] = value
         return True
     
-    async def delete(self, key: str) -> int:
+    async def delete(self, *keys: str) -> int:
         """模擬 DELETE"""
-        logger.debug("🔧 模擬 Redis DELETE", key=key)
-        if key in self.data:
-            del self.data[key]
-            return 1
-        return 0
+        logger.debug("🔧 模擬 Redis DELETE", keys=keys)
+        count = 0
+        for key in keys:
+            for store in (self.data, self.sets, self.hashes, self.lists):
+                if key in store:
+                    del store[key]
+                    count += 1
+        return count
     
-    async def exists(self, key: str) -> bool:
+    async def scan_iter(self, match: Optional[str] = None, count: Optional[int] = None):
+        """模擬 SCAN"""
+        for store in (self.data, self.sets, self.hashes, self.lists):
+            for key in list(store):
+                if match is None or fnmatch.fnmatchcase(key, match):
+                    yield key
+    
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """模擬 MGET"""
+        logger.debug("🔧 模擬 Redis MGET", keys_count=len(keys))
+        return [self.data.get(key) for key in keys]
+    
+    async def exists(self, key: str) -> int:
         """模擬 EXISTS"""
-        return key in self.data
+        return int(any(key in store for store in (self.data, self.sets, self.hashes, self.lists)))
     
     async def expire(self, key: str, seconds: int) -> bool:
         """模擬 EXPIRE"""
@@ -193,4 +587,158 @@ class MockRedis:
     
     async def smembers(self, key: str) -> set:
         """模擬 SMEMBERS"""
-        return self.sets.get(key, set())
\ No newline at end of file
+        return self.sets.get(key, set())
+    
+    async def hset(self, key: str, field: Optional[str] = None, value: Optional[str] = None,
+                   mapping: Optional[Dict[str, str]] = None) -> int:
+        """模擬 HSET"""
+        self.data.pop(key, None)
+        fields = dict(mapping or {})
+        if field is not None:
+            fields[field] = value
+        target = self.hashes.setdefault(key, {})
+        count = sum(1 for f in fields if f not in target)
+        target.update(fields)
+        return count
+    
+    async def hget(self, key: str, field: str) -> Optional[str]:
+        """模擬 HGET"""
+        return self.hashes.get(key, {}).get(field)
+    
+    async def hgetall(self, key: str) -> Dict[str, str]:
+        """模擬 HGETALL"""
+        return dict(self.hashes.get(key, {}))
+    
+    async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        """模擬 HINCRBY"""
+        target = self.hashes.setdefault(key, {})
+        target[field] = str(int(target.get(field, 0)) + amount)
+        return int(target[field])
+    
+    async def hincrbyfloat(self, key: str, field: str, amount: float = 1.0) -> float:
+        """模擬 HINCRBYFLOAT"""
+        target = self.hashes.setdefault(key, {})
+        target[field] = repr(float(target.get(field, 0)) + amount)
+        return float(target[field])
+    
+    async def hdel(self, key: str, *fields: str) -> int:
+        """模擬 HDEL"""
+        target = self.hashes.get(key, {})
+        count = 0
+        for field in fields:
+            if field in target:
+                del target[field]
+                count += 1
+        if key in self.hashes and not target:
+            del self.hashes[key]
+        return count
+
+    async def rpush(self, key: str, *values: str) -> int:
+        """模擬 RPUSH"""
+        target = self.lists.setdefault(key, [])
+        target.extend(values)
+        return len(target)
+
+    async def lrange(self, key: str, start: int, end: int) -> List[str]:
+        """模擬 LRANGE（end 為包含的索引）"""
+        target = self.lists.get(key, [])
+        length = len(target)
+        start = max(start + length if start < 0 else start, 0)
+        end = end + length if end < 0 else end
+        return target[start:end + 1]
+
+    async def ltrim(self, key: str, start: int, end: int) -> bool:
+        """模擬 LTRIM"""
+        if key in self.lists:
+            self.lists[key] = await self.lrange(key, start, end)
+            if not self.lists[key]:
+                del self.lists[key]
+        return True
+
+    async def llen(self, key: str) -> int:
+        """模擬 LLEN"""
+        return len(self.lists.get(key, []))
+
+    def pipeline(self, transaction: bool = True) -> "MockPipeline":
+        """模擬 PIPELINE"""
+        return MockPipeline(self)
+    
+    # Lua 腳本 -> Python 對應實作，由使用腳本的模組透過 mock_script 註冊
+    script_handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+    
+    def register_script(self, script: str) -> Callable[..., Awaitable[Any]]:
+        """模擬 SCRIPT LOAD：以註冊的 Python 實作取代 Lua 腳本"""
+        handler = self.script_handlers.get(script)
+        if handler is None:
+            raise NotImplementedError("MockRedis 沒有此 Lua 腳本的對應實作")
+        
+        async def run(keys: List[str], args: List[Any]) -> Any:
+            return await handler(self, keys, args)
+        
+        return run
+
+
+def mock_script(script: str):
+    """裝飾器：註冊 Lua 腳本在 MockRedis 上的 Python 對應實作（開發用）"""
+    def decorator(handler: Callable[..., Awaitable[Any]]):
+        MockRedis.script_handlers[script] = handler
+        return handler
+    return decorator
+
+
+@mock_script(HSET_IF_EXISTS_SCRIPT)
+async def _mock_hset_if_exists_script(redis: MockRedis, keys: List[str], args: List[Any]) -> int:
+    """HSET_IF_EXISTS_SCRIPT 在 MockRedis 上的對應實作"""
+    if not await redis.exists(keys[0]):
+        return 0
+    if args[1] == "1":
+        await redis.delete(keys[0])
+    pairs = args[2:]
+    await redis.hset(keys[0], mapping=dict(zip(pairs[::2], pairs[1::2])))
+    if int(args[0]) > 0:
+        await redis.expire(keys[0], int(args[0]))
+    return 1
+
+
+class MockPipeline:
+    """模擬 Redis Pipeline：先記錄指令，execute 時依序執行
+    
+    watch() 之後到 multi() 之前的指令會立即執行（與 redis-py 相同）
+    """
+    
+    def __init__(self, redis: MockRedis):
+        self._redis = redis
+        self._commands: List[tuple] = []
+        self._immediate = False
+    
+    def __getattr__(self, name: str):
+        method = getattr(self._redis, name)
+        
+        def command(*args, **kwargs):
+            if self._immediate:
+                return method(*args, **kwargs)
+            self._commands.append((method, args, kwargs))
+            return self
+        
+        return command
+    
+    async def watch(self, *keys: str) -> bool:
+        """模擬 WATCH（單執行緒下不會發生衝突）"""
+        self._immediate = True
+        return True
+    
+    def multi(self):
+        """模擬 MULTI"""
+        self._immediate = False
+    
+    async def execute(self) -> List[Any]:
+        """依序執行所有指令"""
+        commands, self._commands = self._commands, []
+        return [await method(*args, **kwargs) for method, args, kwargs in commands]
+    
+    async def __aenter__(self) -> "MockPipeline":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        self._commands = []
+        self._immediate = False
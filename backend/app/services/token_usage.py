@@ -0,0 +1,188 @@
+"""
+AI Token 使用量 - 估算與累計
+
+- estimate_tokens / estimate_messages_tokens: 串流回應沒有 usage 時的備援估算，
+  有安裝 tiktoken 時使用對應的 tokenizer，否則以字元數估算（中日韓文字約每字 1 token）
+- TokenUsageTracker: 以 Redis Hash 累計每個 Session 與每位門市人員（每日）的 Token 使用量
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import json
+import math
+import re
+
+import structlog
+
+from .redis_manager import RedisManager
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+    tiktoken = None
+
+logger = structlog.get_logger()
+
+# 中日韓文字（含全形標點）
+_CJK_PATTERN = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+# 每則訊息的格式額外 Token 數（與 OpenAI 文件的計算方式相同）
+TOKENS_PER_MESSAGE = 3
+TOKENS_REPLY_PRIMING = 3
+
+_encoding = None
+
+
+def _get_encoding():
+    """取得 tokenizer（gpt-4o 系列使用 o200k_base）"""
+    global _encoding
+    if _encoding is None and TIKTOKEN_AVAILABLE:
+        try:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    估算文字的 Token 數
+
+    Args:
+        text: 文字
+
+    Returns:
+        Token 數
+    """
+    if not text:
+        return 0
+
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + math.ceil((len(text) - cjk_count) / 4)
+
+
+def estimate_messages_tokens(
+    messages: List[Dict[str, Any]],
+    tools: Optional[List[Dict[str, Any]]] = None
+) -> int:
+    """
+    估算一次 Chat Completions 請求的 Prompt Token 數
+
+    Args:
+        messages: 對話訊息
+        tools: Function 定義
+
+    Returns:
+        Token 數
+    """
+    total = TOKENS_REPLY_PRIMING
+
+    for message in messages:
+        total += TOKENS_PER_MESSAGE
+        total += estimate_tokens(message.get("content"))
+        total += estimate_tokens(message.get("name"))
+        for tool_call in message.get("tool_calls") or []:
+            function = tool_call.get("function", {})
+            total += estimate_tokens(function.get("name"))
+            total += estimate_tokens(function.get("arguments"))
+
+    if tools:
+        total += estimate_tokens(json.dumps(tools, ensure_ascii=False))
+
+    return total
+
+
+class TokenUsageTracker:
+    """Token 使用量累計（Redis Hash：prompt/completion/total/requests 與 cost）"""
+
+    # Session 計數保留 1 天，門市人員每日計數保留 35 天
+    SESSION_TTL = 86400
+    STAFF_DAILY_TTL = 35 * 86400
+
+    def __init__(self, redis_manager: RedisManager):
+        """
+        初始化
+
+        Args:
+            redis_manager: Redis 管理器
+        """
+        self.redis = redis_manager
+
+    @staticmethod
+    def _session_key(session_id: str) -> str:
+        """取得 Session 計數的 Redis 鍵"""
+        return f"ai_usage:session:{session_id}"
+
+    @staticmethod
+    def _staff_key(staff_id: str, date: Optional[str] = None) -> str:
+        """取得門市人員每日計數的 Redis 鍵（date 格式 YYYYMMDD，預設今天）"""
+        return f"ai_usage:staff:{staff_id}:{date or datetime.now().strftime('%Y%m%d')}"
+
+    async def record(
+        self,
+        session_id: str,
+        staff_id: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cost: float
+    ) -> bool:
+        """
+        累計一次 AI 呼叫的使用量（單一 Pipeline 往返）
+
+        Args:
+            session_id: 續約 Session ID
+            staff_id: 門市人員 ID
+            prompt_tokens: Prompt Token 數
+            completion_tokens: Completion Token 數
+            cost: 成本（美元）
+
+        Returns:
+            是否寫入成功
+        """
+        targets = [
+            (self._session_key(session_id), self.SESSION_TTL),
+            (self._staff_key(staff_id), self.STAFF_DAILY_TTL)
+        ]
+
+        try:
+            async with self.redis.pipeline() as pipe:
+                for key, ttl in targets:
+                    pipe.hincrby(key, "prompt_tokens", prompt_tokens)
+                    pipe.hincrby(key, "completion_tokens", completion_tokens)
+                    pipe.hincrby(key, "total_tokens", prompt_tokens + completion_tokens)
+                    pipe.hincrby(key, "requests", 1)
+                    pipe.hincrbyfloat(key, "cost", cost)
+                    pipe.expire(key, ttl)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error("累計 Token 使用量失敗", session_id=session_id, staff_id=staff_id, error=str(e))
+            return False
+
+    async def _get(self, key: str) -> Dict[str, Any]:
+        """讀取計數"""
+        try:
+            fields = await self.redis.redis.hgetall(key)
+        except Exception as e:
+            logger.error("讀取 Token 使用量失敗", key=key, error=str(e))
+            fields = {}
+
+        usage = {
+            name: int(fields.get(name, 0))
+            for name in ("prompt_tokens", "completion_tokens", "total_tokens", "requests")
+        }
+        usage["cost"] = round(float(fields.get("cost", 0)), 6)
+        return usage
+
+    async def get_session_usage(self, session_id: str) -> Dict[str, Any]:
+        """取得 Session 的累計使用量"""
+        return await self._get(self._session_key(session_id))
+
+    async def get_staff_usage(self, staff_id: str, date: Optional[str] = None) -> Dict[str, Any]:
+        """取得門市人員某日（預設今天）的累計使用量"""
+        return await self._get(self._staff_key(staff_id, date))
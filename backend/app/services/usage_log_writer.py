@@ -0,0 +1,346 @@
+"""
+AI 使用記錄寫入器 - 背景批次寫入 ai_usage_logs
+
+對話結束時只把記錄放入記憶體佇列（不等待資料庫），由背景工作：
+- 累積到 batch_size 筆或等待 flush_interval 秒後，以 executemany 一次寫入
+- 資料庫無法寫入時，將該批記錄附加到本地 JSON Lines 檔案（spill），
+  之後寫入成功時再補寫回資料庫
+- 佇列已滿時，新的記錄直接寫入 spill 檔案，不阻塞對話
+- 資料庫拒絕的個別資料列（batch errors）寫入 rejected 檔案，不自動補寫，待人工處理
+- 檔案讀寫在執行緒中進行，不阻塞事件迴圈
+
+設定（環境變數）：
+- AI_USAGE_LOG_BATCH_SIZE: 每批最多筆數（預設 50）
+- AI_USAGE_LOG_FLUSH_INTERVAL: 批次最長等待秒數（預設 2）
+- AI_USAGE_LOG_QUEUE_SIZE: 佇列上限（預設 1000）
+- AI_USAGE_LOG_SPILL_PATH: spill 檔案路徑（預設 logs/ai_usage_spill.jsonl）
+"""
+import asyncio
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+import structlog
+
+from .database import DatabaseManager
+
+logger = structlog.get_logger()
+
+INSERT_AI_USAGE_SQL = """
+    INSERT INTO ai_usage_logs (
+        staff_id, session_id, usage_type,
+        prompt_text, response_text,
+        prompt_tokens, completion_tokens, total_tokens,
+        cost_amount, created_at
+    )
+    VALUES (
+        :staff_id, :session_id, :usage_type,
+        :prompt_text, :response_text,
+        :prompt_tokens, :completion_tokens, :total_tokens,
+        :cost_amount, :created_at
+    )
+"""
+
+# CLOB 欄位寫入的最大字元數
+MAX_TEXT_LENGTH = 4000
+
+
+class UsageLogWriter:
+    """ai_usage_logs 背景批次寫入器"""
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        queue_size: Optional[int] = None,
+        spill_path: Optional[str] = None
+    ):
+        """
+        初始化
+
+        Args:
+            db_manager: 資料庫管理器
+            batch_size: 每批最多筆數
+            flush_interval: 批次最長等待秒數
+            queue_size: 佇列上限
+            spill_path: 資料庫無法寫入時的暫存檔案路徑
+        """
+        self.db_manager = db_manager
+        self.batch_size = batch_size or int(os.getenv("AI_USAGE_LOG_BATCH_SIZE", "50"))
+        self.flush_interval = flush_interval or float(os.getenv("AI_USAGE_LOG_FLUSH_INTERVAL", "2"))
+        self.spill_path = Path(spill_path or os.getenv("AI_USAGE_LOG_SPILL_PATH", "logs/ai_usage_spill.jsonl"))
+        # 補寫中的檔案；程序在補寫途中結束時會留下，下次補寫先處理
+        self.replay_path = self.spill_path.with_suffix(self.spill_path.suffix + ".replay")
+        self.rejected_path = self.spill_path.with_suffix(self.spill_path.suffix + ".rejected")
+
+        self.queue: asyncio.Queue = asyncio.Queue(
+            maxsize=queue_size or int(os.getenv("AI_USAGE_LOG_QUEUE_SIZE", "1000"))
+        )
+        self._worker: Optional[asyncio.Task] = None
+        self._closing = False
+        # 檔案操作依序進行，避免同時附加或在改名時寫入
+        self._file_lock = asyncio.Lock()
+        # submit() 無法等待，佇列已滿時的 spill 以背景工作進行
+        self._spill_tasks: Set[asyncio.Task] = set()
+
+        self.written = 0
+        self.spilled = 0
+        self.rejected = 0
+        self.failed_batches = 0
+
+    def start(self):
+        """啟動背景寫入工作"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+            logger.info(
+                "AI 使用記錄寫入器已啟動",
+                batch_size=self.batch_size,
+                flush_interval=self.flush_interval
+            )
+
+    async def close(self, timeout: float = 10):
+        """
+        寫入佇列中剩餘的記錄並停止背景工作
+
+        Args:
+            timeout: 等待剩餘記錄寫入的秒數，逾時後未寫入的記錄存入 spill 檔案
+        """
+        if self._worker is None:
+            return
+
+        # None 為結束標記，之前的記錄都會先被寫入；佇列已滿時不等待空位，
+        # 背景工作在 _closing 後清空佇列即結束
+        self._closing = True
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+        try:
+            await asyncio.wait_for(self._worker, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("AI 使用記錄寫入逾時，剩餘記錄存入暫存檔", remaining=self.queue.qsize())
+
+        # 逾時或結束標記之後才加入的記錄
+        await self._spill([record for record in self._drain() if record is not None])
+        if self._spill_tasks:
+            await asyncio.gather(*self._spill_tasks, return_exceptions=True)
+        self._worker = None
+        self._closing = False
+        logger.info("AI 使用記錄寫入器已關閉", written=self.written, spilled=self.spilled)
+
+    def submit(
+        self,
+        staff_id: str,
+        session_id: str,
+        usage_type: str,
+        prompt_text: Optional[str],
+        response_text: Optional[str],
+        prompt_tokens: int,
+        completion_tokens: int,
+        total_tokens: int,
+        cost_amount: float
+    ) -> bool:
+        """
+        加入一筆使用記錄（不等待資料庫）
+
+        Returns:
+            是否放入佇列（佇列已滿時改寫入 spill 檔案並返回 False）
+        """
+        record = {
+            "staff_id": staff_id,
+            "session_id": session_id,
+            "usage_type": usage_type,
+            "prompt_text": prompt_text[:MAX_TEXT_LENGTH] if prompt_text else None,
+            "response_text": response_text[:MAX_TEXT_LENGTH] if response_text else None,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": total_tokens,
+            "cost_amount": cost_amount,
+            # 批次寫入會延後，建立時間在此記錄而非使用 SYSDATE
+            "created_at": datetime.now()
+        }
+
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            logger.warning("AI 使用記錄佇列已滿，改寫入暫存檔", session_id=session_id)
+            task = asyncio.ensure_future(self._spill([record]))
+            self._spill_tasks.add(task)
+            task.add_done_callback(self._spill_tasks.discard)
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得寫入統計"""
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "spilled": self.spilled,
+            "rejected": self.rejected,
+            "failed_batches": self.failed_batches,
+            "spill_pending": self.spill_path.exists() or self.replay_path.exists()
+        }
+
+    async def _run(self):
+        """背景工作：依筆數或時間觸發批次寫入"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            if self._closing and self.queue.empty():
+                return
+            record = await self.queue.get()
+            if record is None:
+                return
+
+            batch = [record]
+            deadline = loop.time() + self.flush_interval
+            stop = False
+
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+
+            await self._write_batch(batch)
+            if stop:
+                return
+
+    def _drain(self) -> List[Optional[Dict[str, Any]]]:
+        """取出佇列中所有記錄"""
+        records = []
+        while not self.queue.empty():
+            records.append(self.queue.get_nowait())
+        return records
+
+    async def _write_batch(self, batch: List[Dict[str, Any]]):
+        """批次寫入，失敗時存入 spill 檔案；成功時補寫先前暫存的記錄"""
+        rejected: List[Dict[str, Any]] = []
+        try:
+            await self.db_manager.execute_many(
+                INSERT_AI_USAGE_SQL, batch, batch_errors=True, rejected=rejected
+            )
+        except Exception as e:
+            self.failed_batches += 1
+            logger.error("批次寫入 AI 使用記錄失敗，存入暫存檔", count=len(batch), error=str(e))
+            await self._spill(batch)
+            return
+
+        self.written += len(batch) - len(rejected)
+        await self._reject(rejected)
+        logger.info("AI 使用記錄已批次寫入資料庫", count=len(batch) - len(rejected))
+
+        if self.spill_path.exists() or self.replay_path.exists():
+            await self._replay_spill()
+
+    async def _spill(self, records: List[Dict[str, Any]]):
+        """將新的記錄附加到 spill 檔案"""
+        if not records:
+            return
+
+        try:
+            async with self._file_lock:
+                await asyncio.to_thread(_append_records, self.spill_path, records)
+            self.spilled += len(records)
+        except OSError as e:
+            logger.error("寫入 AI 使用記錄暫存檔失敗，記錄遺失", count=len(records), error=str(e))
+
+    async def _reject(self, records: List[Dict[str, Any]]):
+        """將資料庫拒絕的資料列附加到 rejected 檔案（重試也會失敗，不自動補寫）"""
+        if not records:
+            return
+
+        try:
+            async with self._file_lock:
+                await asyncio.to_thread(_append_records, self.rejected_path, records)
+            self.rejected += len(records)
+            logger.warning("AI 使用記錄被資料庫拒絕，已存入檔案", count=len(records), path=str(self.rejected_path))
+        except OSError as e:
+            logger.error("寫入 AI 使用記錄拒絕檔失敗，記錄遺失", count=len(records), error=str(e))
+
+    async def _replay_spill(self):
+        """將 spill 檔案中的記錄補寫回資料庫（先處理上次補寫中斷留下的檔案）"""
+        if self.replay_path.exists() and not await self._replay_file():
+            return
+        if self.spill_path.exists():
+            await self._replay_file()
+
+    async def _replay_file(self) -> bool:
+        """
+        補寫 replay 檔案（不存在時先將 spill 檔案改名，補寫期間新的 spill 記錄會寫到新檔案）
+
+        Returns:
+            是否全部補寫成功
+        """
+        try:
+            async with self._file_lock:
+                records = await asyncio.to_thread(_take_records, self.spill_path, self.replay_path)
+        except (OSError, ValueError) as e:
+            logger.error("讀取 AI 使用記錄暫存檔失敗", error=str(e))
+            return False
+
+        replayed = 0
+        for start in range(0, len(records), self.batch_size):
+            chunk = records[start:start + self.batch_size]
+            rejected: List[Dict[str, Any]] = []
+            try:
+                await self.db_manager.execute_many(
+                    INSERT_AI_USAGE_SQL, chunk, batch_errors=True, rejected=rejected
+                )
+            except Exception as e:
+                logger.error("補寫 AI 使用記錄失敗，保留於暫存檔", error=str(e))
+                break
+            await self._reject(rejected)
+            replayed += len(chunk)
+            self.written += len(chunk) - len(rejected)
+
+        remaining = records[replayed:]
+        try:
+            async with self._file_lock:
+                # 未補寫的記錄放回 spill 檔案（已計入 spilled，不重複計算）
+                await asyncio.to_thread(_append_records, self.spill_path, remaining)
+                await asyncio.to_thread(self.replay_path.unlink, True)
+        except OSError as e:
+            logger.error("更新 AI 使用記錄暫存檔失敗", error=str(e))
+            return False
+
+        logger.info("AI 使用記錄暫存檔已補寫", count=replayed, remaining=len(remaining))
+        return not remaining
+
+
+def _append_records(path: Path, records: List[Dict[str, Any]]):
+    """將記錄附加到 JSON Lines 檔案（在執行緒中執行）"""
+    if not records:
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(
+                {**record, "created_at": record["created_at"].isoformat()},
+                ensure_ascii=False
+            ) + "\n")
+
+
+def _take_records(spill_path: Path, replay_path: Path) -> List[Dict[str, Any]]:
+    """讀取待補寫的記錄（在執行緒中執行）；replay 檔案已存在時沿用，不覆蓋"""
+    if not replay_path.exists():
+        spill_path.replace(replay_path)
+
+    with replay_path.open(encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    for record in records:
+        record["created_at"] = datetime.fromisoformat(record["created_at"])
+    return records
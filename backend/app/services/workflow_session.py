@@ -1,18 +1,197 @@
 """
 續約工作流程 Session 管理器
 管理 Redis 中的續約流程狀態
+
+儲存模式（環境變數 WORKFLOW_SESSION_STORAGE）：
+- json (預設): 整個 Session 以單一 JSON 字串儲存
+- hash: 每個頂層欄位（以及 customer_selection 的子欄位）各自為一個 Hash 欄位，
+        更新時只寫入有變動的欄位
+
+AI 對話紀錄不放在 Session 內，而是各自存放於：
+- renewal_chat:{session_id}: 最近的對話訊息 List（RPUSH + LTRIM，保留 CHAT_HISTORY_WINDOW 筆）
+- renewal_chat_summary:{session_id}: 較早對話的摘要（選用）
+因此一般步驟讀取 Session 的大小不會隨對話增長。
 """
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Sequence
 from datetime import datetime
+import json
+import os
 import secrets
 import structlog
 from enum import Enum
 
-from .redis_manager import RedisManager
+from .redis_manager import RedisManager, MockRedis, mock_script
 
 logger = structlog.get_logger()
 
 
+# hash 模式的狀態轉換：檢查目前步驟、寫入新步驟並重置 TTL，於 Redis 端一次完成
+# KEYS[1]: Session 鍵
+# ARGV[1]: 新步驟 (JSON)  ARGV[2]: updated_at (JSON)  ARGV[3]: TTL
+# ARGV[4...]: 允許的目前步驟 (JSON)
+# 回傳: {狀態 ok/missing/rejected, 原步驟}
+# current_step 遠小於壓縮門檻，一律以 JSON 文字儲存，腳本可直接比對
+TRANSITION_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'current_step')
+if not current then
+    return {'missing', ''}
+end
+for i = 4, #ARGV do
+    if ARGV[i] == current then
+        redis.call('HSET', KEYS[1], 'current_step', ARGV[1], 'updated_at', ARGV[2])
+        redis.call('EXPIRE', KEYS[1], ARGV[3])
+        return {'ok', current}
+    end
+end
+return {'rejected', current}
+"""
+
+
+# hash 模式的欄位寫回：確認 Session 仍存在（且目前步驟未被其他請求改變）後，
+# 寫入欄位並重置 TTL；指定前綴時，先移除該前綴下不在本次寫入中的舊子欄位（整個取代）
+# KEYS[1]: Session 鍵
+# ARGV[1]: TTL  ARGV[2]: 預期的目前步驟 (JSON)，空字串表示不檢查
+# ARGV[3]: 要整個取代的子欄位前綴，空字串表示不取代
+# ARGV[4...]: 欄位、值 (JSON) 交錯排列
+# 回傳: {狀態 ok/missing/rejected, 原步驟}
+FLUSH_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'current_step')
+if not current then
+    return {'missing', ''}
+end
+if ARGV[2] ~= '' and ARGV[2] ~= current then
+    return {'rejected', current}
+end
+local prefix = ARGV[3]
+if prefix ~= '' then
+    local written = {}
+    for i = 4, #ARGV, 2 do
+        written[ARGV[i]] = true
+    end
+    for _, field in ipairs(redis.call('HKEYS', KEYS[1])) do
+        if string.sub(field, 1, #prefix) == prefix and not written[field] then
+            redis.call('HDEL', KEYS[1], field)
+        end
+    end
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 4))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return {'ok', current}
+"""
+
+
+# 新增對話訊息：Session 存在時 RPUSH 並 LTRIM 到保留筆數，同時重置 Session 與對話相關鍵的 TTL
+# KEYS[1]: Session 鍵  KEYS[2]: 對話紀錄鍵  KEYS[3]: 對話摘要鍵
+# ARGV[1]: 訊息 (JSON)  ARGV[2]: 保留筆數  ARGV[3]: TTL
+# 回傳: 對話紀錄筆數，Session 不存在時為 -1
+CHAT_APPEND_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+local length = redis.call('RPUSH', KEYS[2], ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('LTRIM', KEYS[2], -window, -1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+return math.min(length, window)
+"""
+
+
+# 寫入對話摘要並移除已摘要的舊訊息；只修剪到產生摘要時讀取的最後一筆已摘要訊息，
+# 期間新增的訊息不受影響
+# KEYS[1]: 對話紀錄鍵  KEYS[2]: 對話摘要鍵
+# ARGV[1]: 摘要  ARGV[2]: TTL  ARGV[3]: 已摘要的訊息筆數（從最舊算起，0 表示不修剪）
+# ARGV[4]: 最後一筆已摘要的訊息（與 List 中儲存的值相同）
+# 回傳: 實際移除的筆數
+# 新增訊息時可能已從前端移除舊訊息，因此在前 ARGV[3] 筆中由後往前尋找該訊息；
+# 找不到（已被移除或已被其他摘要修剪）時只寫入摘要不修剪
+CHAT_SUMMARY_SCRIPT = """
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[2])
+local count = tonumber(ARGV[3])
+if count <= 0 then
+    return 0
+end
+local messages = redis.call('LRANGE', KEYS[1], 0, count - 1)
+for i = #messages, 1, -1 do
+    if messages[i] == ARGV[4] then
+        redis.call('LTRIM', KEYS[1], i, -1)
+        return i
+    end
+end
+return 0
+"""
+
+
+class _TransitionAborted(Exception):
+    """json 模式 compare-and-set 中止（Session 不存在或目前步驟不允許轉換）"""
+    
+    def __init__(self, status: str, current_step: Optional[str]):
+        self.status = status
+        self.current_step = current_step
+        super().__init__(status)
+
+
+@mock_script(TRANSITION_SCRIPT)
+async def _mock_transition_script(redis: MockRedis, keys: List[str], args: List[Any]) -> List[str]:
+    """TRANSITION_SCRIPT 在 MockRedis 上的對應實作"""
+    current = await redis.hget(keys[0], "current_step")
+    if current is None:
+        return ["missing", ""]
+    if current not in args[3:]:
+        return ["rejected", current]
+    await redis.hset(keys[0], mapping={"current_step": args[0], "updated_at": args[1]})
+    await redis.expire(keys[0], int(args[2]))
+    return ["ok", current]
+
+
+@mock_script(CHAT_SUMMARY_SCRIPT)
+async def _mock_chat_summary_script(redis: MockRedis, keys: List[str], args: List[Any]) -> int:
+    """CHAT_SUMMARY_SCRIPT 在 MockRedis 上的對應實作"""
+    await redis.set(keys[1], args[0], ex=int(args[1]))
+    count = int(args[2])
+    if count <= 0:
+        return 0
+    messages = await redis.lrange(keys[0], 0, count - 1)
+    for i in range(len(messages), 0, -1):
+        if messages[i - 1] == args[3]:
+            await redis.ltrim(keys[0], i, -1)
+            return i
+    return 0
+
+
+@mock_script(FLUSH_SCRIPT)
+async def _mock_flush_script(redis: MockRedis, keys: List[str], args: List[Any]) -> List[str]:
+    """FLUSH_SCRIPT 在 MockRedis 上的對應實作"""
+    current = await redis.hget(keys[0], "current_step")
+    if current is None:
+        return ["missing", ""]
+    if args[1] != "" and args[1] != current:
+        return ["rejected", current]
+    pairs = args[3:]
+    fields = dict(zip(pairs[::2], pairs[1::2]))
+    if args[2]:
+        stale = [
+            field for field in await redis.hgetall(keys[0])
+            if field.startswith(args[2]) and field not in fields
+        ]
+        await redis.hdel(keys[0], *stale)
+    await redis.hset(keys[0], mapping=fields)
+    await redis.expire(keys[0], int(args[0]))
+    return ["ok", current]
+
+
+@mock_script(CHAT_APPEND_SCRIPT)
+async def _mock_chat_append_script(redis: MockRedis, keys: List[str], args: List[Any]) -> int:
+    """CHAT_APPEND_SCRIPT 在 MockRedis 上的對應實作"""
+    if not await redis.exists(keys[0]):
+        return -1
+    length = await redis.rpush(keys[1], args[0])
+    window = int(args[1])
+    await redis.ltrim(keys[1], -window, -1)
+    return min(length, window)
+
+
 class WorkflowStep(str, Enum):
     """工作流程步驟"""
     INIT = "init"
@@ -32,6 +211,12 @@ class WorkflowStep(str, Enum):
 class WorkflowSessionManager:
     """續約工作流程 Session 管理器"""
     
+    # Session TTL（秒）
+    SESSION_TTL = 3600
+    
+    # hash 模式下 customer_selection 子欄位的欄位名稱前綴
+    SELECTION_FIELD_PREFIX = "customer_selection."
+    
     # 狀態轉換規則
     TRANSITIONS = {
         WorkflowStep.INIT: [WorkflowStep.QUERY_CUSTOMER],
@@ -47,9 +232,154 @@ class WorkflowSessionManager:
         WorkflowStep.CONFIRM: [WorkflowStep.COMPLETED]
     }
     
-    def __init__(self, redis_manager: RedisManager):
-        """初始化"""
+    def __init__(
+        self,
+        redis_manager: RedisManager,
+        storage_mode: Optional[str] = None,
+        chat_history_window: Optional[int] = None
+    ):
+        """
+        初始化
+        
+        Args:
+            redis_manager: Redis 管理器
+            storage_mode: 儲存模式 json/hash，預設從環境變數 WORKFLOW_SESSION_STORAGE 讀取
+            chat_history_window: 對話紀錄保留筆數，預設從環境變數 CHAT_HISTORY_WINDOW 讀取
+        """
         self.redis = redis_manager
+        self.storage_mode = (
+            storage_mode or os.getenv("WORKFLOW_SESSION_STORAGE", "json")
+        ).lower()
+        self.use_hash = self.storage_mode == "hash"
+        self.chat_history_window = chat_history_window or int(
+            os.getenv("CHAT_HISTORY_WINDOW", "50")
+        )
+    
+    @staticmethod
+    def _session_key(session_id: str) -> str:
+        """取得 Session 的 Redis 鍵"""
+        return f"renewal_session:{session_id}"
+    
+    @staticmethod
+    def _chat_key(session_id: str) -> str:
+        """取得對話紀錄的 Redis 鍵"""
+        return f"renewal_chat:{session_id}"
+    
+    @staticmethod
+    def _chat_summary_key(session_id: str) -> str:
+        """取得對話摘要的 Redis 鍵"""
+        return f"renewal_chat_summary:{session_id}"
+    
+    def _session_keys(self, session_id: str) -> List[str]:
+        """取得 Session 相關的所有 Redis 鍵"""
+        return [
+            self._session_key(session_id),
+            self._chat_key(session_id),
+            self._chat_summary_key(session_id)
+        ]
+    
+    def _to_hash_fields(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """將 Session 資料展開為 Hash 欄位（customer_selection 拆成子欄位）"""
+        fields = {}
+        for key, value in data.items():
+            if key == "customer_selection" and isinstance(value, dict):
+                for sub_key, sub_value in value.items():
+                    fields[f"{self.SELECTION_FIELD_PREFIX}{sub_key}"] = sub_value
+            else:
+                fields[key] = value
+        return fields
+    
+    def _from_hash_fields(self, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """將 Hash 欄位還原為 Session 資料"""
+        session_data: Dict[str, Any] = {"customer_selection": {}}
+        for field, value in fields.items():
+            if field.startswith(self.SELECTION_FIELD_PREFIX):
+                sub_key = field[len(self.SELECTION_FIELD_PREFIX):]
+                session_data["customer_selection"][sub_key] = value
+            else:
+                session_data[field] = value
+        return session_data
+    
+    def _allowed_from(
+        self,
+        steps: Sequence[WorkflowStep],
+        expected_step: Optional[WorkflowStep] = None
+    ) -> List[WorkflowStep]:
+        """
+        驗證步驟鏈本身的每一段轉換，並返回可以進入第一個步驟的目前步驟
+        
+        Raises:
+            ValueError: 未指定步驟或步驟鏈不合法
+        """
+        if not steps:
+            raise ValueError("未指定要轉換的步驟")
+        
+        for prev_step, step in zip(steps, steps[1:]):
+            if step not in self.TRANSITIONS.get(prev_step, []):
+                raise ValueError(f"非法的狀態轉換: {prev_step} -> {step}")
+        
+        return [
+            step for step, next_steps in self.TRANSITIONS.items()
+            if steps[0] in next_steps and (expected_step is None or step == expected_step)
+        ]
+    
+    async def _save_session(self, session_id: str, session_data: Dict[str, Any]) -> bool:
+        """整筆寫入 Session（並重置 TTL）"""
+        if self.use_hash:
+            return await self.redis.hset_json(
+                self._session_key(session_id),
+                self._to_hash_fields(session_data),
+                ex=self.SESSION_TTL,
+                replace=True
+            )
+        
+        return await self.redis.set_json(
+            self._session_key(session_id),
+            session_data,
+            ex=self.SESSION_TTL
+        )
+    
+    def _flush_args(
+        self,
+        key: str,
+        fields: Dict[str, Any],
+        expected_step: Optional[str] = None,
+        replace_selection: bool = False
+    ) -> List[Any]:
+        """組成 FLUSH_SCRIPT 的參數"""
+        args: List[Any] = [
+            self.SESSION_TTL,
+            json.dumps(expected_step) if expected_step is not None else "",
+            self.SELECTION_FIELD_PREFIX if replace_selection else ""
+        ]
+        for field, value in fields.items():
+            args.extend([field, self.redis.codecs.encode(key, value)])
+        return args
+    
+    async def _write_fields(
+        self,
+        session_id: str,
+        fields: Dict[str, Any],
+        replace_selection: bool = False
+    ) -> bool:
+        """
+        hash 模式：只寫入指定欄位並重置 TTL（以 FLUSH_SCRIPT 一次完成）
+        
+        Session 已不存在時不寫入並返回 False
+        
+        Args:
+            session_id: Session ID
+            fields: 要寫入的 Hash 欄位
+            replace_selection: 是否整個取代 customer_selection（移除未寫入的舊子欄位）
+        """
+        key = self._session_key(session_id)
+        fields["updated_at"] = datetime.now().isoformat()
+        result = await self.redis.run_script(
+            FLUSH_SCRIPT,
+            keys=[key],
+            args=self._flush_args(key, fields, replace_selection=replace_selection)
+        )
+        return bool(result) and result[0] == "ok"
         
     async def create_session(self, staff_id: str, clear_existing: bool = True) -> Dict[str, Any]:
         """
@@ -73,17 +403,12 @@ class WorkflowSessionManager:
             "staff_id": staff_id,
             "current_step": WorkflowStep.INIT,
             "customer_selection": {},
-            "chat_history": [],
             "created_at": datetime.now().isoformat(),
             "updated_at": datetime.now().isoformat()
         }
         
         # 儲存到 Redis (TTL: 1 小時)
-        await self.redis.set_json(
-            f"renewal_session:{session_id}",
-            session_data,
-            ex=3600
-        )
+        await self._save_session(session_id, session_data)
         
         # 將 session_id 加入員工的 session 集合
         await self.redis.redis.sadd(
@@ -110,13 +435,42 @@ class WorkflowSessionManager:
         Returns:
             Session 資料，若不存在則返回 None
         """
-        session_data = await self.redis.get_json(f"renewal_session:{session_id}")
+        if self.use_hash:
+            session_data = await self.redis.hgetall_json(self._session_key(session_id))
+            
+            if not session_data:
+                # 相容舊的 JSON 格式 Session：讀到後轉存為 Hash
+                session_data = await self.redis.get_json(self._session_key(session_id))
+                if session_data:
+                    await self._save_session(session_id, session_data)
+                    logger.info("JSON Session 已轉換為 Hash 格式", session_id=session_id)
+            else:
+                session_data = self._from_hash_fields(session_data)
+        else:
+            session_data = await self.redis.get_json(self._session_key(session_id))
         
         if not session_data:
             logger.warning("Session 不存在", session_id=session_id)
             
         return session_data
     
+    async def load(self, session_id: str) -> Optional["WorkflowSessionUnitOfWork"]:
+        """
+        載入 Session 並建立工作單元（同一請求內的變更累積於記憶體，最後一次寫回）
+        
+        Args:
+            session_id: Session ID
+            
+        Returns:
+            工作單元，若 Session 不存在則返回 None
+        """
+        session_data = await self.get_session(session_id)
+        
+        if not session_data:
+            return None
+        
+        return WorkflowSessionUnitOfWork(self, session_id, session_data)
+    
     async def update_session(
         self,
         session_id: str,
@@ -125,6 +479,10 @@ class WorkflowSessionManager:
         """
         更新 Session 資料
         
+        hash 模式下只寫入 updates 中的欄位。兩種模式下 updates 中的 customer_selection
+        都會整個取代原本的內容（hash 模式同時移除舊的子欄位）；要合併請使用
+        update_customer_selection
+        
         Args:
             session_id: Session ID
             updates: 要更新的資料
@@ -132,21 +490,26 @@ class WorkflowSessionManager:
         Returns:
             是否更新成功
         """
-        session_data = await self.get_session(session_id)
-        
-        if not session_data:
-            return False
-        
-        # 更新資料
-        session_data.update(updates)
-        session_data["updated_at"] = datetime.now().isoformat()
-        
-        # 儲存回 Redis
-        await self.redis.set_json(
-            f"renewal_session:{session_id}",
-            session_data,
-            ex=3600  # 重置 TTL
-        )
+        if self.use_hash:
+            if not await self._write_fields(
+                session_id,
+                self._to_hash_fields(updates),
+                replace_selection="customer_selection" in updates
+            ):
+                logger.warning("Session 不存在", session_id=session_id)
+                return False
+        else:
+            session_data = await self.get_session(session_id)
+            
+            if not session_data:
+                return False
+            
+            # 更新資料
+            session_data.update(updates)
+            session_data["updated_at"] = datetime.now().isoformat()
+            
+            # 儲存回 Redis（重置 TTL）
+            await self._save_session(session_id, session_data)
         
         logger.info(
             "更新續約流程 Session",
@@ -171,21 +534,23 @@ class WorkflowSessionManager:
         Returns:
             是否更新成功
         """
-        session_data = await self.get_session(session_id)
-        
-        if not session_data:
-            return False
-        
-        # 更新 customer_selection
-        session_data["customer_selection"].update(selection_data)
-        session_data["updated_at"] = datetime.now().isoformat()
-        
-        # 儲存回 Redis
-        await self.redis.set_json(
-            f"renewal_session:{session_id}",
-            session_data,
-            ex=3600
-        )
+        if self.use_hash:
+            fields = self._to_hash_fields({"customer_selection": selection_data})
+            if not await self._write_fields(session_id, fields):
+                logger.warning("Session 不存在", session_id=session_id)
+                return False
+        else:
+            session_data = await self.get_session(session_id)
+            
+            if not session_data:
+                return False
+            
+            # 更新 customer_selection
+            session_data["customer_selection"].update(selection_data)
+            session_data["updated_at"] = datetime.now().isoformat()
+            
+            # 儲存回 Redis
+            await self._save_session(session_id, session_data)
         
         logger.info(
             "更新客戶選擇資料",
@@ -213,58 +578,120 @@ class WorkflowSessionManager:
         Raises:
             ValueError: 如果狀態轉換不合法
         """
-        session_data = await self.get_session(session_id)
+        return await self.transition_steps(session_id, [next_step])
+    
+    async def transition_steps(
+        self,
+        session_id: str,
+        steps: Sequence[WorkflowStep],
+        expected_step: Optional[WorkflowStep] = None
+    ) -> bool:
+        """
+        原子性地依序轉換多個步驟（例如 CHECK_ELIGIBILITY -> SELECT_DEVICE_TYPE）
         
-        if not session_data:
-            error_msg = f"Session 不存在: {session_id}"
-            logger.error("Session 不存在", session_id=session_id)
-            raise ValueError(error_msg)
+        檢查、寫入與 TTL 重置在一次操作內完成：hash 模式使用 Lua 腳本，
+        json 模式使用 WATCH/MULTI。並行的轉換若使目前步驟已改變，會被拒絕。
         
-        current_step = WorkflowStep(session_data["current_step"])
+        Args:
+            session_id: Session ID
+            steps: 依序要轉換的步驟，最後一個為最終步驟
+            expected_step: 預期的目前步驟（選填），不符時拒絕轉換
+            
+        Returns:
+            是否轉換成功
+            
+        Raises:
+            ValueError: Session 不存在或狀態轉換不合法
+        """
+        allowed_from = self._allowed_from(steps, expected_step)
+        final_step = steps[-1]
+        updated_at = datetime.now().isoformat()
+        
+        if self.use_hash:
+            result = await self.redis.run_script(
+                TRANSITION_SCRIPT,
+                keys=[self._session_key(session_id)],
+                args=[
+                    json.dumps(final_step.value),
+                    json.dumps(updated_at),
+                    self.SESSION_TTL,
+                    *(json.dumps(step.value) for step in allowed_from)
+                ]
+            )
+            status, current_value = result if result else ("error", "")
+            current_step = json.loads(current_value) if current_value else None
+        else:
+            def apply(session_data: Optional[Dict]) -> Dict:
+                if not session_data:
+                    raise _TransitionAborted("missing", None)
+                if session_data["current_step"] not in allowed_from:
+                    raise _TransitionAborted("rejected", session_data["current_step"])
+                session_data["current_step"] = final_step.value
+                session_data["updated_at"] = updated_at
+                return session_data
+            
+            try:
+                saved = await self.redis.compare_and_set_json(
+                    self._session_key(session_id), apply, ex=self.SESSION_TTL
+                )
+                status = "ok" if saved else "error"
+                current_step = None
+            except _TransitionAborted as aborted:
+                status, current_step = aborted.status, aborted.current_step
         
-        # 檢查狀態轉換是否合法
-        if next_step not in self.TRANSITIONS.get(current_step, []):
-            error_msg = f"非法的狀態轉換: {current_step} -> {next_step}"
+        if status == "error":
+            logger.error("狀態轉換寫入失敗", session_id=session_id)
+            return False
+        
+        if status == "missing":
+            logger.error("Session 不存在", session_id=session_id)
+            raise ValueError(f"Session 不存在: {session_id}")
+        
+        if status != "ok":
             logger.error(
                 "非法的狀態轉換",
                 session_id=session_id,
                 current_step=current_step,
-                next_step=next_step
+                next_steps=[step.value for step in steps],
+                expected_step=expected_step
             )
-            raise ValueError(error_msg)
-        
-        # 更新步驟（確保保存的是字串值）
-        session_data["current_step"] = next_step.value
-        session_data["updated_at"] = datetime.now().isoformat()
+            raise ValueError(f"非法的狀態轉換: {current_step} -> {steps[0].value}")
         
-        logger.info(
-            "準備儲存狀態轉換",
-            session_id=session_id,
-            from_step=current_step,
-            to_step=next_step,
-            to_step_value=next_step.value,
-            current_step_in_data=session_data["current_step"]
-        )
-        
-        # 儲存回 Redis
-        await self.redis.set_json(
-            f"renewal_session:{session_id}",
-            session_data,
-            ex=3600
-        )
-        
-        # 驗證儲存結果
-        saved_data = await self.get_session(session_id)
         logger.info(
             "狀態轉換完成",
             session_id=session_id,
-            from_step=current_step,
-            to_step=next_step,
-            saved_current_step=saved_data.get("current_step") if saved_data else None
+            to_step=final_step.value,
+            steps=[step.value for step in steps]
         )
         
         return True
     
+    async def reset_to_step(
+        self,
+        session_id: str,
+        step: WorkflowStep
+    ) -> bool:
+        """
+        重置到指定步驟（繞過狀態轉換檢查，供使用者返回前面步驟時使用）
+        
+        Args:
+            session_id: Session ID
+            step: 目標步驟
+            
+        Returns:
+            是否重置成功
+        """
+        success = await self.update_session(session_id, {"current_step": step.value})
+        
+        if success:
+            logger.info(
+                "已重置工作流程狀態",
+                session_id=session_id,
+                new_step=step.value
+            )
+        
+        return success
+    
     async def add_chat_message(
         self,
         session_id: str,
@@ -272,7 +699,7 @@ class WorkflowSessionManager:
         content: str
     ) -> bool:
         """
-        新增對話訊息
+        新增對話訊息（只保留最近 chat_history_window 筆）
         
         Args:
             session_id: Session ID
@@ -282,33 +709,114 @@ class WorkflowSessionManager:
         Returns:
             是否新增成功
         """
-        session_data = await self.get_session(session_id)
-        
-        if not session_data:
-            return False
-        
-        # 新增訊息
         message = {
             "role": role,
             "content": content,
             "timestamp": datetime.now().isoformat()
         }
+        chat_key = self._chat_key(session_id)
         
-        session_data["chat_history"].append(message)
-        session_data["updated_at"] = datetime.now().isoformat()
-        
-        # 儲存回 Redis
-        await self.redis.set_json(
-            f"renewal_session:{session_id}",
-            session_data,
-            ex=3600
+        length = await self.redis.run_script(
+            CHAT_APPEND_SCRIPT,
+            keys=self._session_keys(session_id),
+            args=[
+                self.redis.codecs.encode(chat_key, message),
+                self.chat_history_window,
+                self.SESSION_TTL
+            ]
         )
         
+        if length is None or length < 0:
+            logger.warning("新增對話訊息失敗", session_id=session_id)
+            return False
+        
         logger.debug(
             "新增對話訊息",
             session_id=session_id,
             role=role,
-            content_length=len(content)
+            content_length=len(content),
+            history_length=length
+        )
+        
+        return True
+    
+    async def get_chat_history(
+        self,
+        session_id: str,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        取得對話紀錄（由舊到新）
+        
+        Args:
+            session_id: Session ID
+            limit: 只取最近幾筆（預設全部保留的紀錄）
+            
+        Returns:
+            對話訊息列表
+        """
+        start = -limit if limit else 0
+        return await self.redis.lrange_json(self._chat_key(session_id), start, -1)
+    
+    async def get_chat_summary(self, session_id: str) -> Optional[str]:
+        """
+        取得較早對話的摘要
+        
+        Args:
+            session_id: Session ID
+            
+        Returns:
+            摘要文字，尚未產生時返回 None
+        """
+        return await self.redis.get(self._chat_summary_key(session_id))
+    
+    async def set_chat_summary(
+        self,
+        session_id: str,
+        summary: str,
+        keep_last: Optional[int] = None,
+        history: Optional[List[Dict[str, Any]]] = None
+    ) -> bool:
+        """
+        寫入對話摘要，並可同時把已摘要的舊訊息從對話紀錄移除
+        
+        修剪與寫入摘要以 CHAT_SUMMARY_SCRIPT 一次完成，只移除 history 中除最近
+        keep_last 筆以外的訊息，產生摘要期間新增的訊息會保留
+        
+        Args:
+            session_id: Session ID
+            summary: 摘要文字
+            keep_last: 摘要時保留的最近幾筆（None 表示不修剪）
+            history: 產生摘要時讀取的對話紀錄（預設為目前的紀錄）
+            
+        Returns:
+            是否寫入成功
+        """
+        chat_key = self._chat_key(session_id)
+        
+        count, last_summarized = 0, ""
+        if keep_last is not None:
+            if history is None:
+                history = await self.get_chat_history(session_id)
+            count = max(len(history) - keep_last, 0)
+            if count:
+                last_summarized = self.redis.codecs.encode(chat_key, history[count - 1])
+        
+        removed = await self.redis.run_script(
+            CHAT_SUMMARY_SCRIPT,
+            keys=[chat_key, self._chat_summary_key(session_id)],
+            args=[summary, self.SESSION_TTL, count, last_summarized]
+        )
+        
+        if removed is None:
+            logger.error("寫入對話摘要失敗", session_id=session_id)
+            return False
+        
+        logger.info(
+            "更新對話摘要",
+            session_id=session_id,
+            summary_length=len(summary),
+            removed_messages=removed
         )
         
         return True
@@ -330,8 +838,8 @@ class WorkflowSessionManager:
         
         staff_id = session_data["staff_id"]
         
-        # 從 Redis 刪除
-        await self.redis.redis.delete(f"renewal_session:{session_id}")
+        # 從 Redis 刪除（含對話紀錄與摘要）
+        await self.redis.delete_many(self._session_keys(session_id))
         
         # 從員工 session 集合中移除
         await self.redis.redis.srem(
@@ -362,14 +870,12 @@ class WorkflowSessionManager:
         if not session_ids:
             return 0
         
-        count = 0
-        for session_id in session_ids:
-            # 刪除 session 資料
-            await self.redis.redis.delete(f"renewal_session:{session_id}")
-            count += 1
-        
-        # 清空員工 session 集合
-        await self.redis.redis.delete(f"staff_renewal_sessions:{staff_id}")
+        # 一次刪除所有 session 資料與員工 session 集合
+        await self.redis.delete_many([
+            *(key for session_id in session_ids for key in self._session_keys(session_id)),
+            f"staff_renewal_sessions:{staff_id}"
+        ])
+        count = len(session_ids)
         
         logger.info(
             "清除員工所有續約 Session",
@@ -423,3 +929,200 @@ class WorkflowSessionManager:
         current_step = WorkflowStep(session_data["current_step"])
         
         return next_step in self.TRANSITIONS.get(current_step, [])
+
+
+class WorkflowSessionUnitOfWork:
+    """
+    單一請求內的續約流程 Session 工作單元
+    
+    Session 只在載入時讀取一次；更新、狀態轉換與重置都只修改記憶體中的資料，
+    由 flush() 在請求結束時一次寫回 Redis：
+    - hash 模式：以 FLUSH_SCRIPT 只寫入有變動的欄位
+    - json 模式：以 WATCH/MULTI 將有變動的欄位合併到 Redis 中目前的資料
+    
+    Session 在請求期間被刪除（登出、過期）時不會重新建立。
+    
+    發生過狀態轉換時，寫回前會確認 Redis 中的目前步驟仍為載入時的步驟，
+    避免覆蓋並行請求已完成的轉換。
+    """
+    
+    def __init__(
+        self,
+        manager: WorkflowSessionManager,
+        session_id: str,
+        session_data: Dict[str, Any]
+    ):
+        """
+        初始化
+        
+        Args:
+            manager: Session 管理器
+            session_id: Session ID
+            session_data: 已載入的 Session 資料
+        """
+        self.manager = manager
+        self.session_id = session_id
+        self.data = session_data
+        self._loaded_step = session_data.get("current_step")
+        self._changed_fields: Dict[str, Any] = {}
+        self._transitioned = False
+        # customer_selection 是否被整個取代（寫回時移除舊的子欄位）
+        self._replace_selection = False
+    
+    @property
+    def dirty(self) -> bool:
+        """是否有尚未寫回的變更"""
+        return bool(self._changed_fields)
+    
+    def update_session(self, updates: Dict[str, Any]) -> None:
+        """
+        更新 Session 資料（寫回前只存在於記憶體）
+        
+        customer_selection 會整個取代原本的內容（與 WorkflowSessionManager.update_session 相同）
+        
+        Args:
+            updates: 要更新的資料
+        """
+        if "customer_selection" in updates:
+            updates = {**updates, "customer_selection": dict(updates["customer_selection"] or {})}
+            prefix = self.manager.SELECTION_FIELD_PREFIX
+            self._changed_fields = {
+                field: value for field, value in self._changed_fields.items()
+                if not field.startswith(prefix)
+            }
+            self._replace_selection = True
+        
+        self.data.update(updates)
+        self._changed_fields.update(self.manager._to_hash_fields(updates))
+    
+    def update_customer_selection(self, selection_data: Dict[str, Any]) -> None:
+        """
+        更新客戶選擇資料（寫回前只存在於記憶體）
+        
+        Args:
+            selection_data: 客戶選擇資料
+        """
+        self.data.setdefault("customer_selection", {}).update(selection_data)
+        self._changed_fields.update(
+            self.manager._to_hash_fields({"customer_selection": selection_data})
+        )
+    
+    def transition_to_step(self, next_step: WorkflowStep) -> None:
+        """
+        轉換到下一個步驟
+        
+        Raises:
+            ValueError: 如果狀態轉換不合法
+        """
+        self.transition_steps([next_step])
+    
+    def transition_steps(self, steps: Sequence[WorkflowStep]) -> None:
+        """
+        依序轉換多個步驟，以記憶體中的目前步驟驗證
+        
+        Args:
+            steps: 依序要轉換的步驟，最後一個為最終步驟
+            
+        Raises:
+            ValueError: 如果狀態轉換不合法
+        """
+        allowed_from = self.manager._allowed_from(steps)
+        current_step = self.data.get("current_step")
+        
+        if current_step not in allowed_from:
+            logger.error(
+                "非法的狀態轉換",
+                session_id=self.session_id,
+                current_step=current_step,
+                next_steps=[step.value for step in steps]
+            )
+            raise ValueError(f"非法的狀態轉換: {current_step} -> {steps[0].value}")
+        
+        self.update_session({"current_step": steps[-1].value})
+        self._transitioned = True
+    
+    def reset_to_step(self, step: WorkflowStep) -> None:
+        """重置到指定步驟（繞過狀態轉換檢查，供使用者返回前面步驟時使用）"""
+        self.update_session({"current_step": step.value})
+    
+    async def flush(self) -> bool:
+        """
+        將累積的變更一次寫回 Redis（並重置 TTL）
+        
+        Returns:
+            是否寫入成功（沒有變更時直接返回 True）
+            
+        Raises:
+            ValueError: Session 已不存在，或目前步驟已被其他請求改變
+        """
+        if not self.dirty:
+            return True
+        
+        manager = self.manager
+        key = manager._session_key(self.session_id)
+        updated_at = datetime.now().isoformat()
+        expected_step = self._loaded_step if self._transitioned else None
+        
+        self.data["updated_at"] = updated_at
+        self._changed_fields["updated_at"] = updated_at
+        
+        if manager.use_hash:
+            args = manager._flush_args(
+                key, self._changed_fields, expected_step, self._replace_selection
+            )
+            result = await manager.redis.run_script(FLUSH_SCRIPT, keys=[key], args=args)
+            status, current_value = result if result else ("error", "")
+            current_step = json.loads(current_value) if current_value else None
+        else:
+            def apply(session_data: Optional[Dict]) -> Dict:
+                if not session_data:
+                    raise _TransitionAborted("missing", None)
+                if expected_step is not None and session_data["current_step"] != expected_step:
+                    raise _TransitionAborted("rejected", session_data["current_step"])
+                # 只套用本請求變動的欄位，保留其他請求在期間寫入的資料
+                fields = manager._to_hash_fields(session_data)
+                if self._replace_selection:
+                    fields = {
+                        field: value for field, value in fields.items()
+                        if not field.startswith(manager.SELECTION_FIELD_PREFIX)
+                    }
+                fields.update(self._changed_fields)
+                return manager._from_hash_fields(fields)
+            
+            try:
+                saved = await manager.redis.compare_and_set_json(
+                    key, apply, ex=manager.SESSION_TTL
+                )
+                status, current_step = ("ok" if saved else "error"), None
+            except _TransitionAborted as aborted:
+                status, current_step = aborted.status, aborted.current_step
+        
+        if status == "error":
+            logger.error("Session 寫回失敗", session_id=self.session_id)
+            return False
+        
+        if status == "missing":
+            logger.error("Session 不存在", session_id=self.session_id)
+            raise ValueError(f"Session 不存在: {self.session_id}")
+        
+        if status != "ok":
+            logger.error(
+                "Session 目前步驟已被其他請求改變",
+                session_id=self.session_id,
+                expected_step=expected_step,
+                current_step=current_step
+            )
+            raise ValueError(f"Session 目前步驟已改變: {expected_step} -> {current_step}")
+        
+        logger.info(
+            "寫回續約流程 Session",
+            session_id=self.session_id,
+            fields=list(self._changed_fields.keys())
+        )
+        
+        self._loaded_step = self.data.get("current_step")
+        self._changed_fields = {}
+        self._transitioned = False
+        self._replace_selection = False
+        
+        return True
@@ -5,9 +5,13 @@ MCP Server 基礎類別
 - 錯誤處理
 - 日誌記錄
 - 回傳格式標準化
+- Tool 註冊與 stdio 啟動（run_stdio）
+- /mcp/batch 的項目格式：{"ok": true, "result": ...} 或 {"ok": false, "error": {"code", "message"}}
 """
+import json
+import sys
 import structlog
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Callable, Awaitable
 
 logger = structlog.get_logger()
 
@@ -27,8 +31,100 @@ class BaseMCPServer:
             server_name: Server 名稱 (用於日誌記錄)
         """
         self.server_name = server_name
+        # 以 add_tool 註冊的 Tools：name -> {schema, handler}
+        self._tools: Dict[str, Dict[str, Any]] = {}
         logger.info(f"初始化 {server_name}")
     
+    def add_tool(
+        self,
+        name: str,
+        description: str,
+        input_schema: Dict[str, Any],
+        handler: Callable[..., Awaitable[Dict[str, Any]]]
+    ):
+        """
+        註冊 Tool
+        
+        Args:
+            name: Tool 名稱
+            description: Tool 說明
+            input_schema: 參數 JSON Schema
+            handler: 處理函式（以 Tool 參數作為關鍵字參數呼叫）
+        """
+        self._tools[name] = {
+            "schema": {
+                "name": name,
+                "description": description,
+                "inputSchema": input_schema
+            },
+            "handler": handler
+        }
+    
+    def get_tools_schema(self) -> List[Dict[str, Any]]:
+        """取得所有以 add_tool 註冊的 Tools 的 Schema"""
+        return [tool["schema"] for tool in self._tools.values()]
+    
+    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        執行以 add_tool 註冊的 Tool
+        
+        Args:
+            name: Tool 名稱
+            arguments: Tool 參數
+            
+        Returns:
+            Tool 執行結果
+        """
+        if name not in self._tools:
+            return self.error_response("TOOL_NOT_FOUND", f"未知的工具: {name}")
+        handler = self._tools[name]["handler"]
+        
+        try:
+            return await handler(**(arguments or {}))
+        except TypeError as e:
+            return self.error_response("INVALID_PARAMS", f"參數錯誤: {e}")
+        except Exception as e:
+            return await self.handle_error(e, f"執行 {name}")
+    
+    async def run_stdio(self):
+        """以 stdio 啟動 MCP Server（由 MCP Client 以子程序方式啟動）"""
+        try:
+            from mcp.server import Server
+            from mcp.server.stdio import stdio_server
+            from mcp.types import Tool, TextContent
+        except ImportError:
+            logger.error("找不到 mcp 套件，請執行: pip install mcp")
+            raise
+        
+        server = Server(self.server_name)
+        
+        @server.list_tools()
+        async def list_tools() -> List[Tool]:
+            return [
+                Tool(
+                    name=tool["name"],
+                    description=tool["description"],
+                    inputSchema=tool["inputSchema"]
+                )
+                for tool in self.get_tools_schema()
+            ]
+        
+        @server.call_tool()
+        async def call_tool(name: str, arguments: Dict[str, Any]) -> List[TextContent]:
+            result = await self.call_tool(name, arguments)
+            return [TextContent(
+                type="text",
+                text=json.dumps(result, ensure_ascii=False, default=str)
+            )]
+        
+        async with stdio_server() as (read_stream, write_stream):
+            logger.info(f"{self.server_name} 啟動成功，等待連接...")
+            await server.run(
+                read_stream,
+                write_stream,
+                server.create_initialization_options()
+            )
+    
     def success_response(self, data: Any) -> Dict[str, Any]:
         """
         成功回應格式
@@ -126,6 +222,27 @@ class BaseMCPServer:
         return None
 
 
+def batch_ok(result: Any) -> Dict[str, Any]:
+    """
+    /mcp/batch 成功項目
+    
+    Args:
+        result: 與 /mcp/call 成功時相同的回應內容
+    """
+    return {"ok": True, "result": result}
+
+
+def batch_error(code: str, message: str) -> Dict[str, Any]:
+    """
+    /mcp/batch 失敗項目（/mcp/call 會回應錯誤狀態碼的情況）
+    
+    Args:
+        code: 錯誤代碼
+        message: 錯誤訊息
+    """
+    return {"ok": False, "error": {"code": code, "message": str(message)}}
+
+
 class MCPToolError(Exception):
     """MCP Tool 執行錯誤"""
     
@@ -134,3 +251,8 @@ class MCPToolError(Exception):
         self.message = message
         self.details = details or {}
         super().__init__(message)
+
+
+def configure_stdio_logging():
+    """stdio 模式下 stdout 為 MCP 通訊使用，日誌改輸出到 stderr"""
+    structlog.configure(logger_factory=structlog.PrintLoggerFactory(file=sys.stderr))
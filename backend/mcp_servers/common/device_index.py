@@ -0,0 +1,274 @@
+"""
+設備目錄索引
+
+POS Server 與 Mock POS Service 共用的記憶體索引，於載入設備主檔與門市庫存時建立：
+- 每間門市、每種作業系統依價格排序的陣列（價格區間以 bisect 查詢）
+- 設備 -> 門市的反向索引
+- 每個設備跨門市的庫存總數（預約時同步更新）
+- 推薦分數中與預算無關的部分（熱門度、旗艦、上市時間），定期重新計算
+- 推薦候選快取：以（門市、作業系統、預算級距、旗艦篩選）為鍵，查詢時再依實際預算篩選與計分
+  （預約後清除該門市的快取）
+
+庫存數量仍以 mock_stock 為準（與索引共用同一份 dict），索引只存放不會因預約改變的排序結果
+
+設定（環境變數）：
+- MCP_POS_SCORE_REFRESH_SECONDS: 推薦分數重新計算間隔（預設 3600 秒，上市時間加分隨日期改變）
+- MCP_POS_RECOMMENDATION_CACHE_SIZE: 推薦候選快取筆數上限（預設 256）
+- MCP_POS_BUDGET_BAND: 推薦候選快取的預算級距（預設 5000 元）
+"""
+import heapq
+import math
+import os
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
+
+# 不過濾作業系統時使用的索引鍵
+ALL_OS = "*"
+
+
+class DeviceCatalogIndex:
+    """設備目錄的次要索引"""
+
+    def __init__(self, devices: Dict[str, Dict[str, Any]], stock: Dict[str, Dict[str, Dict[str, int]]]):
+        """
+        初始化並建立索引
+
+        Args:
+            devices: 設備主檔（device_id -> 設備資料）
+            stock: 門市庫存（store_id -> device_id -> {quantity, reserved}）
+        """
+        self.devices = devices
+        self.stock = stock
+        self.score_refresh_seconds = int(os.getenv("MCP_POS_SCORE_REFRESH_SECONDS", "3600"))
+        self.recommendation_cache_size = int(os.getenv("MCP_POS_RECOMMENDATION_CACHE_SIZE", "256"))
+        self.budget_band = float(os.getenv("MCP_POS_BUDGET_BAND", "5000"))
+
+        # (store_id, os, 預算級距上限, is_flagship) -> [(位置, device_id, 價格, 基本分數, 可售數量)]
+        self._recommendations: "OrderedDict[Tuple, List[Tuple[int, str, float, int, int]]]" = OrderedDict()
+        self.recommendation_hits = 0
+        self.recommendation_misses = 0
+
+        self.rebuild()
+
+    def rebuild(self):
+        """重新建立所有索引（設備主檔或門市庫存整批更新後呼叫）"""
+        # store_id -> os -> (價格陣列, device_id 陣列)
+        self._price_index: Dict[str, Dict[str, Tuple[List[float], List[str]]]] = {}
+        # device_id -> 有此設備的門市
+        self._device_stores: Dict[str, List[str]] = {}
+        # device_id -> {quantity, reserved}
+        self._totals: Dict[str, Dict[str, int]] = {}
+        # (store_id, device_id) -> 在門市庫存中的順序（維持原本的排序結果）
+        self._positions: Dict[Tuple[str, str], int] = {}
+        # device_id -> 與預算無關的推薦分數（第一次推薦時計算）
+        self._base_scores: Dict[str, int] = {}
+        self._scores_refreshed_at: Optional[float] = None
+        self._recommendations.clear()
+
+        for store_id, store_stock in self.stock.items():
+            entries: Dict[str, List[Tuple[float, int, str]]] = {ALL_OS: []}
+
+            for position, (device_id, stock_info) in enumerate(store_stock.items()):
+                device = self.devices.get(device_id)
+                if not device:
+                    continue
+
+                self._positions[(store_id, device_id)] = position
+                entry = (device["price"], position, device_id)
+                entries[ALL_OS].append(entry)
+                entries.setdefault(device["os"].lower(), []).append(entry)
+
+                self._device_stores.setdefault(device_id, []).append(store_id)
+                totals = self._totals.setdefault(device_id, {"quantity": 0, "reserved": 0})
+                totals["quantity"] += stock_info["quantity"]
+                totals["reserved"] += stock_info["reserved"]
+
+            self._price_index[store_id] = {}
+            for os_key, os_entries in entries.items():
+                os_entries.sort()
+                self._price_index[store_id][os_key] = (
+                    [price for price, _, _ in os_entries],
+                    [device_id for _, _, device_id in os_entries]
+                )
+
+    def has_store(self, store_id: str) -> bool:
+        """門市是否存在"""
+        return store_id in self._price_index
+
+    def find(
+        self,
+        store_id: str,
+        os_filter: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+    ) -> List[str]:
+        """
+        查詢門市中符合作業系統與價格區間的設備
+
+        Args:
+            store_id: 門市代碼
+            os_filter: 作業系統（不區分大小寫，None 表示不過濾）
+            min_price: 最低價格（未提供或為 0 表示不過濾）
+            max_price: 最高價格（未提供或為 0 表示不過濾）
+
+        Returns:
+            device_id 列表（依價格由低到高）
+        """
+        os_index = self._price_index.get(store_id, {})
+        prices, device_ids = os_index.get(os_filter.lower() if os_filter else ALL_OS, ([], []))
+
+        start = bisect_left(prices, min_price) if min_price else 0
+        end = bisect_right(prices, max_price) if max_price else len(prices)
+        return device_ids[start:end]
+
+    def position(self, store_id: str, device_id: str) -> int:
+        """設備在門市庫存中的順序（排序結果相同時用來維持原本順序）"""
+        return self._positions.get((store_id, device_id), 0)
+
+    def stores_for(self, device_id: str) -> List[str]:
+        """有此設備的門市"""
+        return self._device_stores.get(device_id, [])
+
+    def totals_for(self, device_id: str) -> Dict[str, int]:
+        """
+        設備跨門市的庫存總數
+
+        Returns:
+            {"total_stock": 總數量, "available_stock": 可售數量}
+        """
+        totals = self._totals.get(device_id, {"quantity": 0, "reserved": 0})
+        return {
+            "total_stock": totals["quantity"],
+            "available_stock": totals["quantity"] - totals["reserved"]
+        }
+
+    def reserve(self, store_id: str, device_id: str):
+        """預約一台設備：更新門市庫存與庫存總數，並清除該門市的推薦快取"""
+        self.stock[store_id][device_id]["reserved"] += 1
+        if device_id in self._totals:
+            self._totals[device_id]["reserved"] += 1
+
+        for key in [key for key in self._recommendations if key[0] == store_id]:
+            del self._recommendations[key]
+
+    def refresh_scores(self, now: Optional[datetime] = None):
+        """
+        重新計算與預算無關的推薦分數
+
+        熱門度 + 旗艦加 3 分 + 上市未滿 6 個月加 5 分（未滿 12 個月加 2 分）
+        """
+        now = now or datetime.now()
+        self._base_scores = {}
+        for device_id, device in self.devices.items():
+            score = device["popularity_score"]
+            if device["is_flagship"]:
+                score += 3
+
+            release_date = datetime.strptime(device["release_date"], "%Y-%m-%d")
+            months_old = (now - release_date).days / 30
+            if months_old < 6:
+                score += 5
+            elif months_old < 12:
+                score += 2
+
+            self._base_scores[device_id] = score
+
+        self._scores_refreshed_at = time.monotonic()
+        self._recommendations.clear()
+
+    def recommend(
+        self,
+        store_id: str,
+        os_preference: str,
+        budget: float,
+        is_flagship: Optional[bool] = None,
+        limit: int = 5
+    ) -> List[Tuple[str, int, int]]:
+        """
+        取得推薦設備（預算內、有庫存，依推薦分數由高到低）
+
+        預算級距內、有庫存的候選設備（含基本分數與庫存加分）依級距快取；查詢時以實際預算篩選，
+        再計算預算相關的加分（價格達預算 80% 加 5 分、60% 加 3 分），以 heap 取出前 limit 名
+
+        Args:
+            store_id: 門市代碼
+            os_preference: 作業系統（不區分大小寫）
+            budget: 預算上限
+            is_flagship: 是否只要旗艦機（None 表示不限）
+            limit: 推薦數量
+
+        Returns:
+            [(device_id, 推薦分數, 可售數量)]
+        """
+        if (
+            self._scores_refreshed_at is None
+            or time.monotonic() - self._scores_refreshed_at >= self.score_refresh_seconds
+        ):
+            self.refresh_scores()
+
+        if budget <= 0:
+            return []
+
+        band_ceiling = math.ceil(budget / self.budget_band) * self.budget_band
+        candidates = self._band_candidates(store_id, os_preference, band_ceiling, is_flagship)
+
+        scored = []
+        for position, device_id, price, score, available in candidates:
+            if price > budget:
+                continue
+            price_ratio = price / budget
+            if price_ratio >= 0.8:
+                score += 5
+            elif price_ratio >= 0.6:
+                score += 3
+            scored.append((-score, position, device_id, available))
+
+        return [
+            (device_id, -negative_score, available)
+            for negative_score, _, device_id, available in heapq.nsmallest(limit, scored)
+        ]
+
+    def _band_candidates(
+        self,
+        store_id: str,
+        os_preference: str,
+        band_ceiling: float,
+        is_flagship: Optional[bool]
+    ) -> List[Tuple[int, str, float, int, int]]:
+        """
+        預算級距內、有庫存的候選設備（快取）
+
+        Returns:
+            [(門市庫存中的位置, device_id, 價格, 基本分數 + 庫存加分, 可售數量)]
+        """
+        key = (store_id, os_preference.lower(), band_ceiling, is_flagship)
+        cached = self._recommendations.get(key)
+        if cached is not None:
+            self._recommendations.move_to_end(key)
+            self.recommendation_hits += 1
+            return cached
+        self.recommendation_misses += 1
+
+        store_stock = self.stock.get(store_id, {})
+        candidates = []
+        for device_id in self.find(store_id, os_preference, max_price=band_ceiling):
+            device = self.devices[device_id]
+            if is_flagship is not None and device["is_flagship"] != is_flagship:
+                continue
+
+            stock_info = store_stock[device_id]
+            available = stock_info["quantity"] - stock_info["reserved"]
+            if available <= 0:
+                continue
+
+            score = self._base_scores[device_id] + (2 if available >= 5 else 0)
+            candidates.append((self.position(store_id, device_id), device_id, device["price"], score, available))
+
+        self._recommendations[key] = candidates
+        while len(self._recommendations) > self.recommendation_cache_size:
+            self._recommendations.popitem(last=False)
+
+        return candidates
@@ -0,0 +1,351 @@
+"""
+費率方案目錄
+
+Promotion Server 與 Mock Promotion Service 共用的方案索引，於載入方案與促銷資料時建立：
+- plan_id -> 方案、promotion_id -> 促銷（O(1) 查詢）
+- 方案 -> 適用促銷的反向對照
+- 方案詳情（含適用促銷）預先組好並以唯讀 dict 共用，不需每次複製
+- 新增、修改、刪除方案或促銷時只更新受影響的方案，並遞增 version
+- 每個方案預先計算數值化特徵（數據量、通話分鐘數、每 GB 月租），比較方案的結果以
+  排序後的方案 ID 與 version 為 key 快取
+
+設定（環境變數）：
+- PROMOTION_COMPARISON_CACHE_SIZE: 方案比較結果快取筆數上限（預設 256）
+"""
+import copy
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# 數據量，例如 50GB、100GB共享
+_DATA_GB_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*GB", re.IGNORECASE)
+# 通話分鐘數，例如 網外/市話 300分鐘
+_VOICE_MINUTES_PATTERN = re.compile(r"(\d+)\s*分鐘")
+
+
+class FrozenDict(dict):
+    """
+    唯讀 dict
+
+    仍是 dict 的子類別，可直接 JSON 序列化；修改時拋出 TypeError，需要修改時請先 dict(value) 複製
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("唯讀資料不可修改，請先複製")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return {key: copy.deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value: Any) -> Any:
+    """遞迴轉為唯讀結構（dict -> FrozenDict、list -> tuple）"""
+    if isinstance(value, dict):
+        return FrozenDict({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def plan_features(plan: Dict[str, Any]) -> FrozenDict:
+    """
+    方案的數值化特徵
+
+    Returns:
+        {
+            "unlimited_data": 是否上網吃到飽,
+            "data_gb": 數據量 GB（吃到飽或未標示時為 None）,
+            "voice_minutes": 網外/市話通話分鐘數（未標示時為 None）,
+            "fee_per_gb": 每 GB 月租費（data_gb 為 None 時為 None）
+        }
+    """
+    data = str(plan.get("data", ""))
+    unlimited_data = "無限" in data
+    match = None if unlimited_data else _DATA_GB_PATTERN.search(data)
+    data_gb = float(match.group(1)) if match else None
+
+    voice_minutes = None
+    for text in [str(plan.get("voice", ""))] + [str(feature) for feature in plan.get("features", [])]:
+        match = _VOICE_MINUTES_PATTERN.search(text)
+        if match:
+            voice_minutes = int(match.group(1))
+            break
+
+    return FrozenDict({
+        "unlimited_data": unlimited_data,
+        "data_gb": data_gb,
+        "voice_minutes": voice_minutes,
+        "fee_per_gb": round(plan["monthly_fee"] / data_gb, 2) if data_gb else None
+    })
+
+
+def generate_recommendation(plans: List[Dict[str, Any]]) -> str:
+    """生成方案推薦建議"""
+    if not plans:
+        return "無法提供建議"
+
+    if len(plans) == 1:
+        return f"目前只有一個方案 {plans[0]['name']}"
+
+    # 找出最便宜的
+    cheapest = min(plans, key=lambda x: x["monthly_fee"])
+    # 找出數據最多的
+    unlimited_data = [p for p in plans if "無限" in p["data"]]
+
+    recommendations = []
+    recommendations.append(
+        f"🏷️ 最經濟實惠：{cheapest['name']} (月租 ${cheapest['monthly_fee']})"
+    )
+
+    if unlimited_data:
+        recommendations.append(
+            f"🚀 重度使用者：{unlimited_data[0]['name']} (上網吃到飽)"
+        )
+
+    return " | ".join(recommendations)
+
+
+class PlanCatalog:
+    """方案與促銷的索引"""
+
+    def __init__(self, plans: List[Dict[str, Any]], promotions: List[Dict[str, Any]]):
+        """
+        初始化並建立索引
+
+        Args:
+            plans: 方案列表（與 Server 共用，增刪時同步更新）
+            promotions: 促銷列表（與 Server 共用，增刪時同步更新）
+        """
+        self.plans = plans
+        self.promotions = promotions
+        self.version = 0
+        self.comparison_cache_size = int(os.getenv("PROMOTION_COMPARISON_CACHE_SIZE", "256"))
+
+        # (排序後的 plan_id, version) -> 比較結果（依排序後的 plan_id，無有效方案時為 None）
+        self._comparisons: "OrderedDict[Tuple, Optional[FrozenDict]]" = OrderedDict()
+        self.comparison_hits = 0
+        self.comparison_misses = 0
+
+        self.rebuild()
+
+    def rebuild(self):
+        """重新建立所有索引"""
+        self._plans: Dict[str, Dict[str, Any]] = {plan["plan_id"]: plan for plan in self.plans}
+        self._features: Dict[str, FrozenDict] = {
+            plan_id: plan_features(plan) for plan_id, plan in self._plans.items()
+        }
+        self._promotions: Dict[str, Dict[str, Any]] = {}
+        self._promotion_order: Dict[str, int] = {}
+        # plan_id -> 適用的 promotion_id
+        self._plan_promotions: Dict[str, Set[str]] = {}
+        # plan_id -> 方案詳情（唯讀，第一次查詢時組成）
+        self._details: Dict[str, FrozenDict] = {}
+
+        for order, promo in enumerate(self.promotions):
+            self._index_promotion(promo, order)
+        # 新增促銷的排序（排在既有促銷之後）
+        self._next_order = len(self.promotions)
+
+        self._comparisons.clear()
+        self.version += 1
+
+    def _index_promotion(self, promo: Dict[str, Any], order: int):
+        """加入促銷的索引"""
+        promotion_id = promo["promotion_id"]
+        self._promotions[promotion_id] = promo
+        self._promotion_order[promotion_id] = order
+        for plan_id in promo.get("plans", []):
+            self._plan_promotions.setdefault(plan_id, set()).add(promotion_id)
+
+    def _unindex_promotion(self, promotion_id: str) -> Set[str]:
+        """移除促銷的索引，回傳受影響的方案"""
+        promo = self._promotions.pop(promotion_id, None)
+        if promo is None:
+            return set()
+        affected = set(promo.get("plans", []))
+        for plan_id in affected:
+            promotion_ids = self._plan_promotions.get(plan_id)
+            if promotion_ids is not None:
+                promotion_ids.discard(promotion_id)
+        return affected
+
+    def _invalidate(self, plan_ids):
+        """清除方案詳情並遞增版本"""
+        for plan_id in plan_ids:
+            self._details.pop(plan_id, None)
+        self._comparisons.clear()
+        self.version += 1
+
+    def get_plan(self, plan_id: str) -> Optional[Dict[str, Any]]:
+        """取得方案原始資料"""
+        return self._plans.get(plan_id)
+
+    def get_features(self, plan_id: str) -> Optional[FrozenDict]:
+        """取得方案的數值化特徵（見 plan_features）"""
+        return self._features.get(plan_id)
+
+    def get_details(self, plan_id: str) -> Optional[FrozenDict]:
+        """
+        取得方案詳情（含適用促銷）
+
+        Returns:
+            唯讀的方案詳情（所有呼叫端共用），方案不存在時回傳 None
+        """
+        details = self._details.get(plan_id)
+        if details is not None:
+            return details
+
+        plan = self._plans.get(plan_id)
+        if plan is None:
+            return None
+
+        promotion_ids = sorted(self._plan_promotions.get(plan_id, ()), key=self._promotion_order.__getitem__)
+        applicable_promotions = [
+            {
+                "promotion_id": promotion_id,
+                "title": self._promotions[promotion_id]["title"],
+                "benefits": self._promotions[promotion_id]["benefits"]
+            }
+            for promotion_id in promotion_ids
+        ]
+
+        details = freeze({
+            **plan,
+            "applicable_promotions": applicable_promotions,
+            "total_promotions": len(applicable_promotions)
+        })
+        self._details[plan_id] = details
+        return details
+
+    def compare(self, plan_ids: List[str]) -> Optional[FrozenDict]:
+        """
+        比較方案
+
+        同一組方案不論順序只計算一次；方案或促銷變更後 version 改變，快取隨之失效
+
+        Args:
+            plan_ids: 方案 ID 列表（不存在的方案略過）
+
+        Returns:
+            唯讀的 {"plans": [...], "comparison": {...}, "recommendation": str}，
+            方案依 plan_ids 的順序；沒有有效方案時回傳 None
+        """
+        order = [plan_id for plan_id in plan_ids if plan_id in self._plans]
+        key = (tuple(sorted(set(order))), self.version)
+        if key in self._comparisons:
+            self._comparisons.move_to_end(key)
+            self.comparison_hits += 1
+            result = self._comparisons[key]
+        else:
+            self.comparison_misses += 1
+            result = self._build_comparison(key[0])
+            self._comparisons[key] = result
+            while len(self._comparisons) > self.comparison_cache_size:
+                self._comparisons.popitem(last=False)
+
+        if result is None:
+            return None
+
+        # 快取依排序後的方案 ID 建立，呼叫端順序不同時重新排列
+        if order == [plan["plan_id"] for plan in result["plans"]]:
+            return result
+
+        details = {plan["plan_id"]: plan for plan in result["plans"]}
+        unique_order = list(dict.fromkeys(order))
+        return FrozenDict({
+            "plans": tuple(details[plan_id] for plan_id in order),
+            "comparison": FrozenDict({
+                name: FrozenDict({
+                    **summary,
+                    "values": FrozenDict({plan_id: summary["values"][plan_id] for plan_id in unique_order})
+                })
+                for name, summary in result["comparison"].items()
+            }),
+            "recommendation": result["recommendation"]
+        })
+
+    def _build_comparison(self, plan_ids: Tuple[str, ...]) -> Optional[FrozenDict]:
+        """建立比較結果（plan_ids 已排序、不重複且皆存在）"""
+        plans = [self.get_details(plan_id) for plan_id in plan_ids]
+        if not plans:
+            return None
+
+        comparison = {
+            "monthly_fee": {
+                "min": min(p["monthly_fee"] for p in plans),
+                "max": max(p["monthly_fee"] for p in plans),
+                "values": {p["plan_id"]: p["monthly_fee"] for p in plans}
+            },
+            "data": {
+                "values": {p["plan_id"]: p["data"] for p in plans}
+            },
+            "voice": {
+                "values": {p["plan_id"]: p["voice"] for p in plans}
+            },
+            "contract_months": {
+                "values": {p["plan_id"]: p["contract_months"] for p in plans}
+            },
+            "features": {
+                "values": {p["plan_id"]: self._features[p["plan_id"]] for p in plans}
+            }
+        }
+
+        return FrozenDict({
+            "plans": tuple(plans),
+            "comparison": freeze(comparison),
+            "recommendation": generate_recommendation(plans)
+        })
+
+    def upsert_plan(self, plan: Dict[str, Any]):
+        """新增或更新方案"""
+        plan_id = plan["plan_id"]
+        existing = self._plans.get(plan_id)
+        if existing is None:
+            self.plans.append(plan)
+        else:
+            self.plans[self.plans.index(existing)] = plan
+        self._plans[plan_id] = plan
+        self._features[plan_id] = plan_features(plan)
+        self._invalidate([plan_id])
+
+    def remove_plan(self, plan_id: str):
+        """刪除方案"""
+        plan = self._plans.pop(plan_id, None)
+        if plan is not None:
+            self._features.pop(plan_id, None)
+            self.plans.remove(plan)
+            self._invalidate([plan_id])
+
+    def upsert_promotion(self, promo: Dict[str, Any]):
+        """新增或更新促銷（只重組受影響方案的詳情）"""
+        promotion_id = promo["promotion_id"]
+        existing = self._promotions.get(promotion_id)
+        if existing is None:
+            order = self._next_order
+            self._next_order += 1
+            self.promotions.append(promo)
+        else:
+            order = self._promotion_order[promotion_id]
+            self.promotions[self.promotions.index(existing)] = promo
+
+        affected = self._unindex_promotion(promotion_id)
+        self._index_promotion(promo, order)
+        self._invalidate(affected | set(promo.get("plans", [])))
+
+    def remove_promotion(self, promotion_id: str):
+        """刪除促銷"""
+        promo = self._promotions.get(promotion_id)
+        if promo is None:
+            return
+        self.promotions.remove(promo)
+        self._promotion_order.pop(promotion_id, None)
+        self._invalidate(self._unindex_promotion(promotion_id))
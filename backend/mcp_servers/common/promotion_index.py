@@ -0,0 +1,294 @@
+"""
+促銷方案搜尋索引
+
+Promotion Server 與 Mock Promotion Service 共用的記憶體倒排索引，於載入促銷資料時建立：
+- 斷詞：英數字以單字為單位（不區分大小寫），中文以相鄰兩字（bigram）為單位
+- 索引欄位：keywords、title、description（依欄位權重計算詞頻）
+- 以 BM25 計算相關性，只需處理查詢詞出現過的促銷方案
+- 合約類型以 bitmap（Python int）預先篩選
+- 以 heap 取出前 limit 筆
+- 單筆促銷新增、更新或刪除時以 upsert()/remove() 只更新該筆的索引（含向量），不重建整個索引
+- 可搭配向量索引（common.vector_index），以 Reciprocal Rank Fusion 合併關鍵字與向量排序
+
+設定（環境變數）：
+- PROMOTION_SEARCH_MODE: keyword、vector 或 hybrid（預設 hybrid，未提供向量索引時一律為 keyword）
+- PROMOTION_VECTOR_MIN_SCORE: 向量檢索的最低相似度（預設 0.2）
+"""
+import bisect
+import heapq
+import math
+import os
+import re
+from typing import Dict, Any, Optional, List, Tuple
+
+# 英數字單字或連續中文字
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+# 欄位權重（關鍵字比標題、描述重要）
+FIELD_WEIGHTS = {
+    "keywords": 3.0,
+    "title": 2.0,
+    "description": 1.0
+}
+
+# BM25 參數
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Reciprocal Rank Fusion 參數
+RRF_K = 60
+
+SEARCH_MODES = ("keyword", "vector", "hybrid")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    斷詞
+
+    英數字轉小寫後以單字為單位，中文以 bigram 為單位（單獨一個中文字時保留該字）
+    """
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text.lower()):
+        if run.isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class PromotionSearchIndex:
+    """促銷方案的倒排索引與 BM25 排序"""
+
+    def __init__(self, promotions: List[Dict[str, Any]], vector_index=None):
+        """
+        初始化並建立索引
+
+        Args:
+            promotions: 促銷方案列表
+            vector_index: 向量索引（common.vector_index.VectorIndex，選填）
+        """
+        self.promotions = promotions
+        self.vector_index = vector_index
+        self.default_mode = os.getenv("PROMOTION_SEARCH_MODE", "hybrid")
+        self.vector_min_score = float(os.getenv("PROMOTION_VECTOR_MIN_SCORE", "0.2"))
+        self.rebuild()
+
+    @staticmethod
+    def document_text(promo: Dict[str, Any]) -> str:
+        """向量索引使用的促銷文字"""
+        parts = [promo.get("title", ""), promo.get("description", "")]
+        parts.extend(promo.get("keywords", []))
+        parts.extend(promo.get("benefits", []))
+        return " ".join(parts)
+
+    @staticmethod
+    def term_frequencies(promo: Dict[str, Any]) -> Dict[str, float]:
+        """促銷各詞的加權詞頻"""
+        frequencies: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            value = promo.get(field, "")
+            text = " ".join(value) if isinstance(value, list) else value
+            for token in tokenize(text):
+                frequencies[token] = frequencies.get(token, 0.0) + weight
+        return frequencies
+
+    def rebuild(self):
+        """
+        重新建立索引
+
+        促銷序號依 promotions 順序重新編號（清除已刪除促銷留下的空序號）；
+        單筆更新請使用 upsert()/remove()
+        """
+        # 詞 -> {促銷序號: 加權詞頻}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # 合約類型 -> 符合的促銷序號 bitmap
+        self._contract_bitmaps: Dict[str, int] = {}
+        # 合約類型 -> 促銷序號（依優先順序排序，補足沒有符合查詢詞的結果）
+        self._contract_by_priority: Dict[str, List[int]] = {}
+        # 促銷序號 -> 促銷方案（刪除後為 None，序號不重複使用）
+        self._docs: List[Optional[Dict[str, Any]]] = []
+        # 促銷序號 -> 加權詞頻（移除時據此更新倒排索引）
+        self._doc_terms: List[Dict[str, float]] = []
+        self._doc_lengths: List[float] = []
+        # 促銷代碼 -> 促銷序號
+        self._doc_ids: Dict[str, int] = {}
+        self._total_length = 0.0
+
+        for promo in self.promotions:
+            self._append(promo)
+
+        if self.vector_index is not None:
+            self.vector_index.build([self.document_text(promo) for promo in self.promotions])
+
+    def upsert(self, promo: Dict[str, Any]):
+        """新增或更新單筆促銷的索引（更新時沿用原促銷序號）"""
+        doc_id = self._doc_ids.get(promo["promotion_id"])
+        if doc_id is None:
+            doc_id = self._append(promo)
+        else:
+            self._unindex(doc_id)
+            self._docs[doc_id] = promo
+            self._index(doc_id, promo)
+
+        if self.vector_index is not None:
+            self.vector_index.upsert(doc_id, self.document_text(promo))
+
+    def remove(self, promotion_id: str):
+        """移除單筆促銷的索引"""
+        doc_id = self._doc_ids.pop(promotion_id, None)
+        if doc_id is None:
+            return
+        self._unindex(doc_id)
+        self._docs[doc_id] = None
+
+        if self.vector_index is not None:
+            self.vector_index.remove(doc_id)
+
+    def _append(self, promo: Dict[str, Any]) -> int:
+        """以新的促銷序號加入索引"""
+        doc_id = len(self._docs)
+        self._docs.append(promo)
+        self._doc_terms.append({})
+        self._doc_lengths.append(0.0)
+        self._doc_ids[promo["promotion_id"]] = doc_id
+        self._index(doc_id, promo)
+        return doc_id
+
+    def _priority_key(self, doc_id: int) -> Tuple[float, int]:
+        """合約類型列表的排序鍵（優先順序高者在前，相同時依促銷序號）"""
+        return -self._docs[doc_id]["priority"], doc_id
+
+    def _index(self, doc_id: int, promo: Dict[str, Any]):
+        """將促銷加入倒排索引、文件長度與合約類型篩選"""
+        frequencies = self.term_frequencies(promo)
+        for token, frequency in frequencies.items():
+            self._postings.setdefault(token, {})[doc_id] = frequency
+        self._doc_terms[doc_id] = frequencies
+        self._doc_lengths[doc_id] = sum(frequencies.values())
+        self._total_length += self._doc_lengths[doc_id]
+
+        for contract_type in promo.get("eligibility", {}).get("contract_type", []):
+            self._contract_bitmaps[contract_type] = self._contract_bitmaps.get(contract_type, 0) | (1 << doc_id)
+            bisect.insort(
+                self._contract_by_priority.setdefault(contract_type, []), doc_id, key=self._priority_key
+            )
+
+    def _unindex(self, doc_id: int):
+        """將促銷從倒排索引、文件長度與合約類型篩選移除"""
+        for token in self._doc_terms[doc_id]:
+            postings = self._postings[token]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[token]
+        self._total_length -= self._doc_lengths[doc_id]
+        self._doc_terms[doc_id] = {}
+        self._doc_lengths[doc_id] = 0.0
+
+        bit = 1 << doc_id
+        for contract_type, bitmap in self._contract_bitmaps.items():
+            if bitmap & bit:
+                self._contract_bitmaps[contract_type] = bitmap & ~bit
+                self._contract_by_priority[contract_type].remove(doc_id)
+
+    def score(self, query: str, allowed: Optional[int] = None) -> Dict[int, float]:
+        """
+        計算 BM25 分數
+
+        Args:
+            query: 搜尋查詢
+            allowed: 允許的促銷序號 bitmap（None 表示全部）
+
+        Returns:
+            促銷序號 -> BM25 分數（只包含至少符合一個查詢詞的促銷）
+        """
+        scores: Dict[int, float] = {}
+        count = len(self._doc_ids)
+        avg_length = (self._total_length / count) if count else 0.0
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            # IDF 隨文件數變動，於查詢時計算（只計算查詢詞）
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                if allowed is not None and not (allowed >> doc_id) & 1:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return scores
+
+    def contract_bitmap(self, contract_type: Optional[str]) -> Optional[int]:
+        """合約類型對應的促銷序號 bitmap（None 表示不篩選）"""
+        if not contract_type:
+            return None
+        return self._contract_bitmaps.get(contract_type, 0)
+
+    def _fuse(self, keyword_scores: Dict[int, float], vector_hits: List[Tuple[int, float]]) -> Dict[int, float]:
+        """以 Reciprocal Rank Fusion 合併關鍵字與向量排序"""
+        keyword_ranked = sorted(
+            keyword_scores,
+            key=lambda doc_id: (keyword_scores[doc_id], self._docs[doc_id]["priority"]),
+            reverse=True
+        )
+        fused: Dict[int, float] = {}
+        for rank, doc_id in enumerate(keyword_ranked, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1 / (RRF_K + rank)
+        for rank, (doc_id, _) in enumerate(vector_hits, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1 / (RRF_K + rank)
+        return fused
+
+    def search(
+        self,
+        query: str,
+        contract_type: Optional[str] = None,
+        limit: int = 5,
+        mode: Optional[str] = None
+    ) -> Tuple[List[Tuple[Dict[str, Any], float]], int]:
+        """
+        搜尋促銷方案
+
+        未指定合約類型時只回傳符合查詢的促銷；指定合約類型時回傳所有符合資格的促銷，
+        再依相關性排序（與原本的關鍵字比對行為一致）
+
+        Args:
+            query: 搜尋查詢
+            contract_type: 合約類型篩選（攜碼/續約/新申辦）
+            limit: 回傳筆數限制
+            mode: keyword、vector 或 hybrid（預設讀取 PROMOTION_SEARCH_MODE）
+
+        Returns:
+            ([(促銷方案, 相關性分數)], 符合條件的總筆數)
+        """
+        mode = mode or self.default_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"未知的搜尋模式: {mode}")
+        if self.vector_index is None:
+            mode = "keyword"
+
+        allowed = self.contract_bitmap(contract_type)
+        scores = self.score(query, allowed) if mode != "vector" else {}
+
+        if mode != "keyword":
+            # 向量候選數量與關鍵字結果相當即可
+            depth = max(limit, len(scores))
+            vector_hits = self.vector_index.search(query, depth, allowed, self.vector_min_score)
+            scores = dict(vector_hits) if mode == "vector" else self._fuse(scores, vector_hits)
+
+        top = heapq.nlargest(
+            limit,
+            sorted(scores),
+            key=lambda doc_id: (scores[doc_id], self._docs[doc_id]["priority"])
+        )
+
+        if allowed is None:
+            total = len(scores)
+        else:
+            total = allowed.bit_count()
+            # 符合資格但沒有符合查詢詞的促銷，依優先順序補足
+            for doc_id in self._contract_by_priority.get(contract_type, []):
+                if len(top) >= limit:
+                    break
+                if doc_id not in scores:
+                    top.append(doc_id)
+
+        return [(self._docs[doc_id], scores.get(doc_id, 0.0)) for doc_id in top], total
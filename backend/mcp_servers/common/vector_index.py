@@ -0,0 +1,299 @@
+"""
+本機向量檢索
+
+在程序內完成促銷方案的向量檢索，不依賴外部搜尋服務：
+- Embedding 可替換：預設為雜湊 Embedding（固定結果、不需下載模型，適合離線測試），
+  安裝 sentence-transformers 時可改用本機模型
+- 資料量小時以餘弦相似度逐筆計算（有 NumPy 時使用矩陣運算）
+- 資料量超過門檻且安裝 hnswlib 時改用 HNSW 近似搜尋
+- 可將向量存成快照檔，內容未變更時重新啟動直接載入
+- 單筆資料以 upsert()/remove() 更新，只計算該筆的 Embedding
+
+設定（環境變數）：
+- PROMOTION_EMBEDDER: hashing、hashing:<維度> 或 sentence-transformers:<模型名稱>（預設 hashing）
+- PROMOTION_VECTOR_SNAPSHOT: 向量快照檔路徑（未設定時不儲存）
+- PROMOTION_VECTOR_HNSW_THRESHOLD: 使用 HNSW 的資料筆數門檻（預設 5000）
+"""
+import hashlib
+import heapq
+import json
+import math
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import structlog
+
+from .promotion_index import tokenize
+
+logger = structlog.get_logger()
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    """L2 正規化（零向量維持原樣）"""
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm == 0:
+        return vector
+    return [value / norm for value in vector]
+
+
+class HashingEmbedder:
+    """
+    雜湊 Embedding
+
+    以與關鍵字索引相同的斷詞結果做 feature hashing，相同文字在任何程序中都得到相同向量
+    """
+
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+        self.name = f"hashing:{dimension}"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """將文字轉為正規化後的向量"""
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dimension
+            for token in tokenize(text):
+                digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+                sign = 1.0 if digest & 1 else -1.0
+                vector[(digest >> 1) % self.dimension] += sign
+            vectors.append(_normalize(vector))
+        return vectors
+
+
+class SentenceTransformerEmbedder:
+    """sentence-transformers 本機模型 Embedding"""
+
+    def __init__(self, model_name: str):
+        self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.name = f"sentence-transformers:{model_name}"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """將文字轉為正規化後的向量"""
+        return self.model.encode(texts, normalize_embeddings=True).tolist()
+
+
+def create_embedder(spec: Optional[str] = None):
+    """
+    依設定建立 Embedding
+
+    Args:
+        spec: hashing、hashing:<維度> 或 sentence-transformers:<模型名稱>（預設讀取 PROMOTION_EMBEDDER）
+    """
+    spec = spec or os.getenv("PROMOTION_EMBEDDER", "hashing")
+    kind, _, option = spec.partition(":")
+
+    if kind == "sentence-transformers":
+        if SENTENCE_TRANSFORMERS_AVAILABLE and option:
+            return SentenceTransformerEmbedder(option)
+        logger.warning("sentence-transformers 未安裝或未指定模型，改用雜湊 Embedding", spec=spec)
+        return HashingEmbedder()
+
+    if kind != "hashing":
+        logger.warning("未知的 Embedding 設定，改用雜湊 Embedding", spec=spec)
+    return HashingEmbedder(int(option) if option else 256)
+
+
+class VectorIndex:
+    """向量索引（逐筆餘弦相似度或 HNSW）"""
+
+    def __init__(
+        self,
+        embedder=None,
+        snapshot_path: Optional[str] = None,
+        hnsw_threshold: Optional[int] = None
+    ):
+        """
+        初始化
+
+        Args:
+            embedder: Embedding（預設依 PROMOTION_EMBEDDER 建立）
+            snapshot_path: 向量快照檔路徑（預設讀取 PROMOTION_VECTOR_SNAPSHOT）
+            hnsw_threshold: 使用 HNSW 的資料筆數門檻（預設讀取 PROMOTION_VECTOR_HNSW_THRESHOLD）
+        """
+        self.embedder = embedder or create_embedder()
+        snapshot_path = snapshot_path or os.getenv("PROMOTION_VECTOR_SNAPSHOT", "")
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.hnsw_threshold = hnsw_threshold or int(os.getenv("PROMOTION_VECTOR_HNSW_THRESHOLD", "5000"))
+
+        self._vectors: List[List[float]] = []
+        # 已移除的資料序號（序號不重複使用，重新建立索引時清空）
+        self._deleted: set = set()
+        self._matrix = None
+        self._hnsw = None
+
+    @staticmethod
+    def _fingerprint(texts: List[str]) -> str:
+        """文字內容的雜湊（判斷快照是否仍有效）"""
+        return hashlib.sha1("\n".join(texts).encode("utf-8")).hexdigest()
+
+    def build(self, texts: List[str]):
+        """
+        建立索引（快照內容相同時直接載入）
+
+        Args:
+            texts: 每筆資料的文字，向量序號與列表順序相同
+        """
+        fingerprint = self._fingerprint(texts)
+        vectors = self._load_snapshot(fingerprint)
+        if vectors is None:
+            vectors = self.embedder.embed(texts) if texts else []
+            self._save_snapshot(fingerprint, vectors)
+
+        self._vectors = vectors
+        self._deleted = set()
+        self._matrix = np.asarray(vectors, dtype=np.float32) if NUMPY_AVAILABLE and vectors else None
+        self._hnsw = None
+
+        if HNSWLIB_AVAILABLE and len(vectors) >= self.hnsw_threshold:
+            self._hnsw = hnswlib.Index(space="cosine", dim=self.embedder.dimension)
+            self._hnsw.init_index(max_elements=len(vectors), ef_construction=200, M=16)
+            self._hnsw.add_items(self._matrix if self._matrix is not None else vectors, list(range(len(vectors))))
+            self._hnsw.set_ef(64)
+
+        logger.info(
+            "向量索引已建立",
+            embedder=self.embedder.name,
+            count=len(vectors),
+            backend="hnsw" if self._hnsw else ("numpy" if self._matrix is not None else "python")
+        )
+
+    def upsert(self, doc_id: int, text: str):
+        """
+        新增或更新單筆向量（不更新快照，下次啟動時內容不同會重新計算）
+
+        Args:
+            doc_id: 資料序號（等於目前筆數時為新增）
+            text: 資料文字
+        """
+        vector = self.embedder.embed([text])[0]
+
+        if doc_id < len(self._vectors):
+            self._vectors[doc_id] = vector
+            if self._matrix is not None:
+                self._matrix[doc_id] = vector
+        else:
+            self._vectors.append(vector)
+            if NUMPY_AVAILABLE:
+                row = np.asarray([vector], dtype=np.float32)
+                self._matrix = row if self._matrix is None else np.vstack([self._matrix, row])
+
+        if self._hnsw is not None:
+            if doc_id >= self._hnsw.get_max_elements():
+                self._hnsw.resize_index(max(doc_id + 1, self._hnsw.get_max_elements() * 2))
+            self._hnsw.add_items(np.asarray([vector], dtype=np.float32), [doc_id])
+
+    def remove(self, doc_id: int):
+        """移除單筆向量（保留序號，不再出現在檢索結果）"""
+        if doc_id >= len(self._vectors) or doc_id in self._deleted:
+            return
+        self._deleted.add(doc_id)
+        if self._hnsw is not None:
+            self._hnsw.mark_deleted(doc_id)
+
+    def _load_snapshot(self, fingerprint: str) -> Optional[List[List[float]]]:
+        """讀取快照（Embedding 或內容不同時忽略）"""
+        if not self.snapshot_path or not self.snapshot_path.exists():
+            return None
+        try:
+            snapshot = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning("讀取向量快照失敗", path=str(self.snapshot_path), error=str(e))
+            return None
+        if snapshot.get("embedder") != self.embedder.name or snapshot.get("fingerprint") != fingerprint:
+            return None
+        logger.info("載入向量快照", path=str(self.snapshot_path), count=len(snapshot["vectors"]))
+        return snapshot["vectors"]
+
+    def _save_snapshot(self, fingerprint: str, vectors: List[List[float]]):
+        """儲存快照"""
+        if not self.snapshot_path:
+            return
+        try:
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            self.snapshot_path.write_text(
+                json.dumps({"embedder": self.embedder.name, "fingerprint": fingerprint, "vectors": vectors}),
+                encoding="utf-8"
+            )
+        except OSError as e:
+            logger.warning("儲存向量快照失敗", path=str(self.snapshot_path), error=str(e))
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        allowed: Optional[int] = None,
+        min_score: float = 0.0
+    ) -> List[Tuple[int, float]]:
+        """
+        向量檢索
+
+        Args:
+            query: 搜尋查詢
+            limit: 回傳筆數
+            allowed: 允許的資料序號 bitmap（None 表示全部）
+            min_score: 最低相似度
+
+        Returns:
+            [(資料序號, 餘弦相似度)]，相似度由高到低
+        """
+        if len(self._vectors) <= len(self._deleted) or limit <= 0:
+            return []
+
+        query_vector = self.embedder.embed([query])[0]
+
+        if self._hnsw is not None:
+            count = min(limit, len(self._vectors) - len(self._deleted))
+            labels, distances = self._hnsw.knn_query(
+                np.asarray([query_vector], dtype=np.float32),
+                k=count,
+                filter=(lambda doc_id: (allowed >> doc_id) & 1) if allowed is not None else None
+            )
+            results = [(int(doc_id), 1.0 - float(distance)) for doc_id, distance in zip(labels[0], distances[0])]
+        elif self._matrix is not None:
+            scores = self._matrix @ np.asarray(query_vector, dtype=np.float32)
+            results = [
+                (doc_id, float(scores[doc_id])) for doc_id in range(len(scores))
+                if (allowed is None or (allowed >> doc_id) & 1) and doc_id not in self._deleted
+            ]
+            results = heapq.nlargest(limit, results, key=lambda item: item[1])
+        else:
+            results = heapq.nlargest(
+                limit,
+                (
+                    (doc_id, sum(a * b for a, b in zip(vector, query_vector)))
+                    for doc_id, vector in enumerate(self._vectors)
+                    if (allowed is None or (allowed >> doc_id) & 1) and doc_id not in self._deleted
+                ),
+                key=lambda item: item[1]
+            )
+
+        return [(doc_id, score) for doc_id, score in results if score > min_score]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """取得索引資訊"""
+        return {
+            "embedder": self.embedder.name,
+            "count": len(self._vectors) - len(self._deleted),
+            "backend": "hnsw" if self._hnsw else ("numpy" if self._matrix is not None else "python"),
+            "snapshot": str(self.snapshot_path) if self.snapshot_path else None
+        }
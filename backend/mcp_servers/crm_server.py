@@ -22,7 +22,7 @@ import json
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
-from common.base_server import BaseMCPServer, MCPToolError
+from common.base_server import BaseMCPServer, MCPToolError, configure_stdio_logging
 
 logger = structlog.get_logger()
 
@@ -51,6 +51,7 @@ class CRMServer(BaseMCPServer):
         
         # 初始化 Mock 資料
         self._init_mock_data()
+        self.register_tools()
     
     def _init_mock_data(self):
         """初始化 Mock 資料（與 MockCRMService 保持一致）"""
@@ -590,173 +591,117 @@ class CRMServer(BaseMCPServer):
         except Exception as e:
             return await self.handle_error(e, "檢查促銷資格")
 
-
-async def main():
-    """
-    MCP Server 主程式
-    
-    使用 MCP SDK 啟動 CRM MCP Server
-    """
-    logger.info("啟動 CRM MCP Server")
-    
-    try:
-        from mcp.server import Server
-        from mcp.server.stdio import stdio_server
-        from mcp.types import Tool, TextContent
-    except ImportError:
-        logger.error("找不到 mcp 套件，請執行: pip install mcp")
-        raise
-    
-    # 初始化 CRM 實例
-    crm = CRMServer()
     
-    # 建立自訂 Server 類別
-    class CRMServerMCP(Server):
-        def __init__(self):
-            super().__init__("crm-mcp-server")
+    def register_tools(self):
+        """註冊所有 CRM Tools"""
         
-        async def list_tools(self) -> list[Tool]:
-            """列出所有可用的 Tools"""
-            return [
-                Tool(
-                    name="get_customer",
-                    description="查詢客戶基本資料",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "id_number": {
-                                "type": "string",
-                                "description": "身分證字號 (10碼)"
-                            }
-                        },
-                        "required": ["id_number"]
-                    }
-                ),
-                Tool(
-                    name="list_customer_phones",
-                    description="列出客戶所有門號",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "customer_id": {
-                                "type": "string",
-                                "description": "客戶 ID"
-                            }
-                        },
-                        "required": ["customer_id"]
+        self.add_tool(
+            name="get_customer",
+            description="查詢客戶基本資料",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "id_number": {
+                        "type": "string",
+                        "description": "身分證字號 (10碼)"
                     }
-                ),
-                Tool(
-                    name="get_phone_details",
-                    description="取得門號詳細資訊",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "phone_number": {
-                                "type": "string",
-                                "description": "門號"
-                            }
-                        },
-                        "required": ["phone_number"]
+                },
+                "required": ["id_number"]
+            },
+            handler=self.get_customer
+        )
+        
+        self.add_tool(
+            name="list_customer_phones",
+            description="列出客戶所有門號",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "customer_id": {
+                        "type": "string",
+                        "description": "客戶 ID"
                     }
-                ),
-                Tool(
-                    name="check_renewal_eligibility",
-                    description="檢查門號續約資格",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "phone_number": {
-                                "type": "string",
-                                "description": "門號"
-                            },
-                            "renewal_type": {
-                                "type": "string",
-                                "description": "續約類型 (single/with_device)",
-                                "enum": ["single", "with_device"]
-                            }
-                        },
-                        "required": ["phone_number", "renewal_type"]
+                },
+                "required": ["customer_id"]
+            },
+            handler=self.list_customer_phones
+        )
+        
+        self.add_tool(
+            name="get_phone_details",
+            description="取得門號詳細資訊",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "phone_number": {
+                        "type": "string",
+                        "description": "門號"
                     }
-                ),
-                Tool(
-                    name="check_promotion_eligibility",
-                    description="檢查門號促銷資格",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "phone_number": {
-                                "type": "string",
-                                "description": "門號"
-                            },
-                            "promotion_id": {
-                                "type": "string",
-                                "description": "促銷編號"
-                            }
-                        },
-                        "required": ["phone_number", "promotion_id"]
+                },
+                "required": ["phone_number"]
+            },
+            handler=self.get_phone_details
+        )
+        
+        self.add_tool(
+            name="check_renewal_eligibility",
+            description="檢查門號續約資格",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "phone_number": {
+                        "type": "string",
+                        "description": "門號"
+                    },
+                    "renewal_type": {
+                        "type": "string",
+                        "description": "續約類型 (single/with_device)",
+                        "enum": ["single", "with_device"]
                     }
-                )
-            ]
+                },
+                "required": ["phone_number", "renewal_type"]
+            },
+            handler=self.check_renewal_eligibility
+        )
         
-        async def call_tool(self, name: str, arguments: dict) -> list[TextContent]:
-            """執行 Tool 調用"""
-            logger.info(f"MCP 調用工具: {name}", arguments=arguments)
-            
-            try:
-                if name == "get_customer":
-                    result = await crm.get_customer(arguments["id_number"])
-                elif name == "list_customer_phones":
-                    result = await crm.list_customer_phones(arguments["customer_id"])
-                elif name == "get_phone_details":
-                    result = await crm.get_phone_details(arguments["phone_number"])
-                elif name == "check_renewal_eligibility":
-                    result = await crm.check_renewal_eligibility(
-                        arguments["phone_number"],
-                        arguments["renewal_type"]
-                    )
-                elif name == "check_promotion_eligibility":
-                    result = await crm.check_promotion_eligibility(
-                        arguments["phone_number"],
-                        arguments["promotion_id"]
-                    )
-                else:
-                    raise ValueError(f"未知的工具: {name}")
-                
-                # 返回 JSON 結果
-                return [TextContent(
-                    type="text",
-                    text=json.dumps(result, ensure_ascii=False)
-                )]
-                
-            except Exception as e:
-                logger.error(f"工具執行錯誤: {name}", error=str(e))
-                error_result = {
-                    "success": False,
-                    "error": {
-                        "code": "TOOL_EXECUTION_ERROR",
-                        "message": str(e)
+        self.add_tool(
+            name="check_promotion_eligibility",
+            description="檢查門號促銷資格",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "phone_number": {
+                        "type": "string",
+                        "description": "門號"
+                    },
+                    "promotion_id": {
+                        "type": "string",
+                        "description": "促銷編號"
                     }
-                }
-                return [TextContent(
-                    type="text",
-                    text=json.dumps(error_result, ensure_ascii=False)
-                )]
+                },
+                "required": ["phone_number", "promotion_id"]
+            },
+            handler=self.check_promotion_eligibility
+        )
+        
+        logger.info("已註冊 5 個 CRM Tools")
+
+
+
+async def main():
+    """
+    MCP Server 主程式
     
-    # 建立 Server 實例
-    server = CRMServerMCP()
+    使用 MCP SDK 以 stdio 啟動 CRM MCP Server
+    """
+    # stdout 為 MCP 通訊使用，日誌改輸出到 stderr
+    configure_stdio_logging()
+    logger.info("啟動 CRM MCP Server")
     
+    crm = CRMServer()
     logger.info("CRM MCP Server 已註冊 5 個 Tools")
     
-    # 啟動 stdio 通訊
-    async with stdio_server() as (read_stream, write_stream):
-        logger.info("CRM MCP Server 啟動成功，等待連接...")
-        await server.run(
-            read_stream,
-            write_stream,
-            server.create_initialization_options()
-        )
-
+    await crm.run_stdio()
 
 if __name__ == "__main__":
     import asyncio
@@ -9,7 +9,9 @@ CRM MCP Server - HTTP Transport 版本
 測試方式:
     curl -X POST http://localhost:8001/mcp/tools
     curl -X POST http://localhost:8001/mcp/call -d '{"tool":"get_customer","arguments":{"id_number":"A123456789"}}'
+    curl -X POST http://localhost:8001/mcp/batch -d '[{"tool":"get_customer","arguments":{"id_number":"A123456789"}},{"tool":"get_phone_details","arguments":{"phone_number":"0912345678"}}]'
 """
+import asyncio
 import os
 import sys
 from pathlib import Path
@@ -24,6 +26,7 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
 from crm_server import CRMServer
+from common.base_server import batch_ok, batch_error
 
 logger = structlog.get_logger()
 
@@ -37,6 +40,9 @@ app = FastAPI(
 # 初始化 CRM Server
 crm = CRMServer()
 
+# 每次批次調用的上限
+MAX_BATCH_CALLS = int(os.getenv("MCP_BATCH_MAX_CALLS", "50"))
+
 # 請求/回應模型
 class ToolCallRequest(BaseModel):
     """Tool 調用請求"""
@@ -67,6 +73,7 @@ async def root():
         "endpoints": {
             "tools": "/mcp/tools",
             "call": "/mcp/call",
+            "batch": "/mcp/batch",
             "health": "/health"
         }
     }
@@ -183,38 +190,86 @@ async def call_tool(request: ToolCallRequest):
         Tool 執行結果
     """
     logger.info("收到 Tool 調用請求", tool=request.tool, arguments=request.arguments)
+    return await execute_tool(request.tool, request.arguments)
+
+
+@app.post("/mcp/batch")
+async def batch_call_tools(requests: List[ToolCallRequest]):
+    """
+    批次調用多個 Tool（並行執行，結果依請求順序返回）
+    
+    Body:
+        [{"tool": "get_customer", "arguments": {...}}, ...]
+        
+    Returns:
+        {"success": true, "results": [{"ok": true, "result": 同 /mcp/call 的回應} 或
+                                      {"ok": false, "error": {"code", "message"}}]}
+    """
+    if len(requests) > MAX_BATCH_CALLS:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "success": False,
+                "error": {
+                    "code": "BATCH_TOO_LARGE",
+                    "message": f"批次調用最多 {MAX_BATCH_CALLS} 個 Tool"
+                }
+            }
+        )
+    
+    logger.info("收到批次 Tool 調用請求", tools=[call.tool for call in requests])
+    
+    async def run(call: ToolCallRequest) -> Dict[str, Any]:
+        try:
+            return batch_ok(await execute_tool(call.tool, call.arguments))
+        except HTTPException as e:
+            error = e.detail["error"]
+            return batch_error(error["code"], error["message"])
     
+    results = await asyncio.gather(*(run(call) for call in requests))
+    return {"success": True, "results": results}
+
+
+async def execute_tool(tool: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    執行 Tool
+    
+    Raises:
+        HTTPException: Tool 不存在（404）或執行失敗（500）
+    """
     try:
         # 路由到對應的 CRM 方法
-        if request.tool == "get_customer":
-            result = await crm.get_customer(**request.arguments)
-        elif request.tool == "list_customer_phones":
-            result = await crm.list_customer_phones(**request.arguments)
-        elif request.tool == "get_phone_details":
-            result = await crm.get_phone_details(**request.arguments)
-        elif request.tool == "check_renewal_eligibility":
-            result = await crm.check_renewal_eligibility(**request.arguments)
-        elif request.tool == "check_promotion_eligibility":
-            result = await crm.check_promotion_eligibility(**request.arguments)
+        if tool == "get_customer":
+            result = await crm.get_customer(**arguments)
+        elif tool == "list_customer_phones":
+            result = await crm.list_customer_phones(**arguments)
+        elif tool == "get_phone_details":
+            result = await crm.get_phone_details(**arguments)
+        elif tool == "check_renewal_eligibility":
+            result = await crm.check_renewal_eligibility(**arguments)
+        elif tool == "check_promotion_eligibility":
+            result = await crm.check_promotion_eligibility(**arguments)
         else:
-            logger.error("未知的 Tool", tool=request.tool)
+            logger.error("未知的 Tool", tool=tool)
             raise HTTPException(
                 status_code=404,
                 detail={
                     "success": False,
                     "error": {
                         "code": "TOOL_NOT_FOUND",
-                        "message": f"Tool '{request.tool}' 不存在"
+                        "message": f"Tool '{tool}' 不存在"
                     }
                 }
             )
         
         # CRM 方法已經返回標準格式 {success: bool, data/error: ...}
-        logger.info("Tool 調用完成", tool=request.tool, success=result.get("success"))
+        logger.info("Tool 調用完成", tool=tool, success=result.get("success"))
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error("Tool 調用失敗", tool=request.tool, error=str(e))
+        logger.error("Tool 調用失敗", tool=tool, error=str(e))
         raise HTTPException(
             status_code=500,
             detail={
@@ -239,6 +294,7 @@ async def startup_event():
     logger.info("  - Health: http://localhost:8001/health")
     logger.info("  - List Tools: http://localhost:8001/mcp/tools")
     logger.info("  - Call Tool: http://localhost:8001/mcp/call")
+    logger.info("  - Batch Call: http://localhost:8001/mcp/batch")
     logger.info("="*60)
 
 
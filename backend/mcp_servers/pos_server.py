@@ -22,7 +22,8 @@ import json
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
-from common.base_server import BaseMCPServer, MCPToolError
+from common.base_server import BaseMCPServer, MCPToolError, configure_stdio_logging
+from common.device_index import DeviceCatalogIndex
 
 logger = structlog.get_logger()
 
@@ -51,6 +52,7 @@ class POSServer(BaseMCPServer):
         
         # 初始化 Mock 資料
         self._init_mock_data()
+        self.register_tools()
     
     def _init_mock_data(self):
         """初始化 Mock 設備資料"""
@@ -239,12 +241,15 @@ class POSServer(BaseMCPServer):
         
         # Mock 預約記錄
         self.mock_reservations = {}
+        
+        # 庫存查詢使用的索引（價格區間、設備 -> 門市、庫存總數）
+        self.catalog = DeviceCatalogIndex(self.mock_devices, self.mock_stock)
     
     def register_tools(self):
         """註冊所有 POS Tools"""
         
         # Tool 1: query_device_stock
-        self.server.add_tool(
+        self.add_tool(
             name="query_device_stock",
             description="查詢門市設備庫存狀況",
             input_schema={
@@ -274,7 +279,7 @@ class POSServer(BaseMCPServer):
         )
         
         # Tool 2: get_device_info
-        self.server.add_tool(
+        self.add_tool(
             name="get_device_info",
             description="取得設備詳細資訊",
             input_schema={
@@ -291,7 +296,7 @@ class POSServer(BaseMCPServer):
         )
         
         # Tool 3: get_recommended_devices
-        self.server.add_tool(
+        self.add_tool(
             name="get_recommended_devices",
             description="根據客戶偏好取得推薦設備",
             input_schema={
@@ -321,7 +326,7 @@ class POSServer(BaseMCPServer):
         )
         
         # Tool 4: reserve_device
-        self.server.add_tool(
+        self.add_tool(
             name="reserve_device",
             description="預約設備（確保庫存保留）",
             input_schema={
@@ -350,7 +355,7 @@ class POSServer(BaseMCPServer):
         )
         
         # Tool 5: get_device_pricing
-        self.server.add_tool(
+        self.add_tool(
             name="get_device_pricing",
             description="取得設備價格資訊（含促銷價格）",
             input_schema={
@@ -387,19 +392,10 @@ class POSServer(BaseMCPServer):
             store_stock = self.mock_stock[store_id]
             devices = []
             
-            for device_id, stock_info in store_stock.items():
-                device = self.mock_devices.get(device_id)
-                if not device:
-                    continue
-                
-                # 過濾條件（不區分大小寫）
-                if os_filter and device["os"].lower() != os_filter.lower():
-                    continue
-                if min_price and device["price"] < min_price:
-                    continue
-                if max_price and device["price"] > max_price:
-                    continue
-                
+            # 作業系統（不區分大小寫）與價格區間以索引查詢
+            for device_id in self.catalog.find(store_id, os_filter, min_price, max_price):
+                device = self.mock_devices[device_id]
+                stock_info = store_stock[device_id]
                 available = stock_info["quantity"] - stock_info["reserved"]
                 devices.append({
                     "device_id": device_id,
@@ -419,7 +415,7 @@ class POSServer(BaseMCPServer):
                     "chip": device["chip"]
                 })
             
-            devices.sort(key=lambda x: x["available"], reverse=True)
+            devices.sort(key=lambda x: (-x["available"], self.catalog.position(store_id, x["device_id"])))
             
             return {
                 "success": True,
@@ -445,27 +441,19 @@ class POSServer(BaseMCPServer):
             
             device = self.mock_devices[device_id].copy()
             
-            # 計算總庫存
-            total_stock = 0
-            available_stock = 0
+            # 總庫存已預先計算，只列出有此設備的門市
             store_stock_list = []
-            
-            for store_id, store_stock in self.mock_stock.items():
-                if device_id in store_stock:
-                    stock_info = store_stock[device_id]
-                    available = stock_info["quantity"] - stock_info["reserved"]
-                    total_stock += stock_info["quantity"]
-                    available_stock += available
-                    store_stock_list.append({
-                        "store_id": store_id,
-                        "quantity": stock_info["quantity"],
-                        "reserved": stock_info["reserved"],
-                        "available": available
-                    })
+            for store_id in self.catalog.stores_for(device_id):
+                stock_info = self.mock_stock[store_id][device_id]
+                store_stock_list.append({
+                    "store_id": store_id,
+                    "quantity": stock_info["quantity"],
+                    "reserved": stock_info["reserved"],
+                    "available": stock_info["quantity"] - stock_info["reserved"]
+                })
             
             device["stock_summary"] = {
-                "total_stock": total_stock,
-                "available_stock": available_stock,
+                **self.catalog.totals_for(device_id),
                 "stores": store_stock_list
             }
             
@@ -484,45 +472,11 @@ class POSServer(BaseMCPServer):
             if store_id not in self.mock_stock:
                 return {"success": False, "error": f"門市 {store_id} 不存在"}
             
-            store_stock = self.mock_stock[store_id]
-            candidates = []
-            
-            for device_id, stock_info in store_stock.items():
-                device = self.mock_devices.get(device_id)
-                if not device:
-                    continue
-                
-                if device["os"] != os_preference or device["price"] > budget:
-                    continue
-                if is_flagship is not None and device["is_flagship"] != is_flagship:
-                    continue
-                
-                available = stock_info["quantity"] - stock_info["reserved"]
-                if available <= 0:
-                    continue
-                
-                # 計算推薦分數
-                score = device["popularity_score"]
-                price_ratio = device["price"] / budget
-                if price_ratio >= 0.8:
-                    score += 5
-                elif price_ratio >= 0.6:
-                    score += 3
-                
-                if device["is_flagship"]:
-                    score += 3
-                
-                release_date = datetime.strptime(device["release_date"], "%Y-%m-%d")
-                months_old = (datetime.now() - release_date).days / 30
-                if months_old < 6:
-                    score += 5
-                elif months_old < 12:
-                    score += 2
-                
-                if available >= 5:
-                    score += 2
-                
-                candidates.append({
+            # 推薦分數中與預算無關的部分已預先計算，結果依門市、作業系統、預算快取
+            recommendations = []
+            for device_id, score, available in self.catalog.recommend(store_id, os_preference, budget, is_flagship):
+                device = self.mock_devices[device_id]
+                recommendations.append({
                     "device_id": device_id,
                     "brand": device["brand"],
                     "model": device["model"],
@@ -540,9 +494,6 @@ class POSServer(BaseMCPServer):
                     "chip": device["chip"]
                 })
             
-            candidates.sort(key=lambda x: x["recommendation_score"], reverse=True)
-            recommendations = candidates[:5]
-            
             if not recommendations:
                 return {"success": False, "error": f"目前沒有符合條件的設備"}
             
@@ -602,7 +553,7 @@ class POSServer(BaseMCPServer):
                 "status": "active"
             }
             
-            self.mock_stock[store_id][device_id]["reserved"] += 1
+            self.catalog.reserve(store_id, device_id)
             device = self.mock_devices[device_id]
             
             return {
@@ -719,10 +670,11 @@ class POSServer(BaseMCPServer):
 # ==================== 主程式 ====================
 
 async def main():
-    """主程式：啟動 POS MCP Server"""
+    """主程式：以 stdio 啟動 POS MCP Server"""
+    # stdout 為 MCP 通訊使用，日誌改輸出到 stderr
+    configure_stdio_logging()
     server = POSServer()
-    server.register_tools()
-    await server.run()
+    await server.run_stdio()
 
 
 if __name__ == "__main__":
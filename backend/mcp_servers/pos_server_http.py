@@ -10,7 +10,9 @@ POS MCP Server - HTTP Transport 版本
     curl http://localhost:8002/health
     curl -X POST http://localhost:8002/mcp/tools
     curl -X POST http://localhost:8002/mcp/call -H "Content-Type: application/json" -d "{\"tool\":\"query_device_stock\",\"arguments\":{\"store_id\":\"STORE001\"}}"
+    curl -X POST http://localhost:8002/mcp/batch -H "Content-Type: application/json" -d "[{\"tool\":\"get_device_info\",\"arguments\":{\"device_id\":\"DEV001\"}},{\"tool\":\"get_device_pricing\",\"arguments\":{\"device_id\":\"DEV001\"}}]"
 """
+import asyncio
 import os
 import sys
 from pathlib import Path
@@ -25,6 +27,7 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
 from pos_server import POSServer
+from common.base_server import batch_ok, batch_error
 
 logger = structlog.get_logger()
 
@@ -38,6 +41,9 @@ app = FastAPI(
 # 初始化 POS Server
 pos = POSServer()
 
+# 每次批次調用的上限
+MAX_BATCH_CALLS = int(os.getenv("MCP_BATCH_MAX_CALLS", "50"))
+
 # 請求/回應模型
 class ToolCallRequest(BaseModel):
     """Tool 調用請求"""
@@ -69,6 +75,7 @@ async def root():
         "endpoints": {
             "tools": "/mcp/tools",
             "call": "/mcp/call",
+            "batch": "/mcp/batch",
             "health": "/health"
         },
         "tools": [
@@ -241,50 +248,13 @@ async def call_tool(request: ToolCallRequest):
         }
     }
     """
+    tool_name = request.tool
+    args = request.arguments
+    
+    logger.info("HTTP Tool Call", tool=tool_name, args=args)
+    
     try:
-        tool_name = request.tool
-        args = request.arguments
-        
-        logger.info("HTTP Tool Call", tool=tool_name, args=args)
-        
-        # 路由到對應的 Tool 方法
-        if tool_name == "query_device_stock":
-            result = await pos.query_device_stock(
-                store_id=args.get("store_id"),
-                os_filter=args.get("os_filter"),
-                min_price=args.get("min_price"),
-                max_price=args.get("max_price")
-            )
-        
-        elif tool_name == "get_device_info":
-            result = await pos.get_device_info(
-                device_id=args.get("device_id")
-            )
-        
-        elif tool_name == "get_recommended_devices":
-            result = await pos.get_recommended_devices(
-                store_id=args.get("store_id"),
-                os_preference=args.get("os_preference"),
-                budget=args.get("budget"),
-                is_flagship=args.get("is_flagship")
-            )
-        
-        elif tool_name == "reserve_device":
-            result = await pos.reserve_device(
-                store_id=args.get("store_id"),
-                device_id=args.get("device_id"),
-                customer_id=args.get("customer_id"),
-                phone_number=args.get("phone_number")
-            )
-        
-        elif tool_name == "get_device_pricing":
-            result = await pos.get_device_pricing(
-                device_id=args.get("device_id"),
-                plan_type=args.get("plan_type")
-            )
-        
-        else:
-            raise HTTPException(status_code=404, detail=f"Tool '{tool_name}' not found")
+        result = await dispatch_tool(tool_name, args)
         
         # 返回結果
         if result.get("success"):
@@ -301,11 +271,99 @@ async def call_tool(request: ToolCallRequest):
                 }
             )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Tool call failed", tool=tool_name, error=str(e))
         raise HTTPException(status_code=500, detail=f"Tool execution failed: {str(e)}")
 
 
+@app.post("/mcp/batch")
+async def batch_call_tools(requests: List[ToolCallRequest]):
+    """
+    批次調用 POS Tools（並行執行，結果依請求順序返回）
+    
+    Body:
+    [
+        {"tool": "get_device_info", "arguments": {"device_id": "DEV001"}},
+        {"tool": "get_device_pricing", "arguments": {"device_id": "DEV001"}}
+    ]
+    
+    Returns:
+        {"success": true, "results": [{"ok": true, "result": {"success": true, "data": ...}} 或
+                                      {"ok": false, "error": {"code", "message"}}]}
+    """
+    if len(requests) > MAX_BATCH_CALLS:
+        raise HTTPException(status_code=400, detail=f"Batch size exceeds limit ({MAX_BATCH_CALLS})")
+    
+    logger.info("HTTP Batch Tool Call", tools=[call.tool for call in requests])
+    
+    async def run(call: ToolCallRequest) -> Dict[str, Any]:
+        try:
+            result = await dispatch_tool(call.tool, call.arguments)
+        except HTTPException as e:
+            return batch_error("TOOL_NOT_FOUND", e.detail)
+        except Exception as e:
+            logger.error("Tool call failed", tool=call.tool, error=str(e))
+            return batch_error("INTERNAL_ERROR", f"Tool execution failed: {str(e)}")
+        
+        # /mcp/call 對失敗的 Tool 回應 400
+        if result.get("success"):
+            return batch_ok({"success": True, "data": result.get("data")})
+        return batch_error("TOOL_ERROR", result.get("error"))
+    
+    results = await asyncio.gather(*(run(call) for call in requests))
+    return {"success": True, "results": results}
+
+
+async def dispatch_tool(tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    路由到對應的 Tool 方法
+    
+    Raises:
+        HTTPException: Tool 不存在（404）
+    """
+    if tool_name == "query_device_stock":
+        result = await pos.query_device_stock(
+            store_id=args.get("store_id"),
+            os_filter=args.get("os_filter"),
+            min_price=args.get("min_price"),
+            max_price=args.get("max_price")
+        )
+    
+    elif tool_name == "get_device_info":
+        result = await pos.get_device_info(
+            device_id=args.get("device_id")
+        )
+    
+    elif tool_name == "get_recommended_devices":
+        result = await pos.get_recommended_devices(
+            store_id=args.get("store_id"),
+            os_preference=args.get("os_preference"),
+            budget=args.get("budget"),
+            is_flagship=args.get("is_flagship")
+        )
+    
+    elif tool_name == "reserve_device":
+        result = await pos.reserve_device(
+            store_id=args.get("store_id"),
+            device_id=args.get("device_id"),
+            customer_id=args.get("customer_id"),
+            phone_number=args.get("phone_number")
+        )
+    
+    elif tool_name == "get_device_pricing":
+        result = await pos.get_device_pricing(
+            device_id=args.get("device_id"),
+            plan_type=args.get("plan_type")
+        )
+    
+    else:
+        raise HTTPException(status_code=404, detail=f"Tool '{tool_name}' not found")
+    
+    return result
+
+
 @app.on_event("startup")
 async def startup_event():
     """應用啟動事件"""
@@ -319,6 +377,7 @@ async def startup_event():
     print(f"📍 URL: http://localhost:8002")
     print(f"📚 API Docs: http://localhost:8002/docs")
     print(f"🔧 Tools: 5 個")
+    print(f"🔀 Batch: POST /mcp/batch（上限 {MAX_BATCH_CALLS} 筆）")
     print(f"📦 設備: {len(pos.mock_devices)} 個")
     print(f"🏪 門市: {len(pos.mock_stock)} 間")
     print("="*60 + "\n")
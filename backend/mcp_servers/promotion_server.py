@@ -4,8 +4,9 @@ Promotion MCP Server
 提供促銷方案管理相關的 MCP Tools：
 1. search_promotions - 搜尋促銷方案 (RAG)
 2. get_plan_details - 取得方案詳情
-3. compare_plans - 比較方案
-4. calculate_upgrade_cost - 計算升級費用
+3. get_plans_details - 批次取得方案詳情
+4. compare_plans - 比較方案
+5. calculate_upgrade_cost - 計算升級費用
 
 Sprint 5 實作
 """
@@ -20,7 +21,10 @@ import structlog
 current_dir = Path(__file__).parent
 sys.path.insert(0, str(current_dir))
 
-from common.base_server import BaseMCPServer
+from common.base_server import BaseMCPServer, configure_stdio_logging
+from common.plan_catalog import PlanCatalog
+from common.promotion_index import PromotionSearchIndex
+from common.vector_index import VectorIndex
 
 logger = structlog.get_logger()
 
@@ -42,12 +46,30 @@ class PromotionServer(BaseMCPServer):
         # Mock 費率方案資料
         self.plans = self._init_mock_plans()
         
+        # 方案索引（plan_id 查詢、方案 -> 適用促銷）
+        self.plan_catalog = PlanCatalog(self.plans, self.promotions)
+        
+        # 促銷方案搜尋索引（倒排索引 + BM25，並以本機向量索引做混合檢索）
+        self.search_index = PromotionSearchIndex(self.promotions, vector_index=VectorIndex())
+        
+        self.register_tools()
+        
         logger.info(
             "Promotion MCP Server 已初始化",
             promotions_count=len(self.promotions),
             plans_count=len(self.plans)
         )
     
+    def upsert_promotion(self, promo: Dict[str, Any]):
+        """新增或更新促銷（同步更新方案對照與搜尋索引）"""
+        self.plan_catalog.upsert_promotion(promo)
+        self.search_index.upsert(promo)
+    
+    def remove_promotion(self, promotion_id: str):
+        """刪除促銷（同步更新方案對照與搜尋索引）"""
+        self.plan_catalog.remove_promotion(promotion_id)
+        self.search_index.remove(promotion_id)
+    
     def _init_mock_promotions(self) -> List[Dict[str, Any]]:
         """初始化 Mock 促銷方案資料"""
         return [
@@ -311,17 +333,19 @@ class PromotionServer(BaseMCPServer):
         self,
         query: str,
         contract_type: Optional[str] = None,
-        limit: int = 5
+        limit: int = 5,
+        mode: Optional[str] = None
     ) -> Dict[str, Any]:
         """搜尋促銷方案 (RAG)
         
         使用語意搜尋找出最相關的促銷方案
-        目前使用 Mock 關鍵字比對，未來可整合 Azure AI Search
+        關鍵字（倒排索引 + BM25）與本機向量檢索混合排序，不需外部搜尋服務
         
         Args:
             query: 搜尋查詢（自然語言）
             contract_type: 合約類型篩選（攜碼/續約/新申辦）
             limit: 回傳筆數限制
+            mode: keyword、vector 或 hybrid（預設讀取 PROMOTION_SEARCH_MODE）
         
         Returns:
             {
@@ -338,56 +362,24 @@ class PromotionServer(BaseMCPServer):
         )
         
         try:
-            # 簡易關鍵字比對（未來替換為 RAG）
-            query_lower = query.lower()
-            matched_promotions = []
+            # 合約類型以 bitmap 篩選，依 BM25 分數與優先順序取前 limit 筆
+            matched, total = self.search_index.search(query, contract_type, limit, mode)
             
-            for promo in self.promotions:
-                score = 0
-                
-                # 檢查關鍵字
-                for keyword in promo["keywords"]:
-                    if keyword in query_lower or keyword.lower() in query_lower:
-                        score += 10
-                
-                # 檢查標題
-                if any(word in promo["title"] for word in query.split()):
-                    score += 5
-                
-                # 檢查描述
-                if any(word in promo["description"] for word in query.split()):
-                    score += 3
-                
-                # 合約類型篩選
-                if contract_type:
-                    if contract_type in promo["eligibility"].get("contract_type", []):
-                        score += 20
-                    else:
-                        continue  # 不符合合約類型，跳過
-                
-                if score > 0:
-                    promo_copy = promo.copy()
-                    promo_copy["relevance_score"] = score
-                    matched_promotions.append(promo_copy)
-            
-            # 依相關性排序
-            matched_promotions.sort(
-                key=lambda x: (x["relevance_score"], x["priority"]),
-                reverse=True
-            )
-            
-            # 限制回傳筆數
-            result_promotions = matched_promotions[:limit]
+            result_promotions = []
+            for promo, score in matched:
+                promo_copy = promo.copy()
+                promo_copy["relevance_score"] = round(score, 4)
+                result_promotions.append(promo_copy)
             
             logger.info(
                 "促銷方案搜尋完成",
-                total_matched=len(matched_promotions),
+                total_matched=total,
                 returned=len(result_promotions)
             )
             
             return {
                 "promotions": result_promotions,
-                "total": len(matched_promotions),
+                "total": total,
                 "query": query
             }
             
@@ -407,37 +399,22 @@ class PromotionServer(BaseMCPServer):
             plan_id: 方案 ID
         
         Returns:
-            方案詳細資訊，若不存在則回傳 None
+            方案詳細資訊（唯讀，所有呼叫端共用），若不存在則回傳 None
         """
         logger.info("取得方案詳情", plan_id=plan_id)
         
         try:
-            # 查詢方案
-            plan = next((p for p in self.plans if p["plan_id"] == plan_id), None)
+            # 方案詳情（含適用促銷）已預先建立索引
+            result = self.plan_catalog.get_details(plan_id)
             
-            if not plan:
+            if result is None:
                 logger.warning("方案不存在", plan_id=plan_id)
                 return None
             
-            # 查詢適用的促銷活動
-            applicable_promotions = []
-            for promo in self.promotions:
-                if plan_id in promo.get("plans", []):
-                    applicable_promotions.append({
-                        "promotion_id": promo["promotion_id"],
-                        "title": promo["title"],
-                        "benefits": promo["benefits"]
-                    })
-            
-            # 組合完整資訊
-            result = plan.copy()
-            result["applicable_promotions"] = applicable_promotions
-            result["total_promotions"] = len(applicable_promotions)
-            
             logger.info(
                 "方案詳情查詢成功",
                 plan_id=plan_id,
-                promotions_count=len(applicable_promotions)
+                promotions_count=result["total_promotions"]
             )
             
             return result
@@ -446,6 +423,39 @@ class PromotionServer(BaseMCPServer):
             logger.error("取得方案詳情失敗", plan_id=plan_id, error=str(e))
             return None
     
+    async def get_plans_details(self, plan_ids: List[str]) -> Dict[str, Any]:
+        """批次取得方案詳情
+        
+        一次取得多個方案，避免逐一呼叫 get_plan_details（HTTP 傳輸時每次都是一個往返）
+        
+        Args:
+            plan_ids: 方案 ID 列表（重複的 ID 只回傳一次）
+        
+        Returns:
+            {
+                "plans": {plan_id: 方案詳細資訊（唯讀）},
+                "not_found": [不存在的方案 ID]
+            }
+        """
+        logger.info("批次取得方案詳情", count=len(plan_ids))
+        
+        plans = {}
+        not_found = []
+        for plan_id in dict.fromkeys(plan_ids):
+            details = self.plan_catalog.get_details(plan_id)
+            if details is None:
+                not_found.append(plan_id)
+            else:
+                plans[plan_id] = details
+        
+        if not_found:
+            logger.warning("方案不存在", plan_ids=not_found)
+        
+        return {
+            "plans": plans,
+            "not_found": not_found
+        }
+    
     async def compare_plans(
         self,
         plan_ids: List[str]
@@ -474,50 +484,23 @@ class PromotionServer(BaseMCPServer):
                     "comparison": {}
                 }
             
-            # 取得方案詳情
-            plans = []
-            for plan_id in plan_ids:
-                plan = await self.get_plan_details(plan_id)
-                if plan:
-                    plans.append(plan)
-                else:
-                    logger.warning("方案不存在", plan_id=plan_id)
+            # 比較結果由方案索引快取（同一組方案不論順序只計算一次，方案或促銷變更後失效）
+            result = self.plan_catalog.compare(plan_ids)
             
-            if not plans:
+            not_found = [plan_id for plan_id in plan_ids if self.plan_catalog.get_plan(plan_id) is None]
+            if not_found:
+                logger.warning("方案不存在", plan_ids=not_found)
+            
+            if result is None:
                 return {
                     "error": "沒有找到有效的方案",
                     "plans": [],
                     "comparison": {}
                 }
             
-            # 建立比較表
-            comparison = {
-                "monthly_fee": {
-                    "min": min(p["monthly_fee"] for p in plans),
-                    "max": max(p["monthly_fee"] for p in plans),
-                    "values": {p["plan_id"]: p["monthly_fee"] for p in plans}
-                },
-                "data": {
-                    "values": {p["plan_id"]: p["data"] for p in plans}
-                },
-                "voice": {
-                    "values": {p["plan_id"]: p["voice"] for p in plans}
-                },
-                "contract_months": {
-                    "values": {p["plan_id"]: p["contract_months"] for p in plans}
-                }
-            }
-            
-            # 生成建議
-            recommendation = self._generate_recommendation(plans)
-            
-            logger.info("方案比較完成", plans_count=len(plans))
+            logger.info("方案比較完成", plans_count=len(result["plans"]))
             
-            return {
-                "plans": plans,
-                "comparison": comparison,
-                "recommendation": recommendation
-            }
+            return result
             
         except Exception as e:
             logger.error("比較方案失敗", error=str(e))
@@ -527,31 +510,6 @@ class PromotionServer(BaseMCPServer):
                 "comparison": {}
             }
     
-    def _generate_recommendation(self, plans: List[Dict[str, Any]]) -> str:
-        """生成方案推薦建議"""
-        if not plans:
-            return "無法提供建議"
-        
-        if len(plans) == 1:
-            return f"目前只有一個方案 {plans[0]['name']}"
-        
-        # 找出最便宜的
-        cheapest = min(plans, key=lambda x: x["monthly_fee"])
-        # 找出數據最多的
-        unlimited_data = [p for p in plans if "無限" in p["data"]]
-        
-        recommendations = []
-        recommendations.append(
-            f"🏷️ 最經濟實惠：{cheapest['name']} (月租 ${cheapest['monthly_fee']})"
-        )
-        
-        if unlimited_data:
-            recommendations.append(
-                f"🚀 重度使用者：{unlimited_data[0]['name']} (上網吃到飽)"
-            )
-        
-        return " | ".join(recommendations)
-    
     async def calculate_upgrade_cost(
         self,
         current_plan_fee: int,
@@ -645,97 +603,129 @@ class PromotionServer(BaseMCPServer):
             logger.error("計算升級費用失敗", error=str(e))
             return {"error": str(e)}
     
-    def get_tools_schema(self) -> List[Dict[str, Any]]:
-        """取得所有 Tools 的 Schema"""
-        return [
-            {
-                "name": "search_promotions",
-                "description": "搜尋促銷方案，使用自然語言查詢找出最相關的促銷活動",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": "搜尋查詢（自然語言），例如：吃到飽方案、學生優惠、攜碼優惠"
-                        },
-                        "contract_type": {
-                            "type": "string",
-                            "description": "合約類型篩選",
-                            "enum": ["攜碼", "續約", "新申辦"]
-                        },
-                        "limit": {
-                            "type": "integer",
-                            "description": "回傳筆數限制",
-                            "default": 5
-                        }
+    def register_tools(self):
+        """註冊所有 Promotion Tools"""
+        
+        self.add_tool(
+            name="search_promotions",
+            description="搜尋促銷方案，使用自然語言查詢找出最相關的促銷活動",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "搜尋查詢（自然語言），例如：吃到飽方案、學生優惠、攜碼優惠"
                     },
-                    "required": ["query"]
-                }
-            },
-            {
-                "name": "get_plan_details",
-                "description": "取得方案詳細資訊，包含費率、數據、通話、適用促銷等",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "plan_id": {
-                            "type": "string",
-                            "description": "方案 ID，例如：PLAN001"
-                        }
+                    "contract_type": {
+                        "type": "string",
+                        "description": "合約類型篩選",
+                        "enum": ["攜碼", "續約", "新申辦"]
                     },
-                    "required": ["plan_id"]
-                }
-            },
-            {
-                "name": "compare_plans",
-                "description": "比較多個方案的內容與差異，最多可比較 4 個方案",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "plan_ids": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "方案 ID 列表，例如：['PLAN001', 'PLAN002']",
-                            "maxItems": 4
-                        }
+                    "limit": {
+                        "type": "integer",
+                        "description": "回傳筆數限制",
+                        "default": 5
                     },
-                    "required": ["plan_ids"]
-                }
+                    "mode": {
+                        "type": "string",
+                        "description": "檢索方式：keyword（關鍵字）、vector（向量）或 hybrid（混合），選填",
+                        "enum": ["keyword", "vector", "hybrid"]
+                    }
+                },
+                "required": ["query"]
             },
-            {
-                "name": "calculate_upgrade_cost",
-                "description": "計算從現有方案升級到新方案的費用，包含手機折扣",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "current_plan_fee": {
-                            "type": "integer",
-                            "description": "目前方案月租費"
-                        },
-                        "new_plan_id": {
-                            "type": "string",
-                            "description": "新方案 ID"
-                        },
-                        "device_price": {
-                            "type": "integer",
-                            "description": "手機價格",
-                            "default": 0
-                        },
-                        "contract_type": {
-                            "type": "string",
-                            "description": "合約類型",
-                            "enum": ["攜碼", "續約", "新申辦"],
-                            "default": "續約"
-                        }
+            handler=self.search_promotions
+        )
+        
+        self.add_tool(
+            name="get_plan_details",
+            description="取得方案詳細資訊，包含費率、數據、通話、適用促銷等",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "plan_id": {
+                        "type": "string",
+                        "description": "方案 ID，例如：PLAN001"
+                    }
+                },
+                "required": ["plan_id"]
+            },
+            handler=self.get_plan_details
+        )
+        
+        self.add_tool(
+            name="get_plans_details",
+            description="批次取得多個方案的詳細資訊，包含費率、數據、通話、適用促銷等",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "plan_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "方案 ID 列表，例如：['PLAN001', 'PLAN002']"
+                    }
+                },
+                "required": ["plan_ids"]
+            },
+            handler=self.get_plans_details
+        )
+        
+        self.add_tool(
+            name="compare_plans",
+            description="比較多個方案的內容與差異，最多可比較 4 個方案",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "plan_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "方案 ID 列表，例如：['PLAN001', 'PLAN002']",
+                        "maxItems": 4
+                    }
+                },
+                "required": ["plan_ids"]
+            },
+            handler=self.compare_plans
+        )
+        
+        self.add_tool(
+            name="calculate_upgrade_cost",
+            description="計算從現有方案升級到新方案的費用，包含手機折扣",
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "current_plan_fee": {
+                        "type": "integer",
+                        "description": "目前方案月租費"
                     },
-                    "required": ["current_plan_fee", "new_plan_id"]
-                }
-            }
-        ]
+                    "new_plan_id": {
+                        "type": "string",
+                        "description": "新方案 ID"
+                    },
+                    "device_price": {
+                        "type": "integer",
+                        "description": "手機價格",
+                        "default": 0
+                    },
+                    "contract_type": {
+                        "type": "string",
+                        "description": "合約類型",
+                        "enum": ["攜碼", "續約", "新申辦"],
+                        "default": "續約"
+                    }
+                },
+                "required": ["current_plan_fee", "new_plan_id"]
+            },
+            handler=self.calculate_upgrade_cost
+        )
+        
+        logger.info("已註冊 5 個 Promotion Tools")
 
 
 async def main():
     """Promotion MCP Server 主程式"""
+    # stdout 為 MCP 通訊使用，日誌改輸出到 stderr
+    configure_stdio_logging()
     logger.info("啟動 Promotion MCP Server")
     
     # 建立 server
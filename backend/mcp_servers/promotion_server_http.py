@@ -13,11 +13,13 @@ API 端點:
     GET  /health        - 健康檢查
     GET  /mcp/tools     - 取得所有 Tools Schema
     POST /mcp/call      - 呼叫指定 Tool
+    POST /mcp/batch     - 批次呼叫多個 Tool（並行執行，結果依請求順序返回）
 """
+import asyncio
 import os
 import sys
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import structlog
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse
@@ -28,6 +30,7 @@ current_dir = Path(__file__).parent
 sys.path.insert(0, str(current_dir))
 
 from promotion_server import PromotionServer
+from common.base_server import batch_ok, batch_error
 
 # 設定 structlog
 structlog.configure(
@@ -50,6 +53,9 @@ app = FastAPI(
 # Promotion Server 實例
 promotion_server: PromotionServer = None
 
+# 每次批次呼叫的上限
+MAX_BATCH_CALLS = int(os.getenv("MCP_BATCH_MAX_CALLS", "50"))
+
 
 class MCPCallRequest(BaseModel):
     """MCP Tool 呼叫請求"""
@@ -92,11 +98,13 @@ async def root():
         "endpoints": {
             "health": "/health",
             "tools": "/mcp/tools",
-            "call": "/mcp/call"
+            "call": "/mcp/call",
+            "batch": "/mcp/batch"
         },
         "tools": [
             "search_promotions",
             "get_plan_details",
+            "get_plans_details",
             "compare_plans",
             "calculate_upgrade_cost"
         ]
@@ -110,7 +118,8 @@ async def health_check():
         "status": "healthy",
         "service": "promotion-mcp-server",
         "promotions_count": len(promotion_server.promotions) if promotion_server else 0,
-        "plans_count": len(promotion_server.plans) if promotion_server else 0
+        "plans_count": len(promotion_server.plans) if promotion_server else 0,
+        "vector_index": promotion_server.search_index.vector_index.get_stats() if promotion_server else None
     }
 
 
@@ -146,20 +155,9 @@ async def call_tool(request: MCPCallRequest) -> MCPCallResponse:
     )
     
     try:
-        # 根據 Tool 名稱呼叫對應方法
-        if request.tool == "search_promotions":
-            result = await promotion_server.search_promotions(**request.arguments)
-            
-        elif request.tool == "get_plan_details":
-            result = await promotion_server.get_plan_details(**request.arguments)
-            
-        elif request.tool == "compare_plans":
-            result = await promotion_server.compare_plans(**request.arguments)
-            
-        elif request.tool == "calculate_upgrade_cost":
-            result = await promotion_server.calculate_upgrade_cost(**request.arguments)
-            
-        else:
+        result = await dispatch_tool(request.tool, request.arguments)
+        
+        if result is None:
             logger.warning("未知的 Tool", tool=request.tool)
             return MCPCallResponse(
                 success=False,
@@ -186,6 +184,61 @@ async def call_tool(request: MCPCallRequest) -> MCPCallResponse:
         )
 
 
+@app.post("/mcp/batch")
+async def batch_call_tools(requests: List[MCPCallRequest]):
+    """
+    批次呼叫 MCP Tools（並行執行，結果依請求順序返回）
+    
+    Returns:
+        {"success": true, "results": [{"ok": true, "result": 同 /mcp/call 的回應} 或
+                                      {"ok": false, "error": {"code", "message"}}]}
+    """
+    if not promotion_server:
+        raise HTTPException(status_code=500, detail="Promotion Server 未初始化")
+    
+    if len(requests) > MAX_BATCH_CALLS:
+        raise HTTPException(status_code=400, detail=f"批次呼叫最多 {MAX_BATCH_CALLS} 個 Tool")
+    
+    async def run(request: MCPCallRequest) -> Dict[str, Any]:
+        try:
+            result = await dispatch_tool(request.tool, request.arguments)
+        except Exception as e:
+            logger.error("Tool 呼叫失敗", tool=request.tool, error=str(e))
+            return batch_error("INTERNAL_ERROR", str(e))
+        
+        if result is None:
+            return batch_error("TOOL_NOT_FOUND", f"未知的 Tool: {request.tool}")
+        return batch_ok(MCPCallResponse(success=True, result=result).model_dump())
+    
+    results = await asyncio.gather(*(run(request) for request in requests))
+    return {"success": True, "results": results}
+
+
+async def dispatch_tool(tool: str, arguments: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    根據 Tool 名稱呼叫對應方法
+    
+    Returns:
+        Tool 執行結果（Tool 不存在時返回 None）
+    """
+    if tool == "search_promotions":
+        return await promotion_server.search_promotions(**arguments)
+    
+    elif tool == "get_plan_details":
+        return await promotion_server.get_plan_details(**arguments)
+    
+    elif tool == "get_plans_details":
+        return await promotion_server.get_plans_details(**arguments)
+    
+    elif tool == "compare_plans":
+        return await promotion_server.compare_plans(**arguments)
+    
+    elif tool == "calculate_upgrade_cost":
+        return await promotion_server.calculate_upgrade_cost(**arguments)
+    
+    return None
+
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -0,0 +1,305 @@
+"""
+測試 AIConversationManager 生命週期
+以簡單的假 MCP Client 取代 HTTP 連線，不需要啟動 MCP Server
+"""
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# 添加 backend 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services.ai_conversation_manager import AIConversationManager
+from app.services.redis_manager import RedisManager, MockRedis
+from app.services.workflow_session import WorkflowSessionManager
+
+
+class FakeMCPClient:
+    """記錄初始化與關閉次數的假 MCP Client"""
+
+    def __init__(self):
+        self.initialize_calls = 0
+        self.closed = False
+
+    async def initialize(self):
+        self.initialize_calls += 1
+        await asyncio.sleep(0)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def ai_manager(monkeypatch):
+    """共用 RedisManager 的 AI 對話管理器"""
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com/")
+
+    redis_manager = RedisManager()
+    redis_manager.redis = MockRedis()
+
+    manager = AIConversationManager(redis_manager=redis_manager)
+    manager.crm_client = FakeMCPClient()
+    manager.pos_client = FakeMCPClient()
+    manager.promotion_client = FakeMCPClient()
+    return manager
+
+
+class TestLifecycle:
+    """共用實例的初始化與關閉"""
+
+    @pytest.mark.asyncio
+    async def test_initialize_once(self, ai_manager):
+        """並行呼叫 initialize 只會初始化一次"""
+        await asyncio.gather(*(ai_manager.initialize() for _ in range(5)))
+        await ai_manager.initialize()
+
+        assert ai_manager.initialized
+        assert ai_manager.crm_client.initialize_calls == 1
+        assert ai_manager.promotion_client.initialize_calls == 1
+
+    @pytest.mark.asyncio
+    async def test_close_keeps_shared_redis(self, ai_manager):
+        """關閉時不關閉共用的 RedisManager"""
+        closed = []
+
+        async def close_redis():
+            closed.append(True)
+
+        ai_manager.redis_manager.close = close_redis
+        await ai_manager.initialize()
+
+        await ai_manager.close()
+
+        assert ai_manager.crm_client.closed
+        assert not ai_manager.initialized
+        assert closed == []
+
+
+def tool_call_chunk(index, call_id, name, arguments):
+    """建立含單一 tool call 的串流 chunk"""
+    tool_call = SimpleNamespace(
+        index=index,
+        id=call_id,
+        function=SimpleNamespace(name=name, arguments=arguments)
+    )
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None, tool_calls=[tool_call]))])
+
+
+def content_chunk(text):
+    """建立文字內容的串流 chunk"""
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text, tool_calls=None))])
+
+
+def usage_chunk(prompt_tokens, completion_tokens):
+    """建立串流最後的 usage chunk（choices 為空）"""
+    return SimpleNamespace(
+        choices=[],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    )
+
+
+class FakeCompletions:
+    """依序回傳預先準備的串流回應，並記錄每次送出的 messages"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.stream_options = []
+
+    async def create(self, **kwargs):
+        self.requests.append(json.loads(json.dumps(kwargs["messages"], ensure_ascii=False)))
+        self.stream_options.append(kwargs.get("stream_options"))
+        chunks = self.responses.pop(0)
+
+        async def stream():
+            for chunk in chunks:
+                yield chunk
+
+        return stream()
+
+
+def parse_events(events):
+    """將 SSE 字串轉為 (event, data) 列表"""
+    parsed = []
+    for event in events:
+        name_line, data_line = event.strip().split("\n")
+        parsed.append((name_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return parsed
+
+
+class TestParallelToolCalls:
+    """同一輪多個 Tool Calls 並行執行"""
+
+    @pytest.mark.asyncio
+    async def test_runs_concurrently_with_timeout(self, ai_manager):
+        """並行執行、依完成順序產出，逾時的工具回傳錯誤"""
+        delays = {"slow": 0.2, "fast": 0.05, "stuck": 5}
+
+        async def call_function(name, arguments):
+            await asyncio.sleep(delays[name])
+            return {"name": name}
+
+        ai_manager._call_function = call_function
+        ai_manager.tool_timeout = 0.3
+
+        started = time.monotonic()
+        results = [
+            item async for item in ai_manager._execute_tool_calls(
+                [("slow", {}), ("fast", {}), ("stuck", {})]
+            )
+        ]
+        elapsed = time.monotonic() - started
+
+        assert [index for index, _ in results] == [1, 0, 2]
+        assert results[2][1] == {"error": "Function 調用逾時: stuck"}
+        assert elapsed < 0.6
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limit(self, ai_manager):
+        """同時執行的工具數量不超過上限"""
+        running = []
+        peak = []
+
+        async def call_function(name, arguments):
+            running.append(name)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(name)
+            return {}
+
+        ai_manager._call_function = call_function
+        ai_manager.tool_concurrency = 2
+
+        results = [item async for item in ai_manager._execute_tool_calls([(f"t{i}", {}) for i in range(6)])]
+
+        assert len(results) == 6
+        assert max(peak) == 2
+
+    @pytest.mark.asyncio
+    async def test_chat_stream_keeps_tool_call_order(self, ai_manager):
+        """結果依完成順序串流，但送回模型的 tool 訊息維持原始順序"""
+        workflow_manager = WorkflowSessionManager(ai_manager.redis_manager)
+        session_id = (await workflow_manager.create_session("STAFF001"))["session_id"]
+
+        async def call_function(name, arguments):
+            await asyncio.sleep(0.1 if name == "compare_plans" else 0.01)
+            return {"name": name}
+
+        ai_manager._call_function = call_function
+        ai_manager._log_ai_usage = lambda **kwargs: asyncio.sleep(0)
+        completions = FakeCompletions([
+            [
+                tool_call_chunk(0, "call_1", "compare_plans", '{"plan_ids": ["PLAN001"]}'),
+                tool_call_chunk(1, "call_2", "query_device_stock", '{"store_id": "STORE001"}'),
+            ],
+            [content_chunk("比較完成")],
+        ])
+        ai_manager.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+        events = parse_events([
+            event async for event in ai_manager.chat_stream(session_id, "比較方案並查庫存", "STAFF001")
+        ])
+
+        results = [data["name"] for name, data in events if name == "function_result"]
+        assert results == ["query_device_stock", "compare_plans"]
+        assert events[-1][0] == "done"
+
+        second_request = completions.requests[1]
+        assert second_request[-3]["role"] == "assistant"
+        assert [m["tool_call_id"] for m in second_request[-2:]] == ["call_1", "call_2"]
+
+
+class TestTokenUsage:
+    """串流回應的 Token 使用量"""
+
+    async def _run_chat(self, ai_manager, responses):
+        workflow_manager = WorkflowSessionManager(ai_manager.redis_manager)
+        session_id = (await workflow_manager.create_session("STAFF001"))["session_id"]
+
+        async def call_function(name, arguments):
+            return {"name": name}
+
+        ai_manager._call_function = call_function
+        ai_manager._log_ai_usage = lambda **kwargs: asyncio.sleep(0)
+        completions = FakeCompletions(responses)
+        ai_manager.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+        events = parse_events([
+            event async for event in ai_manager.chat_stream(session_id, "查詢方案", "STAFF001")
+        ])
+        return session_id, completions, events[-1][1]["tokens"]
+
+    @pytest.mark.asyncio
+    async def test_uses_reported_usage(self, ai_manager):
+        """累加每一輪 API 回傳的 usage，並寫入 Session 與門市人員計數"""
+        session_id, completions, tokens = await self._run_chat(ai_manager, [
+            [tool_call_chunk(0, "call_1", "get_plans", "{}"), usage_chunk(120, 15)],
+            [content_chunk("推薦方案 A"), usage_chunk(200, 30)],
+        ])
+
+        assert completions.stream_options == [{"include_usage": True}] * 2
+        assert tokens == {"prompt": 320, "completion": 45, "total": 365, "estimated": False}
+
+        session_usage = await ai_manager.usage_tracker.get_session_usage(session_id)
+        staff_usage = await ai_manager.usage_tracker.get_staff_usage("STAFF001")
+        assert session_usage["total_tokens"] == 365
+        assert session_usage["requests"] == 1
+        assert session_usage["cost"] > 0
+        assert staff_usage == session_usage
+
+    @pytest.mark.asyncio
+    async def test_estimates_when_usage_missing(self, ai_manager):
+        """串流沒有 usage 時改用估算並標記 estimated"""
+        _, _, tokens = await self._run_chat(ai_manager, [[content_chunk("推薦方案 A")]])
+
+        assert tokens["estimated"] is True
+        assert tokens["prompt"] > 0
+        assert tokens["completion"] > 0
+
+
+class TestChatSummary:
+    """對話摘要於背景執行"""
+
+    @pytest.mark.asyncio
+    async def test_summary_runs_in_background(self, ai_manager):
+        started = asyncio.Event()
+        release = asyncio.Event()
+        calls = []
+
+        async def update_chat_summary(workflow_manager, session_id, staff_id):
+            calls.append(session_id)
+            started.set()
+            await release.wait()
+
+        ai_manager._update_chat_summary = update_chat_summary
+
+        ai_manager._schedule_chat_summary(None, "renewal_1", "STAFF001")
+        ai_manager._schedule_chat_summary(None, "renewal_1", "STAFF001")
+        await started.wait()
+
+        # 同一 Session 只執行一個摘要工作
+        assert calls == ["renewal_1"]
+        release.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert ai_manager._summary_tasks == {}
+
+    @pytest.mark.asyncio
+    async def test_close_cancels_pending_summary(self, ai_manager):
+        async def update_chat_summary(workflow_manager, session_id, staff_id):
+            await asyncio.sleep(60)
+
+        ai_manager._update_chat_summary = update_chat_summary
+        ai_manager._schedule_chat_summary(None, "renewal_1", "STAFF001")
+        task = ai_manager._summary_tasks["renewal_1"]
+
+        await ai_manager.close()
+
+        assert task.cancelled()
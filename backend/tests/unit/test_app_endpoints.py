@@ -0,0 +1,65 @@
+"""
+測試健康檢查與運行指標端點
+"""
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# 添加 backend 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.main import create_app
+from app.services.redis_manager import RedisManager, MockRedis
+
+
+async def create_test_app(role: str):
+    """建立使用 MockRedis 的應用程式，並寫入指定角色的 Session"""
+    app = create_app()
+    app.redis_manager = RedisManager()
+    app.redis_manager.redis = MockRedis()
+    await app.redis_manager.set_json("session:S1", {
+        "session_id": "S1",
+        "staff_id": 1,
+        "staff_code": "S001",
+        "name": "測試",
+        "role": role,
+        "store_id": 1,
+        "login_time": datetime.now().isoformat(),
+        "expire_time": (datetime.now() + timedelta(hours=1)).isoformat()
+    })
+    return app
+
+
+@pytest.mark.asyncio
+async def test_health_is_liveness_only():
+    """/health 不公開連線池、快取等內部狀態"""
+    app = await create_test_app("Sales")
+
+    response = await app.test_client().get("/health")
+
+    assert response.status_code == 200
+    assert set(await response.get_json()) == {"status", "service", "version"}
+
+
+@pytest.mark.asyncio
+async def test_metrics_requires_manager_role():
+    """/api/metrics 需登入且限主管與管理員"""
+    app = await create_test_app("Sales")
+    client = app.test_client()
+
+    anonymous = await client.get("/api/metrics")
+    sales = await client.get("/api/metrics", headers={"X-Session-ID": "S1"})
+    await app.redis_manager.set_json("session:S1", {
+        **await app.redis_manager.get_json("session:S1"), "role": "Manager"
+    })
+    manager = await client.get("/api/metrics", headers={"X-Session-ID": "S1"})
+
+    assert anonymous.status_code == 401
+    assert sales.status_code == 401
+    assert manager.status_code == 200
+    body = await manager.get_json()
+    assert body["redis"] == {"mode": "mock"}
+    assert {"mcp_http", "mcp_cache", "mcp_stdio", "ai_usage_log"} <= set(body)
@@ -0,0 +1,304 @@
+"""
+測試 DatabaseManager 連線池模式
+以假的非同步連線池取代 Oracle，驗證連線歸還、統計與失敗時的行為
+"""
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# 添加 backend 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services import database
+from app.services.database import DatabaseManager, MockConnection
+
+
+class FakeCursor:
+    """非同步 Cursor（execute / fetchall 需 await）"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    async def execute(self, sql, params=None):
+        if "FAIL" in sql:
+            raise RuntimeError("ORA-00001: unique constraint violated")
+        self.connection.statements.append((sql, params))
+        self.description = [("PLAN_ID",), ("NAME",)]
+        self.rows = [(f"PLAN{i:03d}", f"方案{i}") for i in range(1, self.connection.row_count + 1)]
+        self.rowcount = len(self.rows)
+
+    async def executemany(self, sql, params_list, batcherrors=False):
+        self.connection.statements.append((sql, params_list))
+        self.batch_errors = [
+            SimpleNamespace(offset=i, message="ORA-02291: integrity constraint violated")
+            for i, params in enumerate(params_list) if params.get("a") is None
+        ] if batcherrors else []
+        self.rowcount = len(params_list) - len(self.batch_errors)
+
+    def getbatcherrors(self):
+        return self.batch_errors
+
+    async def fetchall(self):
+        return self.rows
+
+    async def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        self.connection.fetch_sizes.append(size)
+        return batch
+
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.row_count = 2
+        self.fetch_sizes = []
+        self.cursors = []
+
+    def cursor(self):
+        cursor = FakeCursor(self)
+        self.cursors.append(cursor)
+        return cursor
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+    async def ping(self):
+        pass
+
+
+class FakeAcquire:
+    """與 oracledb 相同，acquire() 可直接 await 或作為 async with 使用"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def _acquire(self):
+        if self.pool.fail:
+            raise OSError("DPY-6005: cannot connect to database")
+        self.pool.busy += 1
+        return self.pool.connection
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+    async def __aenter__(self):
+        return await self._acquire()
+
+    async def __aexit__(self, *exc):
+        await self.pool.release(self.pool.connection)
+
+
+class FakePool:
+    """記錄取出與歸還的假連線池"""
+
+    def __init__(self, fail=False):
+        self.min = 2
+        self.max = 10
+        self.opened = 2
+        self.fail = fail
+        self.connection = FakeConnection()
+        self.busy = 0
+
+    def acquire(self):
+        return FakeAcquire(self)
+
+    async def release(self, connection):
+        self.busy -= 1
+
+    async def close(self, force=False):
+        pass
+
+
+def create_db_manager(pool):
+    manager = DatabaseManager()
+    manager.pool = pool
+    manager.dsn = "localhost:1521/XEPDB1"
+    manager.use_real_db = True
+    return manager
+
+
+class TestPool:
+    """連線池模式"""
+
+    @pytest.mark.asyncio
+    async def test_query_releases_connection(self):
+        pool = FakePool()
+        db = create_db_manager(pool)
+
+        rows = await db.execute_query("SELECT plan_id, name FROM plans")
+
+        assert rows == [
+            {"PLAN_ID": "PLAN001", "NAME": "方案1"},
+            {"PLAN_ID": "PLAN002", "NAME": "方案2"},
+        ]
+        assert pool.busy == 0
+        assert db.get_pool_stats()["acquire_count"] == 1
+
+    @pytest.mark.asyncio
+    async def test_execute_many_commits_once(self):
+        pool = FakePool()
+        db = create_db_manager(pool)
+
+        count = await db.execute_many("INSERT INTO t VALUES (:a)", [{"a": 1}, {"a": 2}])
+
+        assert count == 2
+        assert pool.connection.commits == 1
+        assert pool.busy == 0
+
+    @pytest.mark.asyncio
+    async def test_acquire_failure(self):
+        """取不到連線時查詢退回模擬連線，批次寫入則拋出例外"""
+        db = create_db_manager(FakePool(fail=True))
+
+        async with db.get_connection() as conn:
+            assert isinstance(conn, MockConnection)
+
+        with pytest.raises(ConnectionError):
+            await db.execute_many("INSERT INTO t VALUES (:a)", [{"a": 1}])
+
+        assert db.get_pool_stats()["acquire_errors"] == 2
+
+    @pytest.mark.asyncio
+    async def test_mock_mode_stats(self):
+        db = DatabaseManager()
+        await db.initialize()
+
+        assert db.get_pool_stats() == {"mode": "mock"}
+
+
+class TestBulkAndStreaming:
+    """批次 DML 與分批讀取"""
+
+    @pytest.mark.asyncio
+    async def test_execute_many_batch_errors(self):
+        """個別失敗的列不中斷整批，成功的列照常提交"""
+        pool = FakePool()
+        db = create_db_manager(pool)
+
+        rejected = []
+        count = await db.execute_many(
+            "INSERT INTO t VALUES (:a)",
+            [{"a": 1}, {"a": None}, {"a": 3}],
+            batch_errors=True,
+            rejected=rejected
+        )
+
+        assert count == 2
+        assert rejected == [{"a": None}]
+        assert pool.connection.commits == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_query_in_batches(self):
+        pool = FakePool()
+        pool.connection.row_count = 5
+        db = create_db_manager(pool)
+
+        batches = [rows async for rows in db.stream_query("SELECT plan_id, name FROM plans", batch_size=2)]
+
+        assert [len(rows) for rows in batches] == [2, 2, 1]
+        assert batches[0][0] == ("PLAN001", "方案1")
+        cursor = pool.connection.cursors[0]
+        assert cursor.arraysize == 2
+        assert cursor.prefetchrows == 3
+        assert pool.busy == 0
+
+    @pytest.mark.asyncio
+    async def test_row_formats(self):
+        db = create_db_manager(FakePool())
+
+        tuples = await db.execute_query("SELECT plan_id, name FROM plans", row_format="tuple")
+        named = await db.execute_query("SELECT plan_id, name FROM plans", row_format="namedtuple")
+        streamed = [rows async for rows in db.stream_query("SELECT plan_id, name FROM plans", row_format="dict")]
+
+        assert tuples[1] == ("PLAN002", "方案2")
+        assert named[0].plan_id == "PLAN001"
+        assert named[0].name == "方案1"
+        assert streamed == [[{"PLAN_ID": "PLAN001", "NAME": "方案1"}, {"PLAN_ID": "PLAN002", "NAME": "方案2"}]]
+
+    @pytest.mark.asyncio
+    async def test_mock_connection_row_formats(self):
+        db = DatabaseManager()
+
+        rows = await db.execute_query(
+            "SELECT * FROM staff WHERE staff_code = :staff_code",
+            {"staff_code": "S001"},
+            row_format="namedtuple"
+        )
+
+        assert rows[0].staff_id == "STAFF001"
+
+
+class TestSharedLifecycle:
+    """共用實例：交易與延遲重連"""
+
+    @pytest.mark.asyncio
+    async def test_transaction_commits_once(self):
+        pool = FakePool()
+        db = create_db_manager(pool)
+
+        rowcounts = await db.execute_transaction([
+            ("UPDATE renewal_sessions SET status = 'COMPLETED'", {"session_id": "S1"}),
+            ("INSERT INTO customer_service_logs VALUES (:staff_id)", {"staff_id": "STAFF001"}),
+        ])
+
+        assert len(rowcounts) == 2
+        assert pool.connection.commits == 1
+        assert pool.busy == 0
+
+    @pytest.mark.asyncio
+    async def test_transaction_rolls_back(self):
+        pool = FakePool()
+        db = create_db_manager(pool)
+
+        with pytest.raises(RuntimeError):
+            await db.execute_transaction([
+                ("UPDATE renewal_sessions SET status = 'COMPLETED'", {}),
+                ("INSERT FAIL", {}),
+            ])
+
+        assert pool.connection.commits == 0
+        assert pool.connection.rollbacks == 1
+        assert pool.busy == 0
+
+    @pytest.mark.asyncio
+    async def test_lazy_reconnect(self, monkeypatch):
+        """啟動時無法連線，之後取用連線時重新建立連線池"""
+        pool = FakePool(fail=True)
+        monkeypatch.setattr(database, "ORACLE_AVAILABLE", True)
+        monkeypatch.setattr(database, "oracledb", SimpleNamespace(
+            makedsn=lambda host, port, service_name: f"{host}:{port}/{service_name}",
+            create_pool_async=lambda **kwargs: pool,
+            POOL_GETMODE_TIMEDWAIT=3
+        ))
+        monkeypatch.setenv("USE_REAL_ORACLE_DB", "true")
+
+        db = DatabaseManager()
+        db.reconnect_interval = 0
+        await db.initialize()
+        await db.initialize()
+
+        assert db.pool is None
+        assert db.get_pool_stats()["mode"] == "disconnected"
+
+        pool.fail = False
+        rows = await db.execute_query("SELECT plan_id, name FROM plans")
+
+        assert len(rows) == 2
+        assert db.pool is pool
+        assert db.get_pool_stats()["reconnects"] == 1
@@ -0,0 +1,210 @@
+"""
+測試 POS 設備目錄索引
+"""
+import random
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+# 添加 backend 與 mcp_servers 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+sys.path.insert(0, str(backend_dir / "mcp_servers"))
+
+from common.device_index import DeviceCatalogIndex
+from pos_server import POSServer
+
+
+def create_catalog(store_count: int = 50, device_count: int = 300):
+    """產生大量門市與設備的測試資料"""
+    rng = random.Random(42)
+    devices = {
+        f"DEV{i:04d}": {
+            "device_id": f"DEV{i:04d}",
+            "os": rng.choice(["iOS", "Android"]),
+            "price": rng.randrange(5000, 50000, 100),
+            "popularity_score": rng.randint(60, 95),
+            "is_flagship": rng.random() < 0.3,
+            "release_date": f"{rng.choice([2023, 2024])}-{rng.randint(1, 12):02d}-15"
+        }
+        for i in range(device_count)
+    }
+    stock = {
+        f"STORE{s:03d}": {
+            device_id: {"quantity": rng.randint(0, 10), "reserved": 0}
+            for device_id in rng.sample(sorted(devices), device_count // 2)
+        }
+        for s in range(store_count)
+    }
+    return devices, stock
+
+
+class TestDeviceCatalogIndex:
+    """索引查詢結果與逐筆掃描一致"""
+
+    @pytest.mark.parametrize("os_filter, min_price, max_price", [
+        (None, None, None),
+        ("iOS", None, None),
+        ("android", 10000, 30000),
+        (None, 20000, None),
+        ("Android", None, 15000),
+        ("iOS", 0, 0)
+    ])
+    def test_range_lookup_matches_scan(self, os_filter, min_price, max_price):
+        devices, stock = create_catalog()
+        index = DeviceCatalogIndex(devices, stock)
+
+        for store_id, store_stock in stock.items():
+            expected = {
+                device_id for device_id in store_stock
+                if (not os_filter or devices[device_id]["os"].lower() == os_filter.lower())
+                and (not min_price or devices[device_id]["price"] >= min_price)
+                and (not max_price or devices[device_id]["price"] <= max_price)
+            }
+            found = index.find(store_id, os_filter, min_price, max_price)
+
+            assert set(found) == expected
+            assert [devices[d]["price"] for d in found] == sorted(devices[d]["price"] for d in found)
+
+    def test_unknown_store_returns_nothing(self):
+        index = DeviceCatalogIndex(*create_catalog(store_count=2, device_count=10))
+
+        assert not index.has_store("STORE999")
+        assert index.find("STORE999", "iOS") == []
+
+    def test_reverse_index_and_totals(self):
+        devices, stock = create_catalog()
+        index = DeviceCatalogIndex(devices, stock)
+
+        for device_id in devices:
+            stores = [store_id for store_id in stock if device_id in stock[store_id]]
+            assert index.stores_for(device_id) == stores
+            assert index.totals_for(device_id)["total_stock"] == sum(
+                stock[store_id][device_id]["quantity"] for store_id in stores
+            )
+
+    def test_reserve_updates_totals(self):
+        devices, stock = create_catalog()
+        index = DeviceCatalogIndex(devices, stock)
+        store_id = "STORE000"
+        device_id = next(iter(stock[store_id]))
+        before = index.totals_for(device_id)
+
+        index.reserve(store_id, device_id)
+
+        assert stock[store_id][device_id]["reserved"] == 1
+        assert index.totals_for(device_id) == {
+            "total_stock": before["total_stock"],
+            "available_stock": before["available_stock"] - 1
+        }
+
+
+def scan_recommendations(devices, stock, store_id, os_preference, budget, now, limit=5):
+    """逐筆計算推薦分數並完整排序（原本的做法）"""
+    candidates = []
+    for device_id, stock_info in stock[store_id].items():
+        device = devices[device_id]
+        available = stock_info["quantity"] - stock_info["reserved"]
+        if device["os"] != os_preference or device["price"] > budget or available <= 0:
+            continue
+
+        score = device["popularity_score"]
+        price_ratio = device["price"] / budget
+        if price_ratio >= 0.8:
+            score += 5
+        elif price_ratio >= 0.6:
+            score += 3
+        if device["is_flagship"]:
+            score += 3
+        months_old = (now - datetime.strptime(device["release_date"], "%Y-%m-%d")).days / 30
+        if months_old < 6:
+            score += 5
+        elif months_old < 12:
+            score += 2
+        if available >= 5:
+            score += 2
+
+        candidates.append((device_id, score, available))
+
+    candidates.sort(key=lambda x: x[1], reverse=True)
+    return candidates[:limit]
+
+
+class TestRecommendations:
+    """預先計算的推薦分數與快取"""
+
+    NOW = datetime(2024, 6, 1)
+
+    @pytest.mark.parametrize("os_preference", ["iOS", "Android"])
+    @pytest.mark.parametrize("budget", [8000, 25000, 45000])
+    def test_top_k_matches_full_sort(self, os_preference, budget):
+        devices, stock = create_catalog()
+        index = DeviceCatalogIndex(devices, stock)
+        index.refresh_scores(now=self.NOW)
+
+        for store_id in stock:
+            assert index.recommend(store_id, os_preference, budget) == scan_recommendations(
+                devices, stock, store_id, os_preference, budget, self.NOW
+            )
+
+    def test_cached_until_reservation(self):
+        devices, stock = create_catalog()
+        index = DeviceCatalogIndex(devices, stock)
+        index.refresh_scores(now=self.NOW)
+
+        first = index.recommend("STORE000", "Android", 45000)
+        assert index.recommend("STORE000", "android", 45000) == first
+        assert index.recommendation_hits == 1
+
+        device_id, _, available = first[0]
+        index.reserve("STORE000", device_id)
+        after = dict((d, a) for d, _, a in index.recommend("STORE000", "Android", 45000))
+
+        assert index.recommendation_misses == 2
+        assert after.get(device_id, 0) in (available - 1, 0)
+
+    def test_cache_shared_within_budget_band(self, monkeypatch):
+        """同一預算級距共用快取，結果仍依實際預算篩選與計分"""
+        monkeypatch.setenv("MCP_POS_BUDGET_BAND", "5000")
+        devices, stock = create_catalog()
+        index = DeviceCatalogIndex(devices, stock)
+        index.refresh_scores(now=self.NOW)
+
+        for budget in (40001, 42350.5, 45000, 44999):
+            assert index.recommend("STORE000", "Android", budget) == scan_recommendations(
+                devices, stock, "STORE000", "Android", budget, self.NOW
+            )
+
+        assert index.recommendation_misses == 1
+        assert index.recommendation_hits == 3
+
+    def test_refresh_updates_release_bonus(self):
+        devices, stock = create_catalog(store_count=1, device_count=10)
+        device_id = next(iter(stock["STORE000"]))
+        devices[device_id]["release_date"] = "2024-05-01"
+        index = DeviceCatalogIndex(devices, stock)
+
+        index.refresh_scores(now=datetime(2024, 6, 1))
+        recent = index._base_scores[device_id]
+        index.refresh_scores(now=datetime(2025, 6, 1))
+
+        assert index._base_scores[device_id] == recent - 5
+
+
+@pytest.mark.asyncio
+async def test_pos_server_stock_summary_follows_reservations():
+    """POS Server 預約後，設備資訊的庫存總數同步更新"""
+    server = POSServer()
+    before = (await server.get_device_info("DEV001"))["data"]["stock_summary"]
+
+    result = await server.reserve_device("STORE001", "DEV001", "C000001", "0912345678")
+    after = (await server.get_device_info("DEV001"))["data"]["stock_summary"]
+
+    assert result["success"]
+    assert after["available_stock"] == before["available_stock"] - 1
+    assert after["available_stock"] == sum(store["available"] for store in after["stores"])
+
+    stock = await server.query_device_stock("STORE001", os_filter="ios", min_price=25000)
+    assert {d["device_id"] for d in stock["data"]["devices"]} == {"DEV001", "DEV002"}
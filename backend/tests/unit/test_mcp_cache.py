@@ -0,0 +1,217 @@
+"""
+測試唯讀 MCP Tool 結果快取
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加 backend 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services.mcp_cache import MCPResultCache
+from app.services.redis_manager import RedisManager, MockRedis
+
+
+class FakeServer:
+    """記錄調用次數的假 MCP Server"""
+
+    def __init__(self, delay: float = 0, success: bool = True):
+        self.calls = []
+        self.delay = delay
+        self.success = success
+
+    async def fetch(self, tool, arguments):
+        self.calls.append((tool, arguments))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if not self.success:
+            return {"success": False, "error": {"code": "NOT_FOUND"}}
+        return {"success": True, "data": {"tool": tool, **arguments}}
+
+
+def create_redis_manager():
+    """建立使用 MockRedis 的 RedisManager"""
+    manager = RedisManager()
+    manager.redis = MockRedis()
+    return manager
+
+
+@pytest.fixture
+def cache():
+    return MCPResultCache(enabled=True, max_entries=3)
+
+
+class TestResultCache:
+    """本機快取"""
+
+    @pytest.mark.asyncio
+    async def test_read_only_tool_cached(self, cache):
+        server = FakeServer()
+
+        first = await cache.call("promotion", "get_plan_details", {"plan_id": "P1"}, server.fetch)
+        first["data"]["plan_id"] = "modified"
+        second = await cache.call("promotion", "get_plan_details", {"plan_id": "P1"}, server.fetch)
+
+        # 返回複本，呼叫端修改不影響快取
+        assert second["data"]["plan_id"] == "P1"
+        assert len(server.calls) == 1
+        assert cache.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_mutating_tool_bypasses_and_invalidates_stock(self, cache):
+        server = FakeServer()
+        stock_args = {"store_id": "STORE001"}
+        reserve_args = {"store_id": "STORE001", "device_id": "D1", "customer_id": "C1", "phone_number": "0912"}
+
+        device_args = {"device_id": "D1"}
+
+        await cache.call("pos", "query_device_stock", stock_args, server.fetch)
+        await cache.call("pos", "get_device_info", device_args, server.fetch)
+        await cache.call("pos", "reserve_device", reserve_args, server.fetch)
+        await cache.call("pos", "reserve_device", reserve_args, server.fetch)
+        await cache.call("pos", "query_device_stock", stock_args, server.fetch)
+        # 設備資訊含庫存摘要，預約後重新查詢
+        await cache.call("pos", "get_device_info", device_args, server.fetch)
+
+        assert [tool for tool, _ in server.calls] == [
+            "query_device_stock", "get_device_info", "reserve_device", "reserve_device",
+            "query_device_stock", "get_device_info"
+        ]
+
+    @pytest.mark.asyncio
+    async def test_failures_not_cached(self, cache):
+        server = FakeServer(success=False)
+
+        await cache.call("crm", "get_customer", {"id_number": "X"}, server.fetch)
+        await cache.call("crm", "get_customer", {"id_number": "X"}, server.fetch)
+
+        assert len(server.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_calls_coalesced(self, cache):
+        server = FakeServer(delay=0.01)
+
+        results = await asyncio.gather(*(
+            cache.call("pos", "get_device_info", {"device_id": "D1"}, server.fetch) for _ in range(5)
+        ))
+
+        assert len(server.calls) == 1
+        assert cache.coalesced == 4
+        assert all(result["data"]["device_id"] == "D1" for result in results)
+
+    @pytest.mark.asyncio
+    async def test_ttl_and_lru_bound(self, cache):
+        server = FakeServer()
+        cache.ttls["pos"]["get_device_info"] = 0
+
+        await cache.call("pos", "get_device_info", {"device_id": "D1"}, server.fetch)
+        await cache.call("pos", "get_device_info", {"device_id": "D1"}, server.fetch)
+        assert len(server.calls) == 2
+
+        for plan_id in ("P1", "P2", "P3", "P4"):
+            await cache.call("promotion", "get_plan_details", {"plan_id": plan_id}, server.fetch)
+
+        # 上限 3 筆，最久未使用的 P1 被移除
+        assert len(cache._entries) == 3
+        await cache.call("promotion", "get_plan_details", {"plan_id": "P1"}, server.fetch)
+        assert server.calls[-1] == ("get_plan_details", {"plan_id": "P1"})
+
+    @pytest.mark.asyncio
+    async def test_invalidate_during_fetch_not_stored(self, cache):
+        server = FakeServer(delay=0.01)
+
+        pending = asyncio.ensure_future(
+            cache.call("promotion", "search_promotions", {"query": "5G"}, server.fetch)
+        )
+        await asyncio.sleep(0)
+        await cache.invalidate("promotion", "search_promotions")
+        await pending
+        await cache.call("promotion", "search_promotions", {"query": "5G"}, server.fetch)
+
+        assert len(server.calls) == 2
+
+
+class TestRedisBackedCache:
+    """Redis 共用快取"""
+
+    @pytest.mark.asyncio
+    async def test_shared_between_workers(self, monkeypatch):
+        monkeypatch.setenv("MCP_CACHE_REDIS", "true")
+        redis_manager = create_redis_manager()
+        worker_a = MCPResultCache(enabled=True)
+        worker_b = MCPResultCache(enabled=True)
+        worker_a.attach_redis(redis_manager)
+        worker_b.attach_redis(redis_manager)
+        server = FakeServer()
+
+        await worker_a.call("promotion", "get_plan_details", {"plan_id": "P1"}, server.fetch)
+        result = await worker_b.call("promotion", "get_plan_details", {"plan_id": "P1"}, server.fetch)
+
+        assert result["data"]["plan_id"] == "P1"
+        assert len(server.calls) == 1
+        assert worker_b.redis_hits == 1
+
+        await worker_a.invalidate("promotion", "get_plan_details")
+        await worker_b.invalidate("promotion", "get_plan_details")
+        await worker_b.call("promotion", "get_plan_details", {"plan_id": "P1"}, server.fetch)
+        assert len(server.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_one_key_per_entry_with_ttl(self, monkeypatch):
+        monkeypatch.setenv("MCP_CACHE_REDIS", "true")
+        redis_manager = create_redis_manager()
+        expirations = {}
+        original_set = redis_manager.redis.set
+
+        async def recording_set(key, value, ex=None):
+            expirations[key] = ex
+            return await original_set(key, value, ex=ex)
+
+        redis_manager.redis.set = recording_set
+        cache = MCPResultCache(enabled=True)
+        cache.attach_redis(redis_manager)
+        server = FakeServer()
+
+        await cache.call("pos", "query_device_stock", {"device_id": "D1"}, server.fetch)
+        await cache.call("pos", "query_device_stock", {"device_id": "D2"}, server.fetch)
+        await cache.call("pos", "get_device_info", {"device_id": "D1"}, server.fetch)
+
+        stock_keys = [key for key in expirations if key.startswith("mcp_cache:pos:query_device_stock:")]
+        assert len(stock_keys) == 2
+        assert all(expirations[key] == 15 for key in stock_keys)
+
+        await cache.invalidate("pos", "query_device_stock")
+        assert sorted(redis_manager.redis.data) == [
+            key for key in expirations if key.startswith("mcp_cache:pos:get_device_info:")
+        ]
+
+    @pytest.mark.asyncio
+    async def test_crm_results_kept_out_of_redis_by_default(self, monkeypatch):
+        monkeypatch.setenv("MCP_CACHE_REDIS", "true")
+        monkeypatch.delenv("MCP_CACHE_REDIS_SERVERS", raising=False)
+        redis_manager = create_redis_manager()
+        cache = MCPResultCache(enabled=True)
+        cache.attach_redis(redis_manager)
+        server = FakeServer()
+
+        await cache.call("crm", "get_customer", {"id_number": "A123456789"}, server.fetch)
+        await cache.call("crm", "get_customer", {"id_number": "A123456789"}, server.fetch)
+
+        assert len(server.calls) == 1
+        assert redis_manager.redis.data == {}
+
+        monkeypatch.setenv("MCP_CACHE_REDIS_SERVERS", "crm,pos,promotion")
+        opted_in = MCPResultCache(enabled=True)
+        opted_in.attach_redis(redis_manager)
+        await opted_in.call("crm", "get_customer", {"id_number": "A123456789"}, server.fetch)
+        assert len(redis_manager.redis.data) == 1
+
+    def test_redis_not_used_unless_enabled(self, monkeypatch):
+        monkeypatch.setenv("MCP_CACHE_REDIS", "false")
+        cache = MCPResultCache(enabled=True)
+        cache.attach_redis(create_redis_manager())
+
+        assert cache.redis_manager is None
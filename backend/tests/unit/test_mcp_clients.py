@@ -0,0 +1,95 @@
+"""
+測試 stdio MCP Client
+以同一程序內的 MCP Server 取代 stdio 子程序，確認與 HTTP 版本共用的 Tool 介面與錯誤格式
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加 backend 與 mcp_servers 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+sys.path.insert(0, str(backend_dir / "mcp_servers"))
+
+from app.services import mcp_client_base
+from app.services.mcp_cache import MCPResultCache
+from app.services.mcp_client import MCPClientService
+from app.services.mcp_client_pos import MCPClientServicePOS
+from app.services.mcp_client_promotion import MCPClientServicePromotion
+from app.services.mcp_stdio_pool import mcp_stdio_pools
+from crm_server import CRMServer
+from pos_server import POSServer
+from promotion_server import PromotionServer
+
+
+class InProcessPool:
+    """以 BaseMCPServer.call_tool 取代 stdio 子程序"""
+
+    def __init__(self, server, fail=False):
+        self.server = server
+        self.fail = fail
+
+    async def start(self):
+        pass
+
+    async def call_tool(self, name, arguments):
+        if self.fail:
+            raise ConnectionError("process exited")
+        return await self.server.call_tool(name, arguments)
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    """替換 stdio Pool（停用 Tool 快取，每次調用都會送到 Server）"""
+    pools = {
+        "crm": InProcessPool(CRMServer()),
+        "pos": InProcessPool(POSServer()),
+        "promotion": InProcessPool(PromotionServer())
+    }
+    monkeypatch.setattr(mcp_stdio_pools, "get_pool", lambda server: pools[server])
+    monkeypatch.setattr(mcp_client_base, "mcp_result_cache", MCPResultCache(enabled=False))
+    return pools
+
+
+@pytest.mark.asyncio
+async def test_stdio_clients_use_shared_tool_interface(pools):
+    crm = MCPClientService()
+    pos = MCPClientServicePOS()
+    promotion = MCPClientServicePromotion()
+
+    customer = await crm.query_customer_by_id("A123456789")
+    device = await pos.get_device_info("DEV001")
+    plan = await promotion.get_plan_details("PLAN001")
+
+    assert customer["_data_source"] == "MCP_CRM_Server"
+    assert device["device_id"] == "DEV001"
+    assert plan["plan_id"] == "PLAN001"
+    assert crm.initialized and pos.initialized and promotion.initialized
+
+    # 失敗結果與 HTTP 版本相同：{"success": False, "error": {"code", "message"}}
+    missing = await pos._call_tool("get_device_info", {"device_id": "DEV999"})
+    unknown = await promotion._call_tool("no_such_tool", {})
+    assert missing["error"]["message"] == "設備 DEV999 不存在"
+    assert unknown["error"]["code"] == "TOOL_NOT_FOUND"
+
+
+@pytest.mark.asyncio
+async def test_stdio_errors_returned_not_raised(pools):
+    for pool in pools.values():
+        pool.fail = True
+
+    for client in (MCPClientService(), MCPClientServicePOS(), MCPClientServicePromotion()):
+        result = await client._call_tool("any_tool", {})
+        assert result == {
+            "success": False,
+            "error": {"code": "MCP_CALL_EXCEPTION", "message": "process exited"}
+        }
+
+    assert await MCPClientService().query_customer_by_id("A123456789") is None
+
+
+def test_servers_register_tools_with_add_tool():
+    for server, count in ((CRMServer(), 5), (POSServer(), 5), (PromotionServer(), 5)):
+        assert len(server._tools) == count
+        assert [tool["name"] for tool in server.get_tools_schema()] == list(server._tools)
@@ -0,0 +1,175 @@
+"""
+測試 stdio MCP Session Pool
+以假的 Session 取代 MCP Server 子程序
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加 backend 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services.mcp_stdio_pool import StdioSessionPool
+
+
+class FakeContent:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.content = [FakeContent(json.dumps(data))]
+
+
+class FakeSession:
+    """假的 stdio Session：記錄調用，可模擬子程序中斷"""
+
+    def __init__(self, index, delay=0.01, fail_start=False):
+        self.index = index
+        self.delay = delay
+        self.fail_start = fail_start
+        self.inflight = 0
+        self.max_inflight = 0
+        self.calls = []
+        self.crashed = False
+        # 調用途中子程序中斷（送出請求後才發現）
+        self.broken = False
+        self.closed = False
+        self.started = False
+
+    @property
+    def alive(self):
+        return self.started and not self.crashed and not self.closed
+
+    async def start(self, timeout):
+        if self.fail_start:
+            raise RuntimeError("spawn failed")
+        self.started = True
+
+    async def call_tool(self, name, arguments, timeout):
+        if self.crashed:
+            raise ConnectionError("process exited")
+        if self.broken:
+            self.calls.append(name)
+            self.crashed = True
+            raise ConnectionError("broken pipe")
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            self.calls.append(name)
+            await asyncio.sleep(self.delay)
+            return FakeResult({"success": True, "data": {"session": self.index, **arguments}})
+        finally:
+            self.inflight -= 1
+
+    async def ping(self, timeout):
+        if self.crashed:
+            raise ConnectionError("process exited")
+
+    async def close(self):
+        self.closed = True
+
+
+class SessionFactory:
+    """記錄建立過的 Session"""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.created = []
+
+    def __call__(self, index):
+        session = FakeSession(index, **self.kwargs)
+        self.created.append(session)
+        return session
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_spread_over_long_lived_sessions():
+    factory = SessionFactory()
+    pool = StdioSessionPool("pos", factory, size=2, max_concurrency=3)
+
+    results = await asyncio.gather(*(
+        pool.call_tool("get_device_info", {"device_id": f"D{i}"}) for i in range(12)
+    ))
+
+    # 不會每次調用都啟動子程序，同一個 Session 可同時處理多個調用
+    assert len(factory.created) == 2
+    assert [r["data"]["device_id"] for r in results] == [f"D{i}" for i in range(12)]
+    assert all(len(session.calls) == 6 for session in factory.created)
+    assert all(1 < session.max_inflight <= 3 for session in factory.created)
+
+    await pool.close()
+    assert all(session.closed for session in factory.created)
+
+
+@pytest.mark.asyncio
+async def test_crashed_session_respawned_and_call_retried():
+    factory = SessionFactory()
+    pool = StdioSessionPool("crm", factory, size=1)
+    await pool.start()
+    factory.created[0].crashed = True
+
+    result = await pool.call_tool("get_customer", {"id_number": "A123456789"})
+
+    assert result["success"]
+    assert len(factory.created) == 2
+    assert pool.respawns == 1
+    assert pool.get_stats()["alive"] == 1
+
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_mutating_tool_not_retried():
+    factory = SessionFactory()
+    pool = StdioSessionPool("pos", factory, size=2)
+    await pool.start()
+    for session in factory.created:
+        session.broken = True
+
+    with pytest.raises(ConnectionError):
+        await pool.call_tool("reserve_device", {"device_id": "D1"})
+
+    # 請求可能已送達，不可重送造成重複預約
+    assert sum(len(session.calls) for session in factory.created) == 1
+
+    # 唯讀 Tool 換一個 Session 重試
+    result = await pool.call_tool("get_device_info", {"device_id": "D1"})
+    assert result["data"]["device_id"] == "D1"
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_health_check_respawns_dead_session(monkeypatch):
+    monkeypatch.setenv("MCP_STDIO_HEALTH_INTERVAL", "0.01")
+    factory = SessionFactory()
+    pool = StdioSessionPool("promotion", factory, size=2)
+    await pool.start()
+
+    factory.created[1].crashed = True
+    for _ in range(50):
+        await asyncio.sleep(0.01)
+        if pool.respawns:
+            break
+    await asyncio.sleep(0.01)
+
+    assert pool.respawns == 1
+    assert pool.get_stats()["alive"] == 2
+    assert factory.created[1].closed
+
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_start_fails_when_no_session_starts():
+    pool = StdioSessionPool("crm", SessionFactory(fail_start=True), size=2)
+
+    with pytest.raises(RuntimeError):
+        await pool.start()
+
+    assert not pool.started
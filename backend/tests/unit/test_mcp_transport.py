@@ -0,0 +1,297 @@
+"""
+測試共用的 MCP HTTP 連線池
+以 httpx.MockTransport 取代 MCP Server
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+# 添加 backend 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services.mcp_cache import MCPResultCache
+from app.services.mcp_transport import MCPTransport
+from app.services import mcp_client_base, mcp_client_pos_http
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    """替換模組的共用連線池，避免影響其他測試（停用 Tool 快取，每次調用都會送出請求）"""
+    transport = MCPTransport()
+    monkeypatch.setattr(mcp_client_pos_http, "mcp_transport", transport)
+    monkeypatch.setattr(mcp_client_base, "mcp_result_cache", MCPResultCache(enabled=False))
+    return transport
+
+
+def mock_server(requests):
+    """記錄請求的假 MCP Server"""
+
+    def handler(request):
+        requests.append(request.url.path)
+        if request.url.path == "/health":
+            return httpx.Response(200, json={"status": "healthy"})
+        return httpx.Response(200, json={"success": True, "data": {"devices": [{"device_id": "D1"}]}})
+
+    return httpx.MockTransport(handler)
+
+
+def batch_server(requests, batch_status=200, batch_error=None):
+    """
+    支援 /mcp/batch 的假 MCP Server
+
+    batch_status 非 200 時模擬舊版 Server 或 Server 錯誤；batch_error 為批次請求拋出的 httpx 例外
+    """
+
+    def handler(request):
+        if request.url.path == "/health":
+            return httpx.Response(200, json={"status": "healthy"})
+        body = json.loads(request.content)
+        requests.append((request.url.path, body))
+        if request.url.path == "/mcp/batch":
+            if batch_error is not None:
+                raise batch_error("batch failed", request=request)
+            if batch_status != 200:
+                return httpx.Response(batch_status, json={"detail": "Not Found"})
+            results = [
+                {"ok": True, "result": {"success": True, "data": {"device_id": call["arguments"]["device_id"]}}}
+                if call["arguments"]["device_id"] != "MISSING"
+                else {"ok": False, "error": {"code": "TOOL_ERROR", "message": "設備 MISSING 不存在"}}
+                for call in body
+            ]
+            return httpx.Response(200, json={"success": True, "results": results})
+        return httpx.Response(200, json={"success": True, "data": {"device_id": body["arguments"]["device_id"]}})
+
+    return httpx.MockTransport(handler)
+
+
+class TestTransport:
+    """連線池設定與共用"""
+
+    def test_per_server_timeouts(self, monkeypatch):
+        monkeypatch.setenv("MCP_HTTP_READ_TIMEOUT", "20")
+        monkeypatch.setenv("POS_MCP_READ_TIMEOUT", "8")
+        monkeypatch.setenv("POS_MCP_CONNECT_TIMEOUT", "1")
+
+        transport = MCPTransport()
+        pos = transport.get_timeout("pos")
+        crm = transport.get_timeout("crm")
+
+        assert (pos.connect, pos.read, pos.pool) == (1.0, 8.0, 5.0)
+        assert (crm.connect, crm.read) == (3.0, 20.0)
+
+    def test_http2_off_by_default(self, monkeypatch):
+        monkeypatch.delenv("MCP_HTTP2", raising=False)
+
+        assert MCPTransport().http2 is False
+
+    @pytest.mark.asyncio
+    async def test_client_reused_until_closed(self, transport):
+        client = transport.get_client("pos", "http://localhost:8002")
+
+        assert transport.get_client("pos", "http://localhost:8002") is client
+        assert transport.get_client("crm", "http://localhost:8001") is not client
+
+        await transport.close()
+
+        assert client.is_closed
+        assert transport.get_client("pos", "http://localhost:8002") is not client
+        await transport.close()
+
+    @pytest.mark.asyncio
+    async def test_mcp_client_close_keeps_shared_pool(self, transport):
+        """個別 MCP Client 關閉時不關閉共用連線池，只在初始化時做一次健康檢查"""
+        requests = []
+        transport._clients["pos"] = httpx.AsyncClient(
+            base_url="http://localhost:8002",
+            transport=mock_server(requests)
+        )
+        pos_client = mcp_client_pos_http.MCPClientServicePOSHTTP()
+
+        await pos_client.initialize()
+        await pos_client.initialize()
+        devices = await pos_client.query_device_stock("STORE001")
+        await pos_client.close()
+
+        assert devices == [{"device_id": "D1"}]
+        assert requests == ["/health", "/mcp/call"]
+        assert not transport._clients["pos"].is_closed
+        assert not pos_client.initialized
+
+        await transport.close()
+
+
+class TestCallBatcher:
+    """同時發出的 Tool 調用合併為 /mcp/batch"""
+
+    @pytest.fixture
+    def pos_client(self, transport, monkeypatch):
+        monkeypatch.setenv("MCP_HTTP_BATCH", "true")
+        monkeypatch.setenv("MCP_BATCH_MAX_CALLS", "2")
+        return mcp_client_pos_http.MCPClientServicePOSHTTP()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_request(self, transport, pos_client):
+        requests = []
+        transport._clients["pos"] = httpx.AsyncClient(
+            base_url="http://localhost:8002",
+            transport=batch_server(requests)
+        )
+
+        results = await asyncio.gather(*(
+            pos_client._call_tool("get_device_info", {"device_id": f"D{i}"}) for i in range(3)
+        ))
+
+        # 結果依呼叫順序返回，超過上限的部分分成下一批（只有一筆時使用 /mcp/call）
+        assert [r["data"]["device_id"] for r in results] == ["D0", "D1", "D2"]
+        assert [path for path, _ in requests] == ["/mcp/batch", "/mcp/call"]
+        assert [call["arguments"]["device_id"] for call in requests[0][1]] == ["D0", "D1"]
+
+        await transport.close()
+
+    @pytest.mark.asyncio
+    async def test_single_call_uses_call_endpoint(self, transport, pos_client):
+        requests = []
+        transport._clients["pos"] = httpx.AsyncClient(
+            base_url="http://localhost:8002",
+            transport=batch_server(requests)
+        )
+
+        result = await pos_client._call_tool("get_device_info", {"device_id": "D1"})
+
+        assert result["data"] == {"device_id": "D1"}
+        assert [path for path, _ in requests] == ["/mcp/call"]
+
+        await transport.close()
+
+    @pytest.mark.asyncio
+    async def test_falls_back_when_batch_not_supported(self, transport, pos_client):
+        requests = []
+        transport._clients["pos"] = httpx.AsyncClient(
+            base_url="http://localhost:8002",
+            transport=batch_server(requests, batch_status=404)
+        )
+
+        results = await asyncio.gather(*(
+            pos_client._call_tool("get_device_info", {"device_id": f"D{i}"}) for i in range(2)
+        ))
+
+        assert [r["data"]["device_id"] for r in results] == ["D0", "D1"]
+        assert [path for path, _ in requests] == ["/mcp/batch", "/mcp/call", "/mcp/call"]
+        assert not pos_client._batcher.batch_supported
+
+        # 之後不再嘗試批次調用
+        requests.clear()
+        await asyncio.gather(*(
+            pos_client._call_tool("get_device_info", {"device_id": f"D{i}"}) for i in range(2)
+        ))
+        assert [path for path, _ in requests] == ["/mcp/call", "/mcp/call"]
+
+        await transport.close()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("batch_status, batch_error", [(500, None), (200, httpx.ReadTimeout)])
+    async def test_failed_batch_not_resent(self, transport, pos_client, batch_status, batch_error):
+        """Server 可能已執行批次內的調用時不逐筆重送，錯誤交回各呼叫端"""
+        requests = []
+        transport._clients["pos"] = httpx.AsyncClient(
+            base_url="http://localhost:8002",
+            transport=batch_server(requests, batch_status, batch_error)
+        )
+
+        results = await asyncio.gather(*(
+            pos_client._call_tool("get_device_info", {"device_id": f"D{i}"}) for i in range(2)
+        ))
+
+        assert [r["error"]["code"] for r in results] == ["MCP_BATCH_ERROR", "MCP_BATCH_ERROR"]
+        assert [path for path, _ in requests] == ["/mcp/batch"]
+        assert pos_client._batcher.batch_supported
+
+        await transport.close()
+
+    @pytest.mark.asyncio
+    async def test_falls_back_when_batch_not_sent(self, transport, pos_client):
+        """無法連線時批次請求尚未送出，改為逐筆調用"""
+        requests = []
+        transport._clients["pos"] = httpx.AsyncClient(
+            base_url="http://localhost:8002",
+            transport=batch_server(requests, batch_error=httpx.ConnectError)
+        )
+
+        results = await asyncio.gather(*(
+            pos_client._call_tool("get_device_info", {"device_id": f"D{i}"}) for i in range(2)
+        ))
+
+        assert [r["data"]["device_id"] for r in results] == ["D0", "D1"]
+        assert [path for path, _ in requests] == ["/mcp/batch", "/mcp/call", "/mcp/call"]
+
+        await transport.close()
+
+    @pytest.mark.asyncio
+    async def test_non_retryable_tool_not_batched(self, transport, pos_client):
+        """非冪等的 Tool 不與其他調用合併"""
+        requests = []
+        transport._clients["pos"] = httpx.AsyncClient(
+            base_url="http://localhost:8002",
+            transport=batch_server(requests)
+        )
+
+        await asyncio.gather(
+            pos_client._call_tool("reserve_device", {"device_id": "D9"}),
+            pos_client._call_tool("get_device_info", {"device_id": "D1"}),
+            pos_client._call_tool("get_device_info", {"device_id": "D2"})
+        )
+
+        assert sorted(
+            (path, body.get("tool") if isinstance(body, dict) else len(body)) for path, body in requests
+        ) == [("/mcp/batch", 2), ("/mcp/call", "reserve_device")]
+
+        await transport.close()
+
+    @pytest.mark.asyncio
+    async def test_batch_items_unwrapped(self, transport, pos_client):
+        requests = []
+        transport._clients["pos"] = httpx.AsyncClient(
+            base_url="http://localhost:8002",
+            transport=batch_server(requests)
+        )
+
+        found, missing = await asyncio.gather(
+            pos_client._call_tool("get_device_info", {"device_id": "D1"}),
+            pos_client._call_tool("get_device_info", {"device_id": "MISSING"})
+        )
+
+        assert found == {"success": True, "data": {"device_id": "D1"}}
+        assert missing == {"success": False, "error": {"code": "TOOL_ERROR", "message": "設備 MISSING 不存在"}}
+        assert [path for path, _ in requests] == ["/mcp/batch"]
+
+        await transport.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("module_name, tool, arguments", [
+    ("crm_server_http", "get_customer", {"id_number": "A123456789"}),
+    ("pos_server_http", "get_device_info", {"device_id": "DEV001"}),
+    ("promotion_server_http", "get_plan_details", {"plan_id": "PLAN001"}),
+])
+async def test_servers_share_batch_envelope(monkeypatch, module_name, tool, arguments):
+    """三個 MCP Server 的 /mcp/batch 項目格式相同"""
+    import importlib
+    sys.path.insert(0, str(backend_dir / "mcp_servers"))
+    module = importlib.import_module(module_name)
+    if module_name == "promotion_server_http":
+        monkeypatch.setattr(module, "promotion_server", module.PromotionServer())
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=module.app), base_url="http://test") as client:
+        response = await client.post("/mcp/batch", json=[
+            {"tool": tool, "arguments": arguments},
+            {"tool": "no_such_tool", "arguments": {}}
+        ])
+
+    ok, error = response.json()["results"]
+    assert ok["ok"] is True and ok["result"]["success"] is True
+    assert error["ok"] is False and error["error"]["code"] == "TOOL_NOT_FOUND"
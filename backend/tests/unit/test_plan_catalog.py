@@ -0,0 +1,209 @@
+"""
+測試費率方案目錄索引
+"""
+import copy
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加 backend 與 mcp_servers 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+sys.path.insert(0, str(backend_dir / "mcp_servers"))
+
+from common.plan_catalog import PlanCatalog
+from common.promotion_index import PromotionSearchIndex
+from common.vector_index import VectorIndex
+from promotion_server import PromotionServer
+
+
+@pytest.fixture
+def server():
+    return PromotionServer()
+
+
+class TestPlanCatalog:
+    """方案詳情與反向對照"""
+
+    def test_details_match_scan(self, server):
+        for plan in server.plans:
+            details = server.plan_catalog.get_details(plan["plan_id"])
+            expected = [
+                promo["promotion_id"] for promo in server.promotions
+                if plan["plan_id"] in promo["plans"]
+            ]
+
+            assert [p["promotion_id"] for p in details["applicable_promotions"]] == expected
+            assert details["total_promotions"] == len(expected)
+            assert details["monthly_fee"] == plan["monthly_fee"]
+
+        assert server.plan_catalog.get_details("PLAN999") is None
+
+    def test_details_shared_and_read_only(self, server):
+        first = server.plan_catalog.get_details("PLAN001")
+
+        assert server.plan_catalog.get_details("PLAN001") is first
+        with pytest.raises(TypeError):
+            first["monthly_fee"] = 0
+        with pytest.raises(AttributeError):
+            first["features"].append("x")
+
+        # 複製後可自由修改，且可 JSON 序列化
+        editable = copy.deepcopy(first)
+        editable["applicable_promotions"][0]["title"] = "modified"
+        assert json.loads(json.dumps(first))["plan_id"] == "PLAN001"
+        assert server.plan_catalog.get_details("PLAN001")["applicable_promotions"][0]["title"] != "modified"
+
+    def test_incremental_updates(self):
+        plans = [{"plan_id": "P1", "monthly_fee": 100}, {"plan_id": "P2", "monthly_fee": 200}]
+        promotions = [{"promotion_id": "A", "title": "A", "benefits": [], "plans": ["P1"]}]
+        catalog = PlanCatalog(plans, promotions)
+        untouched = catalog.get_details("P2")
+        version = catalog.version
+
+        catalog.upsert_promotion({"promotion_id": "B", "title": "B", "benefits": [], "plans": ["P1"]})
+        assert [p["promotion_id"] for p in catalog.get_details("P1")["applicable_promotions"]] == ["A", "B"]
+        # 不受影響的方案不重新組成
+        assert catalog.get_details("P2") is untouched
+        assert catalog.version > version
+
+        catalog.upsert_promotion({"promotion_id": "A", "title": "A2", "benefits": [], "plans": ["P2"]})
+        assert [p["promotion_id"] for p in catalog.get_details("P1")["applicable_promotions"]] == ["B"]
+        assert catalog.get_details("P2")["applicable_promotions"][0]["title"] == "A2"
+
+        catalog.remove_promotion("B")
+        catalog.upsert_plan({"plan_id": "P1", "monthly_fee": 150})
+        catalog.remove_plan("P2")
+
+        assert catalog.get_details("P1")["monthly_fee"] == 150
+        assert catalog.get_details("P1")["total_promotions"] == 0
+        assert catalog.get_details("P2") is None
+        assert [p["plan_id"] for p in plans] == ["P1"]
+        assert [p["promotion_id"] for p in promotions] == ["A"]
+
+
+@pytest.mark.asyncio
+async def test_server_promotion_update_refreshes_search(server):
+    server.upsert_promotion({
+        "promotion_id": "PROMO900",
+        "title": "長輩專案",
+        "description": "銀髮族專屬",
+        "type": "plan",
+        "keywords": ["長輩", "銀髮"],
+        "benefits": ["月租 $299"],
+        "eligibility": {"contract_type": ["續約"]},
+        "plans": ["PLAN003"],
+        "priority": 5
+    })
+
+    details = await server.get_plan_details("PLAN003")
+    search = await server.search_promotions("長輩")
+
+    assert "PROMO900" in [p["promotion_id"] for p in details["applicable_promotions"]]
+    assert search["promotions"][0]["promotion_id"] == "PROMO900"
+
+
+def test_search_index_incremental_matches_rebuild(server):
+    """單筆更新後的搜尋結果與重新建立的索引相同"""
+    vector_index = server.search_index.vector_index
+    server.upsert_promotion({
+        "promotion_id": "PROMO900",
+        "title": "長輩專案",
+        "description": "銀髮族續約優惠",
+        "type": "plan",
+        "keywords": ["長輩", "續約"],
+        "benefits": ["月租 $299"],
+        "eligibility": {"contract_type": ["續約"]},
+        "plans": ["PLAN003"],
+        "priority": 9
+    })
+    server.upsert_promotion({
+        **next(p for p in server.promotions if p["promotion_id"] == "PROMO004"),
+        "keywords": ["家庭", "回饋"],
+        "eligibility": {"contract_type": ["攜碼"]},
+        "priority": 11
+    })
+    server.remove_promotion("PROMO002")
+
+    rebuilt = PromotionSearchIndex(server.promotions, vector_index=VectorIndex())
+
+    assert vector_index.get_stats()["count"] == len(server.promotions) == 6
+    for query in ("續約 優惠", "家庭 回饋", "學生", "5G"):
+        for contract_type in (None, "攜碼", "續約"):
+            for mode in ("keyword", "vector", "hybrid"):
+                incremental, total = server.search_index.search(query, contract_type, 10, mode)
+                expected, expected_total = rebuilt.search(query, contract_type, 10, mode)
+
+                assert total == expected_total
+                assert [p["promotion_id"] for p, _ in incremental] == [p["promotion_id"] for p, _ in expected]
+                assert [score for _, score in incremental] == pytest.approx([score for _, score in expected])
+
+
+@pytest.mark.asyncio
+async def test_get_plans_details_batch(server):
+    from app.services.promotion_service import MockPromotionService
+
+    for service in (server, MockPromotionService()):
+        result = await service.get_plans_details(["PLAN002", "PLAN999", "PLAN001", "PLAN002"])
+
+        assert list(result["plans"]) == ["PLAN002", "PLAN001"]
+        assert result["plans"]["PLAN001"] == await service.get_plan_details("PLAN001")
+        assert result["not_found"] == ["PLAN999"]
+
+    assert "get_plans_details" in [tool["name"] for tool in server.get_tools_schema()]
+
+
+class TestPlanComparison:
+    """方案特徵與比較快取"""
+
+    def test_plan_features(self, server):
+        catalog = server.plan_catalog
+
+        assert catalog.get_features("PLAN002") == {
+            "unlimited_data": False, "data_gb": 50.0, "voice_minutes": 200, "fee_per_gb": 19.98
+        }
+        assert catalog.get_features("PLAN001")["unlimited_data"] is True
+        assert catalog.get_features("PLAN001")["fee_per_gb"] is None
+        assert catalog.get_features("PLAN006")["voice_minutes"] is None
+
+    def test_comparison_cached_regardless_of_order(self, server):
+        catalog = server.plan_catalog
+
+        first = catalog.compare(["PLAN001", "PLAN002"])
+        second = catalog.compare(["PLAN002", "PLAN001"])
+
+        assert catalog.comparison_misses == 1
+        assert catalog.comparison_hits == 1
+        assert catalog.compare(["PLAN001", "PLAN002"]) is first
+        assert [p["plan_id"] for p in second["plans"]] == ["PLAN002", "PLAN001"]
+        assert list(second["comparison"]["monthly_fee"]["values"]) == ["PLAN002", "PLAN001"]
+        assert second["recommendation"] == first["recommendation"]
+        assert first["comparison"]["features"]["values"]["PLAN002"]["data_gb"] == 50.0
+        assert catalog.compare(["PLAN999"]) is None
+
+    def test_comparison_invalidated_by_updates(self, server):
+        catalog = server.plan_catalog
+        catalog.compare(["PLAN001", "PLAN002"])
+
+        catalog.upsert_plan({**catalog.get_plan("PLAN002"), "monthly_fee": 499, "data": "25GB"})
+        result = catalog.compare(["PLAN001", "PLAN002"])
+
+        assert catalog.comparison_misses == 2
+        assert result["comparison"]["monthly_fee"]["min"] == 499
+        assert result["comparison"]["features"]["values"]["PLAN002"]["fee_per_gb"] == 19.96
+
+
+@pytest.mark.asyncio
+async def test_compare_plans_uses_shared_cache(server):
+    from app.services.promotion_service import MockPromotionService
+
+    mock = MockPromotionService()
+    result = await mock.compare_plans(["PLAN003", "PLAN001", "PLAN999"])
+    again = await mock.compare_plans(["PLAN001", "PLAN003"])
+
+    assert [p["plan_id"] for p in result["plans"]] == ["PLAN003", "PLAN001"]
+    assert again["recommendation"] == result["recommendation"]
+    assert mock.plan_catalog.comparison_hits == 1
+    assert (await server.compare_plans(["PLAN999"]))["error"] == "沒有找到有效的方案"
@@ -0,0 +1,94 @@
+"""
+測試促銷方案倒排索引與 BM25 排序
+"""
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加 backend 與 mcp_servers 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+sys.path.insert(0, str(backend_dir / "mcp_servers"))
+
+from common.promotion_index import PromotionSearchIndex, tokenize
+from promotion_server import PromotionServer
+
+
+def create_promotions(count: int = 500):
+    """產生大量促銷方案的測試資料"""
+    rng = random.Random(7)
+    words = ["吃到飽", "學生", "攜碼", "續約", "家庭", "商務", "5G", "優惠", "回饋", "網內免費"]
+    return [
+        {
+            "promotion_id": f"PROMO{i:04d}",
+            "title": " ".join(rng.sample(words, 2)),
+            "description": "".join(rng.sample(words, 3)),
+            "keywords": rng.sample(words, 3),
+            "eligibility": {"contract_type": rng.sample(["攜碼", "續約", "新申辦"], rng.randint(1, 3))},
+            "priority": rng.randint(1, 10)
+        }
+        for i in range(count)
+    ]
+
+
+def test_tokenize_cjk_bigrams_and_words():
+    assert tokenize("5G 吃到飽 iPhone") == ["5g", "吃到", "到飽", "iphone"]
+    assert tokenize("省") == ["省"]
+
+
+class TestPromotionSearchIndex:
+    """搜尋結果"""
+
+    def test_results_match_full_sort(self):
+        promotions = create_promotions()
+        index = PromotionSearchIndex(promotions)
+
+        for query, contract_type in [("學生 優惠", None), ("吃到飽", "攜碼"), ("商務 回饋", "續約")]:
+            allowed = index.contract_bitmap(contract_type)
+            scores = index.score(query, allowed)
+            eligible = [
+                doc_id for doc_id, promo in enumerate(promotions)
+                if contract_type is None or contract_type in promo["eligibility"]["contract_type"]
+            ]
+            candidates = eligible if contract_type else sorted(scores)
+            expected = sorted(
+                candidates,
+                key=lambda doc_id: (scores.get(doc_id, 0.0), promotions[doc_id]["priority"]),
+                reverse=True
+            )[:10]
+
+            results, total = index.search(query, contract_type, limit=10)
+
+            assert [promo["promotion_id"] for promo, _ in results] == [
+                promotions[doc_id]["promotion_id"] for doc_id in expected
+            ]
+            assert total == len(candidates)
+
+    def test_unmatched_query_returns_nothing(self):
+        index = PromotionSearchIndex(create_promotions(20))
+
+        assert index.search("不存在的查詢", limit=5) == ([], 0)
+
+    def test_unknown_contract_type_filters_everything(self):
+        index = PromotionSearchIndex(create_promotions(20))
+
+        assert index.search("學生", contract_type="不存在", limit=5) == ([], 0)
+
+
+@pytest.mark.asyncio
+async def test_promotion_server_search():
+    """合約類型篩選時列出所有符合資格的促銷，符合查詢詞者排在前面"""
+    server = PromotionServer()
+
+    renewal = await server.search_promotions("單純續約 不搭配裝置", contract_type="續約", limit=10)
+    assert renewal["promotions"][0]["promotion_id"] == "PROMO004"
+    assert {p["promotion_id"] for p in renewal["promotions"]} == {
+        promo["promotion_id"] for promo in server.promotions
+        if "續約" in promo["eligibility"]["contract_type"]
+    }
+
+    student = await server.search_promotions("學生 便宜")
+    assert [p["promotion_id"] for p in student["promotions"]] == ["PROMO002"]
+    assert student["promotions"][0]["relevance_score"] > 0
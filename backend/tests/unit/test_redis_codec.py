@@ -0,0 +1,102 @@
+"""
+測試 Redis 值編碼層
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加 backend 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services.redis_codec import (
+    CodecRegistry,
+    RedisCodec,
+    ZLIB_PREFIX,
+    decode_value,
+)
+
+
+LARGE_SESSION = {
+    "session_id": "renewal_STAFF001_abc",
+    "chat_history": [
+        {"role": "user", "content": f"請推薦適合的方案 {i}", "timestamp": "2026-01-01T00:00:00"}
+        for i in range(50)
+    ],
+}
+
+
+class TestRedisCodec:
+    """編碼與解碼測試"""
+
+    @pytest.mark.parametrize("spec", ["json", "orjson", "orjson+zlib", "json+zlib", "orjson+zstd"])
+    def test_round_trip(self, spec):
+        """各種編碼方式都能還原"""
+        codec = RedisCodec.from_spec(spec, compress_min_bytes=64)
+
+        assert decode_value(codec.encode(LARGE_SESSION)) == LARGE_SESSION
+        assert decode_value(codec.encode({"current_step": "init"})) == {"current_step": "init"}
+
+    def test_compression_threshold(self):
+        """只有超過門檻的值會壓縮，且壓縮後較小"""
+        codec = RedisCodec.from_spec("orjson+zlib", compress_min_bytes=1024)
+
+        small = codec.encode("select_phone")
+        large = codec.encode(LARGE_SESSION)
+
+        assert small == json.dumps("select_phone")
+        assert large.startswith(ZLIB_PREFIX)
+        assert len(large) < len(json.dumps(LARGE_SESSION, ensure_ascii=False))
+
+    def test_legacy_json_is_readable(self):
+        """舊的 json.dumps 資料可直接讀取"""
+        legacy = json.dumps(LARGE_SESSION, ensure_ascii=False)
+
+        assert decode_value(legacy) == LARGE_SESSION
+
+    def test_invalid_spec(self):
+        """不支援的編碼方式"""
+        with pytest.raises(ValueError):
+            RedisCodec.from_spec("pickle")
+
+
+class TestCodecRegistry:
+    """依鍵前綴選擇編碼方式"""
+
+    def test_longest_prefix_wins(self):
+        """最長前綴優先，未符合時使用預設"""
+        registry = CodecRegistry(
+            {
+                "renewal_session:": RedisCodec.from_spec("orjson+zlib"),
+                "renewal_": RedisCodec.from_spec("orjson"),
+            }
+        )
+
+        assert registry.for_key("renewal_session:abc").name == "orjson+zlib"
+        assert registry.for_key("renewal_other").name == "orjson"
+        assert registry.for_key("session:abc").name == "json"
+
+    def test_from_env(self, monkeypatch):
+        """由環境變數讀取規則"""
+        monkeypatch.setenv("REDIS_CODEC_RULES", "a:=orjson, b:=json+zlib")
+        monkeypatch.setenv("REDIS_CODEC_DEFAULT", "orjson")
+        monkeypatch.setenv("REDIS_COMPRESS_MIN_BYTES", "10")
+
+        registry = CodecRegistry.from_env()
+
+        assert registry.for_key("a:1").name == "orjson"
+        assert registry.for_key("b:1").name == "json+zlib"
+        assert registry.for_key("b:1").compress_min_bytes == 10
+        assert registry.for_key("c:1").name == "orjson"
+
+    def test_compression_off_by_default(self, monkeypatch):
+        """壓縮值須以 base64 文字儲存，預設不壓縮；orjson 為選用，預設使用 json"""
+        monkeypatch.delenv("REDIS_CODEC_RULES", raising=False)
+        monkeypatch.delenv("REDIS_CODEC_DEFAULT", raising=False)
+
+        registry = CodecRegistry.from_env()
+
+        assert registry.for_key("renewal_session:abc").name == "json"
+        assert registry.encode("renewal_session:abc", {"messages": ["x" * 100] * 50})[0] == "{"
@@ -0,0 +1,125 @@
+"""
+測試 RedisManager 批次 API
+使用 MockRedis，不需要啟動 Redis
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加 backend 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services.redis_manager import RedisManager, MockRedis
+
+
+def create_redis_manager() -> RedisManager:
+    """建立使用 MockRedis 的 RedisManager"""
+    redis_manager = RedisManager()
+    redis_manager.redis = MockRedis()
+    return redis_manager
+
+
+class TestBatchOperations:
+    """批次操作測試"""
+
+    @pytest.mark.asyncio
+    async def test_mset_and_mget_json(self):
+        """批次寫入後依鍵順序批次讀回，不存在的鍵為 None"""
+        redis_manager = create_redis_manager()
+
+        assert await redis_manager.mset_json(
+            {"a": {"value": 1}, "b": ["x", "y"]},
+            ex=60,
+            ttls={"b": 10}
+        )
+
+        assert await redis_manager.mget_json(["b", "missing", "a"]) == [
+            ["x", "y"], None, {"value": 1}
+        ]
+        assert await redis_manager.mget_json([]) == []
+
+    @pytest.mark.asyncio
+    async def test_delete_many(self):
+        """批次刪除不同型別的鍵"""
+        redis_manager = create_redis_manager()
+        redis_manager.DELETE_BATCH_SIZE = 2
+        await redis_manager.mset_json({"k1": 1, "k2": 2, "k3": 3})
+        await redis_manager.sadd("s1", "member")
+
+        assert await redis_manager.delete_many(["k1", "k2", "k3", "s1", "missing"]) == 4
+        assert await redis_manager.mget_json(["k1", "k2", "k3"]) == [None, None, None]
+        assert await redis_manager.delete_many([]) == 0
+
+    @pytest.mark.asyncio
+    async def test_pipeline(self):
+        """Pipeline 依序執行並回傳結果"""
+        redis_manager = create_redis_manager()
+
+        async with redis_manager.pipeline() as pipe:
+            pipe.set("a", "1")
+            pipe.get("a")
+            results = await pipe.execute()
+
+        assert results == [True, "1"]
+
+    @pytest.mark.asyncio
+    async def test_hset_json_only_if_exists(self):
+        """鍵不存在時不寫入，也不會刪除其他寫入者建立的資料"""
+        redis_manager = create_redis_manager()
+
+        assert not await redis_manager.hset_json("h", {"a": 1}, ex=60, only_if_exists=True)
+        assert await redis_manager.hgetall_json("h") is None
+
+        await redis_manager.hset_json("h", {"a": 1, "b": 2})
+        assert await redis_manager.hset_json("h", {"a": 3}, ex=60, only_if_exists=True)
+        assert await redis_manager.hgetall_json("h") == {"a": 3, "b": 2}
+
+        assert await redis_manager.hset_json("h", {"c": 4}, replace=True, only_if_exists=True)
+        assert await redis_manager.hgetall_json("h") == {"c": 4}
+
+    def test_metrics_in_mock_mode(self):
+        """模擬模式沒有連線池統計"""
+        assert create_redis_manager().get_metrics() == {"mode": "mock"}
+
+    def test_metrics_use_tracked_counters(self):
+        """連線池統計只取 TrackedRedis 計數，不讀取連線池私有屬性"""
+        import redis.asyncio as redis
+        from app.services.redis_manager import TrackedRedis
+
+        redis_manager = RedisManager()
+        redis_manager.pool = redis.ConnectionPool(max_connections=7)
+        redis_manager.redis = TrackedRedis(connection_pool=redis_manager.pool)
+        redis_manager.redis.stats.in_flight = 2
+
+        assert redis_manager.get_metrics() == {
+            "mode": "redis",
+            "pool_max_connections": 7,
+            "in_flight_commands": 2,
+            "commands_total": 0,
+            "pipelines_total": 0
+        }
+
+
+class TestCodecIntegration:
+    """RedisManager 讀寫經過編碼層"""
+
+    @pytest.mark.asyncio
+    async def test_large_session_is_compressed_and_legacy_still_readable(self, monkeypatch):
+        """renewal_session 開啟壓縮時大型值壓縮儲存，舊格式仍可讀取"""
+        monkeypatch.setenv("REDIS_CODEC_RULES", "renewal_session:=json+zlib")
+        redis_manager = create_redis_manager()
+        session = {"chat_history": [{"content": "續約方案比較" * 20}] * 20}
+
+        await redis_manager.set_json("renewal_session:new", session)
+        await redis_manager.redis.set(
+            "renewal_session:old", json.dumps(session, ensure_ascii=False)
+        )
+
+        raw = redis_manager.redis.data["renewal_session:new"]
+        assert len(raw) < len(redis_manager.redis.data["renewal_session:old"])
+        assert await redis_manager.mget_json(
+            ["renewal_session:new", "renewal_session:old"]
+        ) == [session, session]
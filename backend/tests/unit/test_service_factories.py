@@ -0,0 +1,60 @@
+"""
+測試 Service Factory 的共用 Mock Service
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加 backend 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services import crm_factory, pos_factory, promotion_factory
+
+
+@pytest.fixture(autouse=True)
+def mock_mode(monkeypatch):
+    """使用 Mock 模式"""
+    for name in ("USE_MCP_CRM", "USE_MCP_POS", "USE_MCP_PROMOTION"):
+        monkeypatch.setenv(name, "false")
+
+
+@pytest.mark.parametrize("factory, get_service, reload_service", [
+    (crm_factory, "get_crm_service", "reload_mock_crm_service"),
+    (pos_factory, "get_pos_service", "reload_mock_pos_service"),
+    (promotion_factory, "get_promotion_service", "reload_mock_promotion_service"),
+])
+class TestMockServiceSingleton:
+    """Mock Service 在程序內共用，reload 後換成新的實例"""
+
+    @pytest.mark.asyncio
+    async def test_same_instance_across_calls(self, factory, get_service, reload_service):
+        first = await getattr(factory, get_service)()
+        second = await getattr(factory, get_service)()
+
+        assert first is second
+
+    @pytest.mark.asyncio
+    async def test_reload_replaces_instance(self, factory, get_service, reload_service):
+        old = await getattr(factory, get_service)()
+
+        reloaded = getattr(factory, reload_service)()
+
+        assert reloaded is not old
+        assert await getattr(factory, get_service)() is reloaded
+
+
+@pytest.mark.asyncio
+async def test_reload_resets_reservations():
+    """重新載入 POS 資料時，庫存預約數量回到初始值"""
+    pos = pos_factory.reload_mock_pos_service()
+    store_id = next(iter(pos.mock_stock))
+    device_id = next(iter(pos.mock_stock[store_id]))
+    reserved = pos.mock_stock[store_id][device_id]["reserved"]
+
+    await pos.reserve_device(store_id, device_id, "C000001", "0912345678")
+    assert (await pos_factory.get_pos_service()).mock_stock[store_id][device_id]["reserved"] == reserved + 1
+
+    pos = pos_factory.reload_mock_pos_service()
+    assert pos.mock_stock[store_id][device_id]["reserved"] == reserved
@@ -0,0 +1,136 @@
+"""
+測試 Token 使用量估算與累計
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加 backend 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services import token_usage
+from app.services.redis_manager import RedisManager, MockRedis
+from app.services.token_usage import TokenUsageTracker, estimate_tokens, estimate_messages_tokens
+
+
+def create_redis_manager():
+    """建立使用 MockRedis 的 RedisManager"""
+    manager = RedisManager()
+    manager.redis = MockRedis()
+    return manager
+
+
+class TestEstimator:
+    """本地估算"""
+
+    def test_empty_text(self):
+        assert estimate_tokens("") == 0
+        assert estimate_tokens(None) == 0
+
+    def test_heuristic_counts_cjk_per_character(self, monkeypatch):
+        """未安裝 tiktoken 時，中文每字約 1 token，其他字元約 4 字 1 token"""
+        monkeypatch.setattr(token_usage, "TIKTOKEN_AVAILABLE", False)
+        monkeypatch.setattr(token_usage, "_encoding", None)
+
+        assert estimate_tokens("推薦方案") == 4
+        assert estimate_tokens("abcdefgh") == 2
+        assert estimate_tokens("方案 PLAN001") == 2 + 2
+
+    def test_messages_include_overhead_and_tools(self):
+        """訊息格式額外 Token 與 Function 定義都計入"""
+        messages = [
+            {"role": "system", "content": "你是助理"},
+            {"role": "assistant", "content": None, "tool_calls": [
+                {"id": "call_1", "type": "function", "function": {"name": "get_plans", "arguments": "{}"}}
+            ]},
+        ]
+        tools = [{"type": "function", "function": {"name": "get_plans", "parameters": {}}}]
+
+        base = estimate_messages_tokens(messages)
+        assert base > estimate_tokens("你是助理") + 2 * token_usage.TOKENS_PER_MESSAGE
+        assert estimate_messages_tokens(messages, tools) > base
+
+
+class TestTracker:
+    """Redis 累計"""
+
+    @pytest.mark.asyncio
+    async def test_record_accumulates(self):
+        tracker = TokenUsageTracker(create_redis_manager())
+
+        assert await tracker.record("S1", "STAFF001", 100, 20, 0.0008)
+        assert await tracker.record("S1", "STAFF001", 50, 10, 0.0004)
+        await tracker.record("S2", "STAFF001", 10, 5, 0.0001)
+
+        session_usage = await tracker.get_session_usage("S1")
+        assert session_usage == {
+            "prompt_tokens": 150,
+            "completion_tokens": 30,
+            "total_tokens": 180,
+            "requests": 2,
+            "cost": 0.0012,
+        }
+
+        staff_usage = await tracker.get_staff_usage("STAFF001")
+        assert staff_usage["total_tokens"] == 195
+        assert staff_usage["requests"] == 3
+
+    @pytest.mark.asyncio
+    async def test_missing_usage_is_zero(self):
+        tracker = TokenUsageTracker(create_redis_manager())
+
+        usage = await tracker.get_staff_usage("STAFF999", "20240101")
+        assert usage["total_tokens"] == 0
+        assert usage["cost"] == 0.0
+
+
+class TestUsageRoute:
+    """AI 使用量查詢端點"""
+
+    async def create_app(self):
+        from quart import Quart, request
+        from app.routes.statistics import bp
+        from app.services.workflow_session import WorkflowSessionManager
+
+        app = Quart(__name__)
+        app.register_blueprint(bp, url_prefix="/statistics")
+        app.redis_manager = create_redis_manager()
+
+        @app.before_request
+        async def set_user():
+            request.user = {"staff_id": "STAFF001"}
+
+        manager = WorkflowSessionManager(app.redis_manager)
+        own = (await manager.create_session("STAFF001"))["session_id"]
+        other = (await manager.create_session("STAFF002"))["session_id"]
+        await TokenUsageTracker(app.redis_manager).record(other, "STAFF002", 100, 20, 0.0008)
+        return app, own, other
+
+    @pytest.mark.asyncio
+    async def test_session_usage_limited_to_owner(self):
+        app, own, other = await self.create_app()
+        client = app.test_client()
+
+        mine = await client.get("/statistics/ai-usage", query_string={"renewal_session_id": own})
+        others = await client.get("/statistics/ai-usage", query_string={"renewal_session_id": other})
+        missing = await client.get("/statistics/ai-usage", query_string={"renewal_session_id": "NONE"})
+
+        assert mine.status_code == 200
+        assert (await mine.get_json())["data"]["session"]["total_tokens"] == 0
+        assert others.status_code == 403
+        assert "data" not in await others.get_json()
+        assert missing.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_date_validated(self):
+        app, _, _ = await self.create_app()
+        client = app.test_client()
+
+        for date in ("2024-01-01", "2024011", "20241301", "*"):
+            response = await client.get("/statistics/ai-usage", query_string={"date": date})
+            assert response.status_code == 400
+
+        response = await client.get("/statistics/ai-usage", query_string={"date": "20240101"})
+        assert (await response.get_json())["data"]["staff_daily"]["total_tokens"] == 0
@@ -0,0 +1,217 @@
+"""
+測試 AI 使用記錄背景批次寫入
+以假的 DatabaseManager 記錄每次 execute_many，不需要 Oracle
+"""
+import asyncio
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+# 添加 backend 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services.usage_log_writer import UsageLogWriter
+
+
+class FakeDatabase:
+    """記錄批次寫入，available=False 時模擬資料庫中斷"""
+
+    def __init__(self):
+        self.batches = []
+        self.available = True
+        # 這些 session_id 的資料列會被資料庫拒絕（batch errors）
+        self.invalid_sessions = set()
+        # 寫入幾批後中斷（None 表示不中斷）
+        self.fail_after = None
+
+    async def execute_many(self, sql, params_list, batch_errors=False, rejected=None):
+        await asyncio.sleep(0)
+        if not self.available or self.fail_after == 0:
+            raise ConnectionError("Oracle 資料庫無法連線")
+        if self.fail_after is not None:
+            self.fail_after -= 1
+        failed = [row for row in params_list if row["session_id"] in self.invalid_sessions]
+        if rejected is not None:
+            rejected.extend(failed)
+        self.batches.append([row for row in params_list if row not in failed])
+        return len(params_list) - len(failed)
+
+
+def submit(writer, index):
+    return writer.submit(
+        staff_id="STAFF001",
+        session_id=f"S{index}",
+        usage_type="chat",
+        prompt_text="問題",
+        response_text="回答" * 3000,
+        prompt_tokens=100,
+        completion_tokens=20,
+        total_tokens=120,
+        cost_amount=0.0008
+    )
+
+
+@pytest.fixture
+def db():
+    return FakeDatabase()
+
+
+@pytest.fixture
+def spill_path(tmp_path):
+    return str(tmp_path / "ai_usage_spill.jsonl")
+
+
+class TestBatching:
+    """依筆數與時間觸發批次寫入"""
+
+    @pytest.mark.asyncio
+    async def test_size_trigger(self, db, spill_path):
+        writer = UsageLogWriter(db, batch_size=3, flush_interval=5, spill_path=spill_path)
+        writer.start()
+
+        for i in range(7):
+            assert submit(writer, i)
+        await asyncio.sleep(0.05)
+
+        assert [len(batch) for batch in db.batches] == [3, 3]
+
+        await writer.close()
+        assert [len(batch) for batch in db.batches] == [3, 3, 1]
+        assert writer.written == 7
+        assert len(db.batches[0][0]["response_text"]) == 4000
+
+    @pytest.mark.asyncio
+    async def test_time_trigger(self, db, spill_path):
+        writer = UsageLogWriter(db, batch_size=50, flush_interval=0.05, spill_path=spill_path)
+        writer.start()
+
+        submit(writer, 1)
+        await asyncio.sleep(0.15)
+
+        assert len(db.batches) == 1
+        await writer.close()
+
+    @pytest.mark.asyncio
+    async def test_queue_full_spills(self, db, spill_path):
+        """佇列已滿時直接寫入暫存檔"""
+        writer = UsageLogWriter(db, queue_size=1, spill_path=spill_path)
+
+        assert submit(writer, 1)
+        assert not submit(writer, 2)
+        # 暫存檔在背景執行緒寫入
+        await asyncio.sleep(0.05)
+        assert writer.spilled == 1
+        assert Path(spill_path).exists()
+
+
+class TestSpill:
+    """資料庫中斷時暫存到檔案，恢復後補寫"""
+
+    @pytest.mark.asyncio
+    async def test_spill_and_replay(self, db, spill_path):
+        writer = UsageLogWriter(db, batch_size=2, flush_interval=0.02, spill_path=spill_path)
+        writer.start()
+
+        db.available = False
+        for i in range(3):
+            submit(writer, i)
+        await asyncio.sleep(0.1)
+
+        assert writer.failed_batches == 2
+        assert writer.spilled == 3
+        assert Path(spill_path).exists()
+
+        db.available = True
+        submit(writer, 3)
+        await writer.close()
+
+        sessions = [row["session_id"] for batch in db.batches for row in batch]
+        assert sorted(sessions) == ["S0", "S1", "S2", "S3"]
+        assert writer.written == 4
+        assert not Path(spill_path).exists()
+        # 補寫的記錄保留原本的建立時間
+        assert all(row["created_at"].year >= 2024 for batch in db.batches for row in batch)
+
+    @pytest.mark.asyncio
+    async def test_partial_replay_not_counted_twice(self, db, spill_path):
+        writer = UsageLogWriter(db, batch_size=2, spill_path=spill_path)
+        db.available = False
+        await writer._write_batch([_record(i) for i in range(5)])
+        assert writer.spilled == 5
+
+        # 補寫第一批成功後中斷，剩餘記錄放回暫存檔
+        db.available = True
+        db.fail_after = 2
+        await writer._write_batch([_record(9)])
+
+        assert writer.spilled == 5
+        assert writer.written == 3
+        assert _sessions(spill_path) == ["S2", "S3", "S4"]
+        assert not writer.replay_path.exists()
+
+    @pytest.mark.asyncio
+    async def test_leftover_replay_file_not_overwritten(self, db, spill_path):
+        """補寫途中程序結束留下的 .replay 檔案先補寫，不被新的暫存檔覆蓋"""
+        writer = UsageLogWriter(db, spill_path=spill_path)
+        db.available = False
+        await writer._write_batch([_record(1)])
+        Path(spill_path).replace(writer.replay_path)
+        await writer._write_batch([_record(2)])
+
+        db.available = True
+        await writer._write_batch([_record(3)])
+
+        sessions = [row["session_id"] for batch in db.batches for row in batch]
+        assert sorted(sessions) == ["S1", "S2", "S3"]
+        assert not Path(spill_path).exists()
+        assert not writer.replay_path.exists()
+
+    @pytest.mark.asyncio
+    async def test_rejected_rows_saved(self, db, spill_path):
+        writer = UsageLogWriter(db, spill_path=spill_path)
+        db.invalid_sessions = {"S2"}
+
+        await writer._write_batch([_record(i) for i in range(1, 4)])
+
+        assert writer.written == 2
+        assert writer.rejected == 1
+        assert _sessions(writer.rejected_path) == ["S2"]
+        # 被拒絕的資料列不會自動補寫
+        assert not Path(spill_path).exists()
+
+    @pytest.mark.asyncio
+    async def test_close_with_full_queue_does_not_block(self, db, spill_path):
+        writer = UsageLogWriter(db, batch_size=1, flush_interval=0.01, queue_size=2, spill_path=spill_path)
+        writer.start()
+        submit(writer, 1)
+        submit(writer, 2)
+        assert writer.queue.full()
+
+        await asyncio.wait_for(writer.close(), 1)
+
+        sessions = [row["session_id"] for batch in db.batches for row in batch]
+        assert sessions == ["S1", "S2"]
+
+
+def _record(index):
+    return {
+        "staff_id": "STAFF001",
+        "session_id": f"S{index}",
+        "usage_type": "chat",
+        "prompt_text": "問題",
+        "response_text": "回答",
+        "prompt_tokens": 1,
+        "completion_tokens": 1,
+        "total_tokens": 2,
+        "cost_amount": 0.0,
+        "created_at": datetime.now()
+    }
+
+
+def _sessions(path):
+    with Path(path).open(encoding="utf-8") as f:
+        return [json.loads(line)["session_id"] for line in f if line.strip()]
@@ -0,0 +1,129 @@
+"""
+測試本機向量檢索與混合排序
+"""
+import math
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加 backend 與 mcp_servers 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+sys.path.insert(0, str(backend_dir / "mcp_servers"))
+
+from common.promotion_index import PromotionSearchIndex
+from common.vector_index import HashingEmbedder, VectorIndex, create_embedder
+
+TEXTS = [
+    "5G 雙飽專案 網內免費 上網吃到飽",
+    "學生方案 專屬優惠 小資 便宜",
+    "家庭共享方案 全家一起省 多門號",
+    "商務專案 企業 辦公 通話"
+]
+
+
+class CountingEmbedder(HashingEmbedder):
+    """記錄轉換筆數的雜湊 Embedding"""
+
+    def __init__(self):
+        super().__init__(dimension=64)
+        self.embedded = 0
+
+    def embed(self, texts):
+        self.embedded += len(texts)
+        return super().embed(texts)
+
+
+def test_hashing_embedder_deterministic_and_normalized():
+    first = HashingEmbedder(dimension=128).embed(["吃到飽 5G"])[0]
+    second = HashingEmbedder(dimension=128).embed(["吃到飽 5G"])[0]
+
+    assert first == second
+    assert math.isclose(sum(value * value for value in first), 1.0)
+
+
+def test_unknown_embedder_falls_back_to_hashing():
+    assert create_embedder("hashing:64").dimension == 64
+    assert isinstance(create_embedder("unknown"), HashingEmbedder)
+
+
+class TestVectorIndex:
+    """向量檢索"""
+
+    def test_most_similar_first(self):
+        index = VectorIndex(HashingEmbedder())
+        index.build(TEXTS)
+
+        hits = index.search("學生 便宜方案", limit=2)
+
+        assert hits[0][0] == 1
+        assert hits == sorted(hits, key=lambda hit: hit[1], reverse=True)
+
+    def test_allowed_bitmap_and_min_score(self):
+        index = VectorIndex(HashingEmbedder())
+        index.build(TEXTS)
+
+        hits = index.search("學生 便宜方案", limit=4, allowed=0b1100, min_score=0.0)
+
+        assert {doc_id for doc_id, _ in hits} <= {2, 3}
+        assert index.search("xyz", limit=4, min_score=0.2) == []
+
+    def test_snapshot_reused_until_content_changes(self, tmp_path):
+        snapshot = tmp_path / "vectors.json"
+        embedder = CountingEmbedder()
+
+        VectorIndex(embedder, snapshot_path=str(snapshot)).build(TEXTS)
+        reloaded = VectorIndex(embedder, snapshot_path=str(snapshot))
+        reloaded.build(TEXTS)
+
+        assert snapshot.exists()
+        assert embedder.embedded == len(TEXTS)
+        assert reloaded.search("家庭 共享", limit=1)[0][0] == 2
+
+        # 內容變更時重新轉換
+        before = embedder.embedded
+        VectorIndex(embedder, snapshot_path=str(snapshot)).build(TEXTS + ["新方案"])
+        assert embedder.embedded == before + len(TEXTS) + 1
+
+
+class TestHybridSearch:
+    """關鍵字與向量混合排序"""
+
+    @pytest.fixture
+    def promotions(self):
+        return [
+            {
+                "promotion_id": f"PROMO{i}",
+                "title": text.split()[0],
+                "description": text,
+                "keywords": text.split()[1:],
+                "eligibility": {"contract_type": ["續約"] if i % 2 else ["攜碼"]},
+                "priority": i
+            }
+            for i, text in enumerate(TEXTS)
+        ]
+
+    def test_modes(self, promotions):
+        index = PromotionSearchIndex(promotions, vector_index=VectorIndex(HashingEmbedder()))
+
+        for mode in ("keyword", "vector", "hybrid"):
+            results, total = index.search("學生 便宜", limit=3, mode=mode)
+            assert results[0][0]["promotion_id"] == "PROMO1"
+            assert total == len(results)
+
+        with pytest.raises(ValueError):
+            index.search("學生", mode="semantic")
+
+    def test_contract_filter_lists_all_eligible(self, promotions):
+        index = PromotionSearchIndex(promotions, vector_index=VectorIndex(HashingEmbedder()))
+
+        results, total = index.search("企業 辦公", contract_type="續約", limit=5, mode="hybrid")
+
+        assert [promo["promotion_id"] for promo, _ in results] == ["PROMO3", "PROMO1"]
+        assert total == 2
+
+    def test_without_vector_index_uses_keywords(self, promotions):
+        index = PromotionSearchIndex(promotions)
+
+        assert index.search("學生", mode="vector") == index.search("學生", mode="keyword")
@@ -0,0 +1,477 @@
+"""
+測試 WorkflowSessionManager
+使用 MockRedis，不需要啟動 Redis
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# 添加 backend 到路徑
+backend_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.services.redis_manager import RedisManager, MockRedis
+from app.services.workflow_session import WorkflowSessionManager, WorkflowStep
+
+
+def create_redis_manager() -> RedisManager:
+    """建立使用 MockRedis 的 RedisManager"""
+    redis_manager = RedisManager()
+    redis_manager.redis = MockRedis()
+    return redis_manager
+
+
+class TestHashStorage:
+    """hash 儲存模式測試"""
+
+    @pytest.mark.asyncio
+    async def test_create_and_get_session(self):
+        """建立後可完整讀回 Session"""
+        manager = WorkflowSessionManager(create_redis_manager(), storage_mode="hash")
+
+        session = await manager.create_session("STAFF001")
+        loaded = await manager.get_session(session["session_id"])
+
+        assert loaded["staff_id"] == "STAFF001"
+        assert loaded["current_step"] == WorkflowStep.INIT.value
+        assert loaded["customer_selection"] == {}
+        assert "chat_history" not in loaded
+
+    @pytest.mark.asyncio
+    async def test_partial_updates_write_only_changed_fields(self):
+        """customer_selection 子欄位各自成為 Hash 欄位"""
+        redis_manager = create_redis_manager()
+        manager = WorkflowSessionManager(redis_manager, storage_mode="hash")
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+
+        await manager.update_customer_selection(session_id, {"customer_id": "C123456"})
+        await manager.update_customer_selection(session_id, {"device_os": "ios"})
+        await manager.update_session(session_id, {"device": {"device_id": "none"}})
+
+        fields = redis_manager.redis.hashes[f"renewal_session:{session_id}"]
+        assert "customer_selection.customer_id" in fields
+        assert "customer_selection.device_os" in fields
+
+        loaded = await manager.get_session(session_id)
+        assert loaded["customer_selection"] == {"customer_id": "C123456", "device_os": "ios"}
+        assert loaded["device"] == {"device_id": "none"}
+
+    @pytest.mark.asyncio
+    async def test_transition_and_reset(self):
+        """狀態轉換與重置"""
+        manager = WorkflowSessionManager(create_redis_manager(), storage_mode="hash")
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+
+        await manager.transition_to_step(session_id, WorkflowStep.QUERY_CUSTOMER)
+        with pytest.raises(ValueError):
+            await manager.transition_to_step(session_id, WorkflowStep.CONFIRM)
+
+        await manager.reset_to_step(session_id, WorkflowStep.SELECT_PHONE)
+        loaded = await manager.get_session(session_id)
+        assert loaded["current_step"] == WorkflowStep.SELECT_PHONE.value
+
+    @pytest.mark.asyncio
+    async def test_update_missing_session(self):
+        """更新不存在的 Session 不會建立殘缺資料"""
+        redis_manager = create_redis_manager()
+        manager = WorkflowSessionManager(redis_manager, storage_mode="hash")
+
+        assert await manager.update_customer_selection("missing", {"a": 1}) is False
+        assert await manager.get_session("missing") is None
+        assert redis_manager.redis.hashes == {}
+
+    @pytest.mark.asyncio
+    async def test_legacy_json_session_is_migrated(self):
+        """舊的 JSON 格式 Session 讀取後轉為 Hash"""
+        redis_manager = create_redis_manager()
+        json_manager = WorkflowSessionManager(redis_manager, storage_mode="json")
+        session_id = (await json_manager.create_session("STAFF001"))["session_id"]
+
+        hash_manager = WorkflowSessionManager(redis_manager, storage_mode="hash")
+        loaded = await hash_manager.get_session(session_id)
+
+        assert loaded["staff_id"] == "STAFF001"
+        assert f"renewal_session:{session_id}" in redis_manager.redis.hashes
+        assert await hash_manager.update_session(session_id, {"phone": {"phone_number": "0912345678"}})
+
+
+class TestAtomicTransition:
+    """原子狀態轉換測試（hash 模式走 Lua 腳本，json 模式走 WATCH/MULTI）"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("storage_mode", ["hash", "json"])
+    async def test_chained_transition(self, storage_mode):
+        """一次完成多段轉換"""
+        manager = WorkflowSessionManager(create_redis_manager(), storage_mode=storage_mode)
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+
+        await manager.transition_steps(
+            session_id, [WorkflowStep.QUERY_CUSTOMER, WorkflowStep.LIST_PHONES]
+        )
+
+        loaded = await manager.get_session(session_id)
+        assert loaded["current_step"] == WorkflowStep.LIST_PHONES.value
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("storage_mode", ["hash", "json"])
+    async def test_invalid_chain_rejected(self, storage_mode):
+        """步驟鏈本身不合法時拒絕，且不寫入"""
+        manager = WorkflowSessionManager(create_redis_manager(), storage_mode=storage_mode)
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+
+        with pytest.raises(ValueError):
+            await manager.transition_steps(
+                session_id, [WorkflowStep.QUERY_CUSTOMER, WorkflowStep.CONFIRM]
+            )
+
+        loaded = await manager.get_session(session_id)
+        assert loaded["current_step"] == WorkflowStep.INIT.value
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("storage_mode", ["hash", "json"])
+    async def test_conflicting_transition_rejected(self, storage_mode):
+        """目前步驟已被其他請求改變時，相同的轉換會被拒絕"""
+        manager = WorkflowSessionManager(create_redis_manager(), storage_mode=storage_mode)
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+
+        await manager.transition_to_step(session_id, WorkflowStep.QUERY_CUSTOMER)
+        with pytest.raises(ValueError):
+            await manager.transition_to_step(session_id, WorkflowStep.QUERY_CUSTOMER)
+        with pytest.raises(ValueError):
+            await manager.transition_steps(
+                session_id, [WorkflowStep.LIST_PHONES], expected_step=WorkflowStep.INIT
+            )
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("storage_mode", ["hash", "json"])
+    async def test_missing_session(self, storage_mode):
+        """Session 不存在"""
+        manager = WorkflowSessionManager(create_redis_manager(), storage_mode=storage_mode)
+
+        with pytest.raises(ValueError, match="Session 不存在"):
+            await manager.transition_to_step("missing", WorkflowStep.QUERY_CUSTOMER)
+
+
+class TestJsonStorage:
+    """json 儲存模式（預設）測試"""
+
+    @pytest.mark.asyncio
+    async def test_update_and_transition(self):
+        """更新與狀態轉換"""
+        manager = WorkflowSessionManager(create_redis_manager(), storage_mode="json")
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+
+        await manager.update_customer_selection(session_id, {"customer_id": "C123456"})
+        await manager.transition_to_step(session_id, WorkflowStep.QUERY_CUSTOMER)
+
+        loaded = await manager.get_session(session_id)
+        assert loaded["customer_selection"]["customer_id"] == "C123456"
+        assert loaded["current_step"] == WorkflowStep.QUERY_CUSTOMER.value
+
+
+class TestUnitOfWork:
+    """請求範圍工作單元測試"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("storage_mode", ["hash", "json"])
+    async def test_changes_written_only_on_flush(self, storage_mode):
+        """變更累積於記憶體，flush 時一次寫回"""
+        manager = WorkflowSessionManager(create_redis_manager(), storage_mode=storage_mode)
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+
+        unit = await manager.load(session_id)
+        unit.update_customer_selection({"customer_id": "C123456"})
+        unit.transition_steps([WorkflowStep.QUERY_CUSTOMER, WorkflowStep.LIST_PHONES])
+        unit.update_session({"device": {"device_id": "none"}})
+
+        assert unit.data["current_step"] == WorkflowStep.LIST_PHONES.value
+        assert (await manager.get_session(session_id))["current_step"] == WorkflowStep.INIT.value
+
+        assert await unit.flush()
+        assert not unit.dirty
+
+        loaded = await manager.get_session(session_id)
+        assert loaded["current_step"] == WorkflowStep.LIST_PHONES.value
+        assert loaded["customer_selection"] == {"customer_id": "C123456"}
+        assert loaded["device"] == {"device_id": "none"}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("storage_mode", ["hash", "json"])
+    async def test_invalid_transition_raises_immediately(self, storage_mode):
+        """非法轉換在記憶體中即被拒絕"""
+        manager = WorkflowSessionManager(create_redis_manager(), storage_mode=storage_mode)
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+
+        unit = await manager.load(session_id)
+        with pytest.raises(ValueError):
+            unit.transition_to_step(WorkflowStep.CONFIRM)
+
+        unit.reset_to_step(WorkflowStep.SELECT_PHONE)
+        unit.transition_to_step(WorkflowStep.CHECK_ELIGIBILITY)
+        assert await unit.flush()
+        assert (await manager.get_session(session_id))["current_step"] == \
+            WorkflowStep.CHECK_ELIGIBILITY.value
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("storage_mode", ["hash", "json"])
+    async def test_concurrent_transition_rejected_on_flush(self, storage_mode):
+        """其他請求已改變目前步驟時，寫回被拒絕"""
+        manager = WorkflowSessionManager(create_redis_manager(), storage_mode=storage_mode)
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+
+        first = await manager.load(session_id)
+        second = await manager.load(session_id)
+        first.transition_to_step(WorkflowStep.QUERY_CUSTOMER)
+        second.transition_to_step(WorkflowStep.QUERY_CUSTOMER)
+
+        assert await first.flush()
+        with pytest.raises(ValueError):
+            await second.flush()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("storage_mode", ["hash", "json"])
+    async def test_flush_missing_session(self, storage_mode):
+        """Session 在請求期間被刪除時不會重新建立"""
+        redis_manager = create_redis_manager()
+        manager = WorkflowSessionManager(redis_manager, storage_mode=storage_mode)
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+
+        unit = await manager.load(session_id)
+        await manager.delete_session(session_id)
+        unit.update_customer_selection({"customer_id": "C123456"})
+
+        with pytest.raises(ValueError, match="Session 不存在"):
+            await unit.flush()
+        assert await manager.get_session(session_id) is None
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("storage_mode", ["hash", "json"])
+    async def test_flush_keeps_concurrent_writes(self, storage_mode):
+        """寫回只套用本請求變動的欄位，不覆蓋其他請求期間寫入的資料"""
+        manager = WorkflowSessionManager(create_redis_manager(), storage_mode=storage_mode)
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+
+        unit = await manager.load(session_id)
+        await manager.update_session(session_id, {"device": {"device_id": "D1"}})
+        await manager.update_customer_selection(session_id, {"device_os": "ios"})
+        unit.update_customer_selection({"customer_id": "C123456"})
+
+        assert await unit.flush()
+
+        loaded = await manager.get_session(session_id)
+        assert loaded["device"] == {"device_id": "D1"}
+        assert loaded["customer_selection"] == {"device_os": "ios", "customer_id": "C123456"}
+
+
+class TestStaffSessions:
+    """員工 Session 清除測試"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("storage_mode", ["hash", "json"])
+    async def test_clear_staff_sessions(self, storage_mode):
+        """一次清除員工所有 Session"""
+        manager = WorkflowSessionManager(create_redis_manager(), storage_mode=storage_mode)
+        first = (await manager.create_session("STAFF001"))["session_id"]
+        second = (await manager.create_session("STAFF001", clear_existing=False))["session_id"]
+
+        assert await manager.clear_staff_sessions("STAFF001") == 2
+        assert await manager.get_session(first) is None
+        assert await manager.get_session(second) is None
+        assert await manager.get_staff_sessions("STAFF001") == []
+
+
+class TestChatHistory:
+    """對話紀錄（獨立 List）測試"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("storage_mode", ["hash", "json"])
+    async def test_history_is_bounded_and_outside_session(self, storage_mode):
+        """只保留最近 window 筆，且不寫入 Session 本體"""
+        manager = WorkflowSessionManager(
+            create_redis_manager(), storage_mode=storage_mode, chat_history_window=3
+        )
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+
+        for i in range(5):
+            assert await manager.add_chat_message(session_id, "user", f"訊息 {i}")
+
+        history = await manager.get_chat_history(session_id)
+        assert [message["content"] for message in history] == ["訊息 2", "訊息 3", "訊息 4"]
+        assert [m["content"] for m in await manager.get_chat_history(session_id, limit=1)] == ["訊息 4"]
+        assert "chat_history" not in await manager.get_session(session_id)
+
+    @pytest.mark.asyncio
+    async def test_missing_session(self):
+        """Session 不存在時不建立對話紀錄"""
+        redis_manager = create_redis_manager()
+        manager = WorkflowSessionManager(redis_manager)
+
+        assert await manager.add_chat_message("missing", "user", "你好") is False
+        assert redis_manager.redis.lists == {}
+
+    @pytest.mark.asyncio
+    async def test_summary_trims_history(self):
+        """寫入摘要時修剪已摘要的訊息；刪除 Session 一併清除"""
+        redis_manager = create_redis_manager()
+        manager = WorkflowSessionManager(redis_manager)
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+        for i in range(4):
+            await manager.add_chat_message(session_id, "user", f"訊息 {i}")
+
+        assert await manager.get_chat_summary(session_id) is None
+        assert await manager.set_chat_summary(session_id, "客戶想換 iPhone", keep_last=1)
+
+        assert await manager.get_chat_summary(session_id) == "客戶想換 iPhone"
+        assert [m["content"] for m in await manager.get_chat_history(session_id)] == ["訊息 3"]
+
+        await manager.delete_session(session_id)
+        assert await manager.get_chat_history(session_id) == []
+        assert await manager.get_chat_summary(session_id) is None
+
+    @pytest.mark.asyncio
+    async def test_summary_keeps_messages_added_while_summarizing(self):
+        """只修剪產生摘要時讀取的訊息，期間新增的訊息保留"""
+        manager = WorkflowSessionManager(create_redis_manager(), chat_history_window=6)
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+        for i in range(4):
+            await manager.add_chat_message(session_id, "user", f"訊息 {i}")
+
+        history = await manager.get_chat_history(session_id)
+        await manager.add_chat_message(session_id, "user", "新訊息")
+        assert await manager.set_chat_summary(session_id, "摘要", keep_last=1, history=history)
+
+        assert [m["content"] for m in await manager.get_chat_history(session_id)] == ["訊息 3", "新訊息"]
+
+        # 紀錄已達保留上限，新增訊息時從前端移除了舊訊息
+        for i in range(5):
+            await manager.add_chat_message(session_id, "user", f"後續 {i}")
+        history = await manager.get_chat_history(session_id)
+        await manager.add_chat_message(session_id, "user", "最新")
+        assert await manager.set_chat_summary(session_id, "摘要 2", keep_last=1, history=history)
+
+        assert [m["content"] for m in await manager.get_chat_history(session_id)] == ["後續 4", "最新"]
+        assert await manager.get_chat_summary(session_id) == "摘要 2"
+
+
+class TestSubmitApplication:
+    """提交申辦時 Session 與資料庫交易的順序"""
+
+    class FakeDatabase:
+        def __init__(self, fail: bool = False):
+            self.fail = fail
+            self.transactions = 0
+
+        async def execute_transaction(self, statements):
+            if self.fail:
+                raise RuntimeError("db down")
+            self.transactions += 1
+
+    async def create_app(self, db):
+        from quart import Quart
+        from app.routes.renewal_workflow import bp
+
+        app = Quart(__name__)
+        app.register_blueprint(bp, url_prefix="/renewal-workflow")
+        app.redis_manager = create_redis_manager()
+        app.db_manager = db
+
+        manager = WorkflowSessionManager(app.redis_manager)
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+        await manager.update_session(session_id, {
+            "current_step": WorkflowStep.CONFIRM.value,
+            "customer": {"customer_id": "C123456"},
+            "phone": {"phone_number": "0912345678"},
+            "selected_plan": {"plan_name": "5G 1399", "cost_details": {}}
+        })
+        return app, manager, session_id
+
+    @pytest.mark.asyncio
+    async def test_session_claimed_before_commit(self):
+        """Session 先轉為已完成，重送的申辦不會再寫入資料庫"""
+        db = self.FakeDatabase()
+        app, manager, session_id = await self.create_app(db)
+        client = app.test_client()
+
+        first = await client.post("/renewal-workflow/step/submit", json={"session_id": session_id})
+        second = await client.post("/renewal-workflow/step/submit", json={"session_id": session_id})
+
+        assert first.status_code == 200
+        assert second.status_code == 400
+        assert db.transactions == 1
+        loaded = await manager.get_session(session_id)
+        assert loaded["current_step"] == WorkflowStep.COMPLETED.value
+        assert loaded["order_number"] == (await first.get_json())["order_number"]
+
+    @pytest.mark.asyncio
+    async def test_session_restored_when_commit_fails(self):
+        """資料庫交易失敗時 Session 還原為確認步驟"""
+        app, manager, session_id = await self.create_app(self.FakeDatabase(fail=True))
+
+        response = await app.test_client().post(
+            "/renewal-workflow/step/submit", json={"session_id": session_id}
+        )
+
+        assert response.status_code == 500
+        loaded = await manager.get_session(session_id)
+        assert loaded["current_step"] == WorkflowStep.CONFIRM.value
+        assert loaded["order_number"] is None
+
+    @pytest.mark.asyncio
+    async def test_flush_failure_after_commit_keeps_success(self):
+        """資料庫已提交時，Session 寫回失敗不改為錯誤回應"""
+        from quart import Quart, g, jsonify
+        from app.routes.renewal_workflow import flush_workflow_sessions
+
+        class FailingUnit:
+            session_id = "renewal_x"
+
+            async def flush(self):
+                raise ValueError("changed")
+
+        app = Quart(__name__)
+        async with app.test_request_context("/"):
+            g.workflow_sessions = {"renewal_x": FailingUnit()}
+            g.workflow_committed = True
+            response = await flush_workflow_sessions(jsonify({"success": True}))
+            assert response.status_code == 200
+
+            g.workflow_sessions = {"renewal_x": FailingUnit()}
+            response = await flush_workflow_sessions(jsonify({"success": True}))
+            assert response.status_code == 409
+
+
+class TestCustomerSelectionSemantics:
+    """update_session 中的 customer_selection 在兩種模式下都是整個取代"""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("storage_mode", ["hash", "json"])
+    async def test_update_session_replaces_selection(self, storage_mode):
+        redis_manager = create_redis_manager()
+        manager = WorkflowSessionManager(redis_manager, storage_mode=storage_mode)
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+
+        await manager.update_customer_selection(session_id, {"customer_id": "C1", "device_os": "ios"})
+        await manager.update_session(session_id, {"customer_selection": {"customer_id": "C2"}})
+
+        assert (await manager.get_session(session_id))["customer_selection"] == {"customer_id": "C2"}
+        if storage_mode == "hash":
+            fields = redis_manager.redis.hashes[f"renewal_session:{session_id}"]
+            assert "customer_selection.device_os" not in fields
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("storage_mode", ["hash", "json"])
+    async def test_unit_of_work_replaces_selection(self, storage_mode):
+        manager = WorkflowSessionManager(create_redis_manager(), storage_mode=storage_mode)
+        session_id = (await manager.create_session("STAFF001"))["session_id"]
+        await manager.update_customer_selection(session_id, {"customer_id": "C1", "device_os": "ios"})
+
+        unit = await manager.load(session_id)
+        unit.update_customer_selection({"phone_number": "0912345678"})
+        unit.update_session({"customer_selection": {"customer_id": "C2"}})
+        unit.update_customer_selection({"device_os": "android"})
+        assert await unit.flush()
+
+        expected = {"customer_id": "C2", "device_os": "android"}
+        assert unit.data["customer_selection"] == expected
+        assert (await manager.get_session(session_id))["customer_selection"] == expected